@@ -0,0 +1,57 @@
+import os
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+class Settings(BaseSettings):
+    identity_database_url: str
+    identity_secret_key: str
+    identity_algorithm: str = "HS256"
+    identity_user_jwt_expire_minutes: int = 30
+    # End-user access tokens (app.security) are ES256, so other services verify them
+    # with the public keys published at /.well-known/jwks.json. The PEM private key;
+    # empty generates a new key per process, which only suits development.
+    identity_user_jwt_private_key: str = ""
+    # PEM public key of the previous signing key, published until its tokens have expired
+    identity_user_jwt_previous_public_key: str = ""
+    identity_user_jwt_issuer: str = "identity-service"
+    # Revoked tokens per /internal/revocations page
+    revocation_page_size: int = 5000
+    hashing_pool_size: int = os.cpu_count() or 4
+    # Failed rows listed in a bulk import's response (app.imports); all are counted
+    import_max_errors: int = 1000
+    # Highest bcrypt cost an imported password_hash may have: every sign-in pays it
+    import_max_bcrypt_cost: int = 14
+
+    platform_api_url: str = "http://platform-api:8000"
+    platform_timeout_seconds: float = 5.0
+    # Calls to platform-api (app.resilience): connections/calls in flight, consecutive
+    # failures that open the breaker and how long it stays open, and when a slow
+    # /internal/verify-key call is hedged with a second request (0 disables hedging)
+    platform_max_connections: int = 50
+    platform_breaker_failures: int = 5
+    platform_breaker_reset_seconds: float = 10.0
+    platform_hedge_after_seconds: float = 0.05
+
+    # Webhooks (app.webhooks). Each tenant's signing secret is derived from this one;
+    # without it no endpoints can be registered and nothing is delivered.
+    identity_webhook_secret: str = ""
+    webhook_enabled: bool = True
+    # Deliveries (HTTP requests) in flight across all endpoints, and per endpoint
+    webhook_workers: int = 32
+    webhook_max_in_flight_per_endpoint: int = 4
+    # Events per delivery; 1 sends every event on its own
+    webhook_batch_size: int = 20
+    webhook_timeout_seconds: float = 10.0
+    webhook_max_attempts: int = 10
+    webhook_backoff_base_seconds: float = 2.0
+    webhook_backoff_max_seconds: float = 3600.0
+    # How often the outbox is polled when nothing wakes the dispatcher
+    webhook_poll_interval_seconds: float = 2.0
+    # Claimed events go back to the queue if not settled within this time (e.g. after a crash)
+    webhook_lease_seconds: float = 120.0
+    # Accepts http:// URLs and hosts with private, loopback or link-local addresses
+    # as endpoints. Only for development: it lets tenants reach internal services.
+    webhook_allow_private_targets: bool = False
+
+    model_config = SettingsConfigDict(env_file="../.env", extra="ignore")
+
+settings = Settings() #type: ignore
@@ -0,0 +1,40 @@
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import HTTPException, Security
+from fastapi.security.api_key import APIKeyHeader
+
+from app import platform_client
+from app.database import AsyncSessionLocal
+from app.logging_config import tenant_id_var
+
+api_key_header_scheme = APIKeyHeader(name="X-API-Key", auto_error=False)
+
+async def get_db():
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+@dataclass(frozen=True)
+class Tenant:
+    """The calling tenant, as resolved by platform-api."""
+    id: uuid.UUID
+    plan: str
+    max_users: int
+    max_markets: Optional[int] = None
+
+
+async def get_tenant(api_key: str = Security(api_key_header_scheme)) -> Tenant:
+    """Resolves the tenant behind the X-API-Key header through platform-api's /internal/verify-key."""
+    if not api_key:
+        raise HTTPException(status_code=401, detail="Missing X-API-Key header")
+    try:
+        info = await platform_client.verify_api_key(api_key)
+    except platform_client.PlatformUnavailable:
+        raise HTTPException(status_code=503, detail="Tenant verification unavailable")
+    if info is None:
+        raise HTTPException(status_code=401, detail="Invalid or revoked API Key")
+
+    tenant_id_var.set(info["tenant_id"])
+    return Tenant(id=uuid.UUID(info["tenant_id"]), plan=info["plan"], max_users=info["max_users"], max_markets=info.get("max_markets"))
@@ -0,0 +1,41 @@
+"""
+Shared thread pool for bcrypt work.
+
+bcrypt releases the GIL while it hashes, so running hashes on a small pool of
+threads keeps them off the event loop and lets concurrent logins use every core.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from app.config import settings
+from app.security import UNUSABLE_PASSWORD, pwd_context
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.hashing_pool_size, thread_name_prefix="bcrypt")
+    return _executor
+
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), pwd_context.hash, password)
+
+
+async def verify_password(password: str, hashed: Optional[str]) -> bool:
+    """Checks the password; with no usable hash (unknown user) it still spends the time of a check."""
+    loop = asyncio.get_running_loop()
+    if hashed is None or hashed == UNUSABLE_PASSWORD:
+        await loop.run_in_executor(get_executor(), pwd_context.dummy_verify)
+        return False
+    return await loop.run_in_executor(get_executor(), pwd_context.verify, password, hashed)
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
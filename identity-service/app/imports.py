@@ -0,0 +1,269 @@
+"""
+Bulk import of end users from a streamed CSV or NDJSON upload.
+
+The upload is never held in memory. Rows are parsed and validated as chunks
+arrive, and the valid ones stream straight into a temporary staging table over
+a single COPY. Then, in the same transaction:
+
+1. repeats of an email within the file are marked on the staging table;
+2. the tenant's user quota is locked (app.users). Every sign-up takes the same
+   lock, so from here on no other user can appear for the tenant;
+3. emails the tenant already has, then rows beyond the room left, are marked;
+4. the unmarked rows go into users in one INSERT ... SELECT.
+
+Rows carry an email and, optionally, a bcrypt password_hash exported from the
+tenant's previous system. Hashing plain passwords would take bcrypt's full cost
+per row, so they are not accepted; users without a hash get an unusable
+password and sign in after a reset. Hashes above import_max_bcrypt_cost are
+refused too, since every sign-in would pay that cost on the shared hashing pool.
+
+Rows are numbered from 1 in upload order, not counting a CSV header or blank
+lines. Failures are reported by row once the whole upload has been processed,
+up to import_max_errors of them; all of them are counted.
+"""
+import codecs
+import csv
+import json
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import AsyncIterator, Optional
+
+from pydantic import EmailStr, TypeAdapter, ValidationError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.metrics import Counter, Histogram
+from app.security import UNUSABLE_PASSWORD
+from app.users import normalize_email, reserve_quota
+
+import_rows_total = Counter("identity_user_import_rows_total", "Rows processed by bulk user imports", ["outcome"])
+import_seconds = Histogram("identity_user_import_seconds", "Bulk user import duration")
+
+CSV = "csv"
+NDJSON = "ndjson"
+
+# A single line longer than this is rejected rather than buffered
+MAX_LINE_CHARS = 64 * 1024
+
+_email = TypeAdapter(EmailStr)
+# RFC 5322 dot-atom: the unquoted ASCII local parts nearly every address has
+_dot_atom = re.compile(r"^[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+)*$")
+_bcrypt = re.compile(r"^\$2[aby]\$(\d\d)\$[./A-Za-z0-9]{53}$")
+# bcrypt's own minimum cost
+MIN_BCRYPT_COST = 4
+
+_create_staging = text(
+    "CREATE TEMPORARY TABLE user_import (row_no integer NOT NULL, email text NOT NULL, "
+    "hashed_password text NOT NULL, outcome text) ON COMMIT DROP"
+)
+_index_staging = text("CREATE INDEX ON user_import (row_no)")
+_mark_duplicates = text(
+    "UPDATE user_import s SET outcome = 'duplicate' FROM ("
+    "  SELECT row_no, row_number() OVER (PARTITION BY email ORDER BY row_no) AS nth FROM user_import"
+    ") d WHERE d.nth > 1 AND d.row_no = s.row_no"
+)
+_mark_existing = text(
+    "UPDATE user_import s SET outcome = 'exists' FROM users u "
+    "WHERE s.outcome IS NULL AND u.tenant_id = :tenant_id AND u.email = s.email"
+)
+_mark_over_quota = text(
+    "UPDATE user_import SET outcome = 'over_quota' WHERE outcome IS NULL AND row_no >= ("
+    "  SELECT row_no FROM user_import WHERE outcome IS NULL ORDER BY row_no OFFSET :room LIMIT 1"
+    ")"
+)
+_merge = text(
+    "INSERT INTO users (id, tenant_id, email, hashed_password, is_active, created_at) "
+    "SELECT gen_random_uuid(), :tenant_id, email, hashed_password, true, now() "
+    "FROM user_import WHERE outcome IS NULL ORDER BY row_no"
+)
+_outcome_counts = text("SELECT outcome, count(*) FROM user_import WHERE outcome IS NOT NULL GROUP BY outcome")
+_first_failures = text(
+    "SELECT row_no, email, outcome FROM user_import WHERE outcome IS NOT NULL ORDER BY row_no LIMIT :limit"
+)
+
+_MESSAGES = {
+    "duplicate": "Email appears earlier in the upload",
+    "exists": "Email already registered",
+    "over_quota": "User limit reached for your plan",
+}
+
+
+@lru_cache(maxsize=4096)
+def _valid_domain(domain: str) -> bool:
+    return _valid_address(f"postmaster@{domain}")
+
+
+def _valid_address(email: str) -> bool:
+    try:
+        _email.validate_python(email)
+        return True
+    except ValidationError:
+        return False
+
+
+def valid_email(email: str) -> bool:
+    """
+    Same answer as EmailStr. Checking a domain is most of EmailStr's cost, and an
+    import has few distinct domains, so plain local parts are checked here and
+    the domain's verdict is cached.
+    """
+    local, at, domain = email.rpartition("@")
+    if at and len(email) <= 254 and len(local) <= 64 and _dot_atom.match(local):
+        return _valid_domain(domain)
+    return _valid_address(email)
+
+
+class ImportRejected(Exception):
+    """The upload as a whole cannot be processed (bad header, oversized line)."""
+
+
+@dataclass
+class RowError:
+    row: int
+    email: Optional[str]
+    error: str
+
+
+@dataclass
+class ImportResult:
+    received: int = 0
+    created: int = 0
+    failed: int = 0
+    # The first import_max_errors failures, by row
+    errors: list[RowError] = field(default_factory=list)
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+        if len(buffer) > MAX_LINE_CHARS:
+            raise ImportRejected(f"Line longer than {MAX_LINE_CHARS} characters")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+async def _csv_rows(lines: AsyncIterator[str]) -> AsyncIterator[dict | str]:
+    """Dicts keyed by the header's (lowercased) column names."""
+    header: Optional[list[str]] = None
+    pending: Optional[str] = None
+    async for line in lines:
+        pending = line if pending is None else pending + "\n" + line
+        # A quoted field may span lines; wait for its closing quote.
+        if pending.count('"') % 2:
+            if len(pending) > MAX_LINE_CHARS:
+                raise ImportRejected(f"Record longer than {MAX_LINE_CHARS} characters")
+            continue
+        record, pending = pending, None
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [name.strip().lower() for name in values]
+            if "email" not in header:
+                raise ImportRejected("The CSV header has no email column")
+            continue
+        yield dict(zip(header, values))
+    if pending is not None:
+        yield "Unterminated quoted field"
+
+
+async def _ndjson_rows(lines: AsyncIterator[str]) -> AsyncIterator[dict | str]:
+    async for line in lines:
+        if not line.strip():
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError:
+            yield "Not valid JSON"
+            continue
+        yield value if isinstance(value, dict) else "Not a JSON object"
+
+
+class UserImport:
+    def __init__(self, tenant_id: uuid.UUID, max_users: int, fmt: str):
+        self.tenant_id = tenant_id
+        self.max_users = max_users
+        self.fmt = fmt
+        self.result = ImportResult()
+
+    def _fail(self, row: int, email: Optional[str], error: str) -> None:
+        self.result.failed += 1
+        if len(self.result.errors) < settings.import_max_errors:
+            self.result.errors.append(RowError(row=row, email=email, error=error))
+
+    async def records(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, str, str]]:
+        """Valid rows as (row, email, hashed_password); invalid ones are recorded as failures."""
+        lines = _lines(chunks)
+        rows = _csv_rows(lines) if self.fmt == CSV else _ndjson_rows(lines)
+        async for fields in rows:
+            self.result.received += 1
+            row = self.result.received
+            if isinstance(fields, str):
+                import_rows_total.inc(outcome="invalid")
+                self._fail(row, None, fields)
+                continue
+
+            raw_email = fields.get("email")
+            email = normalize_email(raw_email) if isinstance(raw_email, str) else None
+            if email is None or not valid_email(email):
+                import_rows_total.inc(outcome="invalid")
+                self._fail(row, email, "Invalid email")
+                continue
+
+            hashed_password = fields.get("password_hash") or None
+            if hashed_password is not None:
+                match = _bcrypt.match(hashed_password) if isinstance(hashed_password, str) else None
+                if match is None:
+                    import_rows_total.inc(outcome="invalid")
+                    self._fail(row, email, "password_hash is not a bcrypt hash")
+                    continue
+                # Every sign-in verifies at the hash's cost, on the pool all tenants share.
+                if not MIN_BCRYPT_COST <= int(match.group(1)) <= settings.import_max_bcrypt_cost:
+                    import_rows_total.inc(outcome="invalid")
+                    self._fail(row, email, f"password_hash cost must be between {MIN_BCRYPT_COST:02d} and {settings.import_max_bcrypt_cost:02d}")
+                    continue
+            yield row, email, hashed_password or UNUSABLE_PASSWORD #type: ignore
+
+    async def run(self, db: AsyncSession, chunks: AsyncIterator[bytes]) -> ImportResult:
+        """Stages, checks and merges the upload. The caller commits."""
+        started = time.perf_counter()
+        await db.execute(_create_staging)
+        connection = await (await db.connection()).get_raw_connection()
+        await connection.driver_connection.copy_records_to_table( #type: ignore
+            "user_import", records=self.records(chunks), columns=("row_no", "email", "hashed_password"),
+        )
+
+        await db.execute(_index_staging)
+        await db.execute(text("ANALYZE user_import"))
+        await db.execute(_mark_duplicates)
+        # Held until the caller commits, so concurrent imports and sign-ups cannot overshoot the quota,
+        # nor add an email between the check below and the merge.
+        room = await reserve_quota(db, self.tenant_id, self.max_users)
+        await db.execute(_mark_existing, {"tenant_id": self.tenant_id})
+        await db.execute(_mark_over_quota, {"room": room})
+        merged = await db.execute(_merge, {"tenant_id": self.tenant_id})
+        self.result.created = merged.rowcount #type: ignore
+        import_rows_total.inc(self.result.created, outcome="created")
+
+        for outcome, count in await db.execute(_outcome_counts):
+            self.result.failed += count
+            import_rows_total.inc(count, outcome=outcome)
+        room_for_errors = settings.import_max_errors - len(self.result.errors)
+        if room_for_errors > 0:
+            failures = await db.execute(_first_failures, {"limit": room_for_errors})
+            self.result.errors += [RowError(row=row, email=email, error=_MESSAGES[outcome]) for row, email, outcome in failures]
+            # Validation failures were found while streaming, the rest afterwards; report them all by row.
+            self.result.errors.sort(key=lambda error: error.row)
+
+        import_seconds.observe(time.perf_counter() - started)
+        return self.result
@@ -1,7 +1,39 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.metrics import render_latest
+from app.startup import lifespan
+from app.logging_config import setup_logging, RequestContextMiddleware
+from app.resilience import DeadlineMiddleware
+from app.routers import auth, internal, users, webhooks
+from app.security import signing_keys
 
-app = FastAPI(title="Sentinel Service")
+setup_logging("identity-service")
+
+app = FastAPI(title="Sentinel Service", lifespan=lifespan)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(RequestContextMiddleware)
+app.include_router(users.router)
+app.include_router(auth.router)
+app.include_router(internal.router)
+app.include_router(webhooks.router)
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "service": "identity-service running"}
\ No newline at end of file
+    return {"status": "ok", "service": "identity-service running"}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: only succeeds once the connection pool has been warmed."""
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "warming", "service": "identity-service"})
+    return {"status": "ready", "service": "identity-service"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return render_latest()
+
+@app.get("/.well-known/jwks.json")
+async def jwks():
+    """Public keys user tokens are signed with, for services that verify them locally."""
+    return JSONResponse(content=signing_keys().jwks, headers={"Cache-Control": "public, max-age=300"})
@@ -1 +1,70 @@
-from app.database import Base
\ No newline at end of file
+import uuid
+from datetime import datetime, timezone
+from sqlalchemy import Column, String, Integer, BigInteger, Boolean, DateTime, ForeignKey, Index, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from app.database import Base
+
+
+class User(Base):
+    """An end user of one tenant. Emails are unique per tenant and stored lowercased."""
+    __tablename__ = 'users'
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    tenant_id = Column(UUID(as_uuid=True), nullable=False)
+    email = Column(String(255), nullable=False)
+    hashed_password = Column(String(255), nullable=False)
+    is_active = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('tenant_id', 'email', name='uq_users_tenant_email'),
+    )
+
+
+class RevokedToken(Base):
+    """
+    A user token withdrawn before it expired. Verifiers mirror this table
+    incrementally, in id order, through /internal/revocations.
+    """
+    __tablename__ = 'revoked_tokens'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    jti = Column(String(64), nullable=False, unique=True)
+    user_id = Column(UUID(as_uuid=True), nullable=False)
+    # The token's own expiry: after it, the entry no longer matters
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class WebhookEndpoint(Base):
+    __tablename__ = 'webhook_endpoints'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # One endpoint per tenant
+    tenant_id = Column(UUID(as_uuid=True), nullable=False, unique=True)
+    url = Column(String(2048), nullable=False)
+    is_active = Column(Boolean, nullable=False, default=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class WebhookEvent(Base):
+    """The outbox: one row per event per endpoint, written in the transaction that produced the event."""
+    __tablename__ = 'webhook_outbox'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    endpoint_id = Column(Integer, ForeignKey('webhook_endpoints.id', ondelete='CASCADE'), nullable=False)
+    event_type = Column(String(100), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    # PENDING until delivered (DELIVERED) or out of attempts (DEAD)
+    status = Column(String(20), nullable=False, default='PENDING')
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    last_error = Column(String(500))
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    delivered_at = Column(DateTime(timezone=True))
+
+    # The dispatcher only ever looks at pending rows, by endpoint and due time.
+    __table_args__ = (
+        Index('ix_webhook_outbox_endpoint_due', 'endpoint_id', 'next_attempt_at', postgresql_where=text("status = 'PENDING'")),
+    )
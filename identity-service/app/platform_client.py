@@ -0,0 +1,54 @@
+"""
+Calls from identity-service to platform-api.
+
+Every call goes through one ResilientClient (app.resilience). It gives
+platform-api its own pool of keep-alive connections, timeouts bounded by the
+caller's deadline, a circuit breaker and, for /internal/verify-key, hedged
+requests.
+"""
+from typing import Optional
+
+from app.config import settings
+from app.resilience import DependencyUnavailable, ResilientClient
+
+_client: Optional[ResilientClient] = None
+
+
+class PlatformUnavailable(Exception):
+    """platform-api could not be reached or answered with an unexpected error."""
+
+
+def client() -> ResilientClient:
+    global _client
+    if _client is None:
+        _client = ResilientClient(
+            "platform-api",
+            settings.platform_api_url,
+            timeout=settings.platform_timeout_seconds,
+            max_connections=settings.platform_max_connections,
+            breaker_failures=settings.platform_breaker_failures,
+            breaker_reset_seconds=settings.platform_breaker_reset_seconds,
+            hedge_after_seconds=settings.platform_hedge_after_seconds,
+        )
+    return _client
+
+
+async def close() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def verify_api_key(api_key: str) -> Optional[dict]:
+    """The tenant an API key belongs to, as returned by /internal/verify-key, or None if the key is invalid."""
+    try:
+        # A read-only lookup, so safe to hedge.
+        res = await client().get("/internal/verify-key", headers={"X-API-Key": api_key}, hedge=True)
+    except DependencyUnavailable as exc:
+        raise PlatformUnavailable(str(exc)) from exc
+    if res.status_code == 401:
+        return None
+    if res.status_code != 200:
+        raise PlatformUnavailable(f"verify-key answered {res.status_code}")
+    return res.json()
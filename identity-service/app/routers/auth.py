@@ -0,0 +1,43 @@
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.dependencies import get_db, get_tenant, Tenant
+from app.hashing import verify_password
+from app.models import RevokedToken, User
+from app.schemas import TokenResponse, UserLogin
+from app.security import create_user_token, verify_user_token
+from app.users import normalize_email
+
+router = APIRouter(prefix="/auth", tags=["Auth"])
+
+@router.post("/token", response_model=TokenResponse, status_code=200)
+async def login_user(credentials: UserLogin, db: AsyncSession = Depends(get_db), tenant: Tenant = Depends(get_tenant)):
+    """Exchanges one of the tenant's users' email and password for an access token."""
+    result = await db.execute(
+        select(User).where(User.tenant_id == tenant.id, User.email == normalize_email(credentials.email))
+    )
+    user = result.scalar_one_or_none()
+
+    if not await verify_password(credentials.password, str(user.hashed_password) if user else None):
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if not user.is_active: #type: ignore
+        raise HTTPException(status_code=403, detail="User account is disabled")
+
+    access_token, expires_in = create_user_token(user.id, tenant.id, tenant.max_markets) #type: ignore
+    return TokenResponse(access_token=access_token, expires_in=expires_in)
+
+@router.post("/revoke", status_code=204)
+async def revoke_token(claims: dict = Depends(verify_user_token), db: AsyncSession = Depends(get_db)):
+    """
+    Revokes the presented token (logout). Services verifying tokens locally
+    stop accepting it once they next pull /internal/revocations.
+    """
+    stmt = insert(RevokedToken).values(
+        jti=claims["jti"], user_id=claims["sub"], expires_at=datetime.fromtimestamp(claims["exp"], timezone.utc),
+    ).on_conflict_do_nothing(index_elements=[RevokedToken.jti])
+    await db.execute(stmt)
+    await db.commit()
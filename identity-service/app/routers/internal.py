@@ -0,0 +1,34 @@
+import time
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.dependencies import get_db
+from app.models import RevokedToken
+from app.schemas import RevocationsResponse
+
+router = APIRouter(prefix="/internal", tags=["Internal"])
+
+@router.get("/revocations", response_model=RevocationsResponse, status_code=200)
+async def list_revocations(since: int = Query(0, ge=0), db: AsyncSession = Depends(get_db)):
+    """
+    Internal endpoint polled by services that verify user tokens locally.
+    Returns revocations recorded after the `since` cursor, oldest first, one page
+    at a time. Entries whose token has already expired are left out.
+    """
+    result = await db.execute(
+        select(RevokedToken.id, RevokedToken.jti, RevokedToken.expires_at)
+        .where(RevokedToken.id > since)
+        .order_by(RevokedToken.id)
+        .limit(settings.revocation_page_size)
+    )
+    rows = result.all()
+    now = time.time()
+    revoked = [(jti, int(expires_at.timestamp())) for _, jti, expires_at in rows if expires_at.timestamp() > now]
+    return RevocationsResponse(
+        cursor=rows[-1].id if rows else since,
+        revoked=revoked,
+        more=len(rows) == settings.revocation_page_size,
+    )
@@ -0,0 +1,81 @@
+import time
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.dependencies import get_db, get_tenant, Tenant
+from app.hashing import hash_password
+from app.imports import CSV, NDJSON, ImportRejected, UserImport
+from app.models import User
+from app.schemas import UserCreate, UserImportError, UserImportResponse, UserResponse
+from app.users import normalize_email, reserve_quota
+from app.webhooks import dispatcher, enqueue
+
+router = APIRouter(prefix="/users", tags=["Users"])
+
+_IMPORT_FORMATS = {
+    "text/csv": CSV,
+    "application/x-ndjson": NDJSON,
+    "application/ndjson": NDJSON,
+    "application/jsonl": NDJSON,
+}
+
+@router.post("/", response_model=UserResponse, status_code=201)
+async def create_user(user_in: UserCreate, db: AsyncSession = Depends(get_db), tenant: Tenant = Depends(get_tenant)):
+    """Creates an end user for the calling tenant, within the plan's max_users."""
+    email = normalize_email(user_in.email)
+    # Hashed before the quota lock is taken, so the lock is held for milliseconds.
+    hashed_password = await hash_password(user_in.password)
+
+    if await reserve_quota(db, tenant.id, tenant.max_users) < 1:
+        raise HTTPException(status_code=403, detail="User limit reached for your plan")
+    existing = await db.execute(select(User.id).where(User.tenant_id == tenant.id, User.email == email))
+    if existing.scalar_one_or_none() is not None:
+        raise HTTPException(status_code=409, detail="Email already registered")
+
+    user = User(tenant_id=tenant.id, email=email, hashed_password=hashed_password)
+    db.add(user)
+    await db.flush()
+    await enqueue(db, tenant.id, "user.created", {"user_id": str(user.id), "email": email})
+    await db.commit()
+    dispatcher.notify()
+
+    return UserResponse(user_id=user.id, email=email, created_at=user.created_at) #type: ignore
+
+@router.post("/import", response_model=UserImportResponse, status_code=200)
+async def import_users(request: Request, db: AsyncSession = Depends(get_db), tenant: Tenant = Depends(get_tenant)):
+    """
+    Creates users in bulk from a streamed upload: CSV with a header row
+    (Content-Type: text/csv) or one JSON object per line (application/x-ndjson).
+    Each row has an `email` and optionally a bcrypt `password_hash`.
+
+    The upload is processed in constant memory and merged in one transaction.
+    Valid rows are created, up to the plan's max_users. Rows that are invalid,
+    repeated, already registered or over the limit are skipped, and the
+    response lists them.
+    """
+    started = time.perf_counter()
+    fmt = _IMPORT_FORMATS.get(request.headers.get("content-type", "").split(";")[0].strip().lower())
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Upload text/csv or application/x-ndjson")
+
+    job = UserImport(tenant.id, tenant.max_users, fmt)
+    try:
+        result = await job.run(db, request.stream())
+    except ImportRejected as exc:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=str(exc))
+    if result.created:
+        await enqueue(db, tenant.id, "users.imported", {"created": result.created, "failed": result.failed})
+    await db.commit()
+    if result.created:
+        dispatcher.notify()
+
+    return UserImportResponse(
+        received=result.received,
+        created=result.created,
+        failed=result.failed,
+        errors=[UserImportError(row=error.row, email=error.email, error=error.error) for error in result.errors],
+        elapsed_ms=int((time.perf_counter() - started) * 1000),
+    )
@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.dependencies import get_db, get_tenant, Tenant
+from app.models import WebhookEndpoint
+from app.schemas import WebhookEndpointIn, WebhookEndpointResponse, WebhookTestResponse
+from app.webhooks import UnsafeTarget, check_target, dispatcher, enqueue, tenant_secret
+
+router = APIRouter(prefix="/webhooks", tags=["Webhooks"])
+
+def _require_signing_secret() -> None:
+    if not settings.identity_webhook_secret:
+        raise HTTPException(status_code=503, detail="Webhooks are not configured")
+
+def _response(endpoint: WebhookEndpoint) -> WebhookEndpointResponse:
+    return WebhookEndpointResponse(url=str(endpoint.url), is_active=bool(endpoint.is_active), secret=tenant_secret(endpoint.tenant_id)) #type: ignore
+
+@router.put("/endpoint", response_model=WebhookEndpointResponse, status_code=200)
+async def set_endpoint(endpoint_in: WebhookEndpointIn, db: AsyncSession = Depends(get_db), tenant: Tenant = Depends(get_tenant)):
+    """
+    Registers (or replaces) the URL the tenant's events are delivered to, and returns
+    the secret deliveries are signed with. Events already queued go to the new URL.
+    The URL must be https, and its host must resolve to public addresses only.
+    """
+    _require_signing_secret()
+    try:
+        await check_target(str(endpoint_in.url))
+    except UnsafeTarget as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    stmt = insert(WebhookEndpoint).values(tenant_id=tenant.id, url=str(endpoint_in.url), is_active=True)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[WebhookEndpoint.tenant_id],
+        set_={"url": stmt.excluded.url, "is_active": True, "updated_at": stmt.excluded.updated_at},
+    ).returning(WebhookEndpoint)
+    endpoint = (await db.execute(stmt)).scalar_one()
+    await db.commit()
+    return _response(endpoint)
+
+@router.get("/endpoint", response_model=WebhookEndpointResponse, status_code=200)
+async def get_endpoint(db: AsyncSession = Depends(get_db), tenant: Tenant = Depends(get_tenant)):
+    _require_signing_secret()
+    endpoint = (await db.execute(select(WebhookEndpoint).where(WebhookEndpoint.tenant_id == tenant.id))).scalar_one_or_none()
+    if endpoint is None:
+        raise HTTPException(status_code=404, detail="No webhook endpoint registered")
+    return _response(endpoint)
+
+@router.delete("/endpoint", status_code=204)
+async def disable_endpoint(db: AsyncSession = Depends(get_db), tenant: Tenant = Depends(get_tenant)):
+    """Stops deliveries. Queued events are kept and resume if an endpoint is registered again."""
+    await db.execute(update(WebhookEndpoint).where(WebhookEndpoint.tenant_id == tenant.id).values(is_active=False))
+    await db.commit()
+
+@router.post("/test", response_model=WebhookTestResponse, status_code=202)
+async def send_test_event(db: AsyncSession = Depends(get_db), tenant: Tenant = Depends(get_tenant)):
+    """Queues a webhook.test event. Returns immediately; delivery happens in the background."""
+    _require_signing_secret()
+    queued = await enqueue(db, tenant.id, "webhook.test", {"tenant_id": str(tenant.id)})
+    await db.commit()
+    if queued == 0:
+        raise HTTPException(status_code=404, detail="No webhook endpoint registered")
+    dispatcher.notify()
+    return WebhookTestResponse(queued=queued)
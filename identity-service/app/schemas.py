@@ -0,0 +1,54 @@
+from datetime import datetime
+from uuid import UUID
+from typing import Optional
+from pydantic import BaseModel, EmailStr, HttpUrl, Field
+
+class UserCreate(BaseModel):
+    email: EmailStr
+    password: str = Field(min_length=8, max_length=72)
+
+class UserResponse(BaseModel):
+    user_id: UUID
+    email: str
+    created_at: datetime
+
+class UserImportError(BaseModel):
+    row: int
+    email: Optional[str] = None
+    error: str
+
+class UserImportResponse(BaseModel):
+    received: int
+    created: int
+    failed: int
+    # The first failures, by row; `failed` counts them all
+    errors: list[UserImportError]
+    elapsed_ms: int
+
+class UserLogin(BaseModel):
+    email: EmailStr
+    password: str
+
+class TokenResponse(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+    expires_in: int
+
+class RevocationsResponse(BaseModel):
+    # Pass back as `since` to fetch only newer revocations
+    cursor: int
+    # [jti, expiry as epoch seconds]
+    revoked: list[tuple[str, int]]
+    more: bool
+
+class WebhookEndpointIn(BaseModel):
+    url: HttpUrl
+
+class WebhookEndpointResponse(BaseModel):
+    url: str
+    is_active: bool
+    # Key for X-Sentinel-Signature (HMAC-SHA256 of "<timestamp>." + body)
+    secret: str
+
+class WebhookTestResponse(BaseModel):
+    queued: int
@@ -0,0 +1,127 @@
+"""
+End-user passwords and access tokens.
+
+Access tokens are ES256 JWTs. Other services verify them with the public keys
+published at /.well-known/jwks.json, in-process, instead of calling
+identity-service on every request. The header's `kid` names the signing key, so
+the key can be rotated: the previous key's public half stays published (as
+identity_user_jwt_previous_public_key) until the tokens it signed expire.
+
+A signed token cannot be withdrawn, so revoking one records its `jti` in
+revoked_tokens, which verifiers mirror through /internal/revocations.
+"""
+import base64
+import hashlib
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from fastapi import HTTPException, Security
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from jose import JWTError, jwt
+from passlib.context import CryptContext
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+ALGORITHM = "ES256"
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Stored for users imported without a password hash; matches no password
+UNUSABLE_PASSWORD = "!"
+jwt_bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def _b64(value: int) -> str:
+    return base64.urlsafe_b64encode(value.to_bytes(32, "big")).rstrip(b"=").decode()
+
+
+def public_jwk(public_key: ec.EllipticCurvePublicKey) -> dict:
+    """The key as a JWK, with its RFC 7638 thumbprint as `kid`."""
+    numbers = public_key.public_numbers()
+    members = {"crv": "P-256", "kty": "EC", "x": _b64(numbers.x), "y": _b64(numbers.y)}
+    thumbprint = hashlib.sha256(json.dumps(members, separators=(",", ":"), sort_keys=True).encode()).digest()
+    kid = base64.urlsafe_b64encode(thumbprint).rstrip(b"=").decode()
+    return {**members, "kid": kid, "use": "sig", "alg": ALGORITHM}
+
+
+class SigningKeys:
+    def __init__(self, private_pem: str = "", previous_public_pem: str = ""):
+        if private_pem:
+            private_key = serialization.load_pem_private_key(_pem(private_pem), password=None)
+        else:
+            logger.warning("No IDENTITY_USER_JWT_PRIVATE_KEY set; user tokens are signed with a key generated for this process")
+            private_key = ec.generate_private_key(ec.SECP256R1())
+        if not isinstance(private_key, ec.EllipticCurvePrivateKey):
+            raise ValueError("The user token signing key must be a P-256 EC key")
+
+        self.private_pem = private_key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ).decode()
+        current = public_jwk(private_key.public_key())
+        self.kid = current["kid"]
+        self.jwks = {"keys": [current]}
+        if previous_public_pem:
+            previous = serialization.load_pem_public_key(_pem(previous_public_pem))
+            if not isinstance(previous, ec.EllipticCurvePublicKey):
+                raise ValueError("The previous user token key must be a P-256 EC key")
+            self.jwks["keys"].append(public_jwk(previous))
+        # Verifying our own tokens needs the current key only
+        self.public_pem = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+
+
+def _pem(value: str) -> bytes:
+    # .env files often carry PEMs on one line with escaped newlines
+    return value.replace("\\n", "\n").encode()
+
+
+_keys: Optional[SigningKeys] = None
+
+
+def signing_keys() -> SigningKeys:
+    global _keys
+    if _keys is None:
+        _keys = SigningKeys(settings.identity_user_jwt_private_key, settings.identity_user_jwt_previous_public_key)
+    return _keys
+
+
+def create_user_token(user_id: uuid.UUID, tenant_id: uuid.UUID, max_markets: Optional[int] = None) -> tuple[str, int]:
+    """Signs an access token for the user. Returns it with its lifetime in seconds."""
+    keys = signing_keys()
+    now = datetime.now(timezone.utc)
+    lifetime = settings.identity_user_jwt_expire_minutes * 60
+    claims = {
+        "iss": settings.identity_user_jwt_issuer,
+        "sub": str(user_id),
+        "tid": str(tenant_id),
+        "jti": uuid.uuid4().hex,
+        "iat": now,
+        "exp": now + timedelta(seconds=lifetime),
+    }
+    if max_markets is not None:
+        # The tenant's market quota, so trade-engine needs no lookup to enforce it
+        claims["mkt"] = max_markets
+    return jwt.encode(claims, keys.private_pem, algorithm=ALGORITHM, headers={"kid": keys.kid}), lifetime
+
+
+async def verify_user_token(
+    token: HTTPAuthorizationCredentials = Security(jwt_bearer_scheme),
+) -> dict:
+    """Validates a user access token issued by this service and returns its claims."""
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing authorization token")
+    keys = signing_keys()
+    try:
+        return jwt.decode(
+            token.credentials, keys.public_pem, algorithms=[ALGORITHM], issuer=settings.identity_user_jwt_issuer,
+            options={"require_exp": True, "require_jti": True, "require_sub": True},
+        )
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Token is invalid or expired")
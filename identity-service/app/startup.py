@@ -0,0 +1,68 @@
+"""
+Application lifespan: opens the connection pool before traffic arrives and
+tracks readiness separately from liveness.
+
+/health answers as soon as the process is up. /ready only returns 200 once
+every pooled connection has been established. The webhook dispatcher starts
+with the process and stops before the pool is closed.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from sqlalchemy import text
+
+from app import hashing, platform_client
+from app.config import settings
+from app.database import engine
+from app.security import signing_keys
+from app.webhooks import dispatcher
+
+logger = logging.getLogger(__name__)
+
+WARMUP_RETRY_SECONDS = 2.0
+
+
+async def _warm_connection() -> None:
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def warm_up(app: FastAPI) -> None:
+    """Opens the pool, retrying until the database is reachable."""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    while True:
+        try:
+            # Opening pool.size() connections concurrently forces that many distinct connections.
+            await asyncio.gather(*(_warm_connection() for _ in range(engine.pool.size())))
+            break
+        except Exception:
+            logger.exception("Warm-up could not reach the database, retrying in %ss", WARMUP_RETRY_SECONDS)
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+
+    app.state.ready = True
+    logger.info("Warm-up finished in %.0fms", (loop.time() - started) * 1000)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    # Load (or generate) the token signing key now, so a bad key fails the start-up.
+    signing_keys()
+    warmup_task = asyncio.create_task(warm_up(app))
+    webhooks_enabled = settings.webhook_enabled and bool(settings.identity_webhook_secret)
+    if webhooks_enabled:
+        dispatcher.start()
+
+    yield
+
+    warmup_task.cancel()
+    await asyncio.gather(warmup_task, return_exceptions=True)
+    if webhooks_enabled:
+        await dispatcher.stop()
+    await platform_client.close()
+    hashing.shutdown()
+    await engine.dispose()
@@ -0,0 +1,27 @@
+"""
+End-user accounts and the tenant's user quota (Tenant.max_users in platform-api).
+
+Every path that adds users first takes a transaction-scoped advisory lock on
+the tenant, then counts. Concurrent sign-ups for one tenant queue on the lock
+instead of each seeing room for one more user, and other tenants never wait.
+"""
+import uuid
+
+from sqlalchemy import func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.models import User
+
+_lock_tenant = text("SELECT pg_advisory_xact_lock(hashtextextended(:tenant_id, 0))")
+
+
+async def reserve_quota(db: AsyncSession, tenant_id: uuid.UUID, max_users: int) -> int:
+    """Locks the tenant's quota until the transaction ends. Returns how many more users fit."""
+    await db.execute(_lock_tenant, {"tenant_id": str(tenant_id)})
+    count = await db.scalar(select(func.count()).select_from(User).where(User.tenant_id == tenant_id))
+    return max(max_users - (count or 0), 0)
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
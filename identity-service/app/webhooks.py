@@ -0,0 +1,402 @@
+"""
+Webhook delivery through a transactional outbox.
+
+Producing an event never waits on the network. enqueue() adds the event to
+webhook_outbox inside the caller's own transaction. It is a single INSERT ...
+SELECT, which writes nothing when the tenant has no active endpoint. notify()
+then wakes the dispatcher once that transaction has committed.
+
+The dispatcher claims due events in bulk with FOR UPDATE SKIP LOCKED and
+leases them for webhook_lease_seconds. Several replicas can run it side by
+side, and a crash only delays delivery. Claimed events are grouped per endpoint
+into deliveries of up to webhook_batch_size events and sent concurrently:
+
+- One shared httpx client serves every endpoint over pooled keep-alive
+  connections.
+- At most webhook_workers deliveries are in flight overall, and at most
+  webhook_max_in_flight_per_endpoint per endpoint. A claim only takes as many
+  events per endpoint as its free slots can send at once, so one backlogged
+  endpoint can neither fill every worker nor hold claimed events until their
+  lease runs out.
+- A 2xx marks the events DELIVERED. Any other status, or a network error,
+  schedules a retry with exponential backoff and jitter. After
+  webhook_max_attempts attempts the events are marked DEAD.
+
+Every delivery is a JSON body {"events": [{"id", "type", "created_at", "data"}, ...]}
+with two headers:
+
+    X-Sentinel-Timestamp: <unix seconds>
+    X-Sentinel-Signature: v1=<hex HMAC-SHA256 of "<timestamp>." + body>
+
+Endpoints must be https URLs whose host resolves only to public addresses:
+check_target() enforces that at registration, and the dispatcher's connections
+resolve the host again and connect to the address they checked, so a host that
+starts resolving to a private, loopback or link-local address later (DNS
+rebinding) is refused too. webhook_allow_private_targets lifts both rules for
+development.
+
+The key is the tenant's secret. tenant_secret() derives it from
+IDENTITY_WEBHOOK_SECRET, and it is returned when the endpoint is registered.
+Delivery is at least once, so receivers should dedupe on the event id.
+"""
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import random
+import socket
+import time
+import uuid
+from collections import defaultdict
+from typing import Optional
+
+import httpcore
+import httpx
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+webhook_deliveries = Counter("identity_webhook_deliveries_total", "Webhook HTTP deliveries", ["outcome"])
+webhook_events = Counter("identity_webhook_events_total", "Webhook events settled", ["status"])
+webhook_latency = Histogram("identity_webhook_delivery_seconds", "Webhook delivery request latency")
+webhook_in_flight = Gauge("identity_webhook_in_flight", "Webhook deliveries in flight")
+
+PENDING = "PENDING"
+DELIVERED = "DELIVERED"
+DEAD = "DEAD"
+
+TIMESTAMP_HEADER = "X-Sentinel-Timestamp"
+SIGNATURE_HEADER = "X-Sentinel-Signature"
+
+_enqueue = text(
+    "INSERT INTO webhook_outbox (endpoint_id, event_type, payload, status, attempts, next_attempt_at, created_at) "
+    "SELECT id, :event_type, CAST(:payload AS jsonb), 'PENDING', 0, now(), now() "
+    "FROM webhook_endpoints WHERE tenant_id = :tenant_id AND is_active"
+)
+# The oldest due events of each endpoint (an index probe per endpoint), at most :room of them,
+# or the endpoint's entry in :rooms if it already has deliveries in flight.
+_claim = text(
+    "WITH due AS ("
+    "  SELECT o.id FROM webhook_endpoints e"
+    "  LEFT JOIN unnest(CAST(:endpoint_ids AS integer[]), CAST(:rooms AS integer[])) AS r(endpoint_id, room)"
+    "    ON r.endpoint_id = e.id"
+    "  CROSS JOIN LATERAL ("
+    "    SELECT d.id, d.next_attempt_at FROM webhook_outbox d"
+    "    WHERE d.endpoint_id = e.id AND d.status = 'PENDING' AND d.next_attempt_at <= now()"
+    "    ORDER BY d.next_attempt_at LIMIT coalesce(r.room, :room)"
+    "  ) c"
+    "  JOIN webhook_outbox o ON o.id = c.id"
+    "  WHERE e.is_active AND e.id <> ALL(:busy) AND o.status = 'PENDING' AND o.next_attempt_at <= now()"
+    "  ORDER BY c.next_attempt_at LIMIT :limit FOR UPDATE OF o SKIP LOCKED"
+    ") "
+    "UPDATE webhook_outbox o SET next_attempt_at = now() + make_interval(secs => :lease) "
+    "FROM due, webhook_endpoints e WHERE o.id = due.id AND e.id = o.endpoint_id "
+    "RETURNING o.id, o.endpoint_id, e.tenant_id, e.url, o.event_type, o.payload, o.attempts, o.created_at"
+)
+_mark_delivered = text(
+    "UPDATE webhook_outbox SET status = 'DELIVERED', attempts = attempts + 1, delivered_at = now(), last_error = NULL "
+    "WHERE id = ANY(:ids)"
+)
+_mark_failed = text(
+    "UPDATE webhook_outbox SET attempts = attempts + 1, last_error = :error, "
+    "next_attempt_at = now() + make_interval(secs => :delay), "
+    "status = CASE WHEN attempts + 1 >= :max_attempts THEN 'DEAD' ELSE 'PENDING' END "
+    "WHERE id = ANY(:ids)"
+)
+
+
+def tenant_secret(tenant_id: uuid.UUID) -> str:
+    """The key a tenant's webhooks are signed with."""
+    digest = hmac.new(settings.identity_webhook_secret.encode(), f"webhook:{tenant_id}".encode(), hashlib.sha256)
+    return "whsec_" + digest.hexdigest()
+
+
+def sign(secret: str, timestamp: int, body: bytes) -> str:
+    return "v1=" + hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(secret: str, timestamp: str, signature: str, body: bytes, tolerance_seconds: int = 300) -> bool:
+    """What a receiver does with the two headers: checks the HMAC and rejects stale timestamps (replays)."""
+    try:
+        sent = int(timestamp)
+    except ValueError:
+        return False
+    if abs(time.time() - sent) > tolerance_seconds:
+        return False
+    return hmac.compare_digest(sign(secret, sent, body), signature)
+
+
+class UnsafeTarget(Exception):
+    """The URL is not https, or its host resolves to an address that is not public."""
+
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    return ip.is_global and not ip.is_multicast
+
+
+async def resolve_public(host: str, port: int) -> str:
+    """Resolves `host` and returns its first address, unless any of its addresses is not public."""
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as exc:
+        raise UnsafeTarget(f"{host} does not resolve: {exc}") from exc
+    addresses = [info[4][0] for info in infos]
+    if not addresses:
+        raise UnsafeTarget(f"{host} does not resolve")
+    private = [address for address in addresses if not _is_public(address)]
+    if private:
+        raise UnsafeTarget(f"{host} resolves to {private[0]}, which is not a public address")
+    return addresses[0]
+
+
+async def check_target(url: str) -> None:
+    """Raises UnsafeTarget unless `url` may receive webhooks."""
+    if settings.webhook_allow_private_targets:
+        return
+    parsed = httpx.URL(url)
+    if parsed.scheme != "https":
+        raise UnsafeTarget("Webhook URLs must use https")
+    await resolve_public(parsed.host, parsed.port or 443)
+
+
+class _PublicNetworkBackend(httpcore.AsyncNetworkBackend):
+    """Connects only to public addresses, and to the very address it checked."""
+
+    def __init__(self):
+        self._backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        if not settings.webhook_allow_private_targets:
+            try:
+                host = await resolve_public(host, port)
+            except UnsafeTarget as exc:
+                raise httpcore.ConnectError(str(exc)) from exc
+        return await self._backend.connect_tcp(host, port, timeout=timeout, local_address=local_address, socket_options=socket_options)
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        raise httpcore.ConnectError("Webhooks are not delivered to unix sockets")
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before the next try after `attempts` failures: exponential, capped, with the upper half jittered."""
+    delay = min(settings.webhook_backoff_max_seconds, settings.webhook_backoff_base_seconds * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+async def enqueue(session: AsyncSession, tenant_id: uuid.UUID, event_type: str, data: dict) -> int:
+    """
+    Adds an event for the tenant's endpoint to the outbox, in the caller's transaction.
+    Returns how many outbox rows were written (0 without an active endpoint).
+    Call dispatcher.notify() after committing to have it sent right away.
+    """
+    result = await session.execute(_enqueue, {"tenant_id": tenant_id, "event_type": event_type, "payload": json.dumps(data)})
+    return result.rowcount #type: ignore
+
+
+class Delivery:
+    """Up to webhook_batch_size claimed events for one endpoint, sent as one request."""
+    __slots__ = ("endpoint_id", "tenant_id", "url", "ids", "events", "attempts")
+
+    def __init__(self, endpoint_id: int, tenant_id: uuid.UUID, url: str):
+        self.endpoint_id = endpoint_id
+        self.tenant_id = tenant_id
+        self.url = url
+        self.ids: list[int] = []
+        self.events: list[dict] = []
+        # Attempts made so far by the most-tried event
+        self.attempts = 0
+
+
+class WebhookDispatcher:
+    def __init__(self, session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal):
+        self.session_factory = session_factory
+        self.client: Optional[httpx.AsyncClient] = None
+        self._workers: Optional[asyncio.Semaphore] = None
+        self._endpoint_slots: dict[int, asyncio.Semaphore] = {}
+        # endpoint id -> deliveries claimed and not yet settled
+        self._claimed: dict[int, int] = {}
+        self._in_flight: set[asyncio.Task] = set()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="webhook-dispatcher")
+
+    async def stop(self) -> None:
+        """Stops claiming and abandons deliveries in flight; their leases expire and they are sent again."""
+        tasks = [task for task in (self._task, *self._in_flight) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def notify(self) -> None:
+        """Wakes the dispatcher to claim new events now instead of at the next poll."""
+        self._wake.set()
+
+    async def run_once(self) -> int:
+        """Claims what is due and waits for those deliveries to settle. Returns the number of deliveries."""
+        deliveries = await self._claim(settings.webhook_workers * settings.webhook_batch_size)
+        await asyncio.gather(*(self._deliver(delivery) for delivery in deliveries))
+        return len(deliveries)
+
+    async def _run(self) -> None:
+        poll = settings.webhook_poll_interval_seconds
+        while True:
+            self._wake.clear()
+            free = settings.webhook_workers - len(self._in_flight)
+            filled = False
+            if free > 0:
+                try:
+                    deliveries = await self._claim(free * settings.webhook_batch_size)
+                except Exception:
+                    logger.exception("Claiming webhook events failed")
+                    deliveries = []
+                for delivery in deliveries:
+                    task = asyncio.create_task(self._deliver(delivery))
+                    self._in_flight.add(task)
+                    task.add_done_callback(self._delivery_done)
+                filled = len(deliveries) >= free
+            if not filled:
+                # Nothing more due, or every worker busy: wait for a new event, a finished delivery or the next poll.
+                try:
+                    await asyncio.wait_for(self._wake.wait(), poll)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _delivery_done(self, task: asyncio.Task) -> None:
+        self._in_flight.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Webhook delivery failed unexpectedly", exc_info=task.exception())
+        self._wake.set()
+
+    async def _claim(self, limit: int) -> list[Delivery]:
+        cap, batch = settings.webhook_max_in_flight_per_endpoint, settings.webhook_batch_size
+        busy = [endpoint_id for endpoint_id, claimed in self._claimed.items() if claimed >= cap]
+        partial = {endpoint_id: (cap - claimed) * batch for endpoint_id, claimed in self._claimed.items() if claimed < cap}
+        async with self.session_factory() as session:
+            rows = (await session.execute(_claim, {
+                "busy": busy, "endpoint_ids": list(partial), "rooms": list(partial.values()), "room": cap * batch,
+                "limit": limit, "lease": settings.webhook_lease_seconds,
+            })).all()
+            await session.commit()
+
+        by_endpoint: dict[int, list] = defaultdict(list)
+        for row in rows:
+            by_endpoint[row.endpoint_id].append(row)
+        deliveries = []
+        for endpoint_rows in by_endpoint.values():
+            endpoint_rows.sort(key=lambda row: row.id)
+            for start in range(0, len(endpoint_rows), settings.webhook_batch_size):
+                chunk = endpoint_rows[start:start + settings.webhook_batch_size]
+                delivery = Delivery(chunk[0].endpoint_id, chunk[0].tenant_id, chunk[0].url)
+                for row in chunk:
+                    delivery.ids.append(row.id)
+                    delivery.events.append({"id": row.id, "type": row.event_type, "created_at": row.created_at.isoformat(), "data": row.payload})
+                    delivery.attempts = max(delivery.attempts, row.attempts)
+                deliveries.append(delivery)
+                self._claimed[delivery.endpoint_id] = self._claimed.get(delivery.endpoint_id, 0) + 1
+        return deliveries
+
+    def _client(self) -> httpx.AsyncClient:
+        if self.client is None:
+            workers = settings.webhook_workers
+            transport = httpx.AsyncHTTPTransport()
+            # httpx takes no resolver, so its pool is rebuilt around one that refuses private addresses.
+            transport._pool = httpcore.AsyncConnectionPool(
+                ssl_context=httpx.create_ssl_context(),
+                max_connections=workers,
+                max_keepalive_connections=workers,
+                keepalive_expiry=5.0,
+                network_backend=_PublicNetworkBackend(),
+            )
+            self.client = httpx.AsyncClient(
+                transport=transport,
+                timeout=settings.webhook_timeout_seconds,
+                headers={"User-Agent": "sentinel-webhooks/1"},
+            )
+        return self.client
+
+    async def _deliver(self, delivery: Delivery) -> None:
+        try:
+            await self._send_and_settle(delivery)
+        finally:
+            claimed = self._claimed.get(delivery.endpoint_id, 1) - 1
+            if claimed > 0:
+                self._claimed[delivery.endpoint_id] = claimed
+            else:
+                self._claimed.pop(delivery.endpoint_id, None)
+                self._endpoint_slots.pop(delivery.endpoint_id, None)
+
+    async def _send_and_settle(self, delivery: Delivery) -> None:
+        if self._workers is None:
+            self._workers = asyncio.Semaphore(settings.webhook_workers)
+        slots = self._endpoint_slots.get(delivery.endpoint_id)
+        if slots is None:
+            slots = self._endpoint_slots[delivery.endpoint_id] = asyncio.Semaphore(settings.webhook_max_in_flight_per_endpoint)
+
+        body = json.dumps({"events": delivery.events}, separators=(",", ":")).encode()
+        error: Optional[str] = None
+        # The endpoint's slot first: waiting for it must not hold a worker other endpoints could use.
+        async with slots, self._workers:
+            webhook_in_flight.inc()
+            timestamp = int(time.time())
+            headers = {
+                "Content-Type": "application/json",
+                TIMESTAMP_HEADER: str(timestamp),
+                SIGNATURE_HEADER: sign(tenant_secret(delivery.tenant_id), timestamp, body),
+            }
+            started = time.perf_counter()
+            try:
+                if not settings.webhook_allow_private_targets and not delivery.url.startswith("https://"):
+                    raise httpx.UnsupportedProtocol("Webhook URLs must use https")
+                res = await self._client().post(delivery.url, content=body, headers=headers)
+                if not 200 <= res.status_code < 300:
+                    error = f"HTTP {res.status_code}"
+            except httpx.HTTPError as exc:
+                error = f"{type(exc).__name__}: {exc}"
+            finally:
+                webhook_in_flight.inc(-1)
+                webhook_latency.observe(time.perf_counter() - started)
+
+        await self._settle(delivery, error)
+
+    async def _settle(self, delivery: Delivery, error: Optional[str]) -> None:
+        async with self.session_factory() as session:
+            if error is None:
+                await session.execute(_mark_delivered, {"ids": delivery.ids})
+            else:
+                attempts = delivery.attempts + 1
+                await session.execute(_mark_failed, {
+                    "ids": delivery.ids, "error": error[:500], "delay": backoff_seconds(attempts),
+                    "max_attempts": settings.webhook_max_attempts,
+                })
+            await session.commit()
+
+        if error is None:
+            webhook_deliveries.inc(outcome="delivered")
+            webhook_events.inc(len(delivery.ids), status=DELIVERED)
+        elif delivery.attempts + 1 >= settings.webhook_max_attempts:
+            webhook_deliveries.inc(outcome="dead")
+            webhook_events.inc(len(delivery.ids), status=DEAD)
+            logger.warning("Webhook delivery to %s gave up after %d attempts: %s", delivery.url, delivery.attempts + 1, error)
+        else:
+            webhook_deliveries.inc(outcome="retry")
+            logger.info("Webhook delivery to %s failed (%s), retrying", delivery.url, error)
+
+
+dispatcher = WebhookDispatcher()
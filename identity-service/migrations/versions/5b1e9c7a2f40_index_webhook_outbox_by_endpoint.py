@@ -0,0 +1,30 @@
+"""index webhook outbox by endpoint
+
+Revision ID: 5b1e9c7a2f40
+Revises: 86adc2d01590
+Create Date: 2026-10-19 11:02:41.117392
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e9c7a2f40'
+down_revision: Union[str, Sequence[str], None] = '86adc2d01590'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_webhook_outbox_endpoint_due', 'webhook_outbox', ['endpoint_id', 'next_attempt_at'], unique=False, postgresql_where=sa.text("status = 'PENDING'"))
+    op.drop_index('ix_webhook_outbox_due', table_name='webhook_outbox', postgresql_where=sa.text("status = 'PENDING'"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_webhook_outbox_due', 'webhook_outbox', ['next_attempt_at'], unique=False, postgresql_where=sa.text("status = 'PENDING'"))
+    op.drop_index('ix_webhook_outbox_endpoint_due', table_name='webhook_outbox', postgresql_where=sa.text("status = 'PENDING'"))
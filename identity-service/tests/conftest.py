@@ -0,0 +1,67 @@
+import uuid
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from app.config import settings
+from sqlalchemy.pool import NullPool
+
+from app.main import app
+from app.database import Base
+from app.dependencies import get_db, get_tenant, Tenant
+
+#a separate database URL specifically for testing.
+TEST_DATABASE_URL = settings.identity_database_url.replace("/identity_db", "/identity_test_db")
+settings.identity_webhook_secret = settings.identity_webhook_secret or "test-webhook-secret"
+
+engine = create_async_engine(
+    TEST_DATABASE_URL,
+    echo=False,
+    poolclass=NullPool
+)
+TestingSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+@pytest_asyncio.fixture(scope="session", autouse=True)
+async def setup_test_database():
+    """Creates the tables before tests run, and drops them after."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+@pytest.fixture
+def session_factory():
+    """The test session factory, for code that opens its own sessions (background workers)."""
+    return TestingSessionLocal
+
+@pytest_asyncio.fixture
+async def db_session():
+    """Provides a fresh database session for a single test."""
+    async with TestingSessionLocal() as session:
+        yield session
+        await session.rollback()
+
+@pytest.fixture
+def tenant():
+    """The tenant platform-api would resolve the caller's API key to."""
+    return Tenant(id=uuid.uuid4(), plan="FREE", max_users=100)
+
+@pytest_asyncio.fixture
+async def client(db_session: AsyncSession, tenant: Tenant):
+    """
+    Overrides the get_db dependency to use the test database and get_tenant
+    to skip platform-api, and yields an AsyncClient to make mock HTTP requests.
+    """
+    async def override_get_db():
+        yield db_session
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_tenant] = lambda: tenant
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test", headers={"X-API-Key": "snt_test"}) as ac:
+        yield ac
+
+    app.dependency_overrides.clear()
@@ -0,0 +1,76 @@
+import uuid
+import pytest
+from httpx import AsyncClient
+from jose import jwk, jwt
+
+from app.dependencies import Tenant, get_tenant
+from app.main import app
+from app.security import ALGORITHM
+
+pytestmark = pytest.mark.asyncio
+
+PASSWORD = "correct horse"
+
+
+async def create_user(client: AsyncClient, email: str) -> dict:
+    res = await client.post("/users/", json={"email": email, "password": PASSWORD})
+    assert res.status_code == 201, res.text
+    return res.json()
+
+
+async def login(client: AsyncClient, email: str, password: str = PASSWORD):
+    return await client.post("/auth/token", json={"email": email, "password": password})
+
+
+async def test_tokens_verify_against_the_published_key_set(client: AsyncClient, tenant):
+    user = await create_user(client, "Alice@Example.com")
+    assert user["email"] == "alice@example.com"
+
+    res = await login(client, "alice@example.com")
+    assert res.status_code == 200
+    token = res.json()["access_token"]
+    assert res.json()["expires_in"] > 0
+
+    keys = (await client.get("/.well-known/jwks.json")).json()["keys"]
+    kid = jwt.get_unverified_header(token)["kid"]
+    [key] = [key for key in keys if key["kid"] == kid]
+    assert "d" not in key
+    claims = jwt.decode(token, jwk.construct(key, ALGORITHM), algorithms=[ALGORITHM], issuer="identity-service")
+    assert claims["sub"] == user["user_id"]
+    assert claims["tid"] == str(tenant.id)
+
+    assert (await login(client, "alice@example.com", "wrong password")).status_code == 401
+    assert (await login(client, "nobody@example.com")).status_code == 401
+    res = await client.post("/users/", json={"email": "alice@example.com", "password": PASSWORD})
+    assert res.status_code == 409
+
+
+async def test_sign_ups_stop_at_the_plan_limit(client: AsyncClient):
+    small = Tenant(id=uuid.uuid4(), plan="FREE", max_users=2)
+    app.dependency_overrides[get_tenant] = lambda: small
+    for i in range(2):
+        await create_user(client, f"user{i}@example.com")
+    res = await client.post("/users/", json={"email": "one-too-many@example.com", "password": PASSWORD})
+    assert res.status_code == 403
+
+
+async def test_revocations_are_served_incrementally(client: AsyncClient):
+    await create_user(client, "bob@example.com")
+    first = (await login(client, "bob@example.com")).json()["access_token"]
+    second = (await login(client, "bob@example.com")).json()["access_token"]
+
+    start = (await client.get("/internal/revocations")).json()["cursor"]
+    res = await client.post("/auth/revoke", headers={"Authorization": f"Bearer {first}"})
+    assert res.status_code == 204
+    # Revoking twice is harmless.
+    assert (await client.post("/auth/revoke", headers={"Authorization": f"Bearer {first}"})).status_code == 204
+
+    page = (await client.get("/internal/revocations", params={"since": start})).json()
+    assert [jti for jti, _ in page["revoked"]] == [jwt.get_unverified_claims(first)["jti"]]
+    assert page["more"] is False
+
+    await client.post("/auth/revoke", headers={"Authorization": f"Bearer {second}"})
+    page = (await client.get("/internal/revocations", params={"since": page["cursor"]})).json()
+    assert [jti for jti, _ in page["revoked"]] == [jwt.get_unverified_claims(second)["jti"]]
+
+    assert (await client.post("/auth/revoke", headers={"Authorization": "Bearer not-a-token"})).status_code == 401
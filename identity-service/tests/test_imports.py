@@ -0,0 +1,137 @@
+import asyncio
+import uuid
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.dependencies import Tenant, get_tenant
+from app.main import app
+from app.models import User
+from app.security import pwd_context
+from app.users import reserve_quota
+
+pytestmark = pytest.mark.asyncio
+
+CSV_HEADERS = {"Content-Type": "text/csv"}
+NDJSON_HEADERS = {"Content-Type": "application/x-ndjson"}
+
+
+async def chunked(data: str, size: int = 7):
+    """The upload as a stream of small chunks, splitting lines and multi-byte characters."""
+    raw = data.encode()
+    for start in range(0, len(raw), size):
+        yield raw[start:start + size]
+
+
+async def user_count(session_factory, tenant_id: uuid.UUID) -> int:
+    async with session_factory() as session:
+        return await session.scalar(select(func.count()).select_from(User).where(User.tenant_id == tenant_id))
+
+
+async def test_csv_import_reports_every_failed_row(client: AsyncClient, tenant, session_factory):
+    res = await client.post("/users/", json={"email": "existing@example.com", "password": "password123"})
+    assert res.status_code == 201
+    password_hash = pwd_context.hash("imported password")
+
+    upload = (
+        "Email,Password_Hash,Note\r\n"
+        f"ada@example.com,{password_hash},\r\n"
+        "not-an-email,,\r\n"
+        "grace@example.com,plaintext,\r\n"
+        "\r\n"
+        'zoë@example.com,,"a note\nover two lines"\r\n'
+        "ADA@example.com,,\r\n"
+        "existing@example.com,,\r\n"
+        "linus@example.com,,\r\n"
+        f"slow@example.com,{password_hash[:4]}31{password_hash[6:]},\r\n"
+        f"broken@example.com,{password_hash[:4]}99{password_hash[6:]},\r\n"
+    )
+    res = await client.post("/users/import", content=chunked(upload), headers=CSV_HEADERS)
+    assert res.status_code == 200, res.text
+    body = res.json()
+    assert (body["received"], body["created"], body["failed"]) == (9, 3, 6)
+    assert [(error["row"], error["error"]) for error in body["errors"]] == [
+        (2, "Invalid email"),
+        (3, "password_hash is not a bcrypt hash"),
+        (5, "Email appears earlier in the upload"),
+        (6, "Email already registered"),
+        (8, "password_hash cost must be between 04 and 14"),
+        (9, "password_hash cost must be between 04 and 14"),
+    ]
+
+    async with session_factory() as session:
+        emails = (await session.execute(select(User.email).where(User.tenant_id == tenant.id))).scalars().all()
+    assert sorted(emails) == ["ada@example.com", "existing@example.com", "linus@example.com", "zoë@example.com"]
+
+    # Imported hashes work as they did in the old system; users without one cannot sign in yet.
+    res = await client.post("/auth/token", json={"email": "ada@example.com", "password": "imported password"})
+    assert res.status_code == 200
+    res = await client.post("/auth/token", json={"email": "linus@example.com", "password": "!"})
+    assert res.status_code == 401
+
+
+async def test_import_stops_at_the_plan_limit(client: AsyncClient, session_factory):
+    small = Tenant(id=uuid.uuid4(), plan="FREE", max_users=3)
+    app.dependency_overrides[get_tenant] = lambda: small
+    upload = "".join(f'{{"email": "user{i}@example.com"}}\n' for i in range(5))
+
+    res = await client.post("/users/import", content=chunked(upload), headers=NDJSON_HEADERS)
+    body = res.json()
+    assert (body["created"], body["failed"]) == (3, 2)
+    assert [(error["row"], error["error"]) for error in body["errors"]] == [
+        (4, "User limit reached for your plan"), (5, "User limit reached for your plan"),
+    ]
+    res = await client.post("/users/import", content=chunked('{"email": "late@example.com"}\n'), headers=NDJSON_HEADERS)
+    assert res.json()["created"] == 0
+    assert await user_count(session_factory, small.id) == 3
+
+
+async def test_sign_up_during_import_is_reported_as_existing(client: AsyncClient, tenant, session_factory):
+    upload = '{"email": "race@example.com"}\n{"email": "other@example.com"}\n'
+    async with session_factory() as session:
+        # A sign-up holding the quota lock, not yet committed
+        assert await reserve_quota(session, tenant.id, tenant.max_users) > 0
+        session.add(User(tenant_id=tenant.id, email="race@example.com", hashed_password="x"))
+        await session.flush()
+        request = asyncio.create_task(client.post("/users/import", content=chunked(upload), headers=NDJSON_HEADERS))
+        await asyncio.sleep(0.5)
+        assert not request.done()
+        await session.commit()
+
+    res = await request
+    assert res.status_code == 200, res.text
+    body = res.json()
+    assert (body["created"], body["failed"]) == (1, 1)
+    assert body["errors"] == [{"row": 1, "email": "race@example.com", "error": "Email already registered"}]
+
+
+async def test_large_import_caps_the_error_list(client: AsyncClient, session_factory, monkeypatch):
+    monkeypatch.setattr(settings, "import_max_errors", 5)
+    large = Tenant(id=uuid.uuid4(), plan="ENTERPRISE", max_users=100_000)
+    app.dependency_overrides[get_tenant] = lambda: large
+    rows = 20_000
+
+    async def upload():
+        yield b"email\n"
+        for start in range(0, rows, 1000):
+            yield "".join(
+                f"bulk{i}@example.com\n" if i % 100 else "broken\n" for i in range(start, start + 1000)
+            ).encode()
+
+    res = await client.post("/users/import", content=upload(), headers=CSV_HEADERS)
+    body = res.json()
+    assert (body["received"], body["created"], body["failed"]) == (rows, rows - rows // 100, rows // 100)
+    assert [error["row"] for error in body["errors"]] == [1, 101, 201, 301, 401]
+    assert await user_count(session_factory, large.id) == rows - rows // 100
+
+
+async def test_rejected_uploads(client: AsyncClient, tenant, session_factory):
+    res = await client.post("/users/import", content=b"email\n", headers={"Content-Type": "application/json"})
+    assert res.status_code == 415
+    res = await client.post("/users/import", content=chunked("name\nada\n"), headers=CSV_HEADERS)
+    assert res.status_code == 400
+    res = await client.post("/users/import", content=chunked('["ada@example.com"]\nnot json\n'), headers=NDJSON_HEADERS)
+    assert [error["error"] for error in res.json()["errors"]] == ["Not a JSON object", "Not valid JSON"]
+    assert await user_count(session_factory, tenant.id) == 0
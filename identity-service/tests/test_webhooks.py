@@ -0,0 +1,234 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timezone
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import delete, update
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.models import WebhookEndpoint, WebhookEvent
+from app.webhooks import SIGNATURE_HEADER, TIMESTAMP_HEADER, WebhookDispatcher, backoff_seconds, enqueue, tenant_secret, verify_signature
+
+pytestmark = pytest.mark.asyncio
+
+
+class StubReceiver:
+    """A minimal HTTP/1.1 server with keep-alive that records what it is sent."""
+
+    def __init__(self):
+        self.requests: list[tuple[dict, bytes]] = []
+        # Status codes for the next requests, in order; 200 once used up
+        self.statuses: list[int] = []
+        self.delay = 0.0
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.url = f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}/hooks"
+
+    async def stop(self) -> None:
+        self.server.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while await reader.readline():
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, value = line.decode().split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                await asyncio.sleep(self.delay)
+                self.in_flight -= 1
+                self.requests.append((headers, body))
+                status = self.statuses.pop(0) if self.statuses else 200
+                writer.write(f"HTTP/1.1 {status} Stub\r\nContent-Length: 0\r\n\r\n".encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def event_ids(self) -> list[list[int]]:
+        return [[event["id"] for event in json.loads(body)["events"]] for _, body in self.requests]
+
+
+@pytest.fixture(autouse=True)
+def private_targets(monkeypatch):
+    """The stub receivers listen on loopback over plain http."""
+    monkeypatch.setattr(settings, "webhook_allow_private_targets", True)
+
+
+@pytest_asyncio.fixture
+async def receiver(session_factory):
+    async with session_factory() as session:
+        await session.execute(delete(WebhookEndpoint))
+        await session.commit()
+    stub = StubReceiver()
+    await stub.start()
+    yield stub
+    await stub.stop()
+
+
+@pytest_asyncio.fixture
+async def dispatcher(session_factory):
+    webhooks = WebhookDispatcher(session_factory)
+    yield webhooks
+    await webhooks.stop()
+
+
+async def register(session_factory, url: str) -> uuid.UUID:
+    tenant_id = uuid.uuid4()
+    async with session_factory() as session:
+        session.add(WebhookEndpoint(tenant_id=tenant_id, url=url))
+        await session.commit()
+    return tenant_id
+
+
+async def queue_events(session_factory, tenant_id: uuid.UUID, count: int) -> None:
+    async with session_factory() as session:
+        for i in range(count):
+            await enqueue(session, tenant_id, "user.created", {"n": i})
+        await session.commit()
+
+
+async def outbox(session_factory) -> list[WebhookEvent]:
+    async with session_factory() as session:
+        return list((await session.execute(select(WebhookEvent).order_by(WebhookEvent.id))).scalars())
+
+
+async def test_events_are_signed_batched_and_sent_over_one_connection(session_factory, receiver, dispatcher, monkeypatch):
+    monkeypatch.setattr(settings, "webhook_batch_size", 3)
+    monkeypatch.setattr(settings, "webhook_max_in_flight_per_endpoint", 1)
+    tenant_id = await register(session_factory, receiver.url)
+    await queue_events(session_factory, tenant_id, 7)
+    # Tenants without an endpoint produce no outbox rows.
+    async with session_factory() as session:
+        assert await enqueue(session, uuid.uuid4(), "user.created", {}) == 0
+
+    # One delivery in flight per claim, so three claims drain the outbox.
+    assert [await dispatcher.run_once() for _ in range(4)] == [1, 1, 1, 0]
+    rows = await outbox(session_factory)
+    assert receiver.event_ids() == [[row.id for row in rows[i:i + 3]] for i in (0, 3, 6)]
+    assert receiver.connections == 1
+    assert {(row.status, row.attempts) for row in rows} == {("DELIVERED", 1)}
+
+    headers, body = receiver.requests[0]
+    assert verify_signature(tenant_secret(tenant_id), headers[TIMESTAMP_HEADER.lower()], headers[SIGNATURE_HEADER.lower()], body)
+    assert not verify_signature(tenant_secret(uuid.uuid4()), headers[TIMESTAMP_HEADER.lower()], headers[SIGNATURE_HEADER.lower()], body)
+    assert json.loads(body)["events"][0]["type"] == "user.created"
+    assert json.loads(body)["events"][0]["data"] == {"n": 0}
+
+
+async def test_failures_back_off_and_finally_give_up(session_factory, receiver, dispatcher, monkeypatch):
+    monkeypatch.setattr(settings, "webhook_max_attempts", 2)
+    tenant_id = await register(session_factory, receiver.url)
+    await queue_events(session_factory, tenant_id, 1)
+
+    receiver.statuses = [500, 503]
+    await dispatcher.run_once()
+    [row] = await outbox(session_factory)
+    assert (row.status, row.attempts, row.last_error) == ("PENDING", 1, "HTTP 500")
+    assert row.next_attempt_at > datetime.now(timezone.utc)
+    # Not due yet
+    assert await dispatcher.run_once() == 0
+
+    async with session_factory() as session:
+        await session.execute(update(WebhookEvent).values(next_attempt_at=datetime.now(timezone.utc)))
+        await session.commit()
+    await dispatcher.run_once()
+    [row] = await outbox(session_factory)
+    assert (row.status, row.attempts, row.last_error) == ("DEAD", 2, "HTTP 503")
+    assert len(receiver.requests) == 2
+
+    base = settings.webhook_backoff_base_seconds
+    for attempts in (1, 3, 30):
+        delay = min(settings.webhook_backoff_max_seconds, base * 2 ** (attempts - 1))
+        assert delay / 2 <= backoff_seconds(attempts) <= delay
+
+
+async def test_in_flight_requests_are_capped_per_endpoint(session_factory, receiver, dispatcher, monkeypatch):
+    monkeypatch.setattr(settings, "webhook_batch_size", 1)
+    monkeypatch.setattr(settings, "webhook_max_in_flight_per_endpoint", 2)
+    receiver.delay = 0.05
+    tenant_id = await register(session_factory, receiver.url)
+    await queue_events(session_factory, tenant_id, 8)
+
+    # A claim takes no more for the endpoint than its free slots can send.
+    assert await dispatcher.run_once() == 2
+    while await dispatcher.run_once():
+        pass
+    assert receiver.max_in_flight == 2
+    assert sorted(sum(receiver.event_ids(), [])) == [row.id for row in await outbox(session_factory)]
+
+
+async def test_a_backlogged_endpoint_does_not_starve_the_others(session_factory, receiver, dispatcher, monkeypatch):
+    monkeypatch.setattr(settings, "webhook_batch_size", 1)
+    monkeypatch.setattr(settings, "webhook_max_in_flight_per_endpoint", 2)
+    monkeypatch.setattr(settings, "webhook_workers", 4)
+    other = StubReceiver()
+    await other.start()
+    try:
+        backlogged = await register(session_factory, receiver.url)
+        await queue_events(session_factory, backlogged, 20)
+        quiet = await register(session_factory, other.url)
+        await queue_events(session_factory, quiet, 1)
+
+        # The quiet endpoint's event was queued after the whole backlog, and still goes out in the first claim.
+        assert await dispatcher.run_once() == 3
+        assert len(receiver.requests) == 2
+        assert len(other.requests) == 1
+    finally:
+        await other.stop()
+
+
+async def test_background_dispatcher_delivers_without_blocking_requests(client: AsyncClient, tenant, session_factory, receiver, monkeypatch):
+    res = await client.put("/webhooks/endpoint", json={"url": receiver.url})
+    assert res.status_code == 200
+    assert res.json()["secret"] == tenant_secret(tenant.id)
+    assert (await client.get("/webhooks/endpoint")).json()["url"] == receiver.url
+
+    from app import webhooks
+    background = WebhookDispatcher(session_factory)
+    monkeypatch.setattr(webhooks, "dispatcher", background)
+    monkeypatch.setattr("app.routers.webhooks.dispatcher", background)
+    receiver.delay = 0.2
+    background.start()
+    try:
+        res = await client.post("/webhooks/test")
+        assert res.status_code == 202 and res.json() == {"queued": 1}
+        # The response came back while the receiver is still holding the delivery.
+        assert receiver.requests == []
+        for _ in range(50):
+            if receiver.requests:
+                break
+            await asyncio.sleep(0.05)
+        assert json.loads(receiver.requests[0][1])["events"][0]["type"] == "webhook.test"
+    finally:
+        await background.stop()
+
+    assert (await client.delete("/webhooks/endpoint")).status_code == 204
+    assert (await client.post("/webhooks/test")).status_code == 404
+
+
+async def test_only_public_https_targets_are_accepted(client: AsyncClient, tenant, session_factory, receiver, dispatcher, monkeypatch):
+    monkeypatch.setattr(settings, "webhook_allow_private_targets", False)
+    for url in ("http://example.com/hooks", "https://127.0.0.1/hooks", "https://localhost/hooks", "https://169.254.169.254/latest", "https://10.0.0.7/hooks", "https://[::1]/hooks"):
+        res = await client.put("/webhooks/endpoint", json={"url": url})
+        assert res.status_code == 400, url
+
+    # A host that resolves somewhere private by delivery time is not connected to either.
+    tenant_id = await register(session_factory, receiver.url.replace("http://", "https://"))
+    await queue_events(session_factory, tenant_id, 1)
+    assert await dispatcher.run_once() == 1
+    [row] = await outbox(session_factory)
+    assert row.status == "PENDING" and "not a public address" in row.last_error
+    assert receiver.connections == 0
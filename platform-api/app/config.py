@@ -1,3 +1,4 @@
+import os
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -5,6 +6,20 @@ class Settings(BaseSettings):
     platform_secret_key: str
     platform_algorithm: str = "HS256"
     platform_admin_jwt_expire_minutes: int = 60
+    super_admin_secret: str = ""
+    # Adds per-request query count / DB time headers to every response
+    debug: bool = False
+    startup_warmup: bool = True
+    hashing_pool_size: int = os.cpu_count() or 4
+
+    # Runs the purge loop (app.purge) in this process. Off by default: enable it on one
+    # instance only, or run `python -m app.purge` as a scheduled job instead.
+    purge_enabled: bool = False
+    purge_interval_seconds: int = 3600
+    purge_grace_days: int = 30
+    purge_batch_size: int = 1000
+    purge_batch_pause_seconds: float = 0.2
+    purge_dry_run: bool = False
 
     model_config = SettingsConfigDict(env_file="../.env", extra="ignore")
 
@@ -0,0 +1,34 @@
+"""
+Shared thread pool for bcrypt work.
+
+bcrypt releases the GIL while it hashes, so running hashes on a small pool of
+threads keeps them off the event loop and lets a batch use every core.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import settings
+from app.security import pwd_context
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.hashing_pool_size, thread_name_prefix="bcrypt")
+    return _executor
+
+
+async def hash_many(values: list[str]) -> list[str]:
+    """Hashes every value on the hashing pool, preserving order."""
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    return list(await asyncio.gather(*(loop.run_in_executor(executor, pwd_context.hash, value) for value in values)))
+
+
+def shutdown() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
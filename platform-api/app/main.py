@@ -1,14 +1,47 @@
 from fastapi import FastAPI
-from app.routers import tenants, api_key, internal
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.metrics import render_latest
+from app.logging_config import setup_logging, RequestContextMiddleware
+from app.resilience import DeadlineMiddleware
+from app.query_budget import instrument_engine, QueryBudgetMiddleware
+from app.database import engine
+from app.routers import tenants, api_key, internal, admin
+from app.startup import lifespan
 
-app = FastAPI(title="Sentinel Platform API")
+setup_logging("platform-api")
+instrument_engine(engine)
+
+app = FastAPI(title="Sentinel Platform API", lifespan=lifespan)
+app.add_middleware(QueryBudgetMiddleware)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(RequestContextMiddleware)
 app.include_router(tenants.router)
 app.include_router(api_key.router)
 app.include_router(internal.router)
+app.include_router(admin.router)
 
 @app.get("/health")
 async def health_check():
     return {
         "status": "ok",
         "service": "platform-api"
-    }
\ No newline at end of file
+    }
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness probe. Unlike /health this only succeeds once the
+    startup warm-up has finished, so traffic is never routed to a cold process.
+    """
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "warming", "service": "platform-api"})
+    return {
+        "status": "ready",
+        "service": "platform-api"
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return render_latest()
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime, timezone
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, SmallInteger
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, SmallInteger, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -27,6 +27,11 @@ class Tenant(Base):
     api_keys = relationship("APIKey", back_populates="tenant", cascade="all, delete-orphan")
     usage_logs = relationship("UsageLog", back_populates="tenant", cascade="all, delete-orphan")
 
+    # Partial index: only the (few) soft-deleted rows are indexed, for the purge job.
+    __table_args__ = (
+        Index('ix_tenants_deleted_at', 'deleted_at', postgresql_where=text('deleted_at IS NOT NULL')),
+    )
+
 
 class APIKey(Base):
     __tablename__ = 'api_keys'
@@ -48,6 +53,10 @@ class APIKey(Base):
 
     tenant = relationship("Tenant", back_populates="api_keys")
 
+    __table_args__ = (
+        Index('ix_api_keys_revoked_at', 'revoked_at', postgresql_where=text('revoked_at IS NOT NULL')),
+    )
+
 
 class UsageLog(Base):
     __tablename__ = 'usage_logs'
@@ -0,0 +1,166 @@
+"""
+Background purge of soft-deleted tenants and revoked API keys.
+
+Rows past the grace period are hard-deleted in bounded batches, each in its own
+short transaction, with a pause between batches so a large backlog never holds
+locks for long or floods replication. Each batch picks its victims by ctid,
+which lets Postgres delete them with a TID scan instead of re-running the
+predicate.
+
+Runs once from the command line, e.g. as a scheduled job:
+
+    python -m app.purge [--dry-run] [--grace-days 30] [--batch-size 1000]
+
+or on a timer from the app lifespan of the one instance that sets PURGE_ENABLED.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+purged_rows = Counter("platform_purge_rows_total", "Rows hard-deleted by the purge job", ["table"])
+purge_batches = Counter("platform_purge_batches_total", "Delete batches executed by the purge job", ["table"])
+purge_pending = Gauge("platform_purge_pending_rows", "Rows eligible for purge as of the last dry run", ["table"])
+purge_last_run = Gauge("platform_purge_last_run_timestamp_seconds", "Unix time the last purge run finished")
+purge_last_duration = Gauge("platform_purge_last_run_duration_seconds", "Duration of the last purge run")
+
+# (label, table, eligibility predicate). Order matters: children of dead tenants go
+# first, in batches, so deleting the tenant row never fans out into an unbounded cascade.
+PURGE_TARGETS = [
+    (
+        "api_keys",
+        "api_keys",
+        "revoked_at < :cutoff",
+    ),
+    (
+        "usage_logs",
+        "usage_logs",
+        "tenant_id IN (SELECT id FROM tenants WHERE deleted_at < :cutoff)",
+    ),
+    (
+        "tenant_api_keys",
+        "api_keys",
+        "tenant_id IN (SELECT id FROM tenants WHERE deleted_at < :cutoff)",
+    ),
+    (
+        "tenants",
+        "tenants",
+        "deleted_at < :cutoff",
+    ),
+]
+
+
+async def _count_eligible(session_factory: async_sessionmaker[AsyncSession], table: str, predicate: str, cutoff: datetime) -> int:
+    async with session_factory() as session:
+        result = await session.execute(text(f"SELECT count(*) FROM {table} WHERE {predicate}"), {"cutoff": cutoff})
+        return int(result.scalar_one())
+
+
+async def _delete_in_batches(
+    session_factory: async_sessionmaker[AsyncSession],
+    label: str,
+    table: str,
+    predicate: str,
+    cutoff: datetime,
+    batch_size: int,
+    pause_seconds: float,
+) -> int:
+    stmt = text(
+        f"DELETE FROM {table} WHERE ctid = ANY(ARRAY("
+        f"SELECT ctid FROM {table} WHERE {predicate} LIMIT :batch_size))"
+    )
+    total = 0
+    while True:
+        async with session_factory() as session:
+            result = await session.execute(stmt, {"cutoff": cutoff, "batch_size": batch_size})
+            await session.commit()
+        deleted = result.rowcount  # type: ignore[attr-defined]
+
+        total += deleted
+        purged_rows.inc(deleted, table=label)
+        purge_batches.inc(table=label)
+        if deleted:
+            logger.info("Purged %d rows from %s (%d so far)", deleted, label, total)
+
+        if deleted < batch_size:
+            return total
+        await asyncio.sleep(pause_seconds)
+
+
+async def purge_expired(
+    session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+    grace: timedelta | None = None,
+    batch_size: int | None = None,
+    pause_seconds: float | None = None,
+    dry_run: bool | None = None,
+) -> dict[str, int]:
+    """
+    Hard-deletes revoked keys and soft-deleted tenants older than the grace period.
+    Returns rows deleted per target, or rows that would be deleted when dry_run is set.
+    """
+    grace = grace if grace is not None else timedelta(days=settings.purge_grace_days)
+    batch_size = batch_size or settings.purge_batch_size
+    pause_seconds = pause_seconds if pause_seconds is not None else settings.purge_batch_pause_seconds
+    dry_run = settings.purge_dry_run if dry_run is None else dry_run
+
+    cutoff = datetime.now(timezone.utc) - grace
+    started = time.perf_counter()
+    summary: dict[str, int] = {}
+
+    for label, table, predicate in PURGE_TARGETS:
+        if dry_run:
+            summary[label] = await _count_eligible(session_factory, table, predicate, cutoff)
+            purge_pending.set(summary[label], table=label)
+        else:
+            summary[label] = await _delete_in_batches(
+                session_factory, label, table, predicate, cutoff, batch_size, pause_seconds
+            )
+
+    duration = time.perf_counter() - started
+    purge_last_duration.set(duration)
+    purge_last_run.set(time.time())
+    logger.info("Purge %s in %.2fs: %s", "dry run finished" if dry_run else "finished", duration, summary)
+    return summary
+
+
+async def run_purge_loop() -> None:
+    """Runs the purge every PURGE_INTERVAL_SECONDS until cancelled."""
+    while True:
+        try:
+            await purge_expired()
+        except Exception:
+            logger.exception("Purge run failed")
+        await asyncio.sleep(settings.purge_interval_seconds)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Hard-delete soft-deleted tenants and revoked API keys.")
+    parser.add_argument("--dry-run", action="store_true", help="only count eligible rows")
+    parser.add_argument("--grace-days", type=int, default=settings.purge_grace_days)
+    parser.add_argument("--batch-size", type=int, default=settings.purge_batch_size)
+    parser.add_argument("--pause", type=float, default=settings.purge_batch_pause_seconds, help="seconds between batches")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    summary = asyncio.run(purge_expired(
+        grace=timedelta(days=args.grace_days),
+        batch_size=args.batch_size,
+        pause_seconds=args.pause,
+        dry_run=args.dry_run,
+    ))
+    for label, rows in summary.items():
+        print(f"{label}: {rows} {'eligible' if args.dry_run else 'deleted'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Per-request query accounting on the SQLAlchemy engine.
+
+Cursor events on an instrumented engine are charged to the QueryStats bound in
+the current context (and to every enclosing one), so the same hook serves three
+purposes:
+
+- QueryBudgetMiddleware binds stats per request, records them in /metrics and,
+  in debug mode, returns them as X-DB-Query-Count / X-DB-Time-Ms headers.
+- assert_max_queries() wraps a block in tests and fails when it runs more
+  statements than its budget, listing the statements it saw.
+- count_queries() can wrap any block (background jobs, scripts) to measure it.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import settings
+from app.metrics import Counter, Histogram
+
+db_queries_per_request = Histogram(
+    "platform_db_queries_per_request", "Statements executed per request", ["route"],
+    buckets=(0, 1, 2, 3, 4, 5, 8, 13, 21, 50),
+)
+db_time_per_request = Histogram("platform_db_time_seconds", "Time spent in the database per request", ["route"])
+db_queries_total = Counter("platform_db_queries_total", "Statements executed while serving requests", ["route"])
+
+
+class QueryStats:
+    __slots__ = ("count", "db_time", "statements", "parent")
+
+    def __init__(self, parent: Optional["QueryStats"] = None, capture: bool = False):
+        self.count = 0
+        self.db_time = 0.0
+        self.statements: Optional[list[str]] = [] if capture else None
+        self.parent = parent
+
+
+_current_stats: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _charge(statement, time.perf_counter() - conn.info["query_start_time"].pop())
+
+
+def _handle_error(exception_context) -> None:
+    # A failed statement never reaches after_cursor_execute; it still took a round trip.
+    conn = exception_context.connection
+    starts = conn.info.get("query_start_time") if conn is not None else None
+    if starts:
+        _charge(exception_context.statement, time.perf_counter() - starts.pop())
+
+
+def _charge(statement: Optional[str], elapsed: float) -> None:
+    stats = _current_stats.get()
+    while stats is not None:
+        stats.count += 1
+        stats.db_time += elapsed
+        if stats.statements is not None and statement is not None:
+            stats.statements.append(statement)
+        stats = stats.parent
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Attaches the query counting hooks to an engine. Safe to call more than once."""
+    sync_engine = engine.sync_engine
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(sync_engine, "handle_error", _handle_error)
+
+
+@contextmanager
+def count_queries(capture: bool = False) -> Iterator[QueryStats]:
+    """Counts the statements run inside the block, on top of any enclosing counter."""
+    stats = QueryStats(parent=_current_stats.get(), capture=capture)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+@contextmanager
+def assert_max_queries(max_queries: int) -> Iterator[QueryStats]:
+    """Fails the block if it runs more than `max_queries` statements."""
+    with count_queries(capture=True) as stats:
+        yield stats
+    if stats.count > max_queries:
+        executed = "\n".join(f"  {i + 1}. {sql}" for i, sql in enumerate(stats.statements or []))
+        raise AssertionError(f"Expected at most {max_queries} queries, {stats.count} were executed:\n{executed}")
+
+
+class QueryBudgetMiddleware:
+    """Pure ASGI middleware that accounts the statements each request runs."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with count_queries() as stats:
+            async def send_with_stats(message):
+                if message["type"] == "http.response.start" and settings.debug:
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (b"x-db-query-count", str(stats.count).encode()),
+                        (b"x-db-time-ms", f"{stats.db_time * 1000:.2f}".encode()),
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_stats)
+            finally:
+                route = scope.get("route")
+                label = getattr(route, "path", "unmatched")
+                db_queries_per_request.observe(stats.count, route=label)
+                db_time_per_request.observe(stats.db_time, route=label)
+                db_queries_total.inc(stats.count, route=label)
@@ -0,0 +1,196 @@
+import json
+import secrets
+import time
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import ValidationError
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.models import Tenant, APIKey
+from app.schemas import TenantRegister, BulkTenantResult, BulkTenantResponse
+from app.dependencies import get_db
+from app.hashing import hash_many
+from app.security import verify_super_admin
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(verify_super_admin)])
+
+MAX_BULK_TENANTS = 10_000
+# Body bytes allowed per tenant row; a batch's body may be MAX_BULK_TENANTS times this.
+MAX_BULK_ROW_BYTES = 1024
+# Rows per hash/insert round trip. 500 tenants stay well under asyncpg's 32767 bind parameter limit.
+BULK_CHUNK_SIZE = 500
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Batches are limited to {MAX_BULK_TENANTS} tenants")
+
+
+async def _capped_stream(request: Request) -> AsyncIterator[bytes]:
+    """The body's chunks, failing with 413 as soon as it is known to exceed the batch's byte cap."""
+    max_bytes = MAX_BULK_TENANTS * MAX_BULK_ROW_BYTES
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+        raise _too_large()
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise _too_large()
+        yield chunk
+
+
+async def _iter_payloads(request: Request) -> AsyncIterator[tuple[Optional[object], Optional[str]]]:
+    """
+    Yields (payload, parse_error) for every row in the body.
+    NDJSON bodies are decoded line by line as they stream in; anything else must be a JSON array.
+    Either way, no more than MAX_BULK_TENANTS * MAX_BULK_ROW_BYTES bytes are read.
+    """
+    content_type = request.headers.get("content-type", "")
+
+    if "ndjson" in content_type:
+        buffer = b""
+        async for chunk in _capped_stream(request):
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield _decode_line(line)
+        if buffer.strip():
+            yield _decode_line(buffer)
+        return
+
+    body = b"".join([chunk async for chunk in _capped_stream(request)])
+    try:
+        rows = json.loads(body)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=422, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=422, detail="Body must be a JSON array or NDJSON")
+
+    for row in rows:
+        yield row, None
+
+
+def _decode_line(line: bytes) -> tuple[Optional[object], Optional[str]]:
+    try:
+        return json.loads(line), None
+    except json.JSONDecodeError as exc:
+        return None, f"Malformed JSON: {exc.msg}"
+
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in exc.errors())
+
+
+async def _register_chunk(db: AsyncSession, rows: list[tuple[int, TenantRegister]]) -> list[BulkTenantResult]:
+    """
+    Registers one chunk of validated, in-batch-unique tenants in a single transaction.
+    Emails that already exist are filtered out before any bcrypt work is spent on them;
+    ON CONFLICT still covers anything registered concurrently in between.
+    """
+    emails = [tenant_in.email for _, tenant_in in rows]
+    existing = set((await db.execute(select(Tenant.email).where(Tenant.email.in_(emails)))).scalars())
+
+    results = [
+        BulkTenantResult(index=index, email=tenant_in.email, status="duplicate", error="Email already registered")
+        for index, tenant_in in rows if tenant_in.email in existing
+    ]
+    fresh = [(index, tenant_in) for index, tenant_in in rows if tenant_in.email not in existing]
+    if not fresh:
+        return results
+
+    raw_keys = ["snt_" + secrets.token_hex(32) for _ in fresh]
+    hashes = await hash_many([tenant_in.password for _, tenant_in in fresh] + raw_keys)
+    password_hashes, key_hashes = hashes[:len(fresh)], hashes[len(fresh):]
+
+    inserted = await db.execute(
+        insert(Tenant)
+        .values([
+            {"name": tenant_in.name, "email": tenant_in.email, "hashed_password": hashed_pwd}
+            for (_, tenant_in), hashed_pwd in zip(fresh, password_hashes)
+        ])
+        .on_conflict_do_nothing(index_elements=[Tenant.email])
+        .returning(Tenant.id, Tenant.email)
+    )
+    tenant_ids = {email: tenant_id for tenant_id, email in inserted}
+
+    key_rows = [
+        {"tenant_id": tenant_ids[tenant_in.email], "key_prefix": raw_key[:12], "key_hash": key_hash, "name": "Default"}
+        for (_, tenant_in), raw_key, key_hash in zip(fresh, raw_keys, key_hashes)
+        if tenant_in.email in tenant_ids
+    ]
+    if key_rows:
+        await db.execute(insert(APIKey).values(key_rows))
+    await db.commit()
+
+    for (index, tenant_in), raw_key in zip(fresh, raw_keys):
+        if tenant_in.email in tenant_ids:
+            results.append(BulkTenantResult(
+                index=index, email=tenant_in.email, status="created",
+                tenant_id=tenant_ids[tenant_in.email], api_key=raw_key
+            ))
+        else:
+            results.append(BulkTenantResult(
+                index=index, email=tenant_in.email, status="duplicate", error="Email already registered"
+            ))
+    return results
+
+
+@router.post("/tenants/bulk", response_model=BulkTenantResponse, status_code=200)
+async def bulk_register_tenants(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Registers a batch of tenants, each with a default API key.
+    Accepts a JSON array or streamed NDJSON (Content-Type: application/x-ndjson) of
+    {name, email, password} rows and reports a result per row, in input order.
+    Requires the X-Admin-Secret header.
+
+    Every row is parsed and validated before the first chunk is registered, so a
+    batch over MAX_BULK_TENANTS is rejected with 413 before anything is created.
+    A body too large for that many rows is rejected before it is read in full.
+    """
+    started = time.perf_counter()
+    results: list[BulkTenantResult] = []
+    seen_emails: set[str] = set()
+    pending: list[tuple[int, TenantRegister]] = []
+
+    index = 0
+    async for payload, error in _iter_payloads(request):
+        if index >= MAX_BULK_TENANTS:
+            raise _too_large()
+
+        tenant_in = None
+        if error is None:
+            try:
+                tenant_in = TenantRegister.model_validate(payload)
+            except ValidationError as exc:
+                error = _validation_message(exc)
+
+        if tenant_in is None:
+            results.append(BulkTenantResult(index=index, status="invalid", error=error))
+        elif tenant_in.email in seen_emails:
+            results.append(BulkTenantResult(
+                index=index, email=tenant_in.email, status="duplicate", error="Email repeated within batch"
+            ))
+        else:
+            seen_emails.add(tenant_in.email)
+            pending.append((index, tenant_in))
+        index += 1
+
+    for start in range(0, len(pending), BULK_CHUNK_SIZE):
+        results.extend(await _register_chunk(db, pending[start:start + BULK_CHUNK_SIZE]))
+
+    results.sort(key=lambda result: result.index)
+    created = sum(1 for result in results if result.status == "created")
+    elapsed = time.perf_counter() - started
+
+    return BulkTenantResponse(
+        created=created,
+        duplicates=sum(1 for result in results if result.status == "duplicate"),
+        invalid=sum(1 for result in results if result.status == "invalid"),
+        elapsed_ms=round(elapsed * 1000),
+        tenants_per_second=round(created / elapsed, 2) if elapsed > 0 else 0.0,
+        results=results,
+    )
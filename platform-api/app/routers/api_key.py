@@ -1,4 +1,5 @@
 import secrets
+from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -92,5 +93,7 @@ async def revoke_api_key(
         raise HTTPException(status_code=404, detail="API Key not found")
 
     setattr(key_to_revoke, "is_active", False)
+    # revoked_at starts the purge grace period
+    setattr(key_to_revoke, "revoked_at", datetime.now(timezone.utc))
     await db.commit()
     return None
\ No newline at end of file
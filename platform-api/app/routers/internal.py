@@ -9,12 +9,14 @@ router = APIRouter(prefix="/internal", tags=["Internal"])
 async def resolve_api_key(current_tenant: Tenant = Depends(verify_api_key)):
     """
     Internal endpoint called by the Identity Service and Trade Engine.
-    Validates the X-API-Key header and returns the active tenant's ID.
+    Validates the X-API-Key header and returns the active tenant's ID, plan and limits.
     """
     return {
         "tenant_name": current_tenant.name,
         "tenant_email": current_tenant.email,
         "tenant_id": str(current_tenant.id),
         "status": current_tenant.status,
-        "plan": current_tenant.plan
+        "plan": current_tenant.plan,
+        "max_users": current_tenant.max_users,
+        "max_markets": current_tenant.max_markets
     }
\ No newline at end of file
@@ -2,17 +2,15 @@ import secrets
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from passlib.context import CryptContext
 
 from app.models import Tenant, APIKey
 from app.schemas import TenantRegister, TenantResponse, TenantLogin, TokenResponse
 from app.dependencies import get_db
-from app.security import create_access_token
+from app.security import create_access_token, pwd_context
 
 from app.security import verify_jwt
 
 router = APIRouter(prefix="/tenants", tags=["Tenants"])
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 @router.post("/register", response_model=TenantResponse, status_code=201)
 async def register_tenant(tenant_in: TenantRegister, db: AsyncSession = Depends(get_db)):
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from uuid import UUID
+from typing import Literal, Optional
 
 class TenantRegister(BaseModel):
     name: str
@@ -22,4 +23,20 @@ class TokenResponse(BaseModel):
 class APIKeyCreateResponse(BaseModel):
     key_id: str
     raw_key: str
-    message: str
\ No newline at end of file
+    message: str
+
+class BulkTenantResult(BaseModel):
+    index: int
+    email: Optional[str] = None
+    status: Literal["created", "duplicate", "invalid"]
+    tenant_id: Optional[UUID] = None
+    api_key: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkTenantResponse(BaseModel):
+    created: int
+    duplicates: int
+    invalid: int
+    elapsed_ms: int
+    tenants_per_second: float
+    results: list[BulkTenantResult]
\ No newline at end of file
@@ -11,12 +11,15 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError
 from app.config import settings
 import uuid
+import secrets
 from app.database import AsyncSessionLocal
 from app.models import APIKey, Tenant
 from app.dependencies import get_db
+from app.logging_config import tenant_id_var
 
 jwt_bearer_scheme = HTTPBearer(auto_error=False)
 api_key_header_scheme = APIKeyHeader(name="X-API-Key", auto_error=False)
+admin_secret_header_scheme = APIKeyHeader(name="X-Admin-Secret", auto_error=False)
 
 SECRET_KEY = settings.platform_secret_key
 ALGORITHM = settings.platform_algorithm
@@ -24,6 +27,22 @@ EXPIRE_MINUTES = settings.platform_admin_jwt_expire_minutes
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+def api_key_lookup_stmt(prefix: str):
+    """
+    Candidate keys for a prefix, each with its tenant, in a single round trip.
+    Shared with the startup warm-up so the statement is already compiled and
+    prepared before the first request.
+    """
+    return (
+        select(APIKey, Tenant)
+        .join(APIKey.tenant)
+        .where(
+            APIKey.key_prefix == prefix,
+            APIKey.is_active == True,
+            Tenant.status == 'ACTIVE'
+        )
+    )
+
 async def verify_api_key(
     api_key: str = Security(api_key_header_scheme),
     db: AsyncSession = Depends(get_db)
@@ -37,21 +56,12 @@ async def verify_api_key(
 
     prefix = api_key[:12]
 
-    stmt = (
-        select(APIKey)
-        .join(APIKey.tenant)
-        .where(
-            APIKey.key_prefix == prefix,
-            APIKey.is_active == True,
-            Tenant.status == 'ACTIVE'
-        )
-    )
-    result = await db.execute(stmt)
-    potential_keys = result.scalars().all()
+    result = await db.execute(api_key_lookup_stmt(prefix))
+    potential_keys = result.all()
 
-    for db_key in potential_keys:
+    for db_key, tenant in potential_keys:
         if pwd_context.verify(api_key, str(db_key.key_hash)):
-            tenant = await db.get(Tenant, db_key.tenant_id)
+            tenant_id_var.set(str(tenant.id))
             return tenant
 
     raise HTTPException(status_code=401, detail="Invalid or revoked API Key")
@@ -99,4 +109,16 @@ async def verify_jwt(
     if not tenant or str(tenant.status) != 'ACTIVE':
         raise HTTPException(status_code=403, detail="Tenant account suspended or deleted")
 
-    return tenant
\ No newline at end of file
+    tenant_id_var.set(str(tenant.id))
+    return tenant
+
+async def verify_super_admin(admin_secret: str = Security(admin_secret_header_scheme)) -> None:
+    """
+    Guards the /admin/* routes with the shared SUPER_ADMIN_SECRET.
+    The routes are disabled entirely when no secret is configured.
+    """
+    if not settings.super_admin_secret:
+        raise HTTPException(status_code=403, detail="Admin routes are disabled")
+
+    if not admin_secret or not secrets.compare_digest(admin_secret, settings.super_admin_secret):
+        raise HTTPException(status_code=401, detail="Invalid admin secret")
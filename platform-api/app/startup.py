@@ -0,0 +1,90 @@
+"""
+Application lifespan: pre-warms everything the first requests would otherwise
+pay for, and tracks readiness separately from liveness.
+
+/health answers as soon as the process is up. /ready only returns 200 once
+every pooled connection is open and has the hot statements compiled and
+prepared, and the bcrypt backend behind passlib has been loaded.
+"""
+import asyncio
+import logging
+import uuid
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app import hashing
+from app.purge import run_purge_loop
+from app.config import settings
+from app.database import engine
+from app.models import APIKey, Tenant
+from app.security import api_key_lookup_stmt, pwd_context
+
+logger = logging.getLogger(__name__)
+
+WARMUP_RETRY_SECONDS = 2.0
+NIL_UUID = uuid.UUID(int=0)
+# bcrypt("warmup") at cost 4: verifying it loads the backend without paying for a cost-12 hash.
+WARMUP_HASH = "$2b$04$RBUmIuRxmF3y6a2sk3/gq.CXT5Xl10ObP5hHO5JaRg0TKMAH6mjwC"
+
+
+def _hot_statements():
+    """Statements on the key verification / login / key listing paths, with values that match nothing."""
+    return [
+        api_key_lookup_stmt(""),
+        select(Tenant).where(Tenant.email == ""),
+        select(APIKey).where(APIKey.tenant_id == NIL_UUID, APIKey.is_active == True),
+    ]
+
+
+async def _warm_connection() -> None:
+    # asyncpg prepares statements per connection, so every pooled connection
+    # has to run the hot statements itself, not just the first one.
+    async with engine.connect() as conn:
+        async with AsyncSession(bind=conn) as session:
+            for stmt in _hot_statements():
+                await session.execute(stmt)
+            await session.get(Tenant, NIL_UUID)
+
+
+def _warm_passlib() -> None:
+    # The first verify loads the bcrypt backend and compiles the CryptContext.
+    pwd_context.verify("warmup", WARMUP_HASH)
+
+
+async def warm_up(app: FastAPI) -> None:
+    """Opens the pool and loads passlib, retrying until the database is reachable."""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    passlib_warmup = asyncio.create_task(asyncio.to_thread(_warm_passlib))
+    while True:
+        try:
+            # Opening pool.size() connections concurrently forces that many distinct connections.
+            await asyncio.gather(*(_warm_connection() for _ in range(engine.pool.size())))
+            break
+        except Exception:
+            logger.exception("Warm-up could not reach the database, retrying in %ss", WARMUP_RETRY_SECONDS)
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+    await passlib_warmup
+
+    app.state.ready = True
+    logger.info("Warm-up finished in %.0fms", (loop.time() - started) * 1000)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = not settings.startup_warmup
+    warmup_task = asyncio.create_task(warm_up(app)) if settings.startup_warmup else None
+    purge_task = asyncio.create_task(run_purge_loop()) if settings.purge_enabled else None
+
+    yield
+
+    background = [task for task in (warmup_task, purge_task) if task is not None]
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    hashing.shutdown()
+    await engine.dispose()
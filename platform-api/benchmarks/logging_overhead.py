@@ -0,0 +1,105 @@
+"""
+Measures how much event-loop time per request goes into logging.
+
+Each simulated request runs on the event loop and emits what a typical request
+logs with echo=True: a BEGIN, three statements with their parameters, a COMMIT
+and an access line. The time spent inside the logging calls is measured for:
+
+  sync      a StreamHandler writing straight to the sink (what echo=True does)
+  queued    the app.logging_config pipeline with SQL logging unsampled
+  sampled   the pipeline with the default 1% sample rate on sqlalchemy.engine
+  sql-off   the pipeline with SQL_LOG_LEVEL=WARNING (the default)
+
+The sink is a pipe drained by a reader thread, like a container's stdout, so
+the synchronous variant pays for a real write syscall per record.
+
+Usage: python -m benchmarks.logging_overhead [--requests 5000]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import queue
+import statistics
+import threading
+import time
+from logging.handlers import QueueListener
+
+from app.logging_config import ContextQueueHandler, JSONFormatter, SamplingFilter, request_id_var, setup_logging
+
+SQL = "SELECT api_keys.id, api_keys.tenant_id, api_keys.key_prefix, api_keys.key_hash FROM api_keys JOIN tenants ON tenants.id = api_keys.tenant_id WHERE api_keys.key_prefix = $1::VARCHAR"
+
+
+async def simulated_request(sql_logger: logging.Logger, access_logger: logging.Logger) -> float:
+    request_id_var.set("bench")
+    started = time.perf_counter()
+    sql_logger.info("BEGIN (implicit)")
+    for _ in range(3):
+        sql_logger.info(SQL)
+        sql_logger.info("[cached since %.4gs ago] %r", 12.5, ("snt_a3f9b2c1",))
+    sql_logger.info("COMMIT")
+    access_logger.info('%s - "%s %s HTTP/1.1" %d', "10.0.0.1:5123", "GET", "/internal/verify-key", 200)
+    return time.perf_counter() - started
+
+
+async def run_variant(name: str, handler: logging.Handler, sql_level: int, requests: int) -> list[float]:
+    sql_logger = logging.getLogger(f"bench.{name}.sqlalchemy.engine.Engine")
+    access_logger = logging.getLogger(f"bench.{name}.uvicorn.access")
+    for logger in (sql_logger, access_logger):
+        logger.handlers = [handler]
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+    sql_logger.setLevel(sql_level)
+
+    timings = []
+    for _ in range(requests):
+        timings.append(await simulated_request(sql_logger, access_logger))
+        await asyncio.sleep(0)
+    return timings
+
+
+def queued_handler(sink, rate: float) -> tuple[ContextQueueHandler, QueueListener]:
+    log_queue: queue.Queue = queue.Queue(maxsize=100_000)
+    stream = logging.StreamHandler(sink)
+    stream.setFormatter(JSONFormatter("bench"))
+    handler = ContextQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter({f"bench.{name}.sqlalchemy.engine": rate for name in ("queued", "sampled", "sql-off")}))
+    return handler, QueueListener(log_queue, stream)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    # Apply the record-creation settings the services run with.
+    setup_logging("bench")
+
+    read_fd, write_fd = os.pipe()
+    threading.Thread(target=lambda: [None for _ in iter(lambda: os.read(read_fd, 65536), b"")], daemon=True).start()
+
+    with os.fdopen(write_fd, "w") as sink:
+        sync = logging.StreamHandler(sink)
+        sync.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+
+        variants = [("sync", sync, logging.INFO, 1.0), ("queued", None, logging.INFO, 1.0),
+                    ("sampled", None, logging.INFO, 0.01), ("sql-off", None, logging.WARNING, 1.0)]
+        for name, handler, sql_level, rate in variants:
+            listener = None
+            if handler is None:
+                handler, listener = queued_handler(sink, rate)
+                listener.start()
+
+            timings = await run_variant(name, handler, sql_level, args.requests)
+            if listener is not None:
+                listener.stop()
+
+            micros = sorted(t * 1_000_000 for t in timings)
+            print(
+                f"{name:>8}: mean {statistics.fmean(micros):7.1f}us  "
+                f"p50 {micros[len(micros) // 2]:7.1f}us  p99 {micros[int(len(micros) * 0.99)]:7.1f}us per request on the loop"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+"""
+Measures time-to-first-good-p99 for a freshly started platform-api process.
+
+For each startup mode the script spawns uvicorn, waits the way an orchestrator
+would (on /ready when warm-up is enabled, on /health otherwise), then drives
+GET /tenants/me with a fixed number of concurrent clients. "Good" means the p99
+of a sliding window of requests is within --tolerance of the steady-state p99
+measured at the end of the run; the reported figure is the time from process
+spawn until the first such window.
+
+Needs PLATFORM_DATABASE_URL / PLATFORM_SECRET_KEY pointing at a migrated database.
+
+Usage: python -m benchmarks.startup_latency [--requests 2000] [--concurrency 16]
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+SERVICE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def spawn_server(port: int, warmup: bool) -> subprocess.Popen:
+    env = dict(os.environ, STARTUP_WARMUP="true" if warmup else "false")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--no-access-log", "--log-level", "warning"],
+        cwd=SERVICE_ROOT,
+        env=env,
+    )
+
+
+async def wait_for(client: httpx.AsyncClient, path: str, spawned_at: float) -> float:
+    while True:
+        try:
+            if (await client.get(path)).status_code == 200:
+                return time.perf_counter() - spawned_at
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.005)
+
+
+async def session_headers(client: httpx.AsyncClient) -> dict:
+    email = f"bench_{secrets.token_hex(6)}@example.com"
+    await client.post("/tenants/register", json={"name": "Bench", "email": email, "password": "bench_password"})
+    login = await client.post("/tenants/login", json={"email": email, "password": "bench_password"})
+    login.raise_for_status()
+    return {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+
+async def run_mode(args, warmup: bool, headers: dict) -> dict:
+    proc = spawn_server(args.port, warmup)
+    spawned_at = time.perf_counter()
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=30) as client:
+            up_after = await wait_for(client, "/health", spawned_at)
+            ready_after = await wait_for(client, "/ready" if warmup else "/health", spawned_at)
+
+            samples: list[tuple[float, float]] = []
+            remaining = args.requests
+
+            async def worker():
+                nonlocal remaining
+                while remaining > 0:
+                    remaining -= 1
+                    sent = time.perf_counter()
+                    response = await client.get("/tenants/me", headers=headers)
+                    response.raise_for_status()
+                    samples.append((sent - spawned_at, time.perf_counter() - sent))
+
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    samples.sort()
+    latencies = [latency for _, latency in samples]
+    steady_p99 = percentile(latencies[len(latencies) // 2:], 99)
+    threshold = steady_p99 * args.tolerance
+
+    good_after = None
+    for start in range(0, len(samples) - args.window + 1):
+        window = latencies[start:start + args.window]
+        if percentile(window, 99) <= threshold:
+            good_after = samples[start][0]
+            break
+
+    return {
+        "mode": "warm" if warmup else "cold",
+        "health_ms": up_after * 1000,
+        "ready_ms": ready_after * 1000,
+        "first_request_ms": latencies[0] * 1000,
+        "first_window_p99_ms": percentile(latencies[:args.window], 99) * 1000,
+        "steady_p99_ms": steady_p99 * 1000,
+        "median_ms": statistics.median(latencies) * 1000,
+        "good_p99_after_ms": None if good_after is None else good_after * 1000,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--window", type=int, default=100, help="sliding window size for the p99")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed multiple of the steady-state p99")
+    args = parser.parse_args()
+
+    # One throwaway process to create the tenant we authenticate as.
+    proc = spawn_server(args.port, warmup=False)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=30) as client:
+            await wait_for(client, "/health", time.perf_counter())
+            headers = await session_headers(client)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    for warmup in (False, True):
+        result = await run_mode(args, warmup, headers)
+        print(
+            f"{result['mode']:>5}: /health {result['health_ms']:.0f}ms, serving {result['ready_ms']:.0f}ms, "
+            f"first request {result['first_request_ms']:.1f}ms, first-window p99 {result['first_window_p99_ms']:.1f}ms, "
+            f"steady p99 {result['steady_p99_ms']:.1f}ms, "
+            f"time-to-first-good-p99 {result['good_p99_after_ms'] or float('nan'):.0f}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
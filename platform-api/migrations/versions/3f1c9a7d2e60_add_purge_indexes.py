@@ -0,0 +1,30 @@
+"""add_purge_indexes
+
+Revision ID: 3f1c9a7d2e60
+Revises: 84de87452b6a
+Create Date: 2026-10-19 10:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9a7d2e60'
+down_revision: Union[str, Sequence[str], None] = '84de87452b6a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_tenants_deleted_at', 'tenants', ['deleted_at'], unique=False, postgresql_where=sa.text('deleted_at IS NOT NULL'))
+    op.create_index('ix_api_keys_revoked_at', 'api_keys', ['revoked_at'], unique=False, postgresql_where=sa.text('revoked_at IS NOT NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_api_keys_revoked_at', table_name='api_keys', postgresql_where=sa.text('revoked_at IS NOT NULL'))
+    op.drop_index('ix_tenants_deleted_at', table_name='tenants', postgresql_where=sa.text('deleted_at IS NOT NULL'))
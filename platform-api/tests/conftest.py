@@ -9,6 +9,7 @@ from app.main import app
 from app.database import Base
 from app.dependencies import get_db
 from app.security import pwd_context
+from app.query_budget import instrument_engine, assert_max_queries
 
 #a separate database URL specifically for testing.
 TEST_DATABASE_URL = settings.platform_database_url.replace("/platform_db", "/platform_test_db")
@@ -19,6 +20,7 @@ engine = create_async_engine(
     poolclass=NullPool
 )
 TestingSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+instrument_engine(engine)
 
 @pytest_asyncio.fixture(scope="session", autouse=True)
 async def setup_test_database():
@@ -30,6 +32,11 @@ async def setup_test_database():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
 
+@pytest.fixture
+def session_factory():
+    """The test session factory, for code that opens its own sessions (background jobs)."""
+    return TestingSessionLocal
+
 @pytest_asyncio.fixture
 async def db_session():
     """Provides a fresh database session for a single test."""
@@ -54,6 +61,16 @@ async def client(db_session: AsyncSession):
 
     app.dependency_overrides.clear()
 
+@pytest.fixture
+def query_budget():
+    """
+    Asserts a maximum number of statements for a block:
+
+        with query_budget(1):
+            await client.get(...)
+    """
+    return assert_max_queries
+
 @pytest.fixture
 def test_password():
     return "secure_test_password_123"
@@ -0,0 +1,110 @@
+import json
+import pytest
+from httpx import AsyncClient
+
+from app.config import settings
+from app.routers import admin
+
+pytestmark = pytest.mark.asyncio
+
+ADMIN_SECRET = "test_admin_secret"
+
+
+@pytest.fixture(autouse=True)
+def admin_secret(monkeypatch):
+    monkeypatch.setattr(settings, "super_admin_secret", ADMIN_SECRET)
+
+
+async def test_bulk_register_requires_admin_secret(client: AsyncClient):
+    """The admin bouncer: a wrong or missing secret must be rejected."""
+    response = await client.post("/admin/tenants/bulk", json=[], headers={"X-Admin-Secret": "wrong"})
+    assert response.status_code == 401
+
+    response = await client.post("/admin/tenants/bulk", json=[])
+    assert response.status_code == 401
+
+
+async def test_bulk_register_json_array(client: AsyncClient):
+    """
+    Test a mixed batch: new tenants are created with working API keys,
+    while duplicates and invalid rows are reported per row without failing the batch.
+    """
+    await client.post("/tenants/register", json={
+        "name": "Existing Tenant",
+        "email": "bulk_existing@test.com",
+        "password": "password123"
+    })
+
+    batch = [
+        {"name": "Bulk One", "email": "bulk_one@test.com", "password": "bulk_password_1"},
+        {"name": "Bulk Existing", "email": "bulk_existing@test.com", "password": "password123"},
+        {"name": "Bulk Invalid", "email": "not-an-email", "password": "password123"},
+        {"name": "Bulk Two", "email": "bulk_two@test.com", "password": "bulk_password_2"},
+        {"name": "Bulk One Again", "email": "bulk_one@test.com", "password": "bulk_password_1"},
+    ]
+    response = await client.post("/admin/tenants/bulk", json=batch, headers={"X-Admin-Secret": ADMIN_SECRET})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["created"], data["duplicates"], data["invalid"]) == (2, 2, 1)
+    assert [r["status"] for r in data["results"]] == ["created", "duplicate", "invalid", "created", "duplicate"]
+    assert data["tenants_per_second"] > 0
+
+    # The returned key must be usable, and the password must have been hashed correctly
+    api_key = data["results"][0]["api_key"]
+    verify_res = await client.get("/internal/verify-key", headers={"X-API-Key": api_key})
+    assert verify_res.status_code == 200
+    assert verify_res.json()["tenant_email"] == "bulk_one@test.com"
+
+    login_res = await client.post("/tenants/login", json={"email": "bulk_two@test.com", "password": "bulk_password_2"})
+    assert login_res.status_code == 200
+
+
+async def test_bulk_register_ndjson(client: AsyncClient):
+    """Test the streamed NDJSON variant, including a malformed line."""
+    lines = [
+        json.dumps({"name": "Stream One", "email": "stream_one@test.com", "password": "stream_password"}),
+        "{not json",
+    ]
+    response = await client.post(
+        "/admin/tenants/bulk",
+        content="\n".join(lines) + "\n",
+        headers={"X-Admin-Secret": ADMIN_SECRET, "Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[0]["status"] == "created"
+    assert results[1]["status"] == "invalid"
+    assert results[1]["error"].startswith("Malformed JSON")
+
+
+async def test_bulk_register_oversized_batch_creates_nothing(client: AsyncClient, monkeypatch):
+    """A batch over the limit is rejected before any chunk is registered."""
+    monkeypatch.setattr(admin, "MAX_BULK_TENANTS", 3)
+    monkeypatch.setattr(admin, "BULK_CHUNK_SIZE", 1)
+    lines = [
+        json.dumps({"name": f"Over {i}", "email": f"bulk_over_{i}@test.com", "password": "over_password"})
+        for i in range(4)
+    ]
+    response = await client.post(
+        "/admin/tenants/bulk",
+        content="\n".join(lines),
+        headers={"X-Admin-Secret": ADMIN_SECRET, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 413
+
+    login_res = await client.post("/tenants/login", json={"email": "bulk_over_0@test.com", "password": "over_password"})
+    assert login_res.status_code == 401
+
+
+async def test_bulk_register_oversized_body_is_rejected_before_parsing(client: AsyncClient, monkeypatch):
+    """A JSON array body larger than MAX_BULK_TENANTS rows can be is refused, however few rows it has."""
+    monkeypatch.setattr(admin, "MAX_BULK_TENANTS", 2)
+    monkeypatch.setattr(admin, "MAX_BULK_ROW_BYTES", 100)
+    rows = [{"name": "x" * 150, "email": "bulk_big@test.com", "password": "big_password"}]
+    response = await client.post("/admin/tenants/bulk", json=rows, headers={"X-Admin-Secret": ADMIN_SECRET})
+    assert response.status_code == 413
+
+    login_res = await client.post("/tenants/login", json={"email": "bulk_big@test.com", "password": "big_password"})
+    assert login_res.status_code == 401
@@ -0,0 +1,57 @@
+import json
+import logging
+import queue
+import pytest
+from httpx import AsyncClient
+
+from app.logging_config import ContextQueueHandler, JSONFormatter, SamplingFilter, records_dropped, request_id_var, tenant_id_var
+from app.metrics import render_latest
+
+
+def make_record(name: str = "app.test", level: int = logging.INFO, msg: str = "hello %s", args=("world",)):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+def test_json_lines_carry_request_context():
+    """Context is captured on the calling side and rendered as JSON on the listener side."""
+    handler = ContextQueueHandler(queue=None)  # type: ignore[arg-type]
+    request_token = request_id_var.set("req-123")
+    tenant_token = tenant_id_var.set("tenant-456")
+    try:
+        record = handler.prepare(make_record())
+    finally:
+        tenant_id_var.reset(tenant_token)
+        request_id_var.reset(request_token)
+
+    entry = json.loads(JSONFormatter("platform-api").format(record))
+    assert entry["message"] == "hello world"
+    assert entry["request_id"] == "req-123"
+    assert entry["tenant_id"] == "tenant-456"
+    assert entry["service"] == "platform-api"
+
+
+def test_sampling_only_applies_to_configured_debug_categories():
+    never = SamplingFilter({"sqlalchemy.engine": 0.0})
+
+    assert not never.filter(make_record("sqlalchemy.engine.Engine"))
+    assert never.filter(make_record("sqlalchemy.engine.Engine", level=logging.WARNING))
+    assert never.filter(make_record("app.security"))
+
+
+def test_records_dropped_on_a_full_queue_are_counted():
+    handler = ContextQueueHandler(queue.Queue(maxsize=1))
+    before = records_dropped.value()
+    handler.handle(make_record())
+    handler.handle(make_record())
+    assert records_dropped.value() == before + 1
+    assert "log_records_dropped_total" in render_latest()
+
+
+@pytest.mark.asyncio
+async def test_request_id_is_propagated(client: AsyncClient):
+    """An incoming X-Request-ID is reused and echoed; otherwise one is generated."""
+    response = await client.get("/health", headers={"X-Request-ID": "upstream-id"})
+    assert response.headers["x-request-id"] == "upstream-id"
+
+    response = await client.get("/health")
+    assert len(response.headers["x-request-id"]) == 32
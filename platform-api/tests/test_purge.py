@@ -0,0 +1,54 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.future import select
+
+from app.models import Tenant, APIKey, UsageLog
+from app.purge import purge_expired
+
+pytestmark = pytest.mark.asyncio
+
+GRACE = timedelta(days=30)
+
+
+async def test_purge_expired_rows(session_factory):
+    """
+    Test the purge job: rows past the grace period are hard-deleted in batches
+    (dry run first, which must not delete anything), recent and live rows are kept.
+    """
+    long_ago = datetime.now(timezone.utc) - timedelta(days=60)
+    recently = datetime.now(timezone.utc) - timedelta(days=1)
+
+    async with session_factory() as session:
+        dead_tenant = Tenant(name="Dead", email="purge_dead@test.com", hashed_password="x", status="DELETED", deleted_at=long_ago)
+        live_tenant = Tenant(name="Live", email="purge_live@test.com", hashed_password="x")
+        session.add_all([dead_tenant, live_tenant])
+        await session.flush()
+
+        session.add_all([
+            APIKey(tenant_id=dead_tenant.id, key_prefix="snt_dead0000", key_hash="purge_dead_key"),
+            UsageLog(tenant_id=dead_tenant.id, endpoint="/orders", status_code=200),
+            UsageLog(tenant_id=dead_tenant.id, endpoint="/orders", status_code=200),
+            APIKey(tenant_id=live_tenant.id, key_prefix="snt_old00000", key_hash="purge_old_key", is_active=False, revoked_at=long_ago),
+            APIKey(tenant_id=live_tenant.id, key_prefix="snt_new00000", key_hash="purge_new_key", is_active=False, revoked_at=recently),
+            APIKey(tenant_id=live_tenant.id, key_prefix="snt_live0000", key_hash="purge_live_key"),
+        ])
+        await session.commit()
+        dead_id, live_id = dead_tenant.id, live_tenant.id
+
+    expected = {"api_keys": 1, "usage_logs": 2, "tenant_api_keys": 1, "tenants": 1}
+
+    dry_run = await purge_expired(session_factory, grace=GRACE, batch_size=1, pause_seconds=0, dry_run=True)
+    assert dry_run == expected
+
+    summary = await purge_expired(session_factory, grace=GRACE, batch_size=1, pause_seconds=0, dry_run=False)
+    assert summary == expected
+
+    async with session_factory() as session:
+        assert await session.get(Tenant, dead_id) is None
+        assert await session.get(Tenant, live_id) is not None
+
+        remaining = (await session.execute(select(APIKey.key_hash).where(APIKey.tenant_id == live_id))).scalars().all()
+        assert sorted(remaining) == ["purge_live_key", "purge_new_key"]
+
+        logs = (await session.execute(select(UsageLog).where(UsageLog.tenant_id == dead_id))).scalars().all()
+        assert logs == []
@@ -0,0 +1,85 @@
+import pytest
+import secrets
+from httpx import AsyncClient
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app.config import settings
+from app.query_budget import count_queries
+
+pytestmark = pytest.mark.asyncio
+
+
+async def register(client: AsyncClient) -> dict:
+    email = f"budget_{secrets.token_hex(4)}@test.com"
+    res = await client.post("/tenants/register", json={"name": "Budget Tenant", "email": email, "password": "budget_password"})
+    assert res.status_code == 201
+    return {"email": email, "api_key": res.json()["api_key"]}
+
+
+async def login_headers(client: AsyncClient, email: str) -> dict:
+    res = await client.post("/tenants/login", json={"email": email, "password": "budget_password"})
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+
+async def test_register_query_budget(client: AsyncClient, query_budget):
+    """Email check, tenant insert, key insert."""
+    with query_budget(3):
+        await register(client)
+
+
+async def test_verify_key_query_budget(client: AsyncClient, query_budget):
+    """Key and tenant must come back in a single round trip."""
+    tenant = await register(client)
+
+    with query_budget(1):
+        res = await client.get("/internal/verify-key", headers={"X-API-Key": tenant["api_key"]})
+    assert res.status_code == 200
+
+
+async def test_jwt_routes_query_budget(client: AsyncClient, query_budget):
+    tenant = await register(client)
+
+    with query_budget(1):
+        headers = await login_headers(client, tenant["email"])
+
+    with query_budget(1):
+        res = await client.get("/tenants/me", headers=headers)
+    assert res.status_code == 200
+
+    with query_budget(2):
+        res = await client.get("/tenants/api-keys/", headers=headers)
+    assert res.status_code == 200
+
+
+async def test_query_budget_reports_violations(client: AsyncClient, query_budget):
+    """The budget itself must fail loudly, listing the statements it saw."""
+    tenant = await register(client)
+    headers = await login_headers(client, tenant["email"])
+
+    with pytest.raises(AssertionError, match="Expected at most 0 queries"):
+        with query_budget(0):
+            await client.get("/tenants/me", headers=headers)
+
+
+async def test_debug_headers(client: AsyncClient, monkeypatch):
+    tenant = await register(client)
+
+    res = await client.get("/internal/verify-key", headers={"X-API-Key": tenant["api_key"]})
+    assert "x-db-query-count" not in res.headers
+
+    monkeypatch.setattr(settings, "debug", True)
+    res = await client.get("/internal/verify-key", headers={"X-API-Key": tenant["api_key"]})
+    assert res.headers["x-db-query-count"] == "1"
+    assert float(res.headers["x-db-time-ms"]) > 0
+
+
+async def test_failed_statements_are_counted(session_factory):
+    async with session_factory() as session:
+        with count_queries(capture=True) as stats:
+            with pytest.raises(DBAPIError):
+                await session.execute(text("SELECT 1 / 0"))
+        assert stats.count == 1 and stats.statements == ["SELECT 1 / 0"]
+        connection = await session.connection()
+        assert connection.sync_connection.info["query_start_time"] == []
@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from httpx import AsyncClient
+
+from app import migrate, startup
+from app.main import app
+from tests.conftest import TEST_DATABASE_URL
+
+
+async def test_ready_only_after_warm_up(client: AsyncClient, monkeypatch):
+    """/health answers at once; /ready is 503 until every pooled connection is warm."""
+    release = asyncio.Event()
+
+    async def warm_connection():
+        await release.wait()
+
+    monkeypatch.setattr(startup, "_warm_connection", warm_connection)
+    monkeypatch.setattr(app.state, "ready", False, raising=False)
+    warm_up = asyncio.create_task(startup.warm_up(app))
+    try:
+        assert (await client.get("/health")).status_code == 200
+        response = await client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "warming"
+
+        release.set()
+        await asyncio.wait_for(warm_up, timeout=5)
+        response = await client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+    finally:
+        warm_up.cancel()
+
+
+async def _stamp(revisions: list[str]) -> None:
+    import asyncpg
+
+    conn = await asyncpg.connect(TEST_DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1))
+    try:
+        await conn.execute("DROP TABLE IF EXISTS alembic_version")
+        if revisions:
+            await conn.execute("CREATE TABLE alembic_version (version_num varchar(32) PRIMARY KEY)")
+            await conn.executemany("INSERT INTO alembic_version VALUES ($1)", [(revision,) for revision in revisions])
+    finally:
+        await conn.close()
+
+
+@pytest.fixture
+def stamp(monkeypatch):
+    """Points the migration gate at the test database and stamps it with the given revisions."""
+    monkeypatch.setenv(migrate.DATABASE_URL_ENV, TEST_DATABASE_URL)
+    # Synchronous tests run outside the session loop, as the entrypoint does.
+    yield lambda revisions: asyncio.run(_stamp(revisions))
+    asyncio.run(_stamp([]))
+
+
+def test_migrate_skips_alembic_when_schema_is_current(stamp, monkeypatch):
+    from alembic import command
+
+    def upgrade(*args):
+        raise AssertionError("alembic should not run")
+
+    monkeypatch.setattr(command, "upgrade", upgrade)
+    stamp(sorted(migrate.script_heads()))
+    assert migrate.main() == 0
+
+
+def test_migrate_fails_when_schema_is_not_at_head(stamp, monkeypatch):
+    from alembic import command
+
+    upgrades = []
+    # An upgrade that leaves the schema where it was
+    monkeypatch.setattr(command, "upgrade", lambda config, revision: upgrades.append(revision))
+    stamp(["84de87452b6a"])
+    assert migrate.main() != 0
+    assert upgrades == ["head"]
+
+
+def test_migrate_needs_a_database_url(monkeypatch):
+    monkeypatch.delenv(migrate.DATABASE_URL_ENV, raising=False)
+    assert migrate.main() != 0
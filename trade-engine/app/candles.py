@@ -0,0 +1,314 @@
+"""
+OHLCV candles at 1m, 5m, 1h and 1d, aggregated from fills as they happen.
+
+Every (market, resolution) has a CandleSeries, made of two parts:
+
+- the open candle, updated in place for each fill in its bucket;
+- a ring buffer of the last candle_ring_size closed candles, held as NumPy
+  columns (start, open, high, low, close, volume, trades).
+
+A candle closes when a fill lands in a later bucket, or when the flusher sees
+that its bucket has ended. Buckets without trades produce no candle. Prices
+and volumes are integers, and `start` is the bucket's epoch second.
+
+Closed candles are queued, and the flusher bulk-inserts them into `candles`
+every candle_flush_interval_seconds. That table is keyed by (market_id,
+resolution, start), so a range query there is a primary key range scan.
+Queries whose range the ring buffer covers never touch the database.
+
+At startup, history before today (UTC) is loaded from `candles`: the last
+candle_ring_size candles of each series, one index scan each. Today's candles
+are rebuilt from today's fills, found through a BRIN index on
+fills.created_at, and the closed ones are written back. So candles that
+closed but were never flushed before a crash are repaired, and the open
+candles pick up where they left off.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+candles_closed = Counter("trade_candles_closed_total", "Candles closed", ["resolution"])
+candles_persisted = Counter("trade_candles_persisted_total", "Closed candles written to the database")
+candles_pending = Gauge("trade_candles_pending", "Closed candles waiting to be written")
+candle_queries = Counter("trade_candle_queries_total", "Candle range queries", ["source"])
+
+# Name -> bucket length in seconds
+RESOLUTIONS = {"1m": 60, "5m": 300, "1h": 3600, "1d": 86400}
+DAY = RESOLUTIONS["1d"]
+
+CANDLE_DTYPE = np.dtype([
+    ("start", "<i8"), ("open", "<i8"), ("high", "<i8"), ("low", "<i8"),
+    ("close", "<i8"), ("volume", "<i8"), ("trades", "<i8"),
+])
+
+_upsert_candles = text(
+    "INSERT INTO candles (market_id, resolution, start, open, high, low, close, volume, trades) "
+    "VALUES (:market_id, :resolution, :start, :open, :high, :low, :close, :volume, :trades) "
+    "ON CONFLICT (market_id, resolution, start) DO UPDATE SET open = excluded.open, high = excluded.high, "
+    "low = excluded.low, close = excluded.close, volume = excluded.volume, trades = excluded.trades"
+)
+_select_range = text(
+    "SELECT start, open, high, low, close, volume, trades FROM candles "
+    "WHERE market_id = :market_id AND resolution = :resolution AND start >= :start AND start < :end "
+    "ORDER BY start LIMIT :limit"
+)
+_load_history = text(
+    "SELECT m.id, r.resolution, c.start, c.open, c.high, c.low, c.close, c.volume, c.trades "
+    "FROM markets m CROSS JOIN unnest(CAST(:resolutions AS integer[])) AS r(resolution) "
+    "CROSS JOIN LATERAL ("
+    "  SELECT start, open, high, low, close, volume, trades FROM candles "
+    "  WHERE market_id = m.id AND resolution = r.resolution AND start < :before "
+    "  ORDER BY start DESC LIMIT :limit"
+    ") AS c ORDER BY m.id, r.resolution, c.start"
+)
+# Today's fills as minute candles; coarser resolutions are rolled up from them.
+_rebuild_minutes = text(
+    "SELECT market_id, CAST(floor(extract(epoch FROM created_at) / 60) AS bigint) * 60 AS minute, "
+    "(array_agg(price ORDER BY seq))[1], max(price), min(price), (array_agg(price ORDER BY seq DESC))[1], "
+    "sum(quantity), count(*) "
+    "FROM fills WHERE created_at >= :since GROUP BY market_id, minute ORDER BY market_id, minute"
+)
+
+
+class CandleSeries:
+    __slots__ = ("resolution", "ring", "count", "head", "current")
+
+    def __init__(self, resolution: int, capacity: int):
+        self.resolution = resolution
+        self.ring = np.zeros(capacity, dtype=CANDLE_DTYPE)
+        self.count = 0
+        # Next write position
+        self.head = 0
+        # [start, open, high, low, close, volume, trades] of the open candle
+        self.current: Optional[list] = None
+
+    def add(self, timestamp: int, price: int, quantity: int) -> Optional[tuple]:
+        """Adds one trade. Returns the candle it closed, if it started a new bucket."""
+        return self.merge((timestamp - timestamp % self.resolution, price, price, price, price, quantity, 1))
+
+    def merge(self, candle: tuple) -> Optional[tuple]:
+        """Merges a finer candle (or a single trade) into its bucket. Returns the candle it closed, if any."""
+        start = candle[0] - candle[0] % self.resolution
+        current = self.current
+        if current is not None and current[0] == start:
+            if candle[2] > current[2]:
+                current[2] = candle[2]
+            if candle[3] < current[3]:
+                current[3] = candle[3]
+            current[4] = candle[4]
+            current[5] += candle[5]
+            current[6] += candle[6]
+            return None
+
+        closed = self.close()
+        self.current = [start, *candle[1:]]
+        return closed
+
+    def close(self, before: Optional[int] = None) -> Optional[tuple]:
+        """Closes the open candle (only if its bucket ends at or before `before`, when given)."""
+        current = self.current
+        if current is None or (before is not None and current[0] + self.resolution > before):
+            return None
+        self.current = None
+        closed = tuple(current)
+        self.ring[self.head] = closed
+        self.head = (self.head + 1) % len(self.ring)
+        self.count = min(self.count + 1, len(self.ring))
+        return closed
+
+    def closed(self) -> np.ndarray:
+        """The ring's candles, oldest first."""
+        if self.count < len(self.ring):
+            return self.ring[:self.count]
+        return np.concatenate((self.ring[self.head:], self.ring[:self.head]))
+
+    def oldest(self) -> Optional[int]:
+        if self.count == 0:
+            return None
+        return int(self.ring["start"][self.head if self.count == len(self.ring) else 0])
+
+
+class CandleAggregator:
+    def __init__(self, ring_size: Optional[int] = None):
+        self.ring_size = ring_size or settings.candle_ring_size
+        self.series: dict[tuple[int, int], CandleSeries] = {}
+        # (market_id, resolution, candle) closed but not yet persisted
+        self.pending: list[tuple[int, int, tuple]] = []
+        self.loaded = False
+        self._session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal
+        self._task: Optional[asyncio.Task] = None
+
+    def _series(self, market_id: int, resolution: int) -> CandleSeries:
+        key = (market_id, resolution)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = CandleSeries(resolution, self.ring_size)
+        return series
+
+    def _closed(self, market_id: int, resolution: int, candle: tuple) -> None:
+        self.pending.append((market_id, resolution, candle))
+        candles_closed.inc(resolution=_NAMES[resolution])
+
+    # --- ingestion
+
+    def on_batch(self, engine, batch) -> None:
+        """MarketEngine listener: adds the batch's fills to every resolution."""
+        if not batch.fills:
+            return
+        market_id = engine.market_id
+        timestamp = int(batch.created_at.timestamp())
+        for resolution in RESOLUTIONS.values():
+            series = self._series(market_id, resolution)
+            for fill in batch.fills:
+                closed = series.add(timestamp, fill.price, fill.quantity)
+                if closed is not None:
+                    self._closed(market_id, resolution, closed)
+
+    def close_elapsed(self, now: Optional[float] = None) -> int:
+        """Closes every open candle whose bucket has ended. Returns how many were closed."""
+        now = int(now if now is not None else time.time())
+        closed_count = 0
+        for (market_id, resolution), series in self.series.items():
+            closed = series.close(before=now)
+            if closed is not None:
+                self._closed(market_id, resolution, closed)
+                closed_count += 1
+        return closed_count
+
+    # --- persistence
+
+    def start(self, session_factory: Optional[async_sessionmaker[AsyncSession]] = None) -> None:
+        if session_factory is not None:
+            self._session_factory = session_factory
+        self._task = asyncio.create_task(self._run(), name="candle-flusher")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> int:
+        """Writes every closed candle queued so far in one executemany. Returns the count."""
+        self.close_elapsed()
+        pending, self.pending = self.pending, []
+        if not pending:
+            return 0
+        try:
+            async with self._session_factory() as session:
+                await session.execute(_upsert_candles, [_row(market_id, resolution, candle) for market_id, resolution, candle in pending])
+                await session.commit()
+        except Exception:
+            # Keep them for the next flush.
+            self.pending = pending + self.pending
+            raise
+        finally:
+            candles_pending.set(len(self.pending))
+        candles_persisted.inc(len(pending))
+        return len(pending)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.candle_flush_interval_seconds)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Persisting candles failed")
+
+    # --- queries
+
+    async def query(self, market_id: int, resolution: int, start: int, end: int, limit: int) -> list[list[int]]:
+        """
+        Candles with start in [start, end), oldest first, at most `limit`. Includes the
+        open candle. Served from the ring buffer when it covers `start`, else the
+        older part comes from the candles table.
+        """
+        series = self.series.get((market_id, resolution))
+        rows: list[list[int]] = []
+        oldest = series.oldest() if series is not None else None
+        ring_from = oldest if oldest is not None else (series.current[0] if series is not None and series.current else None)
+
+        if ring_from is None or start < ring_from:
+            candle_queries.inc(source="database")
+            # Closed candles not yet flushed are still in the ring, so the database is only asked for what precedes it.
+            db_end = end if ring_from is None else min(end, ring_from)
+            async with self._session_factory() as session:
+                result = await session.execute(_select_range, {
+                    "market_id": market_id, "resolution": resolution, "start": start, "end": db_end, "limit": limit,
+                })
+                rows = [list(row) for row in result]
+        else:
+            candle_queries.inc(source="memory")
+
+        if series is not None and len(rows) < limit:
+            closed = series.closed()
+            lo, hi = np.searchsorted(closed["start"], [max(start, ring_from or start), end])
+            rows += closed[lo:hi].tolist()
+            current = series.current
+            if current is not None and start <= current[0] < end:
+                rows.append(list(current))
+        return [list(row) for row in rows[:limit]]
+
+    # --- startup
+
+    async def load(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+        """Loads history before today, rebuilds today's candles from today's fills and writes the closed ones back."""
+        started = time.perf_counter()
+        self._session_factory = session_factory
+        self.series.clear()
+        self.pending.clear()
+        now = time.time()
+        today = int(now) - int(now) % DAY
+
+        async with session_factory() as session:
+            history = await session.execute(_load_history, {
+                "resolutions": list(RESOLUTIONS.values()), "before": today, "limit": self.ring_size,
+            })
+            for market_id, resolution, *candle in history:
+                self._series(market_id, resolution).merge(tuple(candle))
+            # The last loaded candle of each series is still open; close them all into the rings.
+            for series in self.series.values():
+                series.close()
+
+            minutes = (await session.execute(_rebuild_minutes, {"since": datetime.fromtimestamp(today, timezone.utc)})).all()
+
+        for market_id, *candle in minutes:
+            candle = tuple(int(value) for value in candle)
+            for resolution in RESOLUTIONS.values():
+                closed = self._series(market_id, resolution).merge(candle)
+                if closed is not None:
+                    self.pending.append((market_id, resolution, closed))
+        self.close_elapsed(now)
+        repaired = await self.flush()
+
+        logger.info(
+            "Loaded candles for %d series (%d minutes rebuilt from today's fills, %d candles rewritten) in %.0fms",
+            len(self.series), len(minutes), repaired, (time.perf_counter() - started) * 1000,
+        )
+
+
+_NAMES = {seconds: name for name, seconds in RESOLUTIONS.items()}
+
+
+def _row(market_id: int, resolution: int, candle: tuple) -> dict:
+    start, open_, high, low, close, volume, trades = candle
+    return {
+        "market_id": market_id, "resolution": resolution, "start": start, "open": open_,
+        "high": high, "low": low, "close": close, "volume": volume, "trades": trades,
+    }
+
+
+candles = CandleAggregator()
@@ -0,0 +1,93 @@
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+class Settings(BaseSettings):
+    trade_database_url: str
+    trade_secret_key: str
+    trade_algorithm: str = "HS256"
+
+    # End-user access tokens (app.identity), verified locally with identity-service's published keys
+    identity_service_url: str = "http://identity-service:8001"
+    identity_timeout_seconds: float = 5.0
+    # Calls to identity-service (app.resilience): connections/calls in flight, consecutive
+    # failures that open the breaker and how long it stays open, and when a slow
+    # key-set fetch is hedged with a second request (0 disables hedging)
+    identity_max_connections: int = 20
+    identity_breaker_failures: int = 5
+    identity_breaker_reset_seconds: float = 10.0
+    identity_hedge_after_seconds: float = 0.1
+    identity_token_issuer: str = "identity-service"
+    # A token with an unknown key id refreshes the key set at most this often
+    identity_jwks_min_refresh_seconds: float = 30.0
+    # How often revocations are pulled; a revoked token is still accepted for up to this long
+    identity_revocation_poll_interval_seconds: float = 5.0
+    # Verified tokens remembered, so repeat requests skip the signature check
+    identity_token_cache_size: int = 100_000
+    # Also accept X-User-ID/X-Tenant-ID headers from a trusted forwarder (off unless a
+    # deployment has one); they must be signed with this secret
+    # (app.identity.forwarded_headers), and are refused without one
+    trust_forwarded_headers: bool = False
+    trade_forwarded_headers_secret: str = ""
+
+    # Commands a market task drains from its queue before yielding to the loop
+    engine_command_batch: int = 512
+    # Orders/fills the writer persists per transaction
+    writer_batch_size: int = 5000
+    # Tries before a batch the database refuses is dead-lettered, or, while the database
+    # is unreachable, before markets refuse new orders (app.engine.writer)
+    writer_max_attempts: int = 5
+    # Most orders POST /markets/{id}/orders/batch accepts in one request
+    order_batch_max_orders: int = 200
+
+    # Order journal (app.engine.journal); empty disables it and books are rebuilt from the database
+    journal_dir: str = ""
+    # Segment files roll over at this size
+    journal_segment_bytes: int = 64 * 1024 * 1024
+    journal_snapshot_interval_seconds: float = 300.0
+
+    # Pre-trade risk (app.engine.risk): how far below zero an account's cash may go,
+    # the largest net position (long or short, including resting orders) per market,
+    # and the market quota for tenants whose limit identity-service does not forward
+    risk_credit_limit: int = 10_000_000
+    risk_max_position: int = 1_000_000
+    default_max_markets: int = 10
+
+    # Reference prices (app.market_data)
+    coingecko_api_url: str = "https://api.coingecko.com/api/v3"
+    price_currency: str = "usd"
+    price_poll_interval_seconds: float = 30.0
+    # Quotes older than this are still served, but trigger a background refresh
+    price_ttl_seconds: float = 60.0
+    price_timeout_seconds: float = 5.0
+    price_max_backoff_seconds: float = 600.0
+    # Coin ids per upstream request
+    price_batch_size: int = 250
+
+    # Settlement (app.settlement)
+    settlement_enabled: bool = True
+    settlement_interval_seconds: float = 60.0
+    # Fills applied per transaction; bounds how long balance rows stay locked
+    settlement_batch_size: int = 50_000
+    settlement_batch_pause_seconds: float = 0.0
+
+    # Portfolio valuation (app.portfolio): margin required per unit of gross exposure
+    margin_rate: float = 0.1
+
+    # WebSocket fan-out (app.streaming)
+    stream_book_depth: int = 10
+    stream_max_topics: int = 100
+    # A client is closed once its oldest undelivered update is this old...
+    stream_max_lag_seconds: float = 5.0
+    # ...or once this many distinct topics/orders are waiting for it
+    stream_max_pending: int = 1000
+    # Browser clients cannot set headers on a WebSocket; they authenticate in their
+    # first message instead, which must arrive within this time
+    stream_auth_timeout_seconds: float = 10.0
+
+    # Candles (app.candles): closed candles kept in memory per market and resolution,
+    # and how often closed candles are written to the database
+    candle_ring_size: int = 500
+    candle_flush_interval_seconds: float = 5.0
+
+    model_config = SettingsConfigDict(env_file="../.env", extra="ignore")
+
+settings = Settings() #type: ignore
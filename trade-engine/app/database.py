@@ -4,7 +4,8 @@ from sqlalchemy.orm import declarative_base
 
 DATABASE_URL = os.getenv("TRADE_DATABASE_URL")
 
-engine = create_async_engine(DATABASE_URL, echo=True) #type: ignore
+# SQL statement logging goes through the queued logging pipeline (SQL_LOG_LEVEL), not echo
+engine = create_async_engine(DATABASE_URL) #type: ignore
 AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 Base = declarative_base()
\ No newline at end of file
@@ -0,0 +1,99 @@
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.engine.market import MarketEngine
+from app.engine.registry import registry
+from app.identity import InvalidToken, KeysUnavailable, verifier, verify_forwarded
+from app.logging_config import tenant_id_var
+
+async def get_db():
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+@dataclass(frozen=True)
+class Principal:
+    account_id: uuid.UUID
+    tenant_id: uuid.UUID
+    # The tenant's plan limit, when identity-service forwards it
+    max_markets: Optional[int] = None
+
+
+def _bind(principal: Principal) -> Principal:
+    # Log lines written while handling the request carry the caller's tenant.
+    tenant_id_var.set(str(principal.tenant_id))
+    return principal
+
+
+async def principal_from_token(token: str) -> Principal:
+    """The caller a user access token names. Raises InvalidToken or KeysUnavailable."""
+    verified = await verifier.verify(token)
+    return _bind(Principal(account_id=verified.account_id, tenant_id=verified.tenant_id, max_markets=verified.max_markets))
+
+
+async def get_principal(
+    authorization: Optional[str] = Header(None, description="Bearer access token issued by identity-service"),
+    x_user_id: Optional[str] = Header(None, description="End-user id, set by identity-service"),
+    x_tenant_id: Optional[str] = Header(None, description="Tenant id, set by identity-service"),
+    x_tenant_max_markets: Optional[int] = Header(None, description="Tenant's market quota, set by identity-service"),
+    x_forwarded_timestamp: Optional[str] = Header(None, description="When the forwarder signed the headers above"),
+    x_forwarded_signature: Optional[str] = Header(None, description="Forwarder's signature over the headers above"),
+) -> Principal:
+    """
+    Resolves the caller, preferably from a user access token, which is verified
+    locally (app.identity) without a call to identity-service. Requests from a
+    trusted forwarder carry the user and tenant in headers instead; those are
+    accepted while trust_forwarded_headers is on, and only when signed with
+    trade_forwarded_headers_secret.
+    """
+    if authorization is not None:
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            raise HTTPException(status_code=401, detail="Invalid authorization header")
+        try:
+            return await principal_from_token(token)
+        except InvalidToken:
+            raise HTTPException(status_code=401, detail="Token is invalid or expired")
+        except KeysUnavailable:
+            raise HTTPException(status_code=503, detail="Token verification unavailable")
+
+    if not settings.trust_forwarded_headers or x_user_id is None or x_tenant_id is None:
+        raise HTTPException(status_code=401, detail="Missing authorization token")
+    if not verify_forwarded(x_forwarded_timestamp, x_forwarded_signature, x_user_id, x_tenant_id, x_tenant_max_markets):
+        raise HTTPException(status_code=401, detail="Invalid forwarded user headers")
+    try:
+        return _bind(Principal(account_id=uuid.UUID(x_user_id), tenant_id=uuid.UUID(x_tenant_id), max_markets=x_tenant_max_markets))
+    except ValueError:
+        raise HTTPException(status_code=401, detail="Invalid user or tenant id")
+
+
+async def get_optional_principal(
+    authorization: Optional[str] = Header(None),
+    x_user_id: Optional[str] = Header(None),
+    x_tenant_id: Optional[str] = Header(None),
+    x_tenant_max_markets: Optional[int] = Header(None),
+    x_forwarded_timestamp: Optional[str] = Header(None),
+    x_forwarded_signature: Optional[str] = Header(None),
+) -> Optional[Principal]:
+    """Like get_principal, but None when the request carries no credentials in its headers."""
+    if authorization is None and x_user_id is None:
+        return None
+    return await get_principal(authorization, x_user_id, x_tenant_id, x_tenant_max_markets, x_forwarded_timestamp, x_forwarded_signature)
+
+
+async def get_market_engine(market_id: int, principal: Principal = Depends(get_principal)) -> MarketEngine:
+    """The market's engine. Other tenants' markets are reported as not found."""
+    if not registry.started:
+        raise HTTPException(status_code=503, detail="Trade engine is starting up")
+
+    engine = registry.get_for_tenant(market_id, principal.tenant_id)
+    if engine is None:
+        raise HTTPException(status_code=404, detail="Market not found")
+    if engine.halted is not None:
+        raise HTTPException(status_code=503, detail="Market is halted")
+    return engine
@@ -0,0 +1,505 @@
+"""
+Append-only binary journal of order events, with book snapshots.
+
+Every accepted order, cancel and fill gets a global sequence number and a
+fixed-width binary record (numpy structured dtypes below). Records written
+between two flushes go into one length-prefixed, CRC-checked frame:
+
+    <u32 body length> <u32 crc32(body)> <u32 orders> <u32 cancels> <u32 fills>
+    body = order records | cancel records | fill records
+
+The flusher writes and fsyncs one frame at a time, off the event loop, while
+new records accumulate for the next frame (group commit). MarketEngine only
+acknowledges commands, hands them to the DB writer and notifies listeners once
+their frame is durable. So neither clients nor the database ever see an event
+the journal could lose.
+
+Order records carry the order's remaining quantity after matching. Fill records
+carry the maker's remaining quantity. A book can therefore be rebuilt from
+effects alone, without re-running the matcher.
+
+Segments (journal-<first seq>.log) roll at journal_segment_bytes. Snapshots
+(snapshot-<seq>.bin) hold every resting order as of a sequence number. Each is
+taken only once the journal is durable through that sequence number, and
+written to a temp file that is renamed into place.
+
+Recovery (recover()) loads the latest snapshot and memory-maps the segments.
+A torn frame is only expected at the end of the newest segment, where a crash
+interrupted a write, and is truncated away. A bad frame in any older segment
+means records were lost in the middle of the journal, so recovery raises
+JournalCorrupt rather than replay later records over the gap.
+Each frame section is parsed with np.frombuffer, with no per-record Python. The
+surviving resting orders are computed vectorized: snapshot orders plus tail
+limit orders, minus maker fills, minus cancels. Only the survivors are turned
+into Order objects. Records past the DB writer's checkpoint are also returned,
+so the caller can re-drive writes the database never committed.
+"""
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import time
+import uuid
+import zlib
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from app.config import settings
+from app.engine.orderbook import Fill, Order
+from app.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+journal_records = Counter("trade_journal_records_total", "Records appended to the journal", ["kind"])
+journal_bytes = Counter("trade_journal_bytes_total", "Bytes appended to the journal")
+journal_fsync_seconds = Histogram(
+    "trade_journal_fsync_seconds", "Time to write and fsync one journal frame",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+journal_snapshot_seconds = Histogram("trade_journal_snapshot_seconds", "Time to take and write a book snapshot")
+
+ORDER_DTYPE = np.dtype([
+    ("seq", "<u8"), ("order_id", "<i8"), ("market_id", "<i4"), ("side", "u1"), ("order_type", "u1"),
+    ("price", "<i8"), ("quantity", "<i8"), ("remaining", "<i8"), ("account_hi", "<u8"), ("account_lo", "<u8"),
+])
+CANCEL_DTYPE = np.dtype([
+    ("seq", "<u8"), ("order_id", "<i8"), ("market_id", "<i4"), ("remaining", "<i8"),
+    ("account_hi", "<u8"), ("account_lo", "<u8"),
+])
+FILL_DTYPE = np.dtype([
+    ("seq", "<u8"), ("market_id", "<i4"), ("taker_order_id", "<i8"), ("maker_order_id", "<i8"), ("taker_side", "u1"),
+    ("buy_hi", "<u8"), ("buy_lo", "<u8"), ("sell_hi", "<u8"), ("sell_lo", "<u8"),
+    ("price", "<i8"), ("quantity", "<i8"), ("maker_remaining", "<i8"),
+])
+
+FRAME_HEADER = struct.Struct("<IIIII")
+SNAPSHOT_HEADER = struct.Struct("<8sQQQ")
+SNAPSHOT_MAGIC = b"SNTLSNP1"
+
+_LOW64 = (1 << 64) - 1
+
+
+def split_uuid(value: uuid.UUID) -> tuple[int, int]:
+    n = value.int
+    return n >> 64, n & _LOW64
+
+
+def join_uuid(hi: int, lo: int) -> uuid.UUID:
+    return uuid.UUID(int=(int(hi) << 64) | int(lo))
+
+
+def encode_frame(orders: list[tuple], cancels: list[tuple], fills: list[tuple]) -> bytes:
+    body = b"".join((
+        np.array(orders, dtype=ORDER_DTYPE).tobytes(),
+        np.array(cancels, dtype=CANCEL_DTYPE).tobytes(),
+        np.array(fills, dtype=FILL_DTYPE).tobytes(),
+    ))
+    return FRAME_HEADER.pack(len(body), zlib.crc32(body), len(orders), len(cancels), len(fills)) + body
+
+
+def _fsync_directory(directory: Path) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    def __init__(self, directory: str | os.PathLike, segment_bytes: Optional[int] = None):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes or settings.journal_segment_bytes
+        self.next_seq = 1
+        self.durable_seq = 0
+        self._orders: list[tuple] = []
+        self._cancels: list[tuple] = []
+        self._fills: list[tuple] = []
+        self._waiters: list[asyncio.Future] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._fd: Optional[int] = None
+        self._segment_size = 0
+
+    @property
+    def last_seq(self) -> int:
+        return self.next_seq - 1
+
+    # --- lifecycle
+
+    def open(self, next_seq: int) -> None:
+        """Starts a fresh segment at `next_seq`. Never appends to an existing (possibly torn) file."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.next_seq = next_seq
+        self.durable_seq = next_seq - 1
+        self._open_segment(next_seq)
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="trade-journal")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            await self.commit()
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    # --- appending (called from market tasks)
+
+    def _take_seq(self) -> int:
+        seq = self.next_seq
+        self.next_seq += 1
+        return seq
+
+    def record_order(self, order: Order) -> None:
+        hi, lo = split_uuid(order.account_id)
+        self._orders.append((
+            self._take_seq(), order.order_id, order.market_id, order.side, order.order_type,
+            order.price, order.quantity, order.remaining, hi, lo,
+        ))
+
+    def record_cancel(self, order: Order) -> None:
+        hi, lo = split_uuid(order.account_id)
+        self._cancels.append((self._take_seq(), order.order_id, order.market_id, order.remaining, hi, lo))
+
+    def record_fill(self, fill: Fill) -> None:
+        buy_hi, buy_lo = split_uuid(fill.buy_account_id)
+        sell_hi, sell_lo = split_uuid(fill.sell_account_id)
+        self._fills.append((
+            self._take_seq(), fill.market_id, fill.taker_order_id, fill.maker_order_id, fill.taker_side,
+            buy_hi, buy_lo, sell_hi, sell_lo, fill.price, fill.quantity, fill.maker_remaining,
+        ))
+
+    def mark(self) -> tuple[int, int, int, int]:
+        return self.next_seq, len(self._orders), len(self._cancels), len(self._fills)
+
+    def rollback(self, mark: tuple[int, int, int, int]) -> None:
+        """
+        Drops the records appended since mark(). Only valid if control has not
+        returned to the event loop in between, so no flush can have taken them.
+        """
+        self.next_seq, orders, cancels, fills = mark
+        del self._orders[orders:], self._cancels[cancels:], self._fills[fills:]
+
+    def commit(self) -> asyncio.Future:
+        """A future that resolves once every record appended so far is on disk."""
+        future = asyncio.get_running_loop().create_future()
+        if self.durable_seq >= self.last_seq and not self._waiters:
+            future.set_result(self.durable_seq)
+            return future
+        self._waiters.append(future)
+        assert self._wakeup is not None, "Journal.start() was not called"
+        self._wakeup.set()
+        return future
+
+    # --- flushing
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            orders, cancels, fills = self._orders, self._cancels, self._fills
+            waiters, upto = self._waiters, self.last_seq
+            self._orders, self._cancels, self._fills, self._waiters = [], [], [], []
+
+            try:
+                if orders or cancels or fills:
+                    frame = encode_frame(orders, cancels, fills)
+                    started = time.perf_counter()
+                    await asyncio.to_thread(self._write, frame)
+                    journal_fsync_seconds.observe(time.perf_counter() - started)
+                    journal_bytes.inc(len(frame))
+                    journal_records.inc(len(orders), kind="order")
+                    journal_records.inc(len(cancels), kind="cancel")
+                    journal_records.inc(len(fills), kind="fill")
+                    self.durable_seq = upto
+                    if self._segment_size >= self.segment_bytes:
+                        self._roll(upto + 1)
+            except Exception as exc:
+                logger.critical("Journal write failed; the trade engine should be restarted", exc_info=True)
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(exc)
+                continue
+
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(upto)
+
+    def _write(self, frame: bytes) -> None:
+        assert self._fd is not None
+        view = memoryview(frame)
+        while view:
+            written = os.write(self._fd, view)
+            view = view[written:]
+        os.fsync(self._fd)
+        self._segment_size += len(frame)
+
+    def _open_segment(self, first_seq: int) -> None:
+        path = self.directory / f"journal-{first_seq:020d}.log"
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+        self._segment_size = 0
+        _fsync_directory(self.directory)
+
+    def _roll(self, first_seq: int) -> None:
+        assert self._fd is not None
+        os.close(self._fd)
+        self._open_segment(first_seq)
+
+    # --- snapshots and pruning
+
+    def write_snapshot(self, seq: int, next_order_id: int, orders: np.ndarray) -> Path:
+        """Writes snapshot-<seq>.bin atomically. Blocking: run it in a thread."""
+        path = self.directory / f"snapshot-{seq:020d}.bin"
+        tmp = path.with_suffix(".tmp")
+        body = orders.astype(ORDER_DTYPE, copy=False).tobytes()
+        with open(tmp, "wb") as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, seq, next_order_id, len(orders)))
+            f.write(body)
+            f.write(struct.pack("<I", zlib.crc32(body)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        _fsync_directory(self.directory)
+        return path
+
+    def prune(self, upto_seq: int) -> None:
+        """Deletes closed segments whose records are all <= upto_seq, and all but the newest snapshot."""
+        segments = list_segments(self.directory)
+        for (first, path), (next_first, _) in zip(segments, segments[1:]):
+            if next_first - 1 <= upto_seq:
+                path.unlink(missing_ok=True)
+        snapshots = list_snapshots(self.directory)
+        for _, path in snapshots[:-1]:
+            path.unlink(missing_ok=True)
+
+
+def list_segments(directory: Path) -> list[tuple[int, Path]]:
+    return sorted((int(p.stem.split("-")[1]), p) for p in directory.glob("journal-*.log"))
+
+
+def list_snapshots(directory: Path) -> list[tuple[int, Path]]:
+    return sorted((int(p.stem.split("-")[1]), p) for p in directory.glob("snapshot-*.bin"))
+
+
+def snapshot_rows(books, seq: int) -> np.ndarray:
+    """Every resting order of the given books as ORDER_DTYPE rows (ascending id = time priority)."""
+    rows = []
+    for book in books:
+        for order in book.orders.values():
+            hi, lo = split_uuid(order.account_id)
+            rows.append((seq, order.order_id, order.market_id, order.side, order.order_type, order.price, order.quantity, order.remaining, hi, lo))
+    array = np.array(rows, dtype=ORDER_DTYPE)
+    array.sort(order="order_id")
+    return array
+
+
+class Recovery:
+    """State reconstructed from the journal directory."""
+
+    def __init__(self):
+        self.snapshot_seq = 0
+        self.last_seq = 0
+        self.next_order_id = 1
+        # Resting orders after replay, ORDER_DTYPE, ascending order id
+        self.resting = np.zeros(0, dtype=ORDER_DTYPE)
+        # Raw records newer than the requested tail_after seq (for re-driving DB writes)
+        self.tail_orders = np.zeros(0, dtype=ORDER_DTYPE)
+        self.tail_cancels = np.zeros(0, dtype=CANCEL_DTYPE)
+        self.tail_fills = np.zeros(0, dtype=FILL_DTYPE)
+        self.records_replayed = 0
+
+    @property
+    def empty(self) -> bool:
+        return self.last_seq == 0
+
+
+def _load_snapshot(path: Path) -> Optional[tuple[int, int, np.ndarray]]:
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < SNAPSHOT_HEADER.size + 4:
+        return None
+    magic, seq, next_order_id, count = SNAPSHOT_HEADER.unpack_from(data)
+    end = SNAPSHOT_HEADER.size + count * ORDER_DTYPE.itemsize
+    if magic != SNAPSHOT_MAGIC or len(data) != end + 4:
+        return None
+    body = data[SNAPSHOT_HEADER.size:end]
+    if struct.unpack_from("<I", data, end)[0] != zlib.crc32(body):
+        return None
+    return seq, next_order_id, np.frombuffer(body, dtype=ORDER_DTYPE).copy()
+
+
+class JournalCorrupt(Exception):
+    """A segment other than the newest has a bad frame; the journal cannot be replayed past it."""
+
+
+def _read_segment(path: Path, after_seq: int, last: bool = True) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns the segment's (orders, cancels, fills) records with seq > after_seq. In
+    the last segment, a torn or corrupt frame ends it: the file is truncated to the
+    last good frame. In any other segment it raises JournalCorrupt.
+    """
+    parts: tuple[list, list, list] = ([], [], [])
+    dtypes = (ORDER_DTYPE, CANCEL_DTYPE, FILL_DTYPE)
+    size = path.stat().st_size
+    if size == 0:
+        return tuple(np.zeros(0, dtype=dtype) for dtype in dtypes)  #type: ignore
+
+    records = None
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        offset = 0
+        while offset + FRAME_HEADER.size <= size:
+            length, crc, *counts = FRAME_HEADER.unpack_from(mm, offset)
+            start = offset + FRAME_HEADER.size
+            expected = sum(count * dtype.itemsize for count, dtype in zip(counts, dtypes))
+            if length != expected or start + length > size or zlib.crc32(mm[start:start + length]) != crc:
+                break
+
+            for count, dtype, out in zip(counts, dtypes, parts):
+                if count:
+                    # Raw bytes views into the mapping; the one copy happens in the concatenate below.
+                    records = np.frombuffer(mm, dtype=np.uint8, count=count * dtype.itemsize, offset=start)
+                    # Frames are in seq order, so only the first frames past a snapshot need filtering.
+                    if int(records[:8].view("<u8")[0]) <= after_seq:
+                        typed = records.view(dtype)
+                        records = typed[typed["seq"] > after_seq].view(np.uint8)
+                        del typed
+                    if len(records):
+                        out.append(records)
+                start += count * dtype.itemsize
+            offset = start
+
+        torn = offset < size
+        # Concatenated as bytes: joining structured arrays has a per-array cost that adds up over thousands of frames.
+        arrays = tuple(
+            (np.concatenate(out) if out else np.zeros(0, dtype=np.uint8)).view(dtype) for out, dtype in zip(parts, dtypes)
+        )
+        # Views must be gone before the mapping is closed.
+        records = None
+        for out in parts:
+            out.clear()
+
+    if torn and not last:
+        raise JournalCorrupt(f"Journal segment {path.name} has a torn or corrupt frame at byte {offset}, before the newest segment")
+    if torn:
+        logger.warning("Journal segment %s has a torn or corrupt frame at byte %d; truncating", path.name, offset)
+        os.truncate(path, offset)
+    return arrays  #type: ignore
+
+
+def _concat(parts: list, dtype: np.dtype) -> np.ndarray:
+    if not parts:
+        return np.zeros(0, dtype=dtype)
+    return np.concatenate(parts) if len(parts) > 1 else parts[0].copy()
+
+
+def _after(records: np.ndarray, seq: int) -> np.ndarray:
+    """The records with seq > `seq`, as a view (each record type is appended in seq order)."""
+    return records[np.searchsorted(records["seq"], seq, side="right"):]
+
+
+def recover(directory: str | os.PathLike, tail_after: Optional[int] = None) -> Recovery:
+    """
+    Rebuilds the resting orders from the latest valid snapshot plus the journal tail.
+    Records with seq > tail_after (default: the snapshot seq) are also returned raw.
+    """
+    directory = Path(directory)
+    recovery = Recovery()
+    if not directory.exists():
+        return recovery
+
+    snapshot = None
+    for _, path in reversed(list_snapshots(directory)):
+        snapshot = _load_snapshot(path)
+        if snapshot is not None:
+            break
+        logger.warning("Ignoring unreadable snapshot %s", path.name)
+    if snapshot is not None:
+        recovery.snapshot_seq, recovery.next_order_id, base = snapshot
+    else:
+        base = np.zeros(0, dtype=ORDER_DTYPE)
+    snapshot_seq = recovery.snapshot_seq
+    read_after = snapshot_seq if tail_after is None else min(tail_after, snapshot_seq)
+
+    order_parts, cancel_parts, fill_parts = [], [], []
+    segments = list_segments(directory)
+    for i, (_, path) in enumerate(segments):
+        # Skip segments that end at or before the point we read from.
+        if i + 1 < len(segments) and segments[i + 1][0] - 1 <= read_after:
+            continue
+        orders, cancels, fills = _read_segment(path, read_after, last=i + 1 == len(segments))
+        order_parts.append(orders)
+        cancel_parts.append(cancels)
+        fill_parts.append(fills)
+    orders = _concat(order_parts, ORDER_DTYPE)
+    cancels = _concat(cancel_parts, CANCEL_DTYPE)
+    fills = _concat(fill_parts, FILL_DTYPE)
+
+    tail_after = snapshot_seq if tail_after is None else tail_after
+    recovery.tail_orders = _after(orders, tail_after)
+    recovery.tail_cancels = _after(cancels, tail_after)
+    recovery.tail_fills = _after(fills, tail_after)
+
+    # Book replay only looks at records after the snapshot.
+    orders = _after(orders, snapshot_seq)
+    cancels = _after(cancels, snapshot_seq)
+    fills = _after(fills, snapshot_seq)
+    recovery.records_replayed = len(orders) + len(cancels) + len(fills)
+
+    # Candidates: resting at the snapshot, plus tail limit orders that rested after matching.
+    # Ids are assigned in seq order, so the concatenation stays sorted by order id.
+    rested = orders[(orders["order_type"] == 0) & (orders["remaining"] > 0)]
+    candidates = np.concatenate((base, rested))
+    remaining = candidates["remaining"].copy()
+
+    # Field views of structured arrays are strided; contiguous copies search several times faster.
+    order_ids = np.ascontiguousarray(candidates["order_id"])
+    if len(fills) and len(candidates):
+        # Sorted lookups walk the candidates in order instead of missing the cache on every probe.
+        by_maker = np.argsort(fills["maker_order_id"])
+        makers = fills["maker_order_id"][by_maker]
+        idx = np.searchsorted(order_ids, makers)
+        idx[idx == len(candidates)] = 0
+        hit = order_ids[idx] == makers
+        np.subtract.at(remaining, idx[hit], fills["quantity"][by_maker][hit])
+
+    alive = remaining > 0
+    if len(cancels):
+        alive &= ~np.isin(order_ids, cancels["order_id"])
+    candidates["remaining"] = remaining
+    recovery.resting = candidates[alive]
+
+    last_seqs = [snapshot_seq] + [int(a["seq"][-1]) for a in (orders, cancels, fills) if len(a)]
+    recovery.last_seq = max(last_seqs)
+    if len(orders):
+        recovery.next_order_id = max(recovery.next_order_id, int(orders["order_id"].max()) + 1)
+    if len(base):
+        recovery.next_order_id = max(recovery.next_order_id, int(base["order_id"].max()) + 1)
+    return recovery
+
+
+def orders_from_rows(rows: np.ndarray):
+    """Yields Order objects for ORDER_DTYPE rows."""
+    # Accounts rest many orders each; build each account's UUID once.
+    accounts: dict[tuple[int, int], uuid.UUID] = {}
+    for _, order_id, market_id, side, order_type, price, quantity, remaining, hi, lo in rows.tolist():
+        account_id = accounts.get((hi, lo))
+        if account_id is None:
+            account_id = accounts[(hi, lo)] = join_uuid(hi, lo)
+        order = Order(order_id, market_id, account_id, side, order_type, price, quantity)
+        order.remaining = remaining
+        yield order
+
+
+def fills_from_rows(rows: np.ndarray):
+    """Yields Fill objects for FILL_DTYPE rows."""
+    for _, market_id, taker_id, maker_id, taker_side, buy_hi, buy_lo, sell_hi, sell_lo, price, quantity, maker_remaining in rows.tolist():
+        yield Fill(market_id, taker_id, maker_id, taker_side, join_uuid(buy_hi, buy_lo), join_uuid(sell_hi, sell_lo), price, quantity, maker_remaining)
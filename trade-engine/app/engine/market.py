@@ -0,0 +1,309 @@
+"""
+Single-writer execution for one market.
+
+Every mutation of a market's book goes through its command queue and is applied
+by one asyncio task, so matching never takes a lock and needs no atomic
+sections: callers enqueue a command with a future and await the result.
+
+The task drains up to engine_command_batch commands per wake-up, applies them
+back to back, and hands the resulting order state and fills to the writer as a
+single WriteBatch, and to its listeners (streaming, portfolio valuation).
+
+With a journal (app.engine.journal), the batch's events are appended to it as
+they are applied. Results, the writer and the listeners only see the batch once
+the journal's group commit has made it durable. If the commit fails, the book
+already holds effects that are neither durable nor persisted, so the market is
+halted: queued and later commands fail with MarketUnavailable until a restart
+rebuilds the book from the journal and the database. A command that fails
+unexpectedly while being applied may have left the book half-changed, so it
+halts the market too. The journal records of the batch it was part of are
+dropped and none of the batch is acknowledged or written.
+
+With a risk ledger (app.engine.risk), every order is checked against it right
+before matching, and its fills, reservations and cancels are booked in it, all
+in the same synchronous step.
+
+submit_many() and cancel_all() are single commands: all of their orders are
+applied back to back, without any other command in between, and land in the
+same WriteBatch, so the writer persists them in one transaction.
+"""
+import asyncio
+import functools
+import logging
+import uuid
+from typing import Callable, Optional, Sequence
+
+from app.config import settings
+from app.engine.journal import Journal
+from app.engine.orderbook import BUY, LIMIT, MARKET, Fill, Order, OrderBook
+from app.engine.risk import RiskLedger, RiskRejected
+from app.engine.writer import TradeWriter, WriteBatch, order_row
+
+logger = logging.getLogger(__name__)
+
+OPEN = "OPEN"
+PARTIALLY_FILLED = "PARTIALLY_FILLED"
+FILLED = "FILLED"
+CANCELLED = "CANCELLED"
+
+_SUBMIT = 0
+_CANCEL = 1
+_SUBMIT_MANY = 2
+_CANCEL_ALL = 3
+
+
+class MarketUnavailable(Exception):
+    """The market is not taking commands: its trades cannot be persisted right now, or it is halted."""
+
+
+def order_status(order: Order) -> str:
+    if order.remaining == 0:
+        return FILLED
+    if order.order_type == MARKET:
+        # Market orders never rest: whatever could not be filled is cancelled.
+        return CANCELLED
+    return OPEN if order.remaining == order.quantity else PARTIALLY_FILLED
+
+
+class OrderResult:
+    __slots__ = ("order_id", "market_id", "status", "quantity", "remaining", "fills")
+
+    def __init__(self, order: Order, status: str, fills: list[Fill]):
+        self.order_id = order.order_id
+        self.market_id = order.market_id
+        self.status = status
+        self.quantity = order.quantity
+        self.remaining = order.remaining
+        self.fills = fills
+
+    def as_dict(self) -> dict:
+        return {
+            "order_id": self.order_id,
+            "market_id": self.market_id,
+            "status": self.status,
+            "filled": self.quantity - self.remaining,
+            "remaining": self.remaining,
+            "fills": [
+                {"price": fill.price, "quantity": fill.quantity, "maker_order_id": fill.maker_order_id}
+                for fill in self.fills
+            ],
+        }
+
+
+class MarketEngine:
+    def __init__(
+        self,
+        market_id: int,
+        writer: Optional[TradeWriter],
+        next_order_id: Callable[[], int],
+        price_feed_id: Optional[str] = None,
+        listeners: Sequence = (),
+        journal: Optional[Journal] = None,
+        ledger: Optional[RiskLedger] = None,
+        tenant_id: Optional[uuid.UUID] = None,
+    ):
+        self.market_id = market_id
+        # The tenant that owns the market; only its users may see or trade it
+        self.tenant_id = tenant_id
+        self.price_feed_id = price_feed_id
+        self.book = OrderBook(market_id)
+        self.writer = writer
+        # Objects with on_batch(engine, batch), called in this task after every drained batch
+        self.listeners = list(listeners)
+        self.next_order_id = next_order_id
+        # When set, every batch is journaled and only acknowledged once it is on disk
+        self.journal = journal
+        # When set, orders are risk-checked before matching and booked after it
+        self.ledger = ledger
+        self.commands: asyncio.Queue = asyncio.Queue()
+        # Indexed by command kind
+        self._appliers = (self._apply_submit, self._apply_cancel, self._apply_submit_many, self._apply_cancel_all)
+        self._task: Optional[asyncio.Task] = None
+        # The failure (journal commit or command) that halted the market, if any
+        self.halted: Optional[BaseException] = None
+        # Batches journaled up to this seq were matched before the halt and still count
+        self._intact_through = 0
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name=f"market-{self.market_id}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _check_available(self, new_orders: bool = True) -> None:
+        if self.halted is not None:
+            raise MarketUnavailable("Market is halted")
+        # Cancels are still taken: they only shrink what has to be persisted.
+        if new_orders and self.writer is not None and self.writer.stalled:
+            raise MarketUnavailable("Trades cannot be persisted right now; try again later")
+
+    async def submit(self, account_id, side: int, order_type: int, price: int, quantity: int) -> OrderResult:
+        self._check_available()
+        future = asyncio.get_running_loop().create_future()
+        self.commands.put_nowait((_SUBMIT, (account_id, side, order_type, price, quantity), future))
+        return await future
+
+    async def cancel(self, order_id: int, account_id) -> Optional[OrderResult]:
+        """Cancels a resting order owned by `account_id`. Returns None if there is no such order."""
+        self._check_available(new_orders=False)
+        future = asyncio.get_running_loop().create_future()
+        self.commands.put_nowait((_CANCEL, (order_id, account_id), future))
+        return await future
+
+    async def submit_many(self, account_id, orders: Sequence[tuple[int, int, int, int]]) -> list:
+        """
+        Submits (side, order_type, price, quantity) orders in sequence as one command.
+        Returns, in the same order, an OrderResult for each order that was accepted
+        and the RiskRejected for each one that was not. Every order is checked
+        after the ones before it have been booked.
+        """
+        self._check_available()
+        future = asyncio.get_running_loop().create_future()
+        self.commands.put_nowait((_SUBMIT_MANY, [(account_id, *order) for order in orders], future))
+        return await future
+
+    async def cancel_all(self, account_id, side: Optional[int] = None) -> list[OrderResult]:
+        """Cancels every resting order of `account_id` (on one side only, if given) as one command."""
+        self._check_available(new_orders=False)
+        future = asyncio.get_running_loop().create_future()
+        self.commands.put_nowait((_CANCEL_ALL, (account_id, side), future))
+        return await future
+
+    async def _run(self) -> None:
+        commands = self.commands
+        batch_limit = settings.engine_command_batch
+        appliers = self._appliers
+
+        while True:
+            drained = [await commands.get()]
+            while len(drained) < batch_limit and not commands.empty():
+                drained.append(commands.get_nowait())
+
+            out = WriteBatch()
+            results = []
+            mark = self.journal.mark() if self.journal is not None else None
+            for kind, payload, future in drained:
+                try:
+                    result = appliers[kind](payload, out)
+                except RiskRejected as exc:
+                    if not future.done():
+                        future.set_exception(exc)
+                    continue
+                except Exception as exc:
+                    logger.exception("Market %s failed to apply a command", self.market_id)
+                    self._abandon(drained, mark, exc)
+                    return
+                results.append((future, result))
+
+            if self.journal is None or not out:
+                self._publish(results, out)
+            else:
+                # Nothing leaves the engine until the batch is durable; meanwhile the next batch is matched.
+                out.journal_seq = self.journal.last_seq
+                self.journal.commit().add_done_callback(functools.partial(self._committed, results, out))
+
+    def _abandon(self, drained: list, mark: Optional[tuple], exc: Exception) -> None:
+        """Halts the market after a command failed midway, discarding the whole drained batch."""
+        if self.journal is not None and mark is not None:
+            # Batches still waiting on their commit were matched before this one and stand.
+            self._intact_through = mark[0] - 1
+            self.journal.rollback(mark)
+        self._halt(exc)
+        for _, _, future in drained:
+            if not future.done():
+                future.set_exception(MarketUnavailable("Market is halted"))
+
+    def _committed(self, results: list, out: WriteBatch, commit: asyncio.Future) -> None:
+        exc = commit.exception()
+        if exc is not None and self.halted is None:
+            self._halt(exc)
+        # Batches matched after a failed one built on effects that were lost, even if their own commit worked.
+        if exc is not None or (self.halted is not None and out.journal_seq > self._intact_through):
+            for future, _ in results:
+                if not future.done():
+                    future.set_exception(MarketUnavailable("Market is halted"))
+            return
+        self._publish(results, out)
+
+    def _halt(self, exc: BaseException) -> None:
+        self.halted = exc
+        logger.critical("Market %s halted (%s); restart to recover it", self.market_id, exc)
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        while not self.commands.empty():
+            _, _, future = self.commands.get_nowait()
+            if not future.done():
+                future.set_exception(MarketUnavailable("Market is halted"))
+
+    def _publish(self, results: list, out: WriteBatch) -> None:
+        """Acknowledges the callers, then hands the batch to the writer and the listeners."""
+        for future, result in results:
+            if not future.done():
+                future.set_result(result)
+
+        if self.writer is not None:
+            self.writer.submit(out)
+        if out:
+            for listener in self.listeners:
+                try:
+                    listener.on_batch(self, out)
+                except Exception:
+                    logger.exception("Market %s listener %r failed", self.market_id, listener)
+
+    def _apply_submit(self, payload, out: WriteBatch) -> OrderResult:
+        account_id, side, order_type, price, quantity = payload
+        if self.ledger is not None:
+            self.ledger.check_order(self.book, account_id, side, order_type, price, quantity)
+        order = Order(self.next_order_id(), self.market_id, account_id, side, order_type, price if order_type == LIMIT else 0, quantity)
+        fills = self.book.submit(order)
+        status = order_status(order)
+
+        out.new_orders.append(order_row(order, status, out.created_at))
+        for fill in fills:
+            maker_account = fill.sell_account_id if fill.taker_side == BUY else fill.buy_account_id
+            out.updates.append((fill.maker_order_id, fill.maker_remaining, FILLED if fill.maker_remaining == 0 else PARTIALLY_FILLED, maker_account))
+        out.fills.extend(fills)
+        if self.ledger is not None:
+            self.ledger.on_order(order, fills)
+        if self.journal is not None:
+            self.journal.record_order(order)
+            for fill in fills:
+                self.journal.record_fill(fill)
+        return OrderResult(order, status, fills)
+
+    def _apply_submit_many(self, payloads, out: WriteBatch) -> list:
+        results = []
+        for payload in payloads:
+            try:
+                results.append(self._apply_submit(payload, out))
+            except RiskRejected as exc:
+                results.append(exc)
+        return results
+
+    def _apply_cancel(self, payload, out: WriteBatch) -> Optional[OrderResult]:
+        order_id, account_id = payload
+        order = self.book.orders.get(order_id)
+        if order is None or order.account_id != account_id:
+            return None
+        return self._cancel(order, out)
+
+    def _apply_cancel_all(self, payload, out: WriteBatch) -> list[OrderResult]:
+        account_id, side = payload
+        # A scan rather than a per-account index, which every resting order would pay for.
+        orders = [
+            order for order in self.book.orders.values()
+            if order.account_id == account_id and (side is None or order.side == side)
+        ]
+        return [self._cancel(order, out) for order in orders]
+
+    def _cancel(self, order: Order, out: WriteBatch) -> OrderResult:
+        self.book.cancel(order.order_id)
+        out.updates.append((order.order_id, order.remaining, CANCELLED, order.account_id))
+        if self.ledger is not None:
+            self.ledger.on_cancel(order)
+        if self.journal is not None:
+            self.journal.record_cancel(order)
+        return OrderResult(order, CANCELLED, [])
@@ -0,0 +1,235 @@
+"""
+Price-time priority limit order book for a single market.
+
+Prices and quantities are integers (minor units / contracts), so level lookups
+are exact dict hits. Each side keeps a sorted list of price keys arranged so
+the best level is always at the end of the list: bids by price ascending, asks
+by negated price ascending. Consuming the best level is then a list.pop().
+
+Orders at a level form an intrusive doubly linked FIFO (each order holds its own
+prev/next pointers), which together with the order_id -> Order index makes
+cancellation O(1) without scanning the queue.
+
+The book is not thread- or task-safe by design: exactly one writer (the market's
+MarketEngine task) ever mutates it.
+"""
+from bisect import insort
+from typing import Optional
+
+BUY = 0
+SELL = 1
+SIDE_NAMES = ("BUY", "SELL")
+
+LIMIT = 0
+MARKET = 1
+TYPE_NAMES = ("LIMIT", "MARKET")
+
+
+class Order:
+    __slots__ = (
+        "order_id", "market_id", "account_id", "side", "order_type",
+        "price", "quantity", "remaining", "level", "prev", "next",
+    )
+
+    def __init__(self, order_id: int, market_id: int, account_id, side: int, order_type: int, price: int, quantity: int):
+        self.order_id = order_id
+        self.market_id = market_id
+        self.account_id = account_id
+        self.side = side
+        self.order_type = order_type
+        # Market orders carry 0 here; they never rest.
+        self.price = price
+        self.quantity = quantity
+        self.remaining = quantity
+        self.level: Optional[PriceLevel] = None
+        self.prev: Optional[Order] = None
+        self.next: Optional[Order] = None
+
+    def __repr__(self) -> str:
+        return (
+            f"Order({self.order_id}, {SIDE_NAMES[self.side]} {TYPE_NAMES[self.order_type]} "
+            f"{self.remaining}/{self.quantity} @ {self.price})"
+        )
+
+
+class Fill:
+    __slots__ = (
+        "market_id", "taker_order_id", "maker_order_id", "taker_side",
+        "buy_account_id", "sell_account_id", "price", "quantity", "maker_remaining",
+    )
+
+    def __init__(self, market_id, taker_order_id, maker_order_id, taker_side, buy_account_id, sell_account_id, price, quantity, maker_remaining):
+        self.market_id = market_id
+        self.taker_order_id = taker_order_id
+        self.maker_order_id = maker_order_id
+        self.taker_side = taker_side
+        self.buy_account_id = buy_account_id
+        self.sell_account_id = sell_account_id
+        self.price = price
+        self.quantity = quantity
+        # The maker's remaining quantity after this fill, so callers can persist its state.
+        self.maker_remaining = maker_remaining
+
+    def __repr__(self) -> str:
+        return f"Fill({self.quantity} @ {self.price}, taker={self.taker_order_id}, maker={self.maker_order_id})"
+
+
+class PriceLevel:
+    __slots__ = ("price", "head", "tail", "volume", "count")
+
+    def __init__(self, price: int):
+        self.price = price
+        self.head: Optional[Order] = None
+        self.tail: Optional[Order] = None
+        self.volume = 0
+        self.count = 0
+
+    def append(self, order: Order) -> None:
+        order.level = self
+        order.prev = self.tail
+        order.next = None
+        if self.tail is None:
+            self.head = order
+        else:
+            self.tail.next = order
+        self.tail = order
+        self.volume += order.remaining
+        self.count += 1
+
+    def remove(self, order: Order) -> None:
+        if order.prev is None:
+            self.head = order.next
+        else:
+            order.prev.next = order.next
+        if order.next is None:
+            self.tail = order.prev
+        else:
+            order.next.prev = order.prev
+        self.volume -= order.remaining
+        self.count -= 1
+        order.level = order.prev = order.next = None
+
+
+class OrderBook:
+    __slots__ = ("market_id", "bids", "asks", "bid_keys", "ask_keys", "orders")
+
+    def __init__(self, market_id: int):
+        self.market_id = market_id
+        self.bids: dict[int, PriceLevel] = {}
+        self.asks: dict[int, PriceLevel] = {}
+        # Best level last: bids ascending by price, asks ascending by -price.
+        self.bid_keys: list[int] = []
+        self.ask_keys: list[int] = []
+        self.orders: dict[int, Order] = {}
+
+    def best_bid(self) -> Optional[int]:
+        return self.bid_keys[-1] if self.bid_keys else None
+
+    def best_ask(self) -> Optional[int]:
+        return -self.ask_keys[-1] if self.ask_keys else None
+
+    def submit(self, order: Order) -> list[Fill]:
+        """
+        Matches an incoming order against the opposite side, then rests any
+        limit remainder. Market order remainders are left unfilled for the
+        caller to cancel. Returns the fills in execution order.
+        """
+        fills: list[Fill] = []
+        if order.side == BUY:
+            levels, keys, sign = self.asks, self.ask_keys, -1
+        else:
+            levels, keys, sign = self.bids, self.bid_keys, 1
+        is_limit = order.order_type == LIMIT
+        orders = self.orders
+
+        while order.remaining and keys:
+            best_price = keys[-1] * sign
+            if is_limit and (best_price > order.price if order.side == BUY else best_price < order.price):
+                break
+
+            level = levels[best_price]
+            while order.remaining and level.head is not None:
+                maker = level.head
+                quantity = order.remaining if order.remaining < maker.remaining else maker.remaining
+                order.remaining -= quantity
+                maker.remaining -= quantity
+                level.volume -= quantity
+
+                if order.side == BUY:
+                    fills.append(Fill(self.market_id, order.order_id, maker.order_id, BUY, order.account_id, maker.account_id, best_price, quantity, maker.remaining))
+                else:
+                    fills.append(Fill(self.market_id, order.order_id, maker.order_id, SELL, maker.account_id, order.account_id, best_price, quantity, maker.remaining))
+
+                if maker.remaining == 0:
+                    level.remove(maker)
+                    del orders[maker.order_id]
+
+            if level.head is None:
+                keys.pop()
+                del levels[best_price]
+
+        if order.remaining and is_limit:
+            self._rest(order)
+        return fills
+
+    def sweep_cost(self, side: int, quantity: int) -> int:
+        """What a market order for `quantity` on `side` would pay (or receive) at the current levels."""
+        if side == BUY:
+            levels, keys, sign = self.asks, self.ask_keys, -1
+        else:
+            levels, keys, sign = self.bids, self.bid_keys, 1
+
+        cost = 0
+        for key in reversed(keys):
+            price = key * sign
+            take = min(quantity, levels[price].volume)
+            cost += take * price
+            quantity -= take
+            if not quantity:
+                break
+        return cost
+
+    def add_resting(self, order: Order) -> None:
+        """Places an order on the book without matching (used when rebuilding a book)."""
+        self._rest(order)
+
+    def _rest(self, order: Order) -> None:
+        if order.side == BUY:
+            levels, keys, key = self.bids, self.bid_keys, order.price
+        else:
+            levels, keys, key = self.asks, self.ask_keys, -order.price
+
+        level = levels.get(order.price)
+        if level is None:
+            level = levels[order.price] = PriceLevel(order.price)
+            insort(keys, key)
+        level.append(order)
+        self.orders[order.order_id] = order
+
+    def cancel(self, order_id: int) -> Optional[Order]:
+        """Removes a resting order in O(1) (plus a list removal if its level empties)."""
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return None
+
+        level = order.level
+        assert level is not None
+        level.remove(order)
+        if level.head is None:
+            if order.side == BUY:
+                del self.bids[level.price]
+                self.bid_keys.remove(level.price)
+            else:
+                del self.asks[level.price]
+                self.ask_keys.remove(-level.price)
+        return order
+
+    def depth(self, levels: int = 10) -> dict:
+        """Aggregated price levels, best first."""
+        return {
+            "bids": [[price, self.bids[price].volume] for price in reversed(self.bid_keys[-levels:])],
+            "asks": [[-key, self.asks[-key].volume] for key in reversed(self.ask_keys[-levels:])],
+        }
+
+    def __len__(self) -> int:
+        return len(self.orders)
@@ -0,0 +1,246 @@
+"""
+Process-wide registry of market engines.
+
+The trade engine keeps order books in memory, so it runs as a single process:
+the registry owns one MarketEngine per active market, the shared order id
+sequence, and the writer they all persist through.
+
+With JOURNAL_DIR set, the registry also owns the order journal. At startup the
+books are rebuilt from the latest snapshot plus the journal tail instead of from
+the open orders in the database. Any journaled events the database never got are
+written again. Snapshots are taken every journal_snapshot_interval_seconds and
+on a clean stop, and the segments they make redundant are deleted.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Optional, Sequence
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.engine.journal import Journal, Recovery, fills_from_rows, join_uuid, journal_snapshot_seconds, orders_from_rows, recover, snapshot_rows
+from app.engine.market import MarketEngine, CANCELLED, FILLED, OPEN, PARTIALLY_FILLED, order_status
+from app.engine.orderbook import BUY, Order
+from app.engine.risk import RiskLedger
+from app.engine.writer import JOURNAL_CHECKPOINT, TradeWriter, WriteBatch, order_row
+from app.models import JournalCheckpoint, Market, Order as OrderRow
+
+logger = logging.getLogger(__name__)
+
+
+class MarketRegistry:
+    def __init__(self):
+        self.engines: dict[int, MarketEngine] = {}
+        self.writer: Optional[TradeWriter] = None
+        self.journal: Optional[Journal] = None
+        self.ledger: Optional[RiskLedger] = None
+        self.listeners: list = []
+        self.started = False
+        self._last_order_id = 0
+        self._snapshot_task: Optional[asyncio.Task] = None
+
+    def next_order_id(self) -> int:
+        self._last_order_id += 1
+        return self._last_order_id
+
+    def get(self, market_id: int) -> Optional[MarketEngine]:
+        return self.engines.get(market_id)
+
+    def get_for_tenant(self, market_id: int, tenant_id: uuid.UUID) -> Optional[MarketEngine]:
+        """The market's engine, or None if there is none or it belongs to another tenant."""
+        engine = self.engines.get(market_id)
+        return engine if engine is not None and engine.tenant_id == tenant_id else None
+
+    async def start(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        listeners: Sequence = (),
+        journal_dir: Optional[str] = None,
+        ledger: Optional[RiskLedger] = None,
+    ) -> None:
+        """
+        Loads active markets and rebuilds their books, from the journal if one is
+        configured, otherwise from the open orders in the database. Every engine
+        passes its batches to `listeners` (see MarketEngine). With a `ledger`,
+        it is loaded once the books are rebuilt and orders are risk-checked.
+        """
+        journal_dir = settings.journal_dir if journal_dir is None else journal_dir
+        self.listeners = list(listeners)
+        self.ledger = ledger
+        self.writer = TradeWriter(session_factory)
+        self.writer.start()
+
+        async with session_factory() as session:
+            self._last_order_id = (await session.execute(select(func.max(OrderRow.id)))).scalar_one_or_none() or 0
+            writer_seq = (await session.execute(
+                select(JournalCheckpoint.last_seq).where(JournalCheckpoint.name == JOURNAL_CHECKPOINT)
+            )).scalar_one_or_none() or 0
+
+        recovery = None
+        if journal_dir:
+            started = time.perf_counter()
+            recovery = await asyncio.to_thread(recover, journal_dir, writer_seq)
+            self._last_order_id = max(self._last_order_id, recovery.next_order_id - 1)
+            self.writer.committed_journal_seq = writer_seq
+            self.journal = Journal(journal_dir)
+            # A fresh segment per start: the tail of the previous one may have been torn.
+            self.journal.open(max(recovery.last_seq, writer_seq) + 1)
+            self.journal.start()
+
+        async with session_factory() as session:
+            markets = await session.execute(
+                select(Market.id, Market.price_feed_id, Market.tenant_id).where(Market.status == 'ACTIVE')
+            )
+            for market_id, price_feed_id, tenant_id in markets:
+                self._create_engine(market_id, price_feed_id, tenant_id)
+
+        if recovery is not None and not recovery.empty:
+            restored = self._restore(orders_from_rows(recovery.resting))
+            batch = _redrive_batch(recovery)
+            if batch:
+                logger.warning("Re-persisting %d orders, %d updates and %d fills missing from the database",
+                               len(batch.new_orders), len(batch.updates), len(batch.fills))
+                self.writer.submit(batch)
+                # The ledger reads unsettled fills from the database.
+                if ledger is not None:
+                    await self.writer.flush()
+            logger.info(
+                "Recovered %d resting orders from the journal (snapshot %d, %d events replayed) in %.0fms",
+                restored, recovery.snapshot_seq, recovery.records_replayed, (time.perf_counter() - started) * 1000,
+            )
+        else:
+            async with session_factory() as session:
+                open_orders = await session.stream(
+                    select(OrderRow)
+                    .where(OrderRow.status.in_([OPEN, PARTIALLY_FILLED]))
+                    .order_by(OrderRow.id)
+                    .execution_options(yield_per=10_000)
+                )
+                restored = 0
+                async for row in open_orders.scalars():
+                    restored += self._restore((_order_from_row(row),))
+            if self.journal is not None:
+                # The database state becomes the journal's base.
+                await self.snapshot()
+
+        if ledger is not None:
+            await ledger.load(session_factory, (engine.book for engine in self.engines.values()))
+
+        for engine in self.engines.values():
+            engine.start()
+        if self.journal is not None:
+            self._snapshot_task = asyncio.create_task(self._snapshot_loop(), name="trade-journal-snapshots")
+        self.started = True
+        logger.info("Loaded %d markets with %d resting orders", len(self.engines), restored)
+
+    def _restore(self, orders) -> int:
+        """Adds resting orders (ascending id) to their books, skipping markets that are not active."""
+        restored = 0
+        for order in orders:
+            engine = self.engines.get(order.market_id)
+            if engine is None:
+                continue
+            engine.book.add_resting(order)
+            restored += 1
+        return restored
+
+    async def snapshot(self) -> Optional[int]:
+        """
+        Snapshots every book at the current journal seq, once the journal is durable
+        up to it, then prunes what the snapshot and the writer have made redundant.
+        """
+        journal = self.journal
+        if journal is None:
+            return None
+        halted = [engine.market_id for engine in self.engines.values() if engine.halted is not None]
+        if halted:
+            # Their books hold effects the journal lost; a snapshot would make them durable.
+            logger.error("Not snapshotting while markets %s are halted", halted)
+            return None
+        started = time.perf_counter()
+        # Taken synchronously: no market task can run between reading the seq and the books.
+        seq = journal.last_seq
+        rows = snapshot_rows((engine.book for engine in self.engines.values()), seq)
+        await journal.commit()
+        await asyncio.to_thread(journal.write_snapshot, seq, self._last_order_id + 1, rows)
+        prune_upto = min(seq, self.writer.committed_journal_seq if self.writer is not None else 0)
+        await asyncio.to_thread(journal.prune, prune_upto)
+        journal_snapshot_seconds.observe(time.perf_counter() - started)
+        logger.info("Journal snapshot at seq %d with %d resting orders", seq, len(rows))
+        return seq
+
+    async def _snapshot_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.journal_snapshot_interval_seconds)
+            try:
+                await self.snapshot()
+            except Exception:
+                logger.exception("Journal snapshot failed")
+
+    def add_market(self, market_id: int, price_feed_id: Optional[str] = None, tenant_id: Optional[uuid.UUID] = None) -> MarketEngine:
+        engine = self._create_engine(market_id, price_feed_id, tenant_id)
+        engine.start()
+        return engine
+
+    def price_feed_ids(self) -> set[str]:
+        return {engine.price_feed_id for engine in self.engines.values() if engine.price_feed_id}
+
+    def _create_engine(self, market_id: int, price_feed_id: Optional[str] = None, tenant_id: Optional[uuid.UUID] = None) -> MarketEngine:
+        engine = MarketEngine(
+            market_id, self.writer, self.next_order_id, price_feed_id, self.listeners, self.journal, self.ledger, tenant_id,
+        )
+        self.engines[market_id] = engine
+        return engine
+
+    async def stop(self) -> None:
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+            await asyncio.gather(self._snapshot_task, return_exceptions=True)
+            self._snapshot_task = None
+        for engine in self.engines.values():
+            await engine.stop()
+        if self.journal is not None:
+            # Batches waiting on the journal reach the writer once it is durable.
+            await self.journal.commit()
+        if self.writer is not None:
+            await self.writer.stop()
+        if self.journal is not None:
+            await self.snapshot()
+            await self.journal.stop()
+            self.journal = None
+        self.engines.clear()
+        self.started = False
+
+
+def _order_from_row(row: OrderRow) -> Order:
+    order = Order(row.id, row.market_id, row.account_id, row.side, row.order_type, row.price, row.quantity)
+    order.remaining = row.remaining
+    return order
+
+
+def _redrive_batch(recovery: Recovery) -> WriteBatch:
+    """The journal tail past the writer's checkpoint, as one WriteBatch (updates in journal order)."""
+    batch = WriteBatch()
+    batch.journal_seq = recovery.last_seq
+    for order in orders_from_rows(recovery.tail_orders):
+        batch.new_orders.append(order_row(order, order_status(order), batch.created_at))
+
+    updates = []
+    for seq, order_id, _, remaining, hi, lo in recovery.tail_cancels.tolist():
+        updates.append((seq, (order_id, remaining, CANCELLED, join_uuid(hi, lo))))
+    fills = list(fills_from_rows(recovery.tail_fills))
+    for seq, fill in zip(recovery.tail_fills["seq"].tolist(), fills):
+        maker_account = fill.sell_account_id if fill.taker_side == BUY else fill.buy_account_id
+        status = FILLED if fill.maker_remaining == 0 else PARTIALLY_FILLED
+        updates.append((seq, (fill.maker_order_id, fill.maker_remaining, status, maker_account)))
+    updates.sort(key=lambda item: item[0])
+    batch.updates = [update for _, update in updates]
+    batch.fills = fills
+    return batch
+
+
+registry = MarketRegistry()
@@ -0,0 +1,269 @@
+"""
+In-memory pre-trade risk: balances, reservations, positions and market quotas.
+
+Every account has a ledger entry:
+
+    settled    cash in balances (as of the last settlement the ledger saw)
+    unsettled  cash moved by fills that settlement has not reached yet
+    reserved   cash held for the account's resting buy orders
+    available  = settled + unsettled + risk_credit_limit - reserved
+
+and every (account, market) a position entry with its settled and unsettled
+contracts and the size of its resting buys and sells.
+
+The checks run inside the market task, synchronously, just before matching:
+
+- A buy must not cost more than the available cash. A limit buy is checked at
+  price x quantity. A market buy is checked at what sweeping the book would
+  cost right now.
+- The position, plus everything resting and the new order on the same side,
+  must stay within risk_max_position contracts, long or short.
+
+Check, match, fill accounting and the reservation for the resting remainder all
+happen without yielding to the loop. Every market task runs on the same loop, so
+no other order, in any market, can slip in between and spend the same cash.
+Sells reserve no cash: the position limit is what bounds a short.
+
+Tenants' active market counts live here as well, so POST /markets checks
+max_markets without a COUNT query.
+
+load() builds everything at startup: balances, positions and unsettled fills
+from the database (in one REPEATABLE READ snapshot), and reservations from the
+rebuilt books. After each settlement batch, apply_settlement() takes the new
+balances the batch returned, moves the settled amounts from unsettled to
+settled, and counts any difference from what the ledger expected as drift.
+"""
+import logging
+import time
+from typing import Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.engine.orderbook import BUY, MARKET, Fill, Order, OrderBook
+from app.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+risk_rejections = Counter("trade_risk_rejections_total", "Orders and markets rejected by pre-trade checks", ["reason"])
+risk_drift = Counter("trade_risk_reconcile_drift_total", "Ledger entries corrected after settlement", ["kind"])
+risk_accounts = Gauge("trade_risk_accounts", "Accounts held by the risk ledger")
+
+INSUFFICIENT_BALANCE = "insufficient_balance"
+POSITION_LIMIT = "position_limit"
+MARKET_LIMIT = "market_limit"
+
+_load_balances = text("SELECT account_id, cash FROM balances")
+_load_positions = text("SELECT account_id, market_id, quantity FROM positions WHERE quantity <> 0")
+_unsettled_after = "seq > coalesce((SELECT last_seq FROM settlement_checkpoints WHERE name = 'fills'), 0)"
+_load_unsettled_cash = text(
+    "SELECT account_id, sum(delta) FROM ("
+    f"  SELECT buy_account_id AS account_id, -(price * quantity) AS delta FROM fills WHERE {_unsettled_after}"
+    "  UNION ALL"
+    f"  SELECT sell_account_id, price * quantity FROM fills WHERE {_unsettled_after}"
+    ") AS legs GROUP BY account_id"
+)
+_load_unsettled_positions = text(
+    "SELECT account_id, market_id, sum(delta) FROM ("
+    f"  SELECT buy_account_id AS account_id, market_id, quantity AS delta FROM fills WHERE {_unsettled_after}"
+    "  UNION ALL"
+    f"  SELECT sell_account_id, market_id, -quantity FROM fills WHERE {_unsettled_after}"
+    ") AS legs GROUP BY account_id, market_id"
+)
+_load_market_counts = text("SELECT tenant_id, count(*) FROM markets WHERE status = 'ACTIVE' GROUP BY tenant_id")
+
+
+class RiskRejected(Exception):
+    """A pre-trade check failed. `reason` is one of the *_LIMIT / INSUFFICIENT_BALANCE constants."""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class AccountRisk:
+    __slots__ = ("settled", "unsettled", "reserved")
+
+    def __init__(self):
+        self.settled = 0
+        self.unsettled = 0
+        self.reserved = 0
+
+
+class PositionRisk:
+    __slots__ = ("settled", "unsettled", "open_buy", "open_sell")
+
+    def __init__(self):
+        self.settled = 0
+        self.unsettled = 0
+        self.open_buy = 0
+        self.open_sell = 0
+
+    @property
+    def quantity(self) -> int:
+        return self.settled + self.unsettled
+
+
+class RiskLedger:
+    def __init__(self, credit_limit: Optional[int] = None, max_position: Optional[int] = None):
+        self.credit_limit = settings.risk_credit_limit if credit_limit is None else credit_limit
+        self.max_position = settings.risk_max_position if max_position is None else max_position
+        self.accounts: dict = {}
+        self.positions: dict[tuple, PositionRisk] = {}
+        self.markets_by_tenant: dict = {}
+        self.loaded = False
+
+    def _account(self, account_id) -> AccountRisk:
+        account = self.accounts.get(account_id)
+        if account is None:
+            account = self.accounts[account_id] = AccountRisk()
+        return account
+
+    def _position(self, account_id, market_id: int) -> PositionRisk:
+        key = (account_id, market_id)
+        position = self.positions.get(key)
+        if position is None:
+            position = self.positions[key] = PositionRisk()
+        return position
+
+    def available(self, account_id) -> int:
+        account = self.accounts.get(account_id)
+        if account is None:
+            return self.credit_limit
+        return account.settled + account.unsettled + self.credit_limit - account.reserved
+
+    # --- orders (called from market tasks, synchronously)
+
+    def check_order(self, book: OrderBook, account_id, side: int, order_type: int, price: int, quantity: int) -> None:
+        """Raises RiskRejected if the order may not be placed."""
+        position = self.positions.get((account_id, book.market_id))
+        if position is None:
+            exposure = quantity
+        elif side == BUY:
+            exposure = position.quantity + position.open_buy + quantity
+        else:
+            exposure = position.open_sell + quantity - position.quantity
+        if exposure > self.max_position:
+            risk_rejections.inc(reason=POSITION_LIMIT)
+            raise RiskRejected(POSITION_LIMIT, "Position limit exceeded")
+
+        if side == BUY:
+            cost = book.sweep_cost(BUY, quantity) if order_type == MARKET else price * quantity
+            if cost > self.available(account_id):
+                risk_rejections.inc(reason=INSUFFICIENT_BALANCE)
+                raise RiskRejected(INSUFFICIENT_BALANCE, "Insufficient available balance")
+
+    def on_order(self, order: Order, fills: list[Fill]) -> None:
+        """Books a matched order: its fills, then the reservation for whatever rests."""
+        self.apply_fills(fills)
+        if order.level is not None:
+            self.reserve(order)
+
+    def reserve(self, order: Order) -> None:
+        position = self._position(order.account_id, order.market_id)
+        if order.side == BUY:
+            self._account(order.account_id).reserved += order.price * order.remaining
+            position.open_buy += order.remaining
+        else:
+            position.open_sell += order.remaining
+
+    def on_cancel(self, order: Order) -> None:
+        position = self._position(order.account_id, order.market_id)
+        if order.side == BUY:
+            self._account(order.account_id).reserved -= order.price * order.remaining
+            position.open_buy -= order.remaining
+        else:
+            position.open_sell -= order.remaining
+
+    def apply_fills(self, fills: Iterable[Fill]) -> None:
+        for fill in fills:
+            notional = fill.price * fill.quantity
+            self._account(fill.buy_account_id).unsettled -= notional
+            self._account(fill.sell_account_id).unsettled += notional
+            buyer = self._position(fill.buy_account_id, fill.market_id)
+            seller = self._position(fill.sell_account_id, fill.market_id)
+            buyer.unsettled += fill.quantity
+            seller.unsettled -= fill.quantity
+
+            # The maker's order rested, so part of its reservation is released. Fills happen at the maker's price.
+            if fill.taker_side == BUY:
+                seller.open_sell -= fill.quantity
+            else:
+                buyer.open_buy -= fill.quantity
+                self.accounts[fill.buy_account_id].reserved -= notional
+
+    # --- markets
+
+    def reserve_market(self, tenant_id, max_markets: int) -> None:
+        """Counts a new market against the tenant's quota. Raises RiskRejected once the quota is used up."""
+        count = self.markets_by_tenant.get(tenant_id, 0)
+        if count >= max_markets:
+            risk_rejections.inc(reason=MARKET_LIMIT)
+            raise RiskRejected(MARKET_LIMIT, "Maximum number of active markets reached")
+        self.markets_by_tenant[tenant_id] = count + 1
+
+    def release_market(self, tenant_id) -> None:
+        count = self.markets_by_tenant.get(tenant_id, 0)
+        if count > 0:
+            self.markets_by_tenant[tenant_id] = count - 1
+
+    # --- reconciliation
+
+    def apply_settlement(self, cash_rows: Iterable[tuple], position_rows: Iterable[tuple]) -> None:
+        """
+        Applies one committed settlement batch: (account_id, new cash, delta) and
+        (account_id, market_id, new quantity, delta) as returned by its UPDATEs.
+        """
+        if not self.loaded:
+            return
+        for account_id, cash, delta in cash_rows:
+            account = self._account(account_id)
+            if account.settled + delta != cash:
+                risk_drift.inc(kind="cash")
+                logger.warning("Risk ledger cash for %s was %d, database has %d", account_id, account.settled + delta, cash)
+            account.settled = cash
+            account.unsettled -= delta
+        for account_id, market_id, quantity, delta in position_rows:
+            position = self._position(account_id, market_id)
+            if position.settled + delta != quantity:
+                risk_drift.inc(kind="position")
+                logger.warning("Risk ledger position for %s in market %s was %d, database has %d",
+                               account_id, market_id, position.settled + delta, quantity)
+            position.settled = quantity
+            position.unsettled -= delta
+
+    async def load(self, session_factory: async_sessionmaker[AsyncSession], books: Iterable[OrderBook]) -> None:
+        """Rebuilds the ledger from the database and the resting orders of `books`."""
+        started = time.perf_counter()
+        self.accounts, self.positions, self.markets_by_tenant = {}, {}, {}
+
+        async with session_factory() as session:
+            # Balances and the unsettled fills must agree on the settlement checkpoint.
+            await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+            for account_id, cash in await session.execute(_load_balances):
+                self._account(account_id).settled = cash
+            for account_id, delta in await session.execute(_load_unsettled_cash):
+                self._account(account_id).unsettled = delta
+            for account_id, market_id, quantity in await session.execute(_load_positions):
+                self._position(account_id, market_id).settled = quantity
+            for account_id, market_id, delta in await session.execute(_load_unsettled_positions):
+                self._position(account_id, market_id).unsettled = delta
+            for tenant_id, count in await session.execute(_load_market_counts):
+                self.markets_by_tenant[tenant_id] = count
+
+        resting = 0
+        for book in books:
+            for order in book.orders.values():
+                self.reserve(order)
+                resting += 1
+
+        self.loaded = True
+        risk_accounts.set(len(self.accounts))
+        logger.info(
+            "Loaded risk ledger for %d accounts, %d positions and %d resting orders in %.0fms",
+            len(self.accounts), len(self.positions), resting, (time.perf_counter() - started) * 1000,
+        )
+
+
+ledger = RiskLedger()
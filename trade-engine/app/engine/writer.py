@@ -0,0 +1,242 @@
+"""
+Asynchronous, batched persistence of order state and fills.
+
+Market tasks never wait on the database: after each drained command batch they
+hand the new orders, order state changes and fills to the writer and move on.
+The writer drains everything queued so far (up to writer_batch_size), coalesces
+it to the latest state per order, and writes it in one transaction:
+one executemany INSERT for new orders, one executemany UPDATE for orders that
+already exist, and one executemany INSERT for fills.
+
+When the engine journals (app.engine.journal), the same transaction records the
+highest journal seq it contains in journal_checkpoints, so recovery knows which
+journaled events the database is missing.
+
+Failed writes are retried with exponential backoff. Errors that say nothing
+about the data (the database is unreachable, the connection broke) are retried
+until they clear; after writer_max_attempts of them the writer is `stalled` and
+markets refuse new orders, so the queue cannot grow without bound during an
+outage. Any other error is retried writer_max_attempts times, then the batches
+are written one by one so only the one at fault is dead-lettered: logged at
+ERROR with its rows, and dropped. The rest of the market keeps persisting.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Iterable
+
+from sqlalchemy import bindparam, insert, text, update
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.engine.orderbook import Fill, Order
+from app.metrics import Counter, Gauge
+from app.models import Order as OrderRow, Fill as FillRow
+
+logger = logging.getLogger(__name__)
+
+writer_retries = Counter("trade_writer_retries_total", "Failed write attempts that were retried", ["error"])
+writer_dead_letters = Counter("trade_writer_dead_letters_total", "Write batches dropped after a permanent error")
+writer_stalled = Gauge("trade_writer_stalled", "1 while the writer cannot reach the database and new orders are refused")
+
+RETRY_SECONDS = 1.0
+MAX_RETRY_SECONDS = 30.0
+
+_orders_table = OrderRow.__table__
+_fills_table = FillRow.__table__
+
+_insert_orders = insert(_orders_table)
+_insert_fills = insert(_fills_table)
+_update_orders = (
+    update(_orders_table)
+    .where(_orders_table.c.id == bindparam("order_id"))
+    .values(remaining=bindparam("new_remaining"), status=bindparam("new_status"), updated_at=bindparam("now"))
+)
+_advance_journal_checkpoint = text(
+    "INSERT INTO journal_checkpoints (name, last_seq, updated_at) VALUES (:name, :seq, now()) "
+    "ON CONFLICT (name) DO UPDATE SET last_seq = greatest(journal_checkpoints.last_seq, excluded.last_seq), updated_at = now()"
+)
+JOURNAL_CHECKPOINT = "writer"
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Whether the error is about reaching the database rather than about the data written."""
+    if isinstance(exc, DBAPIError):
+        return exc.connection_invalidated or isinstance(exc, (OperationalError, InterfaceError))
+    return isinstance(exc, (OSError, asyncio.TimeoutError))
+
+
+def order_row(order: Order, status: str, now: datetime) -> dict:
+    return {
+        "id": order.order_id,
+        "market_id": order.market_id,
+        "account_id": order.account_id,
+        "side": order.side,
+        "order_type": order.order_type,
+        "price": order.price,
+        "quantity": order.quantity,
+        "remaining": order.remaining,
+        "status": status,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def fill_row(fill: Fill, now: datetime) -> dict:
+    return {
+        "market_id": fill.market_id,
+        "taker_order_id": fill.taker_order_id,
+        "maker_order_id": fill.maker_order_id,
+        "taker_side": fill.taker_side,
+        "buy_account_id": fill.buy_account_id,
+        "sell_account_id": fill.sell_account_id,
+        "price": fill.price,
+        "quantity": fill.quantity,
+        "created_at": now,
+    }
+
+
+class WriteBatch:
+    """One market task's output for one drained command batch."""
+    __slots__ = ("new_orders", "updates", "fills", "created_at", "journal_seq")
+
+    def __init__(self):
+        self.new_orders: list[dict] = []
+        # (order_id, remaining, status, account_id)
+        self.updates: list[tuple] = []
+        self.fills: list[Fill] = []
+        self.created_at = datetime.now(timezone.utc)
+        # Highest journal seq among the batch's events (0 when not journaled)
+        self.journal_seq = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.new_orders or self.updates or self.fills)
+
+
+class TradeWriter:
+    def __init__(self, session_factory: async_sessionmaker[AsyncSession], batch_size: int | None = None):
+        self.session_factory = session_factory
+        self.batch_size = batch_size or settings.writer_batch_size
+        self.queue: asyncio.Queue[WriteBatch] = asyncio.Queue()
+        # Every journaled event up to this seq is committed to the database
+        self.committed_journal_seq = 0
+        # Set while the database has been unreachable for writer_max_attempts tries
+        self.stalled = False
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="trade-writer")
+
+    async def stop(self) -> None:
+        """Persists everything queued, then stops."""
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def submit(self, batch: WriteBatch) -> None:
+        if batch:
+            self.queue.put_nowait(batch)
+
+    async def flush(self) -> None:
+        """Waits until everything queued so far has been committed."""
+        await self.queue.join()
+
+    async def _run(self) -> None:
+        while True:
+            batches = [await self.queue.get()]
+            rows = len(batches[0].new_orders) + len(batches[0].fills)
+            while rows < self.batch_size and not self.queue.empty():
+                batch = self.queue.get_nowait()
+                batches.append(batch)
+                rows += len(batch.new_orders) + len(batch.fills)
+
+            try:
+                await self._write_retrying(batches)
+            except Exception:
+                # Find the batch at fault, so the others are still written.
+                for batch in batches:
+                    try:
+                        await self._write_retrying([batch])
+                    except Exception as exc:
+                        self._dead_letter(batch, exc)
+
+            for _ in batches:
+                self.queue.task_done()
+
+    async def _write_retrying(self, batches: list[WriteBatch]) -> None:
+        """Writes the batches, waiting out outages. Raises other errors once writer_max_attempts tries failed."""
+        attempt = 0
+        while True:
+            try:
+                await self._write(batches)
+                self._set_stalled(False)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                attempt += 1
+                transient = is_transient(exc)
+                if not transient and attempt >= settings.writer_max_attempts:
+                    raise
+                if transient and attempt >= settings.writer_max_attempts:
+                    self._set_stalled(True)
+                delay = min(RETRY_SECONDS * 2 ** (attempt - 1), MAX_RETRY_SECONDS)
+                writer_retries.inc(error="transient" if transient else "other")
+                logger.warning("Persisting %d write batches failed (attempt %d), retrying in %ss: %s", len(batches), attempt, delay, exc)
+                await asyncio.sleep(delay)
+
+    def _set_stalled(self, stalled: bool) -> None:
+        if stalled != self.stalled:
+            self.stalled = stalled
+            writer_stalled.set(int(stalled))
+            if stalled:
+                logger.error("The database is unreachable; refusing new orders until writes succeed again")
+            else:
+                logger.info("Writes succeed again; accepting new orders")
+
+    def _dead_letter(self, batch: WriteBatch, exc: Exception) -> None:
+        writer_dead_letters.inc()
+        rows = {
+            "journal_seq": batch.journal_seq,
+            "new_orders": batch.new_orders,
+            "updates": batch.updates,
+            "fills": [fill_row(fill, batch.created_at) for fill in batch.fills],
+        }
+        logger.error("Dropping a write batch the database refuses: %s\n%s", exc, json.dumps(rows, default=str))
+
+    async def _write(self, batches: Iterable[WriteBatch]) -> None:
+        # Coalesce to the latest state per order: an order created and filled within
+        # the same flush is inserted once, already in its final state.
+        new_orders: dict[int, dict] = {}
+        updates: dict[int, dict] = {}
+        fills: list[dict] = []
+        journal_seq = 0
+
+        for batch in batches:
+            journal_seq = max(journal_seq, batch.journal_seq)
+            for row in batch.new_orders:
+                new_orders[row["id"]] = row
+            for order_id, remaining, status, _ in batch.updates:
+                if order_id in new_orders:
+                    new_orders[order_id]["remaining"] = remaining
+                    new_orders[order_id]["status"] = status
+                    new_orders[order_id]["updated_at"] = batch.created_at
+                else:
+                    updates[order_id] = {"order_id": order_id, "new_remaining": remaining, "new_status": status, "now": batch.created_at}
+            fills.extend(fill_row(fill, batch.created_at) for fill in batch.fills)
+
+        async with self.session_factory() as session:
+            if new_orders:
+                await session.execute(_insert_orders, list(new_orders.values()))
+            if updates:
+                await session.execute(_update_orders, list(updates.values()))
+            if fills:
+                await session.execute(_insert_fills, fills)
+            if journal_seq:
+                await session.execute(_advance_journal_checkpoint, {"name": JOURNAL_CHECKPOINT, "seq": journal_seq})
+            await session.commit()
+        self.committed_journal_seq = max(self.committed_journal_seq, journal_seq)
@@ -0,0 +1,282 @@
+"""
+Local verification of end-user access tokens.
+
+identity-service signs user tokens with ES256 and publishes the public keys at
+/.well-known/jwks.json, so a trade request is authenticated here without a
+round trip to identity-service:
+
+- Keys are cached by `kid`. A token naming a key we do not have triggers one
+  refresh of the key set (concurrent misses share it), at most once per
+  identity_jwks_min_refresh_seconds, so made-up kids cannot flood
+  identity-service.
+- Revocations are mirrored from /internal/revocations. A poller asks for the
+  entries after its cursor every identity_revocation_poll_interval_seconds, and
+  forgets entries once their token has expired anyway. A revoked token is
+  accepted for at most one interval after the revocation.
+- Verified tokens are remembered (up to identity_token_cache_size), so a
+  client's repeat requests skip the signature check. Expiry and revocation are
+  checked on every request.
+
+A trusted forwarder that has already authenticated the user may instead send
+X-User-ID, X-Tenant-ID and X-Tenant-Max-Markets. They are only believed with an
+X-Forwarded-Signature made with trade_forwarded_headers_secret over those
+values and X-Forwarded-Timestamp (see forwarded_headers()), so a client cannot
+set them itself.
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import time
+import uuid
+from typing import NamedTuple, Optional
+
+from jose import JWTError, jwk, jwt
+from jose.backends.base import Key
+
+from app.config import settings
+from app.metrics import Counter, Gauge
+from app.resilience import ResilientClient, set_deadline
+
+logger = logging.getLogger(__name__)
+
+tokens_total = Counter("trade_identity_tokens_total", "User tokens checked", ["outcome"])
+key_refreshes_total = Counter("trade_identity_key_refreshes_total", "Key set fetches from identity-service", ["outcome"])
+revocation_syncs_total = Counter("trade_identity_revocation_syncs_total", "Revocation list pulls from identity-service", ["outcome"])
+revocations_gauge = Gauge("trade_identity_revocations", "Revoked, unexpired tokens held in memory")
+
+ALGORITHM = "ES256"
+# How old a forwarded principal's timestamp may be, limiting replays of logged headers
+FORWARDED_TOLERANCE_SECONDS = 60
+
+
+class InvalidToken(Exception):
+    """The token is malformed, forged, expired or revoked."""
+
+
+class KeysUnavailable(Exception):
+    """The token names a key we do not have, and identity-service could not be asked for it."""
+
+
+class VerifiedToken(NamedTuple):
+    account_id: uuid.UUID
+    tenant_id: uuid.UUID
+    # The tenant's market quota, when identity-service included it
+    max_markets: Optional[int]
+    jti: str
+    expires_at: float
+
+
+class TokenVerifier:
+    def __init__(self, base_url: Optional[str] = None):
+        self.base_url = (base_url or settings.identity_service_url).rstrip("/")
+        self.keys: dict[str, Key] = {}
+        # jti -> expiry (epoch seconds) of revoked tokens
+        self.revoked: dict[str, int] = {}
+        # Id of the last revocation pulled
+        self.cursor = 0
+        # token -> its verified claims, oldest first
+        self.cache: dict[str, VerifiedToken] = {}
+        self._client: Optional[ResilientClient] = None
+        self._poller: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._refreshed_at = float("-inf")
+
+    def start(self) -> None:
+        self._client = ResilientClient(
+            "identity-service",
+            self.base_url,
+            timeout=settings.identity_timeout_seconds,
+            max_connections=settings.identity_max_connections,
+            breaker_failures=settings.identity_breaker_failures,
+            breaker_reset_seconds=settings.identity_breaker_reset_seconds,
+            hedge_after_seconds=settings.identity_hedge_after_seconds,
+        )
+        self._poller = asyncio.create_task(self._poll_loop(), name="token-revocations")
+
+    async def stop(self) -> None:
+        tasks = [task for task in (self._poller, self._refresh_task) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._poller = self._refresh_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # --- verification
+
+    async def verify(self, token: str) -> VerifiedToken:
+        verified = self.cache.get(token)
+        if verified is None:
+            verified = await self._verify_signature(token)
+            if len(self.cache) >= settings.identity_token_cache_size:
+                self.cache.pop(next(iter(self.cache)))
+            self.cache[token] = verified
+            outcome = "verified"
+        else:
+            outcome = "cached"
+
+        if verified.expires_at <= time.time():
+            self.cache.pop(token, None)
+            tokens_total.inc(outcome="expired")
+            raise InvalidToken("Token has expired")
+        if verified.jti in self.revoked:
+            tokens_total.inc(outcome="revoked")
+            raise InvalidToken("Token has been revoked")
+        tokens_total.inc(outcome=outcome)
+        return verified
+
+    async def _verify_signature(self, token: str) -> VerifiedToken:
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except JWTError as exc:
+            tokens_total.inc(outcome="invalid")
+            raise InvalidToken(str(exc))
+
+        key = self.keys.get(kid) if kid else None
+        if key is None and kid:
+            await self.refresh_keys()
+            key = self.keys.get(kid)
+        if key is None:
+            tokens_total.inc(outcome="invalid")
+            raise InvalidToken("Token is signed with an unknown key")
+
+        try:
+            claims = jwt.decode(
+                token, key, algorithms=[ALGORITHM], issuer=settings.identity_token_issuer,
+                options={"require_exp": True, "require_jti": True, "require_sub": True},
+            )
+            max_markets = claims.get("mkt")
+            return VerifiedToken(
+                account_id=uuid.UUID(claims["sub"]),
+                tenant_id=uuid.UUID(claims["tid"]),
+                max_markets=int(max_markets) if max_markets is not None else None,
+                jti=str(claims["jti"]),
+                expires_at=float(claims["exp"]),
+            )
+        except (JWTError, KeyError, TypeError, ValueError) as exc:
+            tokens_total.inc(outcome="invalid")
+            raise InvalidToken(str(exc))
+
+    # --- keys
+
+    async def refresh_keys(self) -> None:
+        """Fetches the key set, joining a fetch already in flight. Does nothing if one finished too recently."""
+        if self._refresh_task is None:
+            if time.monotonic() - self._refreshed_at < settings.identity_jwks_min_refresh_seconds:
+                return
+            self._refresh_task = asyncio.create_task(self._fetch_keys())
+        # Shielded so one impatient caller cannot cancel the fetch others are waiting on.
+        await asyncio.shield(self._refresh_task)
+
+    async def _fetch_keys(self) -> None:
+        assert self._client is not None, "TokenVerifier.start() was not called"
+        # The task inherited the deadline of the request that started it, but the fetch is shared:
+        # one hurried request must not fail it for every other caller, and hold off the next one.
+        set_deadline(None)
+        self._refreshed_at = time.monotonic()
+        try:
+            # A request may be waiting on this, so a slow answer is hedged.
+            response = await self._client.get("/.well-known/jwks.json", hedge=True)
+            response.raise_for_status()
+            keys = {
+                entry["kid"]: jwk.construct(entry, ALGORITHM)
+                for entry in response.json().get("keys", [])
+                if entry.get("kid") and entry.get("kty") == "EC" and entry.get("alg", ALGORITHM) == ALGORITHM
+            }
+        except Exception as exc:
+            key_refreshes_total.inc(outcome="error")
+            logger.warning("Fetching identity-service's token keys failed: %s", exc)
+            raise KeysUnavailable(str(exc)) from exc
+        finally:
+            self._refresh_task = None
+
+        key_refreshes_total.inc(outcome="ok")
+        # Keys no longer published are dropped along with the tokens they signed.
+        self.keys = keys
+        self.cache = {token: verified for token, verified in self.cache.items() if _kid(token) in keys}
+
+    # --- revocations
+
+    async def sync_revocations(self) -> int:
+        """Pulls revocations after the cursor, page by page, and forgets expired ones. Returns how many were added."""
+        assert self._client is not None, "TokenVerifier.start() was not called"
+        added = 0
+        while True:
+            response = await self._client.get("/internal/revocations", params={"since": self.cursor})
+            response.raise_for_status()
+            page = response.json()
+            for jti, expires_at in page["revoked"]:
+                self.revoked[jti] = expires_at
+            added += len(page["revoked"])
+            self.cursor = page["cursor"]
+            if not page["more"]:
+                break
+
+        now = time.time()
+        for jti in [jti for jti, expires_at in self.revoked.items() if expires_at <= now]:
+            del self.revoked[jti]
+        revocations_gauge.set(len(self.revoked))
+        return added
+
+    async def _poll_loop(self) -> None:
+        try:
+            await self.refresh_keys()
+        except KeysUnavailable:
+            pass
+        while True:
+            try:
+                await self.sync_revocations()
+                revocation_syncs_total.inc(outcome="ok")
+            except Exception as exc:
+                revocation_syncs_total.inc(outcome="error")
+                logger.warning("Pulling revoked tokens from identity-service failed: %s", exc)
+            await asyncio.sleep(settings.identity_revocation_poll_interval_seconds)
+
+
+def sign_forwarded(secret: str, timestamp: int, account_id: str, tenant_id: str, max_markets: Optional[int]) -> str:
+    message = f"{timestamp}.{account_id}.{tenant_id}.{'' if max_markets is None else max_markets}"
+    return "v1=" + hmac.new(secret.encode(), message.encode(), hashlib.sha256).hexdigest()
+
+
+def forwarded_headers(account_id: uuid.UUID, tenant_id: uuid.UUID, max_markets: Optional[int] = None) -> dict:
+    """The headers a trusted forwarder sends on behalf of a user it has authenticated."""
+    timestamp = int(time.time())
+    headers = {
+        "X-User-ID": str(account_id),
+        "X-Tenant-ID": str(tenant_id),
+        "X-Forwarded-Timestamp": str(timestamp),
+        "X-Forwarded-Signature": sign_forwarded(
+            settings.trade_forwarded_headers_secret, timestamp, str(account_id), str(tenant_id), max_markets
+        ),
+    }
+    if max_markets is not None:
+        headers["X-Tenant-Max-Markets"] = str(max_markets)
+    return headers
+
+
+def verify_forwarded(
+    timestamp: Optional[str], signature: Optional[str], account_id: str, tenant_id: str, max_markets: Optional[int],
+) -> bool:
+    """Whether forwarded principal headers were signed with our secret, recently. Never true without a secret."""
+    secret = settings.trade_forwarded_headers_secret
+    if not secret or not timestamp or not signature:
+        return False
+    try:
+        sent = int(timestamp)
+    except ValueError:
+        return False
+    if abs(time.time() - sent) > FORWARDED_TOLERANCE_SECONDS:
+        return False
+    return hmac.compare_digest(sign_forwarded(secret, sent, account_id, tenant_id, max_markets), signature)
+
+
+def _kid(token: str) -> Optional[str]:
+    try:
+        return jwt.get_unverified_header(token).get("kid")
+    except JWTError:
+        return None
+
+
+verifier = TokenVerifier()
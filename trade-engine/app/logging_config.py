@@ -0,0 +1,198 @@
+"""
+Non-blocking structured logging.
+
+Log calls made on the event loop only build the record and drop it on a bounded
+queue; a background listener thread turns records into JSON lines and does the
+actual (blocking) write to stdout. If the queue is full the record is dropped
+rather than stalling the loop, and counted in log_records_dropped_total.
+
+Every line carries the request id and tenant id of the request that produced it
+(via contextvars, captured at call time). High-volume debug categories such as
+per-statement SQL logging can be sampled before they ever reach the queue.
+
+Configured through the environment:
+    LOG_LEVEL          root level (default INFO)
+    SQL_LOG_LEVEL      level for sqlalchemy.engine; INFO logs every statement (default WARNING)
+    LOG_SAMPLE_RATES   comma separated logger=rate pairs for records below WARNING
+                       (default "sqlalchemy.engine=0.01")
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import traceback
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from app.metrics import Counter
+
+request_id_var: contextvars.ContextVar[str | None] = contextvars.ContextVar("request_id", default=None)
+tenant_id_var: contextvars.ContextVar[str | None] = contextvars.ContextVar("tenant_id", default=None)
+
+QUEUE_SIZE = 10_000
+# Loggers that uvicorn configures with its own synchronous handlers.
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+_listener: QueueListener | None = None
+
+records_dropped = Counter("log_records_dropped_total", "Log records dropped because the logging queue was full")
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats records as one JSON object per line. Runs on the listener thread."""
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        tenant_id = getattr(record, "tenant_id", None)
+        if tenant_id:
+            entry["tenant_id"] = tenant_id
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a fraction of sub-WARNING records from the configured logger prefixes."""
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        # Longest prefix first so "sqlalchemy.engine.Engine" beats "sqlalchemy".
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                return random.random() < rate
+        return True
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    Enqueues records without blocking. Runs on the caller's thread, so this is
+    where the contextvars are read and where the message is rendered (args may
+    be mutated after the call returns). JSON encoding and I/O happen on the listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = request_id_var.get()
+        record.tenant_id = tenant_id_var.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            records_dropped.inc()
+
+
+def _parse_sample_rates(raw: str) -> dict[str, float]:
+    rates = {}
+    for pair in filter(None, (part.strip() for part in raw.split(","))):
+        name, _, rate = pair.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+def setup_logging(service: str) -> None:
+    """Routes all logging (including uvicorn's and SQLAlchemy's) through the queue. Idempotent."""
+    global _listener
+    if _listener is not None:
+        return
+
+    # The JSON lines never include thread or process info, so skip collecting it.
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    log_queue: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JSONFormatter(service))
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=False)
+
+    queue_handler = ContextQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(_parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", "sqlalchemy.engine=0.01"))))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    logging.getLogger("sqlalchemy.engine").setLevel(os.getenv("SQL_LOG_LEVEL", "WARNING").upper())
+    for name in UVICORN_LOGGERS:
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Stops the listener after draining everything already queued."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestContextMiddleware:
+    """
+    Pure ASGI middleware that binds a request id for the duration of each request.
+    Reuses an incoming X-Request-ID header (so ids follow a request across services)
+    and echoes it back on the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        request_token = request_id_var.set(request_id)
+        tenant_token = tenant_id_var.set(None)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            tenant_id_var.reset(tenant_token)
+            request_id_var.reset(request_token)
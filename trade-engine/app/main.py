@@ -1,7 +1,33 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.metrics import render_latest
+from app.startup import lifespan
+from app.logging_config import setup_logging, RequestContextMiddleware
+from app.resilience import DeadlineMiddleware
+from app.routers import markets, orders, portfolio, stream
 
-app = FastAPI(title="Sentinel Service")
+setup_logging("trade-engine")
+
+app = FastAPI(title="Sentinel Service", lifespan=lifespan)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(RequestContextMiddleware)
+app.include_router(markets.router)
+app.include_router(orders.router)
+app.include_router(portfolio.router)
+app.include_router(stream.router)
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "service": "trade-engine running"}
\ No newline at end of file
+    return {"status": "ok", "service": "trade-engine running"}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: only succeeds once the connection pool has been warmed."""
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "warming", "service": "trade-engine"})
+    return {"status": "ready", "service": "trade-engine"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return render_latest()
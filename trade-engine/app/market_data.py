@@ -0,0 +1,234 @@
+"""
+Reference prices for markets, from the CoinGecko simple price API.
+
+The upstream has tight rate limits, so nothing on the request path calls it
+directly:
+
+- A poller fetches every tracked coin in one batched /simple/price request per
+  interval (split only if the id list exceeds price_batch_size) and swaps the
+  result into an in-memory snapshot.
+- Reads are served from the snapshot. A quote older than price_ttl_seconds is
+  still returned, and a background refresh is scheduled for it
+  (stale-while-revalidate).
+- A coin that has never been fetched is a miss. Concurrent misses within one
+  loop tick share a single upstream request, and a miss for a coin that is
+  already being fetched awaits that request instead of starting another.
+- A coin the upstream answered without a price for (an unknown id) is
+  remembered as a miss for price_ttl_seconds, so repeated reads of a bad
+  price_feed_id fail at once instead of spending the upstream's rate limit.
+- If the upstream fails or rate-limits us, the last known good quotes keep
+  being served, marked stale, and polling backs off (honouring Retry-After).
+"""
+import asyncio
+import logging
+import time
+from typing import Iterable, Optional
+
+import httpx
+
+from app.config import settings
+from app.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+price_requests_total = Counter("trade_price_feed_requests_total", "Upstream price requests", ["outcome"])
+price_request_seconds = Histogram("trade_price_feed_request_seconds", "Upstream price request latency")
+price_reads_total = Counter("trade_price_reads_total", "Price reads served", ["result"])
+price_snapshot_age = Gauge("trade_price_snapshot_age_seconds", "Age of the oldest quote in the snapshot")
+
+
+class PriceUnavailable(Exception):
+    """No price has ever been fetched for the coin, and the upstream could not provide one."""
+
+
+class PriceQuote:
+    __slots__ = ("coin_id", "price", "fetched_at")
+
+    def __init__(self, coin_id: str, price: float, fetched_at: float):
+        self.coin_id = coin_id
+        self.price = price
+        # time.monotonic() when the upstream returned it
+        self.fetched_at = fetched_at
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+    def is_stale(self) -> bool:
+        return self.age() > settings.price_ttl_seconds
+
+
+class PriceFeed:
+    def __init__(self, base_url: Optional[str] = None, currency: Optional[str] = None):
+        self.base_url = (base_url or settings.coingecko_api_url).rstrip("/")
+        self.currency = currency or settings.price_currency
+        self.snapshot: dict[str, PriceQuote] = {}
+        # coin id -> time.monotonic() when the upstream last answered without a price for it
+        self.unknown: dict[str, float] = {}
+        self.tracked: set[str] = set()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._poller: Optional[asyncio.Task] = None
+        # Single-flight bookkeeping: coin id -> the task fetching it
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._pending: set[str] = set()
+        self._pending_task: Optional[asyncio.Task] = None
+        self._backoff_until = 0.0
+        self._failures = 0
+
+    def start(self) -> None:
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=settings.price_timeout_seconds,
+            headers={"Accept": "application/json"},
+        )
+        self._poller = asyncio.create_task(self._poll_loop(), name="price-feed")
+
+    async def stop(self) -> None:
+        tasks = [task for task in (self._poller, self._pending_task) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._poller = self._pending_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def track(self, coin_ids: Iterable[str]) -> None:
+        """Adds coins to the set the poller refreshes every interval."""
+        self.tracked.update(coin_id for coin_id in coin_ids if coin_id)
+
+    async def get_quote(self, coin_id: str) -> PriceQuote:
+        quote = self.snapshot.get(coin_id)
+        if quote is not None:
+            if quote.is_stale():
+                price_reads_total.inc(result="stale")
+                self._schedule(coin_id)
+            else:
+                price_reads_total.inc(result="fresh")
+            return quote
+
+        unknown_since = self.unknown.get(coin_id)
+        if unknown_since is not None and time.monotonic() - unknown_since <= settings.price_ttl_seconds:
+            price_reads_total.inc(result="unknown")
+            raise PriceUnavailable(coin_id)
+
+        price_reads_total.inc(result="miss")
+        self.tracked.add(coin_id)
+        task = self._schedule(coin_id)
+        if task is not None:
+            # Shielded so one impatient caller cannot cancel the fetch others are waiting on.
+            await asyncio.shield(task)
+
+        quote = self.snapshot.get(coin_id)
+        if quote is None:
+            raise PriceUnavailable(coin_id)
+        return quote
+
+    def _schedule(self, coin_id: str) -> Optional[asyncio.Task]:
+        """Returns the task that will fetch `coin_id`, joining an in-flight or pending one if possible."""
+        task = self._inflight.get(coin_id)
+        if task is not None:
+            return task
+        if time.monotonic() < self._backoff_until:
+            return None
+
+        self._pending.add(coin_id)
+        if self._pending_task is None:
+            self._pending_task = asyncio.create_task(self._fetch_pending())
+        self._inflight[coin_id] = self._pending_task
+        return self._pending_task
+
+    async def _fetch_pending(self) -> None:
+        # Let every miss raised in this loop tick join the batch.
+        await asyncio.sleep(0)
+        coin_ids, self._pending = self._pending, set()
+        self._pending_task = None
+        try:
+            await self.refresh(coin_ids)
+        finally:
+            for coin_id in coin_ids:
+                self._inflight.pop(coin_id, None)
+
+    async def refresh(self, coin_ids: Iterable[str]) -> None:
+        """Fetches the given coins and merges them into the snapshot. Failures keep the old quotes."""
+        ids = sorted(coin_ids)
+        batch = settings.price_batch_size
+        for start in range(0, len(ids), batch):
+            chunk = ids[start:start + batch]
+            try:
+                prices = await self._fetch(chunk)
+            except Exception as exc:
+                self._record_failure(exc)
+                return
+
+            fetched_at = time.monotonic()
+            # Copy-on-write, so readers never see a half-updated snapshot.
+            snapshot = dict(self.snapshot)
+            for coin_id, price in prices.items():
+                snapshot[coin_id] = PriceQuote(coin_id, price, fetched_at)
+            self.snapshot = snapshot
+            for coin_id in chunk:
+                if coin_id in prices:
+                    self.unknown.pop(coin_id, None)
+                else:
+                    self.unknown[coin_id] = fetched_at
+            self._failures = 0
+            self._backoff_until = 0.0
+
+    async def _fetch(self, coin_ids: list[str]) -> dict[str, float]:
+        assert self._client is not None, "PriceFeed.start() was not called"
+        started = time.perf_counter()
+        try:
+            response = await self._client.get(
+                "/simple/price", params={"ids": ",".join(coin_ids), "vs_currencies": self.currency}
+            )
+        finally:
+            price_request_seconds.observe(time.perf_counter() - started)
+
+        if response.status_code == 429:
+            raise _RateLimited(_retry_after(response))
+        response.raise_for_status()
+        price_requests_total.inc(outcome="ok")
+
+        prices = {}
+        for coin_id, quotes in response.json().items():
+            price = quotes.get(self.currency) if isinstance(quotes, dict) else None
+            if isinstance(price, (int, float)):
+                prices[coin_id] = float(price)
+        return prices
+
+    def _record_failure(self, exc: Exception) -> None:
+        self._failures += 1
+        if isinstance(exc, _RateLimited):
+            price_requests_total.inc(outcome="rate_limited")
+            delay = exc.retry_after or settings.price_poll_interval_seconds
+        else:
+            price_requests_total.inc(outcome="error")
+            delay = min(settings.price_poll_interval_seconds * 2 ** (self._failures - 1), settings.price_max_backoff_seconds)
+        self._backoff_until = time.monotonic() + delay
+        logger.warning("Price feed request failed (%s), serving last known prices for %.0fs", exc, delay)
+
+    async def _poll_loop(self) -> None:
+        while True:
+            wait = max(self._backoff_until - time.monotonic(), 0)
+            if not wait and self.tracked:
+                await self.refresh(self.tracked)
+                wait = max(self._backoff_until - time.monotonic(), settings.price_poll_interval_seconds)
+            if self.snapshot:
+                price_snapshot_age.set(max(quote.age() for quote in self.snapshot.values()))
+            await asyncio.sleep(wait or settings.price_poll_interval_seconds)
+
+
+class _RateLimited(Exception):
+    def __init__(self, retry_after: Optional[float]):
+        super().__init__("rate limited by upstream")
+        self.retry_after = retry_after
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+price_feed = PriceFeed()
@@ -0,0 +1,105 @@
+"""
+Fast migration gate used by the container entrypoint.
+
+`alembic upgrade head` boots the whole alembic environment (SQLAlchemy,
+env.py, the app models, a second engine) on every container start even when
+the schema is already current. This compares the revision stamped in
+`alembic_version` against the heads of the local migration scripts using
+only asyncpg and the stdlib, and only hands over to alembic when they differ.
+It exits non-zero if the schema is still not at head afterwards, so the
+service is never started against it.
+
+Usage: python -m app.migrate
+"""
+import ast
+import asyncio
+import os
+import sys
+
+SERVICE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ALEMBIC_INI = os.path.join(SERVICE_ROOT, "alembic.ini")
+VERSIONS_DIR = os.path.join(SERVICE_ROOT, "migrations", "versions")
+DATABASE_URL_ENV = "TRADE_DATABASE_URL"
+
+
+def _revision_header(path: str) -> tuple[str, tuple[str, ...]]:
+    """Reads `revision` and `down_revision` from a migration script without importing it."""
+    with open(path, encoding="utf-8") as fh:
+        tree = ast.parse(fh.read(), filename=path)
+
+    values: dict[str, object] = {}
+    for node in tree.body:
+        if isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name) and node.value:
+            values[node.target.id] = ast.literal_eval(node.value)
+        elif isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            values[node.targets[0].id] = ast.literal_eval(node.value)
+
+    down = values.get("down_revision")
+    if down is None:
+        parents: tuple[str, ...] = ()
+    elif isinstance(down, str):
+        parents = (down,)
+    else:
+        parents = tuple(down)  # type: ignore[arg-type]
+    return str(values["revision"]), parents
+
+
+def script_heads(versions_dir: str = VERSIONS_DIR) -> set[str]:
+    """Returns the head revisions of the migration scripts shipped with this build."""
+    if not os.path.isdir(versions_dir):
+        return set()
+
+    revisions: set[str] = set()
+    referenced: set[str] = set()
+    for name in os.listdir(versions_dir):
+        if name.endswith(".py") and not name.startswith("__"):
+            revision, parents = _revision_header(os.path.join(versions_dir, name))
+            revisions.add(revision)
+            referenced.update(parents)
+    return revisions - referenced
+
+
+async def current_revisions(database_url: str) -> set[str]:
+    """Returns the revisions currently stamped in the database (empty if never migrated)."""
+    import asyncpg
+
+    conn = await asyncpg.connect(database_url.replace("postgresql+asyncpg://", "postgresql://", 1))
+    try:
+        if await conn.fetchval("SELECT to_regclass('alembic_version')") is None:
+            return set()
+        rows = await conn.fetch("SELECT version_num FROM alembic_version")
+        return {row["version_num"] for row in rows}
+    finally:
+        await conn.close()
+
+
+def main() -> int:
+    database_url = os.getenv(DATABASE_URL_ENV)
+    if not database_url:
+        print(f"{DATABASE_URL_ENV} environment variable is missing!", file=sys.stderr)
+        return 1
+
+    heads = script_heads()
+    current = asyncio.run(current_revisions(database_url))
+
+    if current == heads:
+        print(f"Schema is current ({', '.join(sorted(heads)) or 'no revisions'}); skipping alembic.")
+        return 0
+
+    # Only pull in alembic (and with it SQLAlchemy and the app models) when there is work to do.
+    from alembic import command
+    from alembic.config import Config
+
+    print(f"Schema at {sorted(current) or 'base'}, scripts at {sorted(heads)}; upgrading.", flush=True)
+    command.upgrade(Config(ALEMBIC_INI), "head")
+
+    # Never let the service start against a schema the upgrade did not bring to head.
+    current = asyncio.run(current_revisions(database_url))
+    if current != heads:
+        print(f"Schema is at {sorted(current) or 'base'} after upgrading, not {sorted(heads)}.", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
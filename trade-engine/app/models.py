@@ -1 +1,123 @@
-from app.database import Base
\ No newline at end of file
+from datetime import datetime, timezone
+from sqlalchemy import Column, String, Integer, BigInteger, SmallInteger, DateTime, ForeignKey, Index, text
+from sqlalchemy.dialects.postgresql import UUID
+from app.database import Base
+
+
+class Market(Base):
+    __tablename__ = 'markets'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # Tenants own markets; the id comes from platform-api, there is no FK across services.
+    tenant_id = Column(UUID(as_uuid=True), nullable=False)
+    symbol = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default='ACTIVE')
+    # CoinGecko coin id (e.g. "bitcoin") used as the market's reference price, if any
+    price_feed_id = Column(String(100), nullable=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    __table_args__ = (
+        Index('uq_markets_tenant_symbol', 'tenant_id', 'symbol', unique=True),
+    )
+
+
+class Order(Base):
+    __tablename__ = 'orders'
+
+    # Assigned by the matching engine, not the database, so ids exist before persistence.
+    id = Column(BigInteger, primary_key=True, autoincrement=False)
+    market_id = Column(Integer, ForeignKey('markets.id'), nullable=False)
+    account_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+    # 0 = BUY, 1 = SELL / 0 = LIMIT, 1 = MARKET (see app.engine.orderbook)
+    side = Column(SmallInteger, nullable=False)
+    order_type = Column(SmallInteger, nullable=False)
+    price = Column(BigInteger, nullable=False)
+    quantity = Column(BigInteger, nullable=False)
+    remaining = Column(BigInteger, nullable=False)
+    status = Column(String(20), nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    # Only open orders are read back (to rebuild books on startup), so only they are indexed.
+    __table_args__ = (
+        Index('ix_orders_open', 'id', postgresql_where=text("status IN ('OPEN', 'PARTIALLY_FILLED')")),
+    )
+
+
+class Fill(Base):
+    __tablename__ = 'fills'
+
+    # Monotonic sequence: settlement checkpoints by it.
+    seq = Column(BigInteger, primary_key=True, autoincrement=True)
+    market_id = Column(Integer, ForeignKey('markets.id'), nullable=False)
+    taker_order_id = Column(BigInteger, nullable=False)
+    maker_order_id = Column(BigInteger, nullable=False)
+    taker_side = Column(SmallInteger, nullable=False)
+    buy_account_id = Column(UUID(as_uuid=True), nullable=False)
+    sell_account_id = Column(UUID(as_uuid=True), nullable=False)
+    price = Column(BigInteger, nullable=False)
+    quantity = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    # Per-market reads (last trade price, recent fills) walk this backwards.
+    # created_at grows with seq, so a BRIN index finds today's fills for candle rebuilds in a few pages.
+    __table_args__ = (
+        Index('ix_fills_market_seq', 'market_id', 'seq'),
+        Index('ix_fills_created_at_brin', 'created_at', postgresql_using='brin'),
+    )
+
+
+class Balance(Base):
+    __tablename__ = 'balances'
+
+    account_id = Column(UUID(as_uuid=True), primary_key=True)
+    # Settled cash in minor units; only the settlement job writes it.
+    cash = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class Position(Base):
+    __tablename__ = 'positions'
+
+    account_id = Column(UUID(as_uuid=True), primary_key=True)
+    market_id = Column(Integer, ForeignKey('markets.id'), primary_key=True)
+    # Signed net contracts: positive long, negative short.
+    quantity = Column(BigInteger, nullable=False, default=0)
+    # Net cost basis in minor units: paid for buys minus received for sells.
+    cost = Column(BigInteger, nullable=False, default=0, server_default='0')
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class SettlementCheckpoint(Base):
+    __tablename__ = 'settlement_checkpoints'
+
+    name = Column(String(50), primary_key=True)
+    # Every fill with seq <= last_seq has been applied to balances and positions.
+    last_seq = Column(BigInteger, nullable=False, default=0)
+    fills_settled = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class JournalCheckpoint(Base):
+    __tablename__ = 'journal_checkpoints'
+
+    name = Column(String(50), primary_key=True)
+    # Every journaled event with seq <= last_seq is in the orders/fills tables.
+    last_seq = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class Candle(Base):
+    __tablename__ = 'candles'
+
+    market_id = Column(Integer, ForeignKey('markets.id'), primary_key=True)
+    # Bucket length in seconds (60, 300, 3600, 86400)
+    resolution = Column(Integer, primary_key=True)
+    # Bucket start, epoch seconds
+    start = Column(BigInteger, primary_key=True)
+    open = Column(BigInteger, nullable=False)
+    high = Column(BigInteger, nullable=False)
+    low = Column(BigInteger, nullable=False)
+    close = Column(BigInteger, nullable=False)
+    volume = Column(BigInteger, nullable=False)
+    trades = Column(BigInteger, nullable=False)
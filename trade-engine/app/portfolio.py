@@ -0,0 +1,319 @@
+"""
+Vectorized mark-to-market valuation of every account's positions.
+
+Positions are held column-oriented: one NumPy array per field, with one entry per
+(account, market) slot. Account and market ids map to dense row indexes, and
+marks form a price vector indexed by market. Holdings are sparse (most accounts
+trade a handful of markets), so slots scale with positions held rather than
+accounts x markets, and per-account totals come from np.bincount over the slot
+columns:
+
+    value[slot]    = quantity * mark[market]   (cost when the market has no mark)
+    market_value   = sum of value per account
+    unrealized_pnl = market_value - cost
+    equity         = cash + market_value
+    margin_used    = margin_rate * sum of |value| per account
+    margin_usage   = margin_used / equity
+
+cost is the net cost basis (paid for buys minus received for sells), kept in
+positions.cost by settlement. margin_usage has no value (NaN in totals(), None
+in account_summary()) for an account that uses margin without positive equity.
+
+revalue() recomputes everything in one pass. Between full passes, totals are
+maintained incrementally:
+
+- apply_fills() touches only the slots the fills changed.
+- set_marks() touches only the slots in markets whose mark moved.
+
+In both cases each touched slot's old contribution is subtracted and its new one
+added. The valuation listens to every market engine, so it follows live fills.
+At startup it loads the settled positions, then replays the fills settlement
+has not reached yet.
+"""
+import logging
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.engine.orderbook import Fill
+from app.metrics import Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+portfolio_positions = Gauge("trade_portfolio_positions", "Position slots held by the valuation")
+portfolio_revalue_seconds = Histogram(
+    "trade_portfolio_revalue_seconds", "Duration of a full valuation pass",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+_load_positions = text("SELECT account_id, market_id, quantity, cost FROM positions WHERE quantity <> 0 OR cost <> 0")
+_load_balances = text("SELECT account_id, cash FROM balances")
+_load_unsettled_fills = text(
+    "SELECT market_id, buy_account_id, sell_account_id, price, quantity FROM fills "
+    "WHERE seq > coalesce((SELECT last_seq FROM settlement_checkpoints WHERE name = 'fills'), 0) ORDER BY seq"
+)
+_load_last_prices = text(
+    "SELECT m.id, (SELECT f.price FROM fills f WHERE f.market_id = m.id ORDER BY f.seq DESC LIMIT 1) "
+    "FROM markets m"
+)
+
+
+def _grow(array: np.ndarray, size: int, fill=0) -> np.ndarray:
+    if size <= len(array):
+        return array
+    grown = np.full(max(size, len(array) * 2), fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class PortfolioValuation:
+    def __init__(self, margin_rate: Optional[float] = None, capacity: int = 1024):
+        self.margin_rate = settings.margin_rate if margin_rate is None else margin_rate
+        self.loaded = False
+
+        self.account_index: dict = {}
+        self.account_ids: list = []
+        self.market_index: dict[int, int] = {}
+        self.market_ids: list[int] = []
+        self.slot_index: dict[tuple[int, int], int] = {}
+        # Slots per account row / market column, so per-account listings and
+        # per-market mark updates never scan every slot
+        self.account_slots: list[list[int]] = []
+        self.market_slots: list[list[int]] = []
+        self.size = 0
+
+        # Slot columns
+        self.slot_account = np.zeros(capacity, dtype=np.int64)
+        self.slot_market = np.zeros(capacity, dtype=np.int64)
+        self.quantity = np.zeros(capacity, dtype=np.int64)
+        self.cost = np.zeros(capacity, dtype=np.int64)
+        # Market columns (NaN: no mark yet)
+        self.marks = np.full(capacity, np.nan)
+        # Account columns
+        self.cash = np.zeros(capacity, dtype=np.int64)
+        self.cost_total = np.zeros(capacity, dtype=np.int64)
+        self.value = np.zeros(capacity)
+        self.gross = np.zeros(capacity)
+
+    # --- index management
+
+    def _account_row(self, account_id) -> int:
+        row = self.account_index.get(account_id)
+        if row is None:
+            row = self.account_index[account_id] = len(self.account_ids)
+            self.account_ids.append(account_id)
+            self.account_slots.append([])
+            if row >= len(self.cash):
+                self.cash = _grow(self.cash, row + 1)
+                self.cost_total = _grow(self.cost_total, row + 1)
+                self.value = _grow(self.value, row + 1)
+                self.gross = _grow(self.gross, row + 1)
+        return row
+
+    def _market_col(self, market_id: int) -> int:
+        col = self.market_index.get(market_id)
+        if col is None:
+            col = self.market_index[market_id] = len(self.market_ids)
+            self.market_ids.append(market_id)
+            self.market_slots.append([])
+            self.marks = _grow(self.marks, col + 1, np.nan)
+        return col
+
+    def _slot(self, account_id, market_id: int) -> int:
+        row = self._account_row(account_id)
+        col = self._market_col(market_id)
+        slot = self.slot_index.get((row, col))
+        if slot is None:
+            slot = self.slot_index[(row, col)] = self.size
+            self.size += 1
+            if slot >= len(self.quantity):
+                self.slot_account = _grow(self.slot_account, slot + 1)
+                self.slot_market = _grow(self.slot_market, slot + 1)
+                self.quantity = _grow(self.quantity, slot + 1)
+                self.cost = _grow(self.cost, slot + 1)
+            self.slot_account[slot] = row
+            self.slot_market[slot] = col
+            self.account_slots[row].append(slot)
+            self.market_slots[col].append(slot)
+        return slot
+
+    # --- valuation
+
+    def _contributions(self, slots) -> tuple[np.ndarray, np.ndarray]:
+        """(value, |value|) of the given slots at the current marks."""
+        mark = self.marks[self.slot_market[slots]]
+        priced = ~np.isnan(mark)
+        value = np.where(priced, self.quantity[slots] * np.where(priced, mark, 0.0), self.cost[slots])
+        return value, np.abs(value)
+
+    def revalue(self) -> None:
+        """Recomputes every account's totals from the slot columns in one vectorized pass."""
+        started = time.perf_counter()
+        n, accounts = self.size, len(self.account_ids)
+        value, gross = self._contributions(np.s_[:n])
+        rows = self.slot_account[:n]
+        self.value[:accounts] = np.bincount(rows, weights=value, minlength=accounts)
+        self.gross[:accounts] = np.bincount(rows, weights=gross, minlength=accounts)
+        self.cost_total[:accounts] = np.bincount(rows, weights=self.cost[:n], minlength=accounts).astype(np.int64)
+        portfolio_revalue_seconds.observe(time.perf_counter() - started)
+        portfolio_positions.set(n)
+
+    def apply_deltas(self, account_ids: Iterable, market_ids: Iterable[int], quantity, cost, cash) -> None:
+        """Applies position/cash deltas (one entry per leg) and updates only the affected totals."""
+        slots = np.fromiter((self._slot(a, m) for a, m in zip(account_ids, market_ids)), dtype=np.int64)
+        if not len(slots):
+            return
+        touched = np.unique(slots)
+        touched_rows = self.slot_account[touched]
+        old_value, old_gross = self._contributions(touched)
+
+        np.add.at(self.quantity, slots, quantity)
+        np.add.at(self.cost, slots, cost)
+        leg_rows = self.slot_account[slots]
+        np.add.at(self.cost_total, leg_rows, cost)
+        np.add.at(self.cash, leg_rows, cash)
+
+        new_value, new_gross = self._contributions(touched)
+        np.add.at(self.value, touched_rows, new_value - old_value)
+        np.add.at(self.gross, touched_rows, new_gross - old_gross)
+        portfolio_positions.set(self.size)
+
+    def apply_fills(self, fills: Iterable[Fill]) -> None:
+        accounts, markets, quantity, cost = [], [], [], []
+        for fill in fills:
+            notional = fill.price * fill.quantity
+            accounts += (fill.buy_account_id, fill.sell_account_id)
+            markets += (fill.market_id, fill.market_id)
+            quantity += (fill.quantity, -fill.quantity)
+            cost += (notional, -notional)
+        cost_array = np.array(cost, dtype=np.int64)
+        self.apply_deltas(accounts, markets, np.array(quantity, dtype=np.int64), cost_array, -cost_array)
+
+    def set_marks(self, market_ids: Iterable[int], prices: Iterable[Optional[float]]) -> None:
+        """Moves marks and revalues only the slots in markets whose mark changed."""
+        cols = np.fromiter((self._market_col(m) for m in market_ids), dtype=np.int64)
+        new = np.array([np.nan if p is None else p for p in prices], dtype=np.float64)
+        changed = ~((self.marks[cols] == new) | (np.isnan(self.marks[cols]) & np.isnan(new)))
+        if not changed.any():
+            return
+        cols, new = cols[changed], new[changed]
+
+        if len(cols) * 4 > len(self.market_ids):
+            # Most marks moved: a full pass is cheaper than selecting slots.
+            self.marks[cols] = new
+            self.revalue()
+            return
+
+        touched = np.fromiter(
+            (slot for col in cols.tolist() for slot in self.market_slots[col]), dtype=np.int64
+        )
+        rows = self.slot_account[touched]
+        old_value, old_gross = self._contributions(touched)
+        self.marks[cols] = new
+        new_value, new_gross = self._contributions(touched)
+        np.add.at(self.value, rows, new_value - old_value)
+        np.add.at(self.gross, rows, new_gross - old_gross)
+
+    def totals(self) -> dict[str, np.ndarray]:
+        """Per-account columns, aligned with self.account_ids."""
+        accounts = len(self.account_ids)
+        value = self.value[:accounts]
+        equity = self.cash[:accounts] + value
+        margin = self.gross[:accounts] * self.margin_rate
+        with np.errstate(divide="ignore", invalid="ignore"):
+            usage = np.where(equity > 0, margin / equity, np.where(margin > 0, np.nan, 0.0))
+        return {
+            "cash": self.cash[:accounts],
+            "market_value": value,
+            "cost": self.cost_total[:accounts],
+            "unrealized_pnl": value - self.cost_total[:accounts],
+            "equity": equity,
+            "margin_used": margin,
+            "margin_usage": usage,
+        }
+
+    def account_summary(self, account_id) -> dict:
+        row = self.account_index.get(account_id)
+        if row is None:
+            positions: list[dict] = []
+            cash = value = gross = 0.0
+            cost = 0
+        else:
+            slots = np.array(self.account_slots[row], dtype=np.int64)
+            slot_value, _ = self._contributions(slots)
+            marks = self.marks[self.slot_market[slots]]
+            positions = [
+                {
+                    "market_id": self.market_ids[self.slot_market[slot]],
+                    "quantity": int(self.quantity[slot]),
+                    "cost": int(self.cost[slot]),
+                    "mark": None if np.isnan(mark) else float(mark),
+                    "market_value": float(v),
+                    "unrealized_pnl": float(v - self.cost[slot]),
+                }
+                for slot, v, mark in zip(slots, slot_value, marks)
+                if self.quantity[slot] or self.cost[slot]
+            ]
+            cash, value, gross, cost = int(self.cash[row]), float(self.value[row]), float(self.gross[row]), int(self.cost_total[row])
+
+        equity = cash + value
+        margin = gross * self.margin_rate
+        return {
+            "cash": cash,
+            "market_value": value,
+            "cost": cost,
+            "unrealized_pnl": value - cost,
+            "equity": equity,
+            "margin_used": margin,
+            "margin_usage": margin / equity if equity > 0 else (None if margin else 0.0),
+            "positions": positions,
+        }
+
+    # --- wiring
+
+    def on_batch(self, engine, batch) -> None:
+        """MarketEngine listener: follows live fills and marks the market at its last trade."""
+        if batch.fills:
+            self.apply_fills(batch.fills)
+            self.set_marks([engine.market_id], [batch.fills[-1].price])
+
+    async def load(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+        """Loads settled positions and cash, replays unsettled fills, and marks markets at their last trade."""
+        started = time.perf_counter()
+        async with session_factory() as session:
+            for account_id, market_id, quantity, cost in await session.execute(_load_positions):
+                slot = self._slot(account_id, market_id)
+                self.quantity[slot] = quantity
+                self.cost[slot] = cost
+            for account_id, cash in await session.execute(_load_balances):
+                self.cash[self._account_row(account_id)] = cash
+
+            unsettled = (await session.execute(_load_unsettled_fills)).all()
+            last_prices = (await session.execute(_load_last_prices)).all()
+
+        for market_id, price in last_prices:
+            self.marks[self._market_col(market_id)] = np.nan if price is None else price
+        self.revalue()
+
+        if unsettled:
+            accounts, markets, quantity, cost = [], [], [], []
+            for market_id, buyer, seller, price, qty in unsettled:
+                accounts += (buyer, seller)
+                markets += (market_id, market_id)
+                quantity += (qty, -qty)
+                cost += (price * qty, -price * qty)
+            cost_array = np.array(cost, dtype=np.int64)
+            self.apply_deltas(accounts, markets, np.array(quantity, dtype=np.int64), cost_array, -cost_array)
+
+        self.loaded = True
+        logger.info(
+            "Loaded %d positions for %d accounts (%d unsettled fills) in %.0fms",
+            self.size, len(self.account_ids), len(unsettled), (time.perf_counter() - started) * 1000,
+        )
+
+
+portfolio = PortfolioValuation()
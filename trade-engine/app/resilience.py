@@ -0,0 +1,304 @@
+"""
+Resilient calls between services (trade-engine -> identity-service -> platform-api).
+
+One slow hop would otherwise inflate the latency of every request above it, so
+each dependency gets a ResilientClient that combines:
+
+- Timeouts: each call is bounded by the dependency's timeout, and by the time
+  left on the incoming request's deadline, if it has one.
+- Deadline propagation: the time left is sent on as X-Deadline-Ms, and
+  DeadlineMiddleware on the receiving side adopts it. A request whose deadline
+  has already passed is answered 504 without running, because nobody is
+  waiting for the result anymore.
+- Circuit breaker: after breaker_failures consecutive failures (connection
+  errors, timeouts, 5xx), calls fail fast for breaker_reset_seconds. Then a
+  single probe is let through, and its outcome closes or reopens the breaker.
+- Bulkhead: the dependency has its own connection pool, and at most
+  max_connections calls in flight. A call waits for a free slot within its
+  time budget, then fails, so a slow dependency cannot tie up every connection
+  and task.
+- Hedging (idempotent calls only, opt-in per call): if no response arrives
+  within hedge_after_seconds and a slot is free, a second identical request
+  is sent. The first response wins and the other request is cancelled.
+
+Failures surface as DependencyUnavailable. Each client reports to the
+http_dependency_* metrics, labelled with the dependency's name.
+
+This module is kept identical across the services.
+"""
+import asyncio
+import contextvars
+import time
+from typing import Optional
+
+import httpx
+
+from app.metrics import Counter, Gauge, Histogram
+
+DEADLINE_HEADER = "X-Deadline-Ms"
+
+requests_total = Counter("http_dependency_requests_total", "Calls to other services", ["dependency", "outcome"])
+request_seconds = Histogram("http_dependency_request_seconds", "Latency of calls to other services", ["dependency"])
+in_flight = Gauge("http_dependency_in_flight", "Calls to other services in flight", ["dependency"])
+breaker_state = Gauge("http_dependency_breaker_state", "Circuit breaker state (0 closed, 1 open, 2 half-open)", ["dependency"])
+hedges_total = Counter("http_dependency_hedges_total", "Hedged requests sent, by which request answered first", ["dependency", "winner"])
+deadline_rejections_total = Counter("http_deadline_rejections_total", "Incoming requests answered 504 because their deadline had passed")
+
+# time.monotonic() by which the current request must be answered, if it has a deadline
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class DependencyUnavailable(Exception):
+    """The dependency failed, timed out, or was not called (breaker open, bulkhead full, deadline passed)."""
+
+
+class CircuitOpen(DependencyUnavailable):
+    pass
+
+
+class BulkheadFull(DependencyUnavailable):
+    pass
+
+
+class DeadlineExceeded(DependencyUnavailable):
+    pass
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None if it has none."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def set_deadline(seconds: Optional[float]) -> contextvars.Token:
+    """Gives the current context a deadline `seconds` from now (None removes it)."""
+    return _deadline.set(None if seconds is None else time.monotonic() + seconds)
+
+
+def reset_deadline(token: contextvars.Token) -> None:
+    _deadline.reset(token)
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        breaker_state.set(self.state, dependency=name)
+
+    def _set(self, state: int) -> None:
+        self.state = state
+        breaker_state.set(state, dependency=self.name)
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead. In half-open state only one (the probe) may."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self._set(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def success(self) -> None:
+        self.failures = 0
+        self._probing = False
+        if self.state != self.CLOSED:
+            self._set(self.CLOSED)
+
+    def failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set(self.OPEN)
+
+    def release(self) -> None:
+        """The call was abandoned (e.g. a cancelled hedge) without telling us anything."""
+        self._probing = False
+
+
+class ResilientClient:
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        *,
+        timeout: float,
+        max_connections: int,
+        breaker_failures: int = 5,
+        breaker_reset_seconds: float = 10.0,
+        hedge_after_seconds: float = 0.0,
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.hedge_after_seconds = hedge_after_seconds
+        self.breaker = CircuitBreaker(name, breaker_failures, breaker_reset_seconds)
+        self._slots = asyncio.Semaphore(max_connections)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get(self, url: str, *, hedge: bool = False, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, hedge=hedge, **kwargs)
+
+    async def request(self, method: str, url: str, *, hedge: bool = False, headers: Optional[dict] = None, **kwargs) -> httpx.Response:
+        """
+        Sends the request, returning any response below 500. Only pass hedge=True
+        for idempotent requests, since they may be sent twice.
+        """
+        left = remaining()
+        if left is not None and left <= 0:
+            requests_total.inc(dependency=self.name, outcome="deadline_exceeded")
+            raise DeadlineExceeded(f"{self.name}: deadline already passed")
+        budget, deadline_bound = self.timeout, False
+        if left is not None and left < budget:
+            # A timeout caused by the caller's deadline says nothing about the dependency's health.
+            budget, deadline_bound = left, True
+
+        expires = time.monotonic() + budget
+        if not hedge or self.hedge_after_seconds <= 0 or self.hedge_after_seconds >= budget:
+            return await self._attempt(method, url, expires, deadline_bound, headers or {}, kwargs)
+
+        tasks = [asyncio.create_task(self._attempt(method, url, expires, deadline_bound, headers or {}, kwargs))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after_seconds)
+            # Hedge only into spare capacity, never into a queue.
+            if done or self._slots.locked():
+                return await tasks[0]
+
+            tasks.append(asyncio.create_task(self._attempt(method, url, expires, deadline_bound, headers or {}, kwargs)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        hedges_total.inc(dependency=self.name, winner="original" if task is tasks[0] else "hedge")
+                        return task.result()
+            # Both failed; the original's error is the informative one.
+            raise tasks[0].exception() #type: ignore
+        finally:
+            unfinished = [task for task in tasks if not task.done()]
+            for task in unfinished:
+                task.cancel()
+            await asyncio.gather(*unfinished, return_exceptions=True)
+
+    async def _attempt(
+        self, method: str, url: str, expires: float, deadline_bound: bool, headers: dict, kwargs: dict,
+    ) -> httpx.Response:
+        if not self.breaker.allow():
+            requests_total.inc(dependency=self.name, outcome="circuit_open")
+            raise CircuitOpen(f"{self.name}: circuit open")
+
+        settled = False
+        try:
+            try:
+                if self._slots.locked():
+                    await asyncio.wait_for(self._slots.acquire(), timeout=max(expires - time.monotonic(), 0))
+                else:
+                    await self._slots.acquire()
+            except asyncio.TimeoutError:
+                requests_total.inc(dependency=self.name, outcome="bulkhead_full")
+                raise BulkheadFull(f"{self.name}: no free connection slot")
+
+            in_flight.inc(dependency=self.name)
+            started = time.perf_counter()
+            try:
+                left = expires - time.monotonic()
+                if left <= 0:
+                    requests_total.inc(dependency=self.name, outcome="deadline_exceeded")
+                    raise DeadlineExceeded(f"{self.name}: deadline passed while waiting for a slot")
+                headers = {**headers, DEADLINE_HEADER: str(int(left * 1000))}
+                response = await self.client().request(method, url, headers=headers, timeout=left, **kwargs)
+            except httpx.TimeoutException as exc:
+                if deadline_bound:
+                    requests_total.inc(dependency=self.name, outcome="deadline_exceeded")
+                    raise DeadlineExceeded(f"{self.name}: deadline passed") from exc
+                requests_total.inc(dependency=self.name, outcome="timeout")
+                self.breaker.failure()
+                settled = True
+                raise DependencyUnavailable(f"{self.name}: timed out") from exc
+            except httpx.HTTPError as exc:
+                requests_total.inc(dependency=self.name, outcome="error")
+                self.breaker.failure()
+                settled = True
+                raise DependencyUnavailable(f"{self.name}: {exc}") from exc
+            finally:
+                request_seconds.observe(time.perf_counter() - started, dependency=self.name)
+                in_flight.inc(-1, dependency=self.name)
+                self._slots.release()
+
+            if response.status_code >= 500:
+                requests_total.inc(dependency=self.name, outcome="server_error")
+                self.breaker.failure()
+                settled = True
+                raise DependencyUnavailable(f"{self.name} answered {response.status_code}")
+            requests_total.inc(dependency=self.name, outcome="ok")
+            self.breaker.success()
+            settled = True
+            return response
+        finally:
+            if not settled:
+                self.breaker.release()
+
+
+class DeadlineMiddleware:
+    """
+    Pure ASGI middleware that adopts the caller's X-Deadline-Ms for the duration
+    of the request, so calls made while handling it share the caller's budget.
+    Requests that arrive already past their deadline are answered 504 at once.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        budget_ms = None
+        for name, value in scope["headers"]:
+            if name == b"x-deadline-ms":
+                try:
+                    budget_ms = int(value)
+                except ValueError:
+                    pass
+                break
+        if budget_ms is None:
+            await self.app(scope, receive, send)
+            return
+
+        if budget_ms <= 0:
+            deadline_rejections_total.inc()
+            await send({"type": "http.response.start", "status": 504, "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body", "body": b'{"detail":"Deadline exceeded"}'})
+            return
+
+        token = set_deadline(budget_ms / 1000)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_deadline(token)
@@ -0,0 +1,116 @@
+import time
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.candles import RESOLUTIONS, candles
+from app.config import settings
+from app.dependencies import get_db, get_principal, get_market_engine, Principal
+from app.engine.market import MarketEngine
+from app.engine.registry import registry
+from app.engine.risk import ledger, RiskRejected
+from app.market_data import price_feed, PriceUnavailable
+from app.models import Market
+from app.schemas import MarketCreate, MarketResponse, BookResponse, CandlesResponse, PriceResponse
+
+router = APIRouter(prefix="/markets", tags=["Markets"])
+
+@router.post("/", response_model=MarketResponse, status_code=201)
+async def create_market(
+    market_in: MarketCreate,
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(get_principal)
+):
+    """
+    Opens a new market for the caller's tenant and starts its matching engine.
+    The tenant's max_markets quota is checked in memory, against the risk ledger.
+    """
+    if not registry.started:
+        raise HTTPException(status_code=503, detail="Trade engine is starting up")
+
+    max_markets = principal.max_markets if principal.max_markets is not None else settings.default_max_markets
+    try:
+        ledger.reserve_market(principal.tenant_id, max_markets)
+    except RiskRejected as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    market = Market(tenant_id=principal.tenant_id, symbol=market_in.symbol, price_feed_id=market_in.price_feed_id, status='ACTIVE')
+    db.add(market)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        ledger.release_market(principal.tenant_id)
+        raise HTTPException(status_code=409, detail="Market symbol already exists")
+
+    registry.add_market(market.id, market.price_feed_id, market.tenant_id) #type: ignore
+    if market.price_feed_id:
+        price_feed.track([market.price_feed_id]) #type: ignore
+    return market
+
+@router.get("/", response_model=list[MarketResponse], status_code=200)
+async def list_markets(
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(get_principal)
+):
+    """Lists the active markets of the caller's tenant."""
+    stmt = select(Market).where(Market.tenant_id == principal.tenant_id, Market.status == 'ACTIVE')
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+@router.get("/{market_id}/book", response_model=BookResponse, status_code=200)
+async def get_order_book(depth: int = 10, engine: MarketEngine = Depends(get_market_engine)):
+    """
+    Aggregated order book, best levels first. Read straight from the in-memory book.
+    """
+    return BookResponse(market_id=engine.market_id, **engine.book.depth(min(max(depth, 1), 100)))
+
+@router.get("/{market_id}/candles", response_model=CandlesResponse, status_code=200)
+async def get_candles(
+    resolution: Literal["1m", "5m", "1h", "1d"] = "1m",
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    engine: MarketEngine = Depends(get_market_engine),
+):
+    """
+    OHLCV candles with start in [start, end) (epoch seconds), oldest first, including
+    the candle still open. Defaults to the last `limit` buckets. Recent candles come
+    from memory; older ones from the candles table.
+    """
+    seconds = RESOLUTIONS[resolution]
+    if end is None:
+        end = int(time.time()) + seconds
+    if start is None:
+        start = end - seconds * limit
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    rows = await candles.query(engine.market_id, seconds, start, end, limit)
+    return CandlesResponse(market_id=engine.market_id, resolution=resolution, candles=rows)
+
+@router.get("/{market_id}/price", response_model=PriceResponse, status_code=200)
+async def get_reference_price(engine: MarketEngine = Depends(get_market_engine)):
+    """
+    The market's reference price from the cached price feed. Served from memory;
+    `stale` is set when the quote is older than the TTL (a refresh is underway
+    or the upstream is unavailable).
+    """
+    if not engine.price_feed_id:
+        raise HTTPException(status_code=404, detail="Market has no reference price")
+    try:
+        quote = await price_feed.get_quote(engine.price_feed_id)
+    except PriceUnavailable:
+        raise HTTPException(status_code=503, detail="Reference price unavailable")
+
+    return PriceResponse(
+        market_id=engine.market_id,
+        price_feed_id=quote.coin_id,
+        price=quote.price,
+        currency=price_feed.currency,
+        age_seconds=round(quote.age(), 3),
+        stale=quote.is_stale(),
+    )
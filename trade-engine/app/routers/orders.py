@@ -0,0 +1,97 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.dependencies import get_principal, get_market_engine, Principal
+from app.engine.market import MarketEngine, MarketUnavailable
+from app.engine.orderbook import BUY, SELL, LIMIT, MARKET
+from app.engine.risk import RiskRejected
+from app.schemas import BatchOrderCreate, BatchOrderResponse, MassCancelResponse, OrderCreate, OrderResponse
+
+router = APIRouter(prefix="/markets/{market_id}/orders", tags=["Orders"])
+
+SIDES = {"BUY": BUY, "SELL": SELL}
+ORDER_TYPES = {"LIMIT": LIMIT, "MARKET": MARKET}
+
+@router.post("/", response_model=OrderResponse, status_code=201)
+async def place_order(
+    order_in: OrderCreate,
+    engine: MarketEngine = Depends(get_market_engine),
+    principal: Principal = Depends(get_principal)
+):
+    """
+    Submits an order to the market's matching engine and returns its immediate outcome.
+    Limit remainders rest on the book; market order remainders are cancelled.
+    Orders that fail the pre-trade risk checks are rejected with 400, and all orders
+    with 503 while the market's trades cannot be persisted.
+    """
+    try:
+        result = await engine.submit(
+            principal.account_id,
+            SIDES[order_in.side],
+            ORDER_TYPES[order_in.type],
+            order_in.price or 0,
+            order_in.quantity,
+        )
+    except RiskRejected as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except MarketUnavailable as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    return result.as_dict()
+
+@router.post("/batch", response_model=BatchOrderResponse, status_code=200)
+async def place_orders(
+    batch_in: BatchOrderCreate,
+    engine: MarketEngine = Depends(get_market_engine),
+    principal: Principal = Depends(get_principal)
+):
+    """
+    Submits up to order_batch_max_orders orders in one engine command: they are risk-checked
+    and matched one after another with nothing interleaved, and persisted in one transaction.
+    Each order gets its own result, in request order; rejected ones don't stop the rest.
+    """
+    try:
+        results = await engine.submit_many(principal.account_id, [
+            (SIDES[order_in.side], ORDER_TYPES[order_in.type], order_in.price or 0, order_in.quantity)
+            for order_in in batch_in.orders
+        ])
+    except MarketUnavailable as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    rejected = sum(isinstance(result, RiskRejected) for result in results)
+    return {
+        "market_id": engine.market_id,
+        "accepted": len(results) - rejected,
+        "rejected": rejected,
+        "results": [
+            {"reason": result.reason, "detail": str(result)} if isinstance(result, RiskRejected) else result.as_dict()
+            for result in results
+        ],
+    }
+
+@router.delete("/", response_model=MassCancelResponse, status_code=200)
+async def cancel_orders(
+    side: Optional[Literal["BUY", "SELL"]] = None,
+    engine: MarketEngine = Depends(get_market_engine),
+    principal: Principal = Depends(get_principal)
+):
+    """Cancels all of the caller's resting orders in the market (or on one side of it) in one engine command."""
+    try:
+        results = await engine.cancel_all(principal.account_id, SIDES[side] if side is not None else None)
+    except MarketUnavailable as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    return {"market_id": engine.market_id, "cancelled": len(results), "orders": [result.as_dict() for result in results]}
+
+@router.delete("/{order_id}", response_model=OrderResponse, status_code=200)
+async def cancel_order(
+    order_id: int,
+    engine: MarketEngine = Depends(get_market_engine),
+    principal: Principal = Depends(get_principal)
+):
+    """Cancels one of the caller's resting orders."""
+    try:
+        result = await engine.cancel(order_id, principal.account_id)
+    except MarketUnavailable as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Open order not found")
+    return result.as_dict()
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.dependencies import get_principal, Principal
+from app.portfolio import portfolio
+from app.schemas import PortfolioResponse
+
+router = APIRouter(prefix="/portfolio", tags=["Portfolio"])
+
+@router.get("/", response_model=PortfolioResponse, status_code=200)
+async def get_portfolio(principal: Principal = Depends(get_principal)):
+    """
+    Mark-to-market valuation of the caller's positions, including fills not yet settled.
+    Served from the in-memory valuation; marks are each market's last trade price.
+    """
+    if not portfolio.loaded:
+        raise HTTPException(status_code=503, detail="Trade engine is starting up")
+    return portfolio.account_summary(principal.account_id)
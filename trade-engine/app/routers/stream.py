@@ -0,0 +1,123 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, status
+
+from app.config import settings
+from app.dependencies import get_optional_principal, principal_from_token, Principal
+from app.identity import InvalidToken, KeysUnavailable
+from app.engine.registry import registry
+from app.streaming import hub, book_data, Subscriber
+
+router = APIRouter(tags=["Streaming"])
+
+
+def _resolve_topic(topic: str, principal: Principal) -> str | None:
+    """Maps a client topic to a hub topic, or None if it is unknown or not the caller's to see."""
+    if topic == "orders":
+        return f"orders:{principal.account_id}"
+    kind, _, market = topic.partition(":")
+    if kind in ("book", "ticker") and market.isdigit() and registry.get_for_tenant(int(market), principal.tenant_id) is not None:
+        return f"{kind}:{int(market)}"
+    return None
+
+
+def _apply(subscriber: Subscriber, principal: Principal, message: dict) -> None:
+    op = message.get("op")
+    topics = message.get("topics")
+    if op not in ("subscribe", "unsubscribe") or not isinstance(topics, list):
+        hub.send_direct(subscriber, "error", {"detail": "Expected {\"op\": \"subscribe\"|\"unsubscribe\", \"topics\": [...]}"})
+        return
+
+    for requested in topics:
+        topic = _resolve_topic(str(requested), principal)
+        if topic is None:
+            hub.send_direct(subscriber, "error", {"detail": f"Unknown topic {requested}"})
+            continue
+        if op == "unsubscribe":
+            hub.unsubscribe(subscriber, topic)
+            continue
+        if len(subscriber.topics) >= settings.stream_max_topics:
+            hub.send_direct(subscriber, "error", {"detail": "Too many subscriptions"})
+            return
+        hub.subscribe(subscriber, topic)
+        if topic.startswith("book:"):
+            # Start from a snapshot; later updates replace it.
+            hub.send_direct(subscriber, topic, book_data(registry.get(int(topic[5:]))))
+
+    hub.send_direct(subscriber, "subscriptions", {"topics": sorted(subscriber.topics)})
+
+
+# Offered as the first subprotocol, followed by the access token
+BEARER_SUBPROTOCOL = "bearer"
+
+
+async def _token_principal(websocket: WebSocket, token: object) -> Optional[Principal]:
+    """Verifies a token sent over the socket. Closes the socket and returns None if it is refused."""
+    try:
+        if not isinstance(token, str) or not token:
+            raise InvalidToken("No token")
+        return await principal_from_token(token)
+    except InvalidToken:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Token is invalid or expired")
+    except KeysUnavailable:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Token verification unavailable")
+    return None
+
+
+async def _first_message_principal(websocket: WebSocket) -> Optional[Principal]:
+    try:
+        raw = await asyncio.wait_for(websocket.receive_text(), timeout=settings.stream_auth_timeout_seconds)
+        message = json.loads(raw)
+    except (asyncio.TimeoutError, ValueError):
+        message = None
+    if not isinstance(message, dict) or message.get("op") != "auth":
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Authenticate first")
+        return None
+    return await _token_principal(websocket, message.get("token"))
+
+
+@router.websocket("/stream")
+async def stream(websocket: WebSocket, principal: Optional[Principal] = Depends(get_optional_principal)):
+    """
+    Live market data and order events.
+
+    Clients that can set headers authenticate as on any other endpoint. Browsers
+    either offer the subprotocols ["bearer", <access token>], or send
+    {"op": "auth", "token": <access token>} as their first message, within
+    stream_auth_timeout_seconds. A refused token closes the socket with 1008.
+
+    Send {"op": "subscribe", "topics": ["book:1", "ticker:1", "orders"]}; updates arrive
+    as {"topic": ..., "data": ...}. Slow clients receive the latest value per topic
+    (or per order) and are closed with code 1013 if they fall too far behind.
+    """
+    subprotocols = websocket.scope.get("subprotocols") or []
+    if principal is None and len(subprotocols) == 2 and subprotocols[0] == BEARER_SUBPROTOCOL:
+        principal = await _token_principal(websocket, subprotocols[1])
+        if principal is None:
+            return
+        await websocket.accept(subprotocol=BEARER_SUBPROTOCOL)
+    else:
+        await websocket.accept()
+        if principal is None:
+            principal = await _first_message_principal(websocket)
+            if principal is None:
+                return
+
+    subscriber = hub.connect(websocket, principal.account_id)
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                message = None
+            if not isinstance(message, dict):
+                hub.send_direct(subscriber, "error", {"detail": "Messages must be JSON objects"})
+                continue
+            _apply(subscriber, principal, message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await hub.disconnect(subscriber)
@@ -0,0 +1,105 @@
+from datetime import datetime
+from typing import Literal, Optional, Union
+from uuid import UUID
+
+from pydantic import BaseModel, Field, model_validator
+
+from app.config import settings
+
+
+class MarketCreate(BaseModel):
+    symbol: str = Field(min_length=1, max_length=50)
+    # CoinGecko coin id used as the reference price, e.g. "bitcoin"
+    price_feed_id: Optional[str] = Field(default=None, min_length=1, max_length=100)
+
+class MarketResponse(BaseModel):
+    id: int
+    tenant_id: UUID
+    symbol: str
+    status: str
+    price_feed_id: Optional[str] = None
+    created_at: datetime
+
+class PriceResponse(BaseModel):
+    market_id: int
+    price_feed_id: str
+    price: float
+    currency: str
+    age_seconds: float
+    stale: bool
+
+class OrderCreate(BaseModel):
+    side: Literal["BUY", "SELL"]
+    type: Literal["LIMIT", "MARKET"] = "LIMIT"
+    # Integer minor units; required for limit orders, ignored for market orders
+    price: Optional[int] = Field(default=None, gt=0)
+    quantity: int = Field(gt=0)
+
+    @model_validator(mode="after")
+    def limit_orders_need_a_price(self):
+        if self.type == "LIMIT" and self.price is None:
+            raise ValueError("price is required for limit orders")
+        return self
+
+class FillResponse(BaseModel):
+    price: int
+    quantity: int
+    maker_order_id: int
+
+class OrderResponse(BaseModel):
+    order_id: int
+    market_id: int
+    status: str
+    filled: int
+    remaining: int
+    fills: list[FillResponse]
+
+class BatchOrderCreate(BaseModel):
+    orders: list[OrderCreate] = Field(min_length=1, max_length=settings.order_batch_max_orders)
+
+class OrderRejection(BaseModel):
+    status: Literal["REJECTED"] = "REJECTED"
+    reason: str
+    detail: str
+
+class BatchOrderResponse(BaseModel):
+    market_id: int
+    accepted: int
+    rejected: int
+    # One entry per submitted order, in request order
+    results: list[Union[OrderResponse, OrderRejection]]
+
+class MassCancelResponse(BaseModel):
+    market_id: int
+    cancelled: int
+    orders: list[OrderResponse]
+
+class BookResponse(BaseModel):
+    market_id: int
+    bids: list[list[int]]
+    asks: list[list[int]]
+
+class CandlesResponse(BaseModel):
+    market_id: int
+    resolution: Literal["1m", "5m", "1h", "1d"]
+    # [start, open, high, low, close, volume, trades], oldest first; start is epoch seconds
+    candles: list[list[int]]
+
+class PositionValuation(BaseModel):
+    market_id: int
+    quantity: int
+    cost: int
+    mark: Optional[float]
+    market_value: float
+    unrealized_pnl: float
+
+class PortfolioResponse(BaseModel):
+    cash: int
+    market_value: float
+    cost: int
+    unrealized_pnl: float
+    equity: float
+    margin_used: float
+    # margin_used / equity; null when margin is used without any equity
+    margin_usage: Optional[float]
+    positions: list[PositionValuation]
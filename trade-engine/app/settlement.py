@@ -0,0 +1,232 @@
+"""
+Periodic settlement of fills into balances and positions.
+
+Fills are settled in seq order, in bounded batches. Each batch is one
+transaction that:
+
+1. locks the checkpoint row (so concurrent runners serialize) and reads the
+   last settled seq,
+2. picks the next settlement_batch_size fills by primary key range,
+3. stages the per-account cash deltas and per-(account, market) position
+   deltas into temp tables, aggregated in SQL,
+4. creates any missing balance/position rows, then applies the deltas with one
+   UPDATE ... FROM per table, returning the rows it changed,
+5. advances the checkpoint.
+
+After each commit the changed rows go to `on_settled`, which the app wires to
+the risk ledger so it can reconcile against the new balances.
+
+Because the checkpoint moves in the same transaction as the balances, a run
+that crashes mid-way loses only its uncommitted batch, and the next run resumes
+right after the last committed one: no fill is settled twice or skipped.
+
+Fill seqs commit in order because the trade writer is the only inserter and
+commits one transaction at a time, so "everything up to the checkpoint" is a
+stable set.
+
+Runs on an APScheduler interval from the app lifespan, or once from the command line:
+
+    python -m app.settlement [--batch-size 50000]
+"""
+import argparse
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT = "fills"
+
+settled_fills = Counter("trade_settlement_fills_total", "Fills applied to balances and positions")
+settlement_batches = Counter("trade_settlement_batches_total", "Settlement transactions committed")
+settlement_run_seconds = Histogram(
+    "trade_settlement_run_seconds", "Duration of a settlement run",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 120),
+)
+settlement_last_rows = Gauge("trade_settlement_last_run_fills", "Fills settled by the last run")
+settlement_last_duration = Gauge("trade_settlement_last_run_duration_seconds", "Duration of the last settlement run")
+settlement_last_run = Gauge("trade_settlement_last_run_timestamp_seconds", "Unix time the last settlement run finished")
+settlement_checkpoint_seq = Gauge("trade_settlement_checkpoint_seq", "Highest fill seq settled")
+
+_ensure_checkpoint = text(
+    "INSERT INTO settlement_checkpoints (name, last_seq, fills_settled, updated_at) "
+    "VALUES (:name, 0, 0, now()) ON CONFLICT (name) DO NOTHING"
+)
+_lock_checkpoint = text("SELECT last_seq FROM settlement_checkpoints WHERE name = :name FOR UPDATE")
+_batch_upper_bound = text(
+    "SELECT max(seq), count(*) FROM ("
+    "SELECT seq FROM fills WHERE seq > :after ORDER BY seq LIMIT :batch_size) AS batch"
+)
+
+_stage_cash = [
+    text("CREATE TEMP TABLE settle_cash (account_id uuid PRIMARY KEY, delta bigint NOT NULL) ON COMMIT DROP"),
+    text(
+        "INSERT INTO settle_cash (account_id, delta) "
+        "SELECT account_id, sum(delta) FROM ("
+        "  SELECT buy_account_id AS account_id, -(price * quantity) AS delta FROM fills WHERE seq > :after AND seq <= :upto"
+        "  UNION ALL"
+        "  SELECT sell_account_id, price * quantity FROM fills WHERE seq > :after AND seq <= :upto"
+        ") AS legs GROUP BY account_id"
+    ),
+]
+_stage_positions = [
+    text(
+        "CREATE TEMP TABLE settle_positions (account_id uuid, market_id integer, delta bigint NOT NULL, "
+        "cost_delta bigint NOT NULL, PRIMARY KEY (account_id, market_id)) ON COMMIT DROP"
+    ),
+    text(
+        "INSERT INTO settle_positions (account_id, market_id, delta, cost_delta) "
+        "SELECT account_id, market_id, sum(delta), sum(cost_delta) FROM ("
+        "  SELECT buy_account_id AS account_id, market_id, quantity AS delta, price * quantity AS cost_delta"
+        "  FROM fills WHERE seq > :after AND seq <= :upto"
+        "  UNION ALL"
+        "  SELECT sell_account_id, market_id, -quantity, -(price * quantity) FROM fills WHERE seq > :after AND seq <= :upto"
+        ") AS legs GROUP BY account_id, market_id"
+    ),
+]
+# Missing rows are created first (in key order), so the UPDATE ... FROM statements only ever update.
+_create_balances = text(
+    "INSERT INTO balances (account_id, cash, updated_at) "
+    "SELECT account_id, 0, now() FROM settle_cash ORDER BY account_id ON CONFLICT (account_id) DO NOTHING"
+)
+# The updates return the new values and the deltas applied, for the in-memory risk ledger.
+_update_balances = text(
+    "UPDATE balances AS b SET cash = b.cash + s.delta, updated_at = now() "
+    "FROM settle_cash AS s WHERE b.account_id = s.account_id "
+    "RETURNING b.account_id, b.cash, s.delta"
+)
+_create_positions = text(
+    "INSERT INTO positions (account_id, market_id, quantity, cost, updated_at) "
+    "SELECT account_id, market_id, 0, 0, now() FROM settle_positions ORDER BY account_id, market_id "
+    "ON CONFLICT (account_id, market_id) DO NOTHING"
+)
+_update_positions = text(
+    "UPDATE positions AS p SET quantity = p.quantity + s.delta, cost = p.cost + s.cost_delta, updated_at = now() "
+    "FROM settle_positions AS s WHERE p.account_id = s.account_id AND p.market_id = s.market_id "
+    "RETURNING p.account_id, p.market_id, p.quantity, s.delta"
+)
+_advance_checkpoint = text(
+    "UPDATE settlement_checkpoints SET last_seq = :upto, fills_settled = fills_settled + :count, updated_at = now() "
+    "WHERE name = :name"
+)
+
+
+async def _settle_batch(session: AsyncSession, batch_size: int) -> tuple[int, int, list, list]:
+    """
+    Settles the next batch in the session's transaction. Returns the fills settled,
+    the new checkpoint, and the balance and position rows the batch changed.
+    """
+    after = (await session.execute(_lock_checkpoint, {"name": CHECKPOINT})).scalar_one()
+    upto, count = (await session.execute(_batch_upper_bound, {"after": after, "batch_size": batch_size})).one()
+    if not count:
+        return 0, after, [], []
+
+    params = {"after": after, "upto": upto}
+    for stmt in (*_stage_cash, *_stage_positions):
+        await session.execute(stmt, params)
+    await session.execute(_create_balances)
+    balances = (await session.execute(_update_balances)).all()
+    await session.execute(_create_positions)
+    positions = (await session.execute(_update_positions)).all()
+    await session.execute(_advance_checkpoint, {"upto": upto, "count": count, "name": CHECKPOINT})
+    return count, upto, balances, positions
+
+
+async def settle_pending(
+    session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+    batch_size: Optional[int] = None,
+    pause_seconds: Optional[float] = None,
+    on_settled: Optional[Callable[[list, list], None]] = None,
+) -> dict[str, int]:
+    """
+    Settles every fill past the checkpoint. Returns the fills and batches settled and
+    the new checkpoint. `on_settled(balances, positions)` is called after each
+    committed batch with the rows it changed (see RiskLedger.apply_settlement).
+    """
+    batch_size = batch_size or settings.settlement_batch_size
+    pause_seconds = pause_seconds if pause_seconds is not None else settings.settlement_batch_pause_seconds
+
+    started = time.perf_counter()
+    total = batches = 0
+    checkpoint = 0
+
+    async with session_factory() as session:
+        await session.execute(_ensure_checkpoint, {"name": CHECKPOINT})
+        await session.commit()
+
+    while True:
+        async with session_factory() as session:
+            count, checkpoint, balances, positions = await _settle_batch(session, batch_size)
+            await session.commit()
+        if count and on_settled is not None:
+            on_settled(balances, positions)
+
+        if not count:
+            break
+        total += count
+        batches += 1
+        settled_fills.inc(count)
+        settlement_batches.inc()
+        settlement_checkpoint_seq.set(checkpoint)
+
+        if count < batch_size:
+            break
+        if pause_seconds:
+            await asyncio.sleep(pause_seconds)
+
+    duration = time.perf_counter() - started
+    settlement_run_seconds.observe(duration)
+    settlement_last_duration.set(duration)
+    settlement_last_rows.set(total)
+    settlement_last_run.set(time.time())
+    if total:
+        logger.info("Settled %d fills in %d batches in %.2fs (checkpoint %d)", total, batches, duration, checkpoint)
+    return {"fills": total, "batches": batches, "checkpoint": checkpoint}
+
+
+async def _scheduled_run(on_settled: Optional[Callable[[list, list], None]] = None) -> None:
+    try:
+        await settle_pending(on_settled=on_settled)
+    except Exception:
+        logger.exception("Settlement run failed")
+
+
+def create_scheduler(on_settled: Optional[Callable[[list, list], None]] = None) -> AsyncIOScheduler:
+    """
+    Settlement every SETTLEMENT_INTERVAL_SECONDS. A run that overruns its interval
+    is never overlapped by the next one; missed runs collapse into one.
+    """
+    scheduler = AsyncIOScheduler()
+    scheduler.add_job(
+        _scheduled_run,
+        "interval",
+        seconds=settings.settlement_interval_seconds,
+        args=[on_settled],
+        id="settlement",
+        max_instances=1,
+        coalesce=True,
+    )
+    return scheduler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Settle all pending fills into balances and positions.")
+    parser.add_argument("--batch-size", type=int, default=settings.settlement_batch_size)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    summary = asyncio.run(settle_pending(batch_size=args.batch_size))
+    print(f"settled {summary['fills']} fills in {summary['batches']} batches, checkpoint {summary['checkpoint']}")
+
+
+if __name__ == "__main__":
+    main()
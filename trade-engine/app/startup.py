@@ -0,0 +1,86 @@
+"""
+Application lifespan: opens the connection pool before traffic arrives and
+tracks readiness separately from liveness.
+
+/health answers as soon as the process is up. /ready only returns 200 once
+every pooled connection has been established, the portfolio valuation and the
+candles have been loaded, every market's order book has been rebuilt and the
+risk ledger loaded. The price feed starts polling once the markets are known,
+and the settlement scheduler once the books are loaded. User token keys and
+revocations are pulled from identity-service from the start.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from sqlalchemy import text
+
+from app.candles import candles
+from app.config import settings
+from app.database import engine, AsyncSessionLocal
+from app.engine.registry import registry
+from app.engine.risk import ledger
+from app.identity import verifier
+from app.market_data import price_feed
+from app.portfolio import portfolio
+from app.settlement import create_scheduler
+from app.streaming import hub
+
+logger = logging.getLogger(__name__)
+
+WARMUP_RETRY_SECONDS = 2.0
+
+
+async def _warm_connection() -> None:
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def warm_up(app: FastAPI) -> None:
+    """Opens the pool and loads the order books, retrying until the database is reachable."""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    while True:
+        try:
+            # Opening pool.size() connections concurrently forces that many distinct connections.
+            await asyncio.gather(*(_warm_connection() for _ in range(engine.pool.size())))
+            break
+        except Exception:
+            logger.exception("Warm-up could not reach the database, retrying in %ss", WARMUP_RETRY_SECONDS)
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+
+    await portfolio.load(AsyncSessionLocal)
+    await candles.load(AsyncSessionLocal)
+    await registry.start(AsyncSessionLocal, listeners=[hub, portfolio, candles], ledger=ledger)
+    candles.start()
+    price_feed.track(registry.price_feed_ids())
+    price_feed.start()
+    if settings.settlement_enabled:
+        app.state.settlement_scheduler = create_scheduler(on_settled=ledger.apply_settlement)
+        app.state.settlement_scheduler.start()
+
+    app.state.ready = True
+    logger.info("Warm-up finished in %.0fms", (loop.time() - started) * 1000)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    app.state.settlement_scheduler = None
+    warmup_task = asyncio.create_task(warm_up(app))
+    verifier.start()
+
+    yield
+
+    warmup_task.cancel()
+    await asyncio.gather(warmup_task, return_exceptions=True)
+    if app.state.settlement_scheduler is not None:
+        app.state.settlement_scheduler.shutdown(wait=False)
+    await price_feed.stop()
+    await verifier.stop()
+    await registry.stop()
+    # After the engines, so the last fills' candles are flushed too.
+    await candles.stop()
+    await engine.dispose()
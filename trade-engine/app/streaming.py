@@ -0,0 +1,222 @@
+"""
+WebSocket fan-out of market data and order events.
+
+Topics:
+
+- book:{market_id}     aggregated depth, after every engine batch that changed it
+- ticker:{market_id}   last trade price and best bid/ask, after every batch with fills
+- orders:{account_id}  the caller's own order events (subscribed to as "orders")
+
+Each update is serialized once per topic, and the same string is handed to every
+subscriber. Subscribers never get an unbounded queue. Each one holds a dict of
+pending messages keyed by conflation key: the topic for book and ticker, the
+order id for order events. A newer update replaces the older one in place, so a
+slow consumer skips intermediate states and gets the latest value (a book
+snapshot, or an order's latest status). A client is disconnected when its oldest
+undelivered update is older than stream_max_lag_seconds, or when it has more
+than stream_max_pending distinct keys waiting.
+
+Publishing happens synchronously in the market's task, so it must stay cheap:
+topics without subscribers cost a dict lookup, and sending happens in one
+sender task per connection.
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Optional
+
+from starlette.websockets import WebSocket
+
+from app.config import settings
+from app.engine.orderbook import SIDE_NAMES
+from app.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+stream_connections = Gauge("trade_stream_connections", "Open WebSocket connections")
+stream_messages_sent = Counter("trade_stream_messages_sent_total", "Messages written to WebSocket clients")
+stream_messages_conflated = Counter("trade_stream_messages_conflated_total", "Pending messages replaced by a newer value")
+stream_slow_disconnects = Counter("trade_stream_slow_disconnects_total", "Clients disconnected for falling behind", ["reason"])
+
+# "Try Again Later": the client was too slow and should reconnect.
+CLOSE_TOO_SLOW = 1013
+
+
+class Subscriber:
+    __slots__ = ("websocket", "account_id", "topics", "pending", "sending_since", "wakeup", "sender", "closed")
+
+    def __init__(self, websocket: WebSocket, account_id):
+        self.websocket = websocket
+        self.account_id = account_id
+        self.topics: set[str] = set()
+        # conflation key -> (serialized message, time the oldest undelivered value was queued)
+        self.pending: dict[str, tuple[str, float]] = {}
+        # Queue time of the message currently being written, if a write is in progress
+        self.sending_since: Optional[float] = None
+        self.wakeup = asyncio.Event()
+        self.sender: Optional[asyncio.Task] = None
+        self.closed = False
+
+    def offer(self, key: str, message: str, now: float) -> Optional[str]:
+        """Queues a message, replacing any pending one with the same key. Returns a reason if the client is too slow."""
+        pending = self.pending
+        queued = pending.get(key)
+        if queued is not None:
+            # Keep the slot's original queue time: the client still hasn't seen anything newer than that.
+            pending[key] = (message, queued[1])
+            stream_messages_conflated.inc()
+        else:
+            if len(pending) >= settings.stream_max_pending:
+                return "backlog"
+            pending[key] = (message, now)
+        self.wakeup.set()
+
+        # Messages leave in queue order, so the one being written (if any) is the oldest.
+        oldest = self.sending_since if self.sending_since is not None else next(iter(pending.values()))[1]
+        if now - oldest > settings.stream_max_lag_seconds:
+            return "lag"
+        return None
+
+    async def run_sender(self) -> None:
+        pending = self.pending
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while pending:
+                key = next(iter(pending))
+                message, self.sending_since = pending.pop(key)
+                await self.websocket.send_text(message)
+                self.sending_since = None
+                stream_messages_sent.inc()
+
+
+class StreamHub:
+    def __init__(self):
+        self.topics: dict[str, set[Subscriber]] = {}
+
+    def connect(self, websocket: WebSocket, account_id) -> Subscriber:
+        subscriber = Subscriber(websocket, account_id)
+        subscriber.sender = asyncio.create_task(subscriber.run_sender())
+        stream_connections.inc()
+        return subscriber
+
+    async def disconnect(self, subscriber: Subscriber) -> None:
+        self._detach(subscriber)
+        if subscriber.sender is not None:
+            subscriber.sender.cancel()
+            await asyncio.gather(subscriber.sender, return_exceptions=True)
+            subscriber.sender = None
+
+    def subscribe(self, subscriber: Subscriber, topic: str) -> None:
+        self.topics.setdefault(topic, set()).add(subscriber)
+        subscriber.topics.add(topic)
+
+    def unsubscribe(self, subscriber: Subscriber, topic: str) -> None:
+        subscribers = self.topics.get(topic)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.topics[topic]
+        subscriber.topics.discard(topic)
+
+    def has_subscribers(self, topic: str) -> bool:
+        return topic in self.topics
+
+    def send_direct(self, subscriber: Subscriber, topic: str, data: dict) -> None:
+        """Queues a message for one subscriber only (e.g. the snapshot sent on subscribe)."""
+        reason = subscriber.offer(topic, encode(topic, data), time.monotonic())
+        if reason is not None:
+            self._drop_slow(subscriber, reason)
+
+    def publish(self, topic: str, data: dict, key: Optional[str] = None) -> None:
+        subscribers = self.topics.get(topic)
+        if not subscribers:
+            return
+        message = encode(topic, data)
+        key = key or topic
+        now = time.monotonic()
+        slow = None
+        for subscriber in subscribers:
+            reason = subscriber.offer(key, message, now)
+            if reason is not None:
+                slow = slow or []
+                slow.append((subscriber, reason))
+        if slow:
+            for subscriber, reason in slow:
+                self._drop_slow(subscriber, reason)
+
+    def on_batch(self, engine, batch) -> None:
+        """Publishes one engine batch: the book, the ticker and order events for the accounts involved."""
+        market_id = engine.market_id
+        book = engine.book
+
+        topic = f"book:{market_id}"
+        if topic in self.topics:
+            self.publish(topic, book_data(engine))
+
+        topic = f"ticker:{market_id}"
+        if batch.fills and topic in self.topics:
+            last = batch.fills[-1]
+            self.publish(topic, {
+                "market_id": market_id,
+                "last_price": last.price,
+                "last_quantity": last.quantity,
+                "last_side": SIDE_NAMES[last.taker_side],
+                "volume": sum(fill.quantity for fill in batch.fills),
+                "best_bid": book.best_bid(),
+                "best_ask": book.best_ask(),
+            })
+
+        topics = self.topics
+        for row in batch.new_orders:
+            topic = f"orders:{row['account_id']}"
+            if topic in topics:
+                self.publish(topic, order_event(market_id, row["id"], row["status"], row["remaining"], row["quantity"]), f"order:{row['id']}")
+        for order_id, remaining, status, account_id in batch.updates:
+            topic = f"orders:{account_id}"
+            if topic in topics:
+                self.publish(topic, order_event(market_id, order_id, status, remaining), f"order:{order_id}")
+
+    def _detach(self, subscriber: Subscriber) -> None:
+        if subscriber.closed:
+            return
+        subscriber.closed = True
+        for topic in list(subscriber.topics):
+            self.unsubscribe(subscriber, topic)
+        subscriber.pending.clear()
+        stream_connections.inc(-1)
+
+    def _drop_slow(self, subscriber: Subscriber, reason: str) -> None:
+        if subscriber.closed:
+            return
+        stream_slow_disconnects.inc(reason=reason)
+        logger.info("Disconnecting slow stream client %s (%s)", subscriber.account_id, reason)
+        self._detach(subscriber)
+        asyncio.create_task(self._close_slow(subscriber))
+
+    async def _close_slow(self, subscriber: Subscriber) -> None:
+        # Stop the sender first: it may be stuck writing to the very socket we are closing.
+        await self.disconnect(subscriber)
+        try:
+            await asyncio.wait_for(subscriber.websocket.close(code=CLOSE_TOO_SLOW, reason="too slow"), timeout=1.0)
+        except Exception:
+            pass
+
+
+def encode(topic: str, data: dict) -> str:
+    return json.dumps({"topic": topic, "data": data}, separators=(",", ":"), default=str)
+
+
+def book_data(engine) -> dict:
+    return {"market_id": engine.market_id, **engine.book.depth(settings.stream_book_depth)}
+
+
+def order_event(market_id: int, order_id: int, status: str, remaining: int, quantity: Optional[int] = None) -> dict:
+    event = {"market_id": market_id, "order_id": order_id, "status": status, "remaining": remaining}
+    if quantity is not None:
+        event["quantity"] = quantity
+    return event
+
+
+hub = StreamHub()
@@ -0,0 +1,74 @@
+"""
+Candle aggregation cost.
+
+Feeds --fills fills spread over --markets markets and --minutes minutes of
+trading through a CandleAggregator (all four resolutions), then times range
+queries served from the ring buffers.
+
+Usage: python -m benchmarks.candles [--fills 1000000] [--markets 100] [--minutes 1440]
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from app.candles import CandleAggregator
+from app.engine.orderbook import BUY, Fill
+from benchmarks.matching import percentile
+
+BATCH = 20
+
+
+def run(fills: int, markets: int, minutes: int, queries: int, seed: int) -> None:
+    rng = random.Random(seed)
+    aggregator = CandleAggregator(ring_size=500)
+    account = uuid.uuid4()
+    start = 1_700_000_000 - 1_700_000_000 % 86400
+    step = minutes * 60 / (fills / BATCH)
+
+    batches = []
+    for i in range(fills // BATCH):
+        market_id = rng.randrange(markets)
+        batch = SimpleNamespace(
+            created_at=datetime.fromtimestamp(start + i * step, timezone.utc),
+            fills=[Fill(market_id, 0, 0, BUY, account, account, rng.randint(900, 1100), rng.randint(1, 10), 0) for _ in range(BATCH)],
+        )
+        batches.append((SimpleNamespace(market_id=market_id), batch))
+
+    started = time.perf_counter()
+    for engine, batch in batches:
+        aggregator.on_batch(engine, batch)
+    elapsed = time.perf_counter() - started
+    print(f"ingest: {fills / elapsed:,.0f} fills/s ({len(aggregator.pending):,} candles closed, {len(aggregator.series):,} series)")
+
+    async def query_all() -> list[float]:
+        perf = time.perf_counter
+        end = start + minutes * 60
+        latencies = []
+        for _ in range(queries):
+            market_id = rng.randrange(markets)
+            t0 = perf()
+            await aggregator.query(market_id, 60, end - 300 * 60, end, 300)
+            latencies.append(perf() - t0)
+        return latencies
+
+    latencies = asyncio.run(query_all())
+    print(f" query: p50 {percentile(latencies, 50) * 1e6:.1f}us  p99 {percentile(latencies, 99) * 1e6:.1f}us (300 x 1m from memory)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fills", type=int, default=1_000_000)
+    parser.add_argument("--markets", type=int, default=100)
+    parser.add_argument("--minutes", type=int, default=1440)
+    parser.add_argument("--queries", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    run(args.fills, args.markets, args.minutes, args.queries, args.seed)
+
+
+if __name__ == "__main__":
+    main()
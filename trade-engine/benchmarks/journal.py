@@ -0,0 +1,181 @@
+"""
+Order journal: recovery time and append overhead.
+
+- recovery: writes a synthetic journal of --events events (half orders, 40%
+            fills against earlier orders, 10% cancels) in frames of
+            --frame-events, split into 64MB segments. Then times recover() with
+            no snapshot, so the whole journal is replayed, and the creation of
+            Order objects for the surviving resting orders.
+- engine:   the matching benchmark's order flow through a MarketEngine, with
+            and without a journal, so the group-commit overhead shows in
+            throughput and latency.
+
+Usage: python -m benchmarks.journal [--events 10000000] [--frame-events 1000] [--orders 100000] [--dir /tmp/journal-bench]
+"""
+import argparse
+import asyncio
+import shutil
+import tempfile
+import time
+import uuid
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from app.config import settings
+from app.engine.journal import CANCEL_DTYPE, FILL_DTYPE, FRAME_HEADER, ORDER_DTYPE, Journal, orders_from_rows, recover
+from app.engine.market import MarketEngine
+from benchmarks.matching import generate_flow, percentile
+
+
+def write_synthetic(directory: Path, events: int, frame_events: int, seed: int) -> int:
+    """Writes the journal frame by frame. Returns its size in bytes."""
+    rng = np.random.default_rng(seed)
+    per_frame = (frame_events // 2, frame_events // 10, frame_events - frame_events // 2 - frame_events // 10)
+    frames = events // frame_events
+    n_orders, n_cancels, n_fills = (count * frames for count in per_frame)
+
+    orders = np.zeros(n_orders, dtype=ORDER_DTYPE)
+    orders["order_id"] = np.arange(1, n_orders + 1)
+    orders["market_id"] = rng.integers(1, 201, n_orders)
+    orders["side"] = rng.integers(0, 2, n_orders)
+    orders["order_type"] = rng.random(n_orders) < 0.05
+    orders["price"] = np.where(orders["order_type"] == 1, 0, rng.integers(9_900, 10_100, n_orders))
+    orders["quantity"] = rng.integers(1, 20, n_orders)
+    orders["remaining"] = np.where(orders["order_type"] == 1, 0, orders["quantity"])
+    # 100k accounts
+    account = rng.integers(0, 100_000, n_orders, dtype=np.uint64)
+    orders["account_hi"] = account * 0x9E3779B97F4A7C15
+    orders["account_lo"] = account
+
+    cancels = np.zeros(n_cancels, dtype=CANCEL_DTYPE)
+    fills = np.zeros(n_fills, dtype=FILL_DTYPE)
+    fills["price"] = rng.integers(9_900, 10_100, n_fills)
+
+    segment_bytes = settings.journal_segment_bytes
+    total = 0
+    handle = None
+    segment_size = segment_bytes
+    seq = 1
+    for frame in range(frames):
+        o = orders[frame * per_frame[0]:(frame + 1) * per_frame[0]]
+        c = cancels[frame * per_frame[1]:(frame + 1) * per_frame[1]]
+        f = fills[frame * per_frame[2]:(frame + 1) * per_frame[2]]
+        # Makers and cancels are recent orders (near the top of the book); each fill takes the maker's full size.
+        known = int(o["order_id"][-1])
+        oldest = max(1, known - 20 * per_frame[0])
+        c["order_id"] = rng.integers(oldest, known + 1, len(c))
+        f["maker_order_id"] = rng.integers(oldest, known + 1, len(f))
+        f["taker_order_id"] = rng.integers(oldest, known + 1, len(f))
+        f["quantity"] = orders["quantity"][f["maker_order_id"] - 1]
+
+        for block in (o, c, f):
+            block["seq"] = np.arange(seq, seq + len(block))
+            seq += len(block)
+
+        if segment_size >= segment_bytes:
+            if handle is not None:
+                handle.close()
+            handle = open(directory / f"journal-{int(o['seq'][0]):020d}.log", "wb")
+            segment_size = 0
+        body = o.tobytes() + c.tobytes() + f.tobytes()
+        chunk = FRAME_HEADER.pack(len(body), zlib.crc32(body), len(o), len(c), len(f)) + body
+        handle.write(chunk)
+        segment_size += len(chunk)
+        total += len(chunk)
+    if handle is not None:
+        handle.close()
+    return total
+
+
+def run_recovery(directory: Path, events: int, frame_events: int, seed: int) -> None:
+    started = time.perf_counter()
+    size = write_synthetic(directory, events, frame_events, seed)
+    print(f"wrote {events:,} events ({size / 2**20:,.0f} MB) in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    recovery = recover(directory)
+    parsed = time.perf_counter() - started
+    started = time.perf_counter()
+    survivors = sum(1 for _ in orders_from_rows(recovery.resting))
+    materialized = time.perf_counter() - started
+    print(
+        f"recovery: {recovery.records_replayed:,} events replayed in {parsed:.2f}s "
+        f"({recovery.records_replayed / parsed / 1e6:.1f}M events/s), "
+        f"{survivors:,} resting orders built in {materialized:.2f}s, total {parsed + materialized:.2f}s"
+    )
+
+
+async def run_engine(flow: list[tuple], clients: int, directory) -> None:
+    journal = None
+    if directory is not None:
+        journal = Journal(directory)
+        journal.open(1)
+        journal.start()
+    ids = iter(range(1, len(flow) + 1)).__next__
+    engine = MarketEngine(1, writer=None, next_order_id=ids, journal=journal)
+    engine.start()
+
+    submitted: list[int] = []
+    latencies: list[float] = []
+    position = 0
+    perf = time.perf_counter
+
+    async def client():
+        nonlocal position
+        while position < len(flow):
+            command = flow[position]
+            position += 1
+            t0 = perf()
+            if command[0] == "cancel":
+                target = submitted[-command[1]] if len(submitted) >= command[1] else 0
+                await engine.cancel(target, None)
+            else:
+                _, account, side, order_type, price, quantity = command
+                result = await engine.submit(account, side, order_type, price, quantity)
+                submitted.append(result.order_id)
+            latencies.append(perf() - t0)
+
+    started = perf()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = perf() - started
+    await engine.stop()
+    if journal is not None:
+        await journal.stop()
+    name = "journal" if journal is not None else "memory"
+    print(
+        f"{name:>7}: {len(latencies) / elapsed:,.0f} orders/s | p50 {percentile(latencies, 50) * 1e6:.0f}us  "
+        f"p99 {percentile(latencies, 99) * 1e6:.0f}us  p99.9 {percentile(latencies, 99.9) * 1e6:.0f}us"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=10_000_000)
+    parser.add_argument("--frame-events", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--dir", help="Directory to write the journals to (default: a temp dir)")
+    args = parser.parse_args()
+
+    root = Path(args.dir or tempfile.mkdtemp(prefix="journal-bench-"))
+    try:
+        (root / "recovery").mkdir(parents=True, exist_ok=True)
+        run_recovery(root / "recovery", args.events, args.frame_events, args.seed)
+
+        # Account ids must be UUIDs to be journaled.
+        accounts = [uuid.UUID(int=i + 1) for i in range(1000)]
+        flow = [
+            command if command[0] == "cancel" else (command[0], accounts[command[1]], *command[2:])
+            for command in generate_flow(args.orders, args.seed)
+        ]
+        asyncio.run(run_engine(flow, args.clients, None))
+        asyncio.run(run_engine(flow, args.clients, root / "engine"))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
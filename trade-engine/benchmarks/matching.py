@@ -0,0 +1,128 @@
+"""
+Matching engine throughput and latency.
+
+Generates a deterministic order flow around a drifting mid price (mostly limit
+orders, some marketable, some market orders, some cancels of resting orders) and
+runs it twice:
+
+- book:   straight through OrderBook.submit / cancel, timing every call.
+- engine: through a MarketEngine task (no writer), with --clients coroutines
+          awaiting results, so latency includes queueing and the task hop.
+
+Usage: python -m benchmarks.matching [--orders 200000] [--clients 64] [--seed 7]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from app.engine.market import MarketEngine
+from app.engine.orderbook import BUY, SELL, LIMIT, MARKET, Order, OrderBook
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def generate_flow(count: int, seed: int, accounts: int = 1000) -> list[tuple]:
+    """("submit", account, side, type, price, quantity) or ("cancel", nth_submit_back)."""
+    rng = random.Random(seed)
+    mid = 10_000
+    flow = []
+    for _ in range(count):
+        mid = max(100, mid + rng.choice((-1, 0, 0, 1)))
+        roll = rng.random()
+        if roll < 0.15:
+            flow.append(("cancel", rng.randint(1, 200)))
+            continue
+        side = BUY if rng.random() < 0.5 else SELL
+        if roll < 0.20:
+            flow.append(("submit", rng.randrange(accounts), side, MARKET, 0, rng.randint(1, 20)))
+        else:
+            offset = int(rng.expovariate(1 / 8)) - 2
+            price = mid - offset if side == BUY else mid + offset
+            flow.append(("submit", rng.randrange(accounts), side, LIMIT, price, rng.randint(1, 50)))
+    return flow
+
+
+def report(name: str, elapsed: float, latencies: list[float], fills: int, resting: int) -> None:
+    print(
+        f"{name:>6}: {len(latencies) / elapsed:,.0f} orders/s, {fills:,} fills, {resting:,} resting | "
+        f"p50 {percentile(latencies, 50) * 1e6:.1f}us  p99 {percentile(latencies, 99) * 1e6:.1f}us  "
+        f"p99.9 {percentile(latencies, 99.9) * 1e6:.1f}us"
+    )
+
+
+def run_book(flow: list[tuple]) -> None:
+    book = OrderBook(1)
+    submitted: list[int] = []
+    latencies: list[float] = []
+    fills = 0
+    perf = time.perf_counter
+
+    started = perf()
+    for next_id, command in enumerate(flow, 1):
+        if command[0] == "cancel":
+            target = submitted[-command[1]] if len(submitted) >= command[1] else 0
+            t0 = perf()
+            book.cancel(target)
+        else:
+            _, account, side, order_type, price, quantity = command
+            order = Order(next_id, 1, account, side, order_type, price, quantity)
+            t0 = perf()
+            fills += len(book.submit(order))
+            submitted.append(next_id)
+        latencies.append(perf() - t0)
+    report("book", perf() - started, latencies, fills, len(book))
+
+
+async def run_engine(flow: list[tuple], clients: int) -> None:
+    ids = iter(range(1, len(flow) + 1)).__next__
+    engine = MarketEngine(1, writer=None, next_order_id=ids)
+    engine.start()
+
+    submitted: list[int] = []
+    latencies: list[float] = []
+    fills = 0
+    position = 0
+    perf = time.perf_counter
+
+    async def client():
+        nonlocal position, fills
+        while position < len(flow):
+            command = flow[position]
+            position += 1
+            t0 = perf()
+            if command[0] == "cancel":
+                target = submitted[-command[1]] if len(submitted) >= command[1] else 0
+                await engine.cancel(target, None)
+            else:
+                _, account, side, order_type, price, quantity = command
+                result = await engine.submit(account, side, order_type, price, quantity)
+                fills += len(result.fills)
+                submitted.append(result.order_id)
+            latencies.append(perf() - t0)
+
+    started = perf()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = perf() - started
+    await engine.stop()
+    report("engine", elapsed, latencies, fills, len(engine.book))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=200_000)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    flow = generate_flow(args.orders, args.seed)
+    run_book(flow)
+    asyncio.run(run_engine(flow, args.clients))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Portfolio valuation cost: full vectorized pass vs incremental updates vs a Python loop.
+
+Builds a synthetic book of --accounts accounts holding --positions positions each
+(on average) across --markets markets, then times:
+
+- a full revalue() over every slot,
+- the same computation as a plain Python loop over position tuples (the
+  "iterate ORM rows" baseline), on a sample and extrapolated,
+- apply_fills() for a batch of --fills fills,
+- set_marks() for a single market tick.
+
+Usage: python -m benchmarks.portfolio [--accounts 1000000] [--positions 5] [--markets 2000]
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+import numpy as np
+
+from app.engine.orderbook import BUY, Fill
+from app.portfolio import PortfolioValuation
+
+
+def timed(fn, repeat: int = 5) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=1_000_000)
+    parser.add_argument("--positions", type=int, default=5)
+    parser.add_argument("--markets", type=int, default=2000)
+    parser.add_argument("--fills", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    slots = args.accounts * args.positions
+    valuation = PortfolioValuation(capacity=slots)
+
+    started = time.perf_counter()
+    accounts = [uuid.UUID(int=i + 1) for i in range(args.accounts)]
+    # Bulk-build the columns directly; the index dicts are what load() would fill in.
+    valuation.account_ids = accounts
+    valuation.account_index = {account: i for i, account in enumerate(accounts)}
+    valuation.account_slots = [[] for _ in accounts]
+    valuation.market_ids = list(range(1, args.markets + 1))
+    valuation.market_index = {m: i for i, m in enumerate(valuation.market_ids)}
+    for name in ("cash", "cost_total"):
+        setattr(valuation, name, np.zeros(args.accounts, dtype=np.int64))
+    valuation.value = np.zeros(args.accounts)
+    valuation.gross = np.zeros(args.accounts)
+    valuation.marks = rng.integers(1, 100, size=args.markets).astype(np.float64)
+
+    rows = np.repeat(np.arange(args.accounts), args.positions)
+    cols = rng.integers(0, args.markets, size=slots)
+    valuation.slot_account[:slots] = rows
+    valuation.slot_market[:slots] = cols
+    valuation.quantity[:slots] = rng.integers(-50, 50, size=slots)
+    valuation.cost[:slots] = valuation.quantity[:slots] * rng.integers(1, 100, size=slots)
+    valuation.size = slots
+    valuation.slot_index = {(int(r), int(c)): i for i, (r, c) in enumerate(zip(rows, cols))}
+    valuation.market_slots = [[] for _ in valuation.market_ids]
+    for slot, col in enumerate(cols.tolist()):
+        valuation.market_slots[col].append(slot)
+    print(f"built {slots:,} positions for {args.accounts:,} accounts in {time.perf_counter() - started:.1f}s")
+
+    full = timed(valuation.revalue)
+    print(f"full vectorized pass: {full * 1000:.1f}ms ({slots / full / 1e6:.0f}M positions/s)")
+
+    sample = 200_000
+    tuples = list(zip(rows[:sample].tolist(), cols[:sample].tolist(), valuation.quantity[:sample].tolist(), valuation.cost[:sample].tolist()))
+    marks = valuation.marks.tolist()
+
+    def python_loop():
+        value: dict[int, float] = {}
+        pnl: dict[int, float] = {}
+        for row, col, quantity, cost in tuples:
+            v = quantity * marks[col]
+            value[row] = value.get(row, 0.0) + v
+            pnl[row] = pnl.get(row, 0.0) + v - cost
+
+    loop = timed(python_loop, repeat=3) * slots / sample
+    print(f"python loop (extrapolated): {loop * 1000:.0f}ms ({loop / full:.0f}x slower)")
+
+    fills = [
+        Fill(int(m), 0, 0, BUY, accounts[int(b)], accounts[int(s)], int(p), int(q), 0)
+        for m, b, s, p, q in zip(
+            rng.integers(1, args.markets + 1, size=args.fills), rng.integers(0, args.accounts, size=args.fills),
+            rng.integers(0, args.accounts, size=args.fills), rng.integers(1, 100, size=args.fills), rng.integers(1, 20, size=args.fills),
+        )
+    ]
+    incremental = timed(lambda: valuation.apply_fills(fills))
+    print(f"apply_fills({args.fills}): {incremental * 1000:.2f}ms ({incremental / args.fills * 1e6:.1f}us per fill)")
+
+    prices = iter(rng.integers(1, 100, size=100).tolist())
+    tick = timed(lambda: valuation.set_marks([1], [next(prices)]))
+    print(f"set_marks(1 market): {tick * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
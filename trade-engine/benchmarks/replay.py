@@ -0,0 +1,495 @@
+"""
+Order-flow replay: throughput, latency, memory and GC pauses under a realistic load.
+
+A flow is a NumPy array of FLOW_DTYPE rows, each an order or a cancel scheduled
+`at` seconds into the run. The same options and --seed always give the same flow.
+`generate` writes one to a .npy file, so the same flow can be replayed across
+commits. `run` replays a file, or generates the flow in memory from the same
+options:
+
+- Orders arrive as a Poisson process at --rate per second, spread evenly over
+  --markets markets.
+- Each market's mid price random-walks by at most a tick per order.
+- --cancel-ratio of the rows cancel one of the market's 200 most recent orders.
+  --market-ratio of the orders are market orders.
+- Limit prices sit away from the mid, on the passive side, by an offset drawn
+  from --distribution with mean --spread ticks, minus two ticks, so some orders
+  cross. The distributions are exponential (most near the top of the book),
+  normal (|N(0, spread)|) and uniform (0 to 2 x spread).
+
+Targets:
+
+- engine:   in-process MarketEngines with a RiskLedger and no database. This
+            covers matching and risk only.
+- registry: in-process. Starts the registry against TRADE_DATABASE_URL, with a
+            RiskLedger, the writer and the portfolio and candle listeners, on
+            throwaway markets. Once the flow has been written, one settlement
+            run covers its fills. The markets and their rows are deleted
+            afterwards.
+- http:     POST and DELETE requests to a running trade-engine at --url. They
+            carry the user and tenant as forwarded headers, signed with
+            TRADE_FORWARDED_HEADERS_SECRET. Forwarded headers are refused by
+            default, so only point it at a server started with
+            TRUST_FORWARDED_HEADERS=true and the same secret, never at a
+            production one. The markets it creates are left open.
+
+With a --rate, rows are sent at their scheduled time (open loop). Latency is
+measured from that time, so time spent queued behind a saturated engine
+counts. With --rate 0, --clients workers send as fast as responses come back.
+
+The report gives:
+
+- throughput;
+- latency percentiles per operation;
+- risk rejections;
+- RSS growth and peak;
+- GC pauses, as count and total/max per generation, from gc.callbacks.
+
+For http, memory and GC are the client's. --json writes the same numbers to a
+file.
+
+Usage:
+    python -m benchmarks.replay generate flow.npy [--markets 10] [--orders 200000] [--rate 5000] [--seed 7] ...
+    python -m benchmarks.replay run [--flow flow.npy | generator options] [--target engine|registry|http] [--clients 64]
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import os
+import resource
+import time
+import uuid
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import text
+
+from app.engine.market import MarketEngine
+from app.engine.orderbook import BUY, LIMIT, MARKET, SIDE_NAMES, TYPE_NAMES
+from app.engine.risk import RiskLedger, RiskRejected
+from benchmarks.matching import percentile
+
+SUBMIT = 0
+CANCEL = 1
+
+FLOW_DTYPE = np.dtype([
+    ("at", "<f8"), ("market", "<u4"), ("kind", "u1"), ("account", "<u4"),
+    ("side", "u1"), ("type", "u1"), ("price", "<i8"), ("quantity", "<i8"), ("back", "<u4"),
+])
+
+DISTRIBUTIONS = ("exponential", "normal", "uniform")
+MID_PRICE = 10_000
+# How far back (in the market's submits) a cancel may reach
+CANCEL_WINDOW = 200
+
+
+def generate_flow(
+    markets: int = 10,
+    orders: int = 200_000,
+    rate: float = 5000.0,
+    cancel_ratio: float = 0.15,
+    market_ratio: float = 0.05,
+    distribution: str = "exponential",
+    spread: float = 8.0,
+    accounts: int = 1000,
+    seed: int = 7,
+) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    flow = np.zeros(orders, dtype=FLOW_DTYPE)
+    flow["at"] = np.cumsum(rng.exponential(1 / rate, orders)) if rate else 0.0
+    flow["market"] = rng.integers(0, markets, orders)
+    flow["kind"] = rng.random(orders) < cancel_ratio
+    flow["account"] = rng.integers(0, accounts, orders)
+    flow["side"] = rng.integers(0, 2, orders)
+    flow["type"] = np.where(rng.random(orders) < market_ratio, MARKET, LIMIT)
+    flow["quantity"] = rng.integers(1, 51, orders)
+    flow["back"] = rng.integers(1, CANCEL_WINDOW + 1, orders)
+
+    # Each market's mid walks over its own rows only.
+    steps = rng.choice(np.array([-1, 0, 0, 1]), orders)
+    mid = np.empty(orders, dtype=np.int64)
+    for market in range(markets):
+        rows = np.flatnonzero(flow["market"] == market)
+        mid[rows] = MID_PRICE + np.cumsum(steps[rows])
+    np.maximum(mid, 100, out=mid)
+
+    if distribution == "exponential":
+        offsets = rng.exponential(spread, orders)
+    elif distribution == "normal":
+        offsets = np.abs(rng.normal(0, spread * np.sqrt(np.pi / 2), orders))
+    elif distribution == "uniform":
+        offsets = rng.uniform(0, 2 * spread, orders)
+    else:
+        raise ValueError(f"Unknown price distribution {distribution!r}")
+    offsets = offsets.astype(np.int64) - 2
+
+    price = np.where(flow["side"] == BUY, mid - offsets, mid + offsets)
+    flow["price"] = np.where(flow["type"] == MARKET, 0, np.maximum(price, 1))
+    return flow
+
+
+def save_flow(path: str, flow: np.ndarray) -> None:
+    np.save(path, flow, allow_pickle=False)
+
+
+def load_flow(path: str) -> np.ndarray:
+    flow = np.load(path, allow_pickle=False)
+    if flow.dtype != FLOW_DTYPE:
+        raise ValueError(f"{path} is not an order-flow file")
+    return flow
+
+
+# --- targets
+
+
+class EngineTarget:
+    """MarketEngines in this process, with a risk ledger and no database."""
+    name = "engine"
+
+    def __init__(self, markets: int, ledger: RiskLedger):
+        ids = itertools.count(1).__next__
+        self.engines = [MarketEngine(market + 1, writer=None, next_order_id=ids, ledger=ledger) for market in range(markets)]
+
+    async def start(self) -> None:
+        for engine in self.engines:
+            engine.start()
+
+    async def submit(self, market: int, account, side: int, order_type: int, price: int, quantity: int) -> Optional[int]:
+        try:
+            result = await self.engines[market].submit(account, side, order_type, price, quantity)
+        except RiskRejected:
+            return None
+        return result.order_id
+
+    async def cancel(self, market: int, order_id: int, account) -> bool:
+        return await self.engines[market].cancel(order_id, account) is not None
+
+    async def finish(self) -> dict:
+        for engine in self.engines:
+            await engine.stop()
+        return {}
+
+
+class RegistryTarget(EngineTarget):
+    """The production registry, writer, listeners and settlement, against TRADE_DATABASE_URL."""
+    name = "registry"
+
+    def __init__(self, markets: int, ledger: RiskLedger):
+        self.markets = markets
+        self.ledger = ledger
+        self.market_ids: list[int] = []
+        self.engines = []
+
+    async def start(self) -> None:
+        from app.candles import candles
+        from app.database import AsyncSessionLocal, engine
+        from app.engine.registry import registry
+        from app.portfolio import portfolio
+
+        tenant_id = uuid.uuid4()
+        async with engine.begin() as conn:
+            for market in range(self.markets):
+                self.market_ids.append((await conn.execute(text(
+                    "INSERT INTO markets (tenant_id, symbol, status, created_at) VALUES (:tenant, :symbol, 'ACTIVE', now()) RETURNING id"
+                ), {"tenant": tenant_id, "symbol": f"REPLAY-{uuid.uuid4().hex[:8]}-{market}"})).scalar_one())
+
+        await portfolio.load(AsyncSessionLocal)
+        await candles.load(AsyncSessionLocal)
+        await registry.start(AsyncSessionLocal, listeners=[portfolio, candles], ledger=self.ledger)
+        self.engines = [registry.get(market_id) for market_id in self.market_ids]
+
+    async def finish(self) -> dict:
+        from app.candles import candles
+        from app.database import AsyncSessionLocal, engine
+        from app.engine.registry import registry
+        from app.settlement import settle_pending
+
+        started = time.perf_counter()
+        # Stopping drains the engines and flushes the writer.
+        await registry.stop()
+        await candles.flush()
+        drained = time.perf_counter() - started
+
+        started = time.perf_counter()
+        summary = await settle_pending(AsyncSessionLocal, on_settled=self.ledger.apply_settlement)
+        settled = time.perf_counter() - started
+
+        async with engine.begin() as conn:
+            ids = {"ids": self.market_ids}
+            await conn.execute(text(
+                "DELETE FROM balances WHERE account_id IN (SELECT account_id FROM positions WHERE market_id = ANY(:ids))"
+            ), ids)
+            for table in ("positions", "candles", "fills", "orders"):
+                await conn.execute(text(f"DELETE FROM {table} WHERE market_id = ANY(:ids)"), ids)
+            await conn.execute(text("DELETE FROM markets WHERE id = ANY(:ids)"), ids)
+        await engine.dispose()
+        return {
+            "drain_seconds": drained,
+            "settlement": {"fills": summary["fills"], "batches": summary["batches"], "seconds": settled},
+        }
+
+
+class HttpTarget:
+    """A running trade-engine, over its public order endpoints."""
+    name = "http"
+
+    def __init__(self, url: str, markets: int, clients: int):
+        import httpx
+
+        self.client = httpx.AsyncClient(
+            base_url=url, timeout=30.0, limits=httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+        )
+        self.markets = markets
+        self.market_ids: list[int] = []
+        self.tenant_id = uuid.uuid4()
+
+    def _headers(self, account, max_markets: Optional[int] = None) -> dict:
+        from app.identity import forwarded_headers
+
+        return forwarded_headers(account, self.tenant_id, max_markets)
+
+    async def start(self) -> None:
+        headers = self._headers(uuid.uuid4(), max_markets=self.markets)
+        for market in range(self.markets):
+            res = await self.client.post("/markets/", json={"symbol": f"REPLAY-{uuid.uuid4().hex[:8]}-{market}"}, headers=headers)
+            res.raise_for_status()
+            self.market_ids.append(res.json()["id"])
+
+    async def submit(self, market: int, account, side: int, order_type: int, price: int, quantity: int) -> Optional[int]:
+        body = {"side": SIDE_NAMES[side], "type": TYPE_NAMES[order_type], "quantity": quantity, "price": price or None}
+        res = await self.client.post(f"/markets/{self.market_ids[market]}/orders/", json=body, headers=self._headers(account))
+        if res.status_code == 400:
+            return None
+        res.raise_for_status()
+        return res.json()["order_id"]
+
+    async def cancel(self, market: int, order_id: int, account) -> bool:
+        res = await self.client.delete(f"/markets/{self.market_ids[market]}/orders/{order_id}", headers=self._headers(account))
+        if res.status_code == 404:
+            return False
+        res.raise_for_status()
+        return True
+
+    async def finish(self) -> dict:
+        await self.client.aclose()
+        return {}
+
+
+# --- measurement
+
+
+class GcPauses:
+    """Collects the duration of every garbage collection while installed in gc.callbacks."""
+
+    def __init__(self):
+        self.pauses: dict[int, list[float]] = {0: [], 1: [], 2: []}
+        self._started = 0.0
+
+    def __call__(self, phase: str, info: dict) -> None:
+        if phase == "start":
+            self._started = time.perf_counter()
+        else:
+            self.pauses[info["generation"]].append(time.perf_counter() - self._started)
+
+    def __enter__(self) -> "GcPauses":
+        gc.callbacks.append(self)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        gc.callbacks.remove(self)
+
+    def summary(self) -> dict:
+        return {
+            f"gen{generation}": {"count": len(pauses), "total_ms": sum(pauses) * 1000, "max_ms": max(pauses, default=0.0) * 1000}
+            for generation, pauses in self.pauses.items()
+        }
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+def latency_summary(latencies: list[float]) -> dict:
+    if not latencies:
+        return {"count": 0}
+    summary = {"count": len(latencies)}
+    for pct in (50, 90, 99, 99.9):
+        summary[f"p{pct:g}_us"] = percentile(latencies, pct) * 1e6
+    summary["max_us"] = max(latencies) * 1e6
+    return summary
+
+
+async def play(flow: np.ndarray, target, accounts: list, clients: int, paced: bool) -> dict:
+    """Sends the flow through `target` with `clients` concurrent workers."""
+    rows = flow.tolist()
+    # Per market: (order_id, account) of every accepted order, oldest first
+    submitted: list[list[tuple]] = [[] for _ in range(int(flow["market"].max()) + 1 if len(flow) else 0)]
+    latencies: dict[str, list[float]] = {"submit": [], "cancel": []}
+    counts = {"rejected": 0, "cancel_misses": 0, "cancel_skipped": 0}
+    position = 0
+    perf = time.perf_counter
+    started = perf()
+
+    async def worker():
+        nonlocal position
+        while position < len(rows):
+            at, market, kind, account, side, order_type, price, quantity, back = rows[position]
+            position += 1
+            if paced:
+                scheduled = started + at
+                delay = scheduled - perf()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                scheduled = perf()
+
+            if kind == CANCEL:
+                orders = submitted[market]
+                if len(orders) < back:
+                    counts["cancel_skipped"] += 1
+                    continue
+                order_id, owner = orders[-back]
+                if not await target.cancel(market, order_id, owner):
+                    counts["cancel_misses"] += 1
+                latencies["cancel"].append(perf() - scheduled)
+            else:
+                order_id = await target.submit(market, accounts[account], side, order_type, price, quantity)
+                latencies["submit"].append(perf() - scheduled)
+                if order_id is None:
+                    counts["rejected"] += 1
+                else:
+                    submitted[market].append((order_id, accounts[account]))
+                    if len(submitted[market]) > 4 * CANCEL_WINDOW:
+                        del submitted[market][:-CANCEL_WINDOW]
+
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    elapsed = perf() - started
+    sent = len(latencies["submit"]) + len(latencies["cancel"])
+    return {
+        "elapsed_seconds": elapsed,
+        "operations": sent,
+        "throughput": sent / elapsed if elapsed else 0.0,
+        "offered_rate": len(rows) / rows[-1][0] if paced and rows and rows[-1][0] else None,
+        "latency": {name: latency_summary(values) for name, values in latencies.items()},
+        **counts,
+    }
+
+
+async def replay(flow: np.ndarray, args: argparse.Namespace) -> dict:
+    markets = int(flow["market"].max()) + 1
+    accounts = [uuid.UUID(int=(args.seed + 1) << 64 | account) for account in range(int(flow["account"].max()) + 1)]
+    ledger = RiskLedger(credit_limit=args.credit_limit, max_position=args.max_position)
+    if args.target == "engine":
+        target = EngineTarget(markets, ledger)
+    elif args.target == "registry":
+        target = RegistryTarget(markets, ledger)
+    else:
+        target = HttpTarget(args.url, markets, args.clients)
+
+    await target.start()
+    gc.collect()
+    rss_before = rss_bytes()
+    with GcPauses() as pauses:
+        results = await play(flow, target, accounts, args.clients, paced=args.rate > 0 and flow["at"][-1] > 0)
+    results["memory"] = {
+        "rss_growth_mb": (rss_bytes() - rss_before) / 2**20,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    results["gc"] = pauses.summary()
+    results.update(await target.finish())
+    results["target"] = target.name
+    results["markets"] = markets
+    return results
+
+
+def report(results: dict) -> None:
+    offered = f" (offered {results['offered_rate']:,.0f}/s)" if results["offered_rate"] else ""
+    print(
+        f"{results['target']}: {results['operations']:,} operations over {results['markets']} markets in "
+        f"{results['elapsed_seconds']:.1f}s: {results['throughput']:,.0f}/s{offered}"
+    )
+    for name, summary in results["latency"].items():
+        if summary["count"]:
+            print(
+                f"  {name:>6}: n={summary['count']:,}  p50 {summary['p50_us']:.0f}us  p90 {summary['p90_us']:.0f}us  "
+                f"p99 {summary['p99_us']:.0f}us  p99.9 {summary['p99.9_us']:.0f}us  max {summary['max_us']:.0f}us"
+            )
+    print(
+        f"  {results['rejected']:,} orders rejected by risk checks, {results['cancel_misses']:,} cancels found nothing, "
+        f"{results['cancel_skipped']:,} skipped (no order to cancel yet)"
+    )
+    memory = results["memory"]
+    print(f"  memory: RSS {memory['rss_growth_mb']:+.1f}MB, peak {memory['peak_rss_mb']:.0f}MB")
+    print("  gc: " + " | ".join(
+        f"{generation} {stats['count']} pauses, {stats['total_ms']:.0f}ms total, {stats['max_ms']:.1f}ms max"
+        for generation, stats in results["gc"].items()
+    ))
+    if "settlement" in results:
+        settlement = results["settlement"]
+        print(
+            f"  writer drained in {results['drain_seconds']:.1f}s; settled {settlement['fills']:,} fills in "
+            f"{settlement['batches']} batches, {settlement['seconds']:.1f}s "
+            f"({settlement['fills'] / max(settlement['seconds'], 1e-9):,.0f} fills/s)"
+        )
+
+
+def flow_from_args(args: argparse.Namespace) -> np.ndarray:
+    if getattr(args, "flow", None):
+        return load_flow(args.flow)
+    return generate_flow(
+        args.markets, args.orders, args.rate, args.cancel_ratio, args.market_ratio,
+        args.distribution, args.spread, args.accounts, args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generator = argparse.ArgumentParser(add_help=False)
+    generator.add_argument("--markets", type=int, default=10)
+    generator.add_argument("--orders", type=int, default=200_000, help="rows, cancels included")
+    generator.add_argument("--rate", type=float, default=5000.0, help="rows per second; 0 sends as fast as possible")
+    generator.add_argument("--cancel-ratio", type=float, default=0.15)
+    generator.add_argument("--market-ratio", type=float, default=0.05)
+    generator.add_argument("--distribution", choices=DISTRIBUTIONS, default="exponential")
+    generator.add_argument("--spread", type=float, default=8.0, help="mean distance of limit prices from the mid, in ticks")
+    generator.add_argument("--accounts", type=int, default=1000)
+    generator.add_argument("--seed", type=int, default=7)
+
+    generate = commands.add_parser("generate", parents=[generator], help="write a flow file")
+    generate.add_argument("path")
+
+    run = commands.add_parser("run", parents=[generator], help="replay a flow")
+    run.add_argument("--flow", help="a file written by `generate`; otherwise the flow is generated from the options")
+    run.add_argument("--target", choices=("engine", "registry", "http"), default="engine")
+    run.add_argument("--url", default="http://localhost:8002")
+    run.add_argument("--clients", type=int, default=64)
+    run.add_argument("--credit-limit", type=int, default=10**12)
+    run.add_argument("--max-position", type=int, default=10**9)
+    run.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    flow = flow_from_args(args)
+    print(f"flow: {len(flow):,} rows, {int(flow['market'].max()) + 1} markets, {time.perf_counter() - started:.1f}s to build")
+    if args.command == "generate":
+        save_flow(args.path, flow)
+        print(f"wrote {args.path} ({os.path.getsize(args.path) / 2**20:.1f}MB)")
+        return
+
+    results = asyncio.run(replay(flow, args))
+    report(results)
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump({"args": vars(args), "results": results}, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Pre-trade risk check cost.
+
+Fills a RiskLedger with --accounts accounts holding positions in --markets
+markets, then times check_order alone, and the matching benchmark's order flow
+through a MarketEngine with and without the ledger.
+
+Usage: python -m benchmarks.risk [--accounts 1000000] [--markets 100] [--orders 200000]
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+
+from app.engine.market import MarketEngine
+from app.engine.orderbook import BUY, LIMIT, SELL, OrderBook
+from app.engine.risk import RiskLedger, RiskRejected
+from benchmarks.matching import generate_flow, percentile
+
+
+def run_checks(accounts: int, markets: int, checks: int, seed: int) -> None:
+    rng = random.Random(seed)
+    ledger = RiskLedger(credit_limit=10**12, max_position=10**9)
+    ids = [uuid.UUID(int=rng.getrandbits(128)) for _ in range(accounts)]
+    started = time.perf_counter()
+    for account_id in ids:
+        ledger._account(account_id).settled = rng.randint(0, 10**6)
+        for market_id in rng.sample(range(markets), 3):
+            ledger._position(account_id, market_id).settled = rng.randint(-100, 100)
+    print(f"ledger: {len(ledger.accounts):,} accounts, {len(ledger.positions):,} positions built in {time.perf_counter() - started:.1f}s")
+
+    book = OrderBook(0)
+    perf = time.perf_counter
+    latencies = []
+    for _ in range(checks):
+        account_id = ids[rng.randrange(accounts)]
+        side = BUY if rng.random() < 0.5 else SELL
+        t0 = perf()
+        try:
+            ledger.check_order(book, account_id, side, LIMIT, 10_000, 10)
+        except RiskRejected:
+            pass
+        latencies.append(perf() - t0)
+    print(
+        f" check: p50 {percentile(latencies, 50) * 1e6:.2f}us  p99 {percentile(latencies, 99) * 1e6:.2f}us  "
+        f"p99.9 {percentile(latencies, 99.9) * 1e6:.2f}us"
+    )
+
+
+async def run_engine(flow: list[tuple], ledger) -> None:
+    ids = iter(range(1, len(flow) + 1)).__next__
+    engine = MarketEngine(1, writer=None, next_order_id=ids, ledger=ledger)
+    engine.start()
+    submitted: list[int] = []
+    started = time.perf_counter()
+    for command in flow:
+        if command[0] == "cancel":
+            target = submitted[-command[1]] if len(submitted) >= command[1] else 0
+            await engine.cancel(target, None)
+        else:
+            _, account, side, order_type, price, quantity = command
+            result = await engine.submit(account, side, order_type, price, quantity)
+            submitted.append(result.order_id)
+    elapsed = time.perf_counter() - started
+    await engine.stop()
+    print(f"{'ledger' if ledger is not None else 'none':>6}: {len(flow) / elapsed:,.0f} orders/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=1_000_000)
+    parser.add_argument("--markets", type=int, default=100)
+    parser.add_argument("--checks", type=int, default=200_000)
+    parser.add_argument("--orders", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    run_checks(args.accounts, args.markets, args.checks, args.seed)
+    flow = generate_flow(args.orders, args.seed)
+    asyncio.run(run_engine(flow, None))
+    asyncio.run(run_engine(flow, RiskLedger(credit_limit=10**12, max_position=10**9)))
+
+
+if __name__ == "__main__":
+    main()
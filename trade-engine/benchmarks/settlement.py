@@ -0,0 +1,86 @@
+"""
+Settlement throughput: can one run keep up with 1M fills per interval?
+
+Creates a throwaway market, bulk-inserts --fills fills between --accounts random
+accounts (generated server-side with generate_series, so loading is not what
+gets measured), settles everything pending, and reports fills/second and the
+per-batch transaction time. The benchmark's rows are deleted afterwards.
+
+Needs TRADE_DATABASE_URL pointing at a migrated database. Any fills already
+pending there are settled as part of the run.
+
+Usage: python -m benchmarks.settlement [--fills 1000000] [--accounts 20000] [--batch-size 50000]
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.database import AsyncSessionLocal, engine
+from app.settlement import settle_pending
+
+
+async def load_fills(market_id: int, fills: int, accounts: int) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TEMP TABLE bench_accounts AS "
+            "SELECT n, gen_random_uuid() AS account_id FROM generate_series(0, :accounts - 1) AS n"
+        ), {"accounts": accounts})
+        await conn.execute(text(
+            "INSERT INTO fills (market_id, taker_order_id, maker_order_id, taker_side, buy_account_id, sell_account_id, price, quantity, created_at) "
+            "SELECT :market_id, i, i, (i % 2)::smallint, b.account_id, s.account_id, 9900 + (i % 200), 1 + (i % 50), now() "
+            "FROM generate_series(1::bigint, :fills) AS i "
+            "JOIN bench_accounts b ON b.n = (i * 7919) % :accounts "
+            "JOIN bench_accounts s ON s.n = (i * 104729 + 1) % :accounts"
+        ), {"market_id": market_id, "fills": fills, "accounts": accounts})
+
+
+async def cleanup(market_id: int) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "DELETE FROM balances WHERE account_id IN (SELECT account_id FROM positions WHERE market_id = :market_id)"
+        ), {"market_id": market_id})
+        await conn.execute(text("DELETE FROM positions WHERE market_id = :market_id"), {"market_id": market_id})
+        await conn.execute(text("DELETE FROM fills WHERE market_id = :market_id"), {"market_id": market_id})
+        await conn.execute(text("DELETE FROM markets WHERE id = :market_id"), {"market_id": market_id})
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fills", type=int, default=1_000_000)
+    parser.add_argument("--accounts", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=settings.settlement_batch_size)
+    args = parser.parse_args()
+
+    # Settle whatever is already pending so it does not skew the measurement.
+    await settle_pending(AsyncSessionLocal)
+
+    async with engine.begin() as conn:
+        market_id = (await conn.execute(text(
+            "INSERT INTO markets (tenant_id, symbol, status, created_at) VALUES (:tenant, :symbol, 'CLOSED', now()) RETURNING id"
+        ), {"tenant": uuid.uuid4(), "symbol": f"BENCH-{uuid.uuid4().hex[:8]}"})).scalar_one()
+
+    try:
+        started = time.perf_counter()
+        await load_fills(market_id, args.fills, args.accounts)
+        print(f"loaded {args.fills:,} fills in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        summary = await settle_pending(AsyncSessionLocal, batch_size=args.batch_size)
+        elapsed = time.perf_counter() - started
+
+        print(
+            f"settled {summary['fills']:,} fills in {summary['batches']} batches: {elapsed:.1f}s, "
+            f"{summary['fills'] / elapsed:,.0f} fills/s, {elapsed / max(summary['batches'], 1) * 1000:.0f}ms per batch "
+            f"(interval budget {settings.settlement_interval_seconds:.0f}s)"
+        )
+    finally:
+        await cleanup(market_id)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
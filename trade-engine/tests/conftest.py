@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+import pytest_asyncio
+import uuid
+import uvicorn
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from app.config import settings
+from sqlalchemy.pool import NullPool
+
+from app.main import app
+from app.candles import candles
+from app.database import Base
+from app.dependencies import get_db
+from app.engine.registry import registry
+from app.engine.risk import ledger
+from app.identity import forwarded_headers
+from app.streaming import hub
+
+#a separate database URL specifically for testing.
+TEST_DATABASE_URL = settings.trade_database_url.replace("/trade_db", "/trade_test_db")
+
+engine = create_async_engine(
+    TEST_DATABASE_URL,
+    echo=False,
+    poolclass=NullPool
+)
+TestingSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+@pytest_asyncio.fixture(scope="session", autouse=True)
+async def setup_test_database():
+    """Creates the tables before tests run, and drops them after."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+
+@pytest.fixture
+def session_factory():
+    """The test session factory, for code that opens its own sessions (engine, writer, jobs)."""
+    return TestingSessionLocal
+
+@pytest_asyncio.fixture
+async def db_session():
+    """Provides a fresh database session for a single test."""
+    async with TestingSessionLocal() as session:
+        yield session
+        await session.rollback()
+
+@pytest_asyncio.fixture
+async def trading_registry():
+    """Starts the market registry (engines + writer + risk ledger + candles) against the test database."""
+    await candles.load(TestingSessionLocal)
+    await registry.start(TestingSessionLocal, listeners=[hub, candles], ledger=ledger)
+    yield registry
+    await registry.stop()
+
+@pytest_asyncio.fixture
+async def client(db_session: AsyncSession, trading_registry):
+    """
+    Overrides the get_db dependency to use the test database,
+    and yields an AsyncClient to make mock HTTP requests.
+    """
+    async def override_get_db():
+        yield db_session
+
+    app.dependency_overrides[get_db] = override_get_db
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+    app.dependency_overrides.clear()
+
+@pytest.fixture
+def tenant_id():
+    return uuid.uuid4()
+
+@pytest.fixture(autouse=True)
+def forwarded_headers_secret(monkeypatch):
+    """Lets tests act as the trusted forwarder (principal_headers)."""
+    monkeypatch.setattr(settings, "trust_forwarded_headers", True)
+    monkeypatch.setattr(settings, "trade_forwarded_headers_secret", "test_forwarding_secret")
+
+def principal_headers(tenant_id: uuid.UUID, account_id: uuid.UUID | None = None, max_markets: int | None = None) -> dict:
+    """Signed headers a trusted forwarder sends for an authenticated user."""
+    return forwarded_headers(account_id or uuid.uuid4(), tenant_id, max_markets)
+
+@pytest_asyncio.fixture
+async def serve():
+    """
+    Serves ASGI apps on local ports in this event loop: `await serve(app)` returns
+    the server's http://127.0.0.1:<port> address. They are shut down after the test.
+    """
+    servers: list[tuple[uvicorn.Server, asyncio.Task]] = []
+
+    async def start(asgi_app) -> str:
+        server = uvicorn.Server(uvicorn.Config(asgi_app, host="127.0.0.1", port=0, log_level="warning", lifespan="off"))
+        task = asyncio.create_task(server.serve())
+        servers.append((server, task))
+        while not server.started:
+            await asyncio.sleep(0.01)
+        return f"http://127.0.0.1:{server.servers[0].sockets[0].getsockname()[1]}"
+
+    yield start
+    for server, task in servers:
+        server.should_exit = True
+    await asyncio.gather(*(task for _, task in servers))
@@ -0,0 +1,136 @@
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import insert, select
+
+from app.candles import DAY, CandleAggregator
+from app.engine.orderbook import BUY, Fill
+from app.models import Candle, Fill as FillRow
+from tests.conftest import principal_headers
+from tests.test_orders import create_market
+from tests.test_settlement import make_market
+
+pytestmark = pytest.mark.asyncio
+
+BUYER, SELLER = uuid.uuid4(), uuid.uuid4()
+
+
+def trade(aggregator: CandleAggregator, market_id: int, timestamp: int, *fills: tuple[int, int]) -> None:
+    """Feeds one engine batch of (price, quantity) fills stamped `timestamp`."""
+    batch = SimpleNamespace(
+        created_at=datetime.fromtimestamp(timestamp, timezone.utc),
+        fills=[Fill(market_id, 0, 0, BUY, BUYER, SELLER, price, quantity, 0) for price, quantity in fills],
+    )
+    aggregator.on_batch(SimpleNamespace(market_id=market_id), batch)
+
+
+async def test_fills_roll_up_into_every_resolution():
+    aggregator = CandleAggregator(ring_size=4)
+    base = 1_700_000_100 - 1_700_000_100 % 3600
+    trade(aggregator, 1, base + 5, (100, 2), (104, 1))
+    trade(aggregator, 1, base + 50, (98, 3))
+    trade(aggregator, 1, base + 70, (101, 1))
+
+    minute = aggregator.series[(1, 60)]
+    assert minute.closed().tolist() == [(base, 100, 104, 98, 98, 6, 3)]
+    assert minute.current == [base + 60, 101, 101, 101, 101, 1, 1]
+    assert aggregator.series[(1, 300)].current == [base, 100, 104, 98, 101, 7, 4]
+    assert aggregator.series[(1, 86400)].current[0] == base - base % DAY
+    assert [(resolution, candle[0]) for _, resolution, candle in aggregator.pending] == [(60, base)]
+
+    # Buckets without trades produce no candle; the ring keeps the newest `ring_size`.
+    for i in range(2, 7):
+        trade(aggregator, 1, base + i * 120, (100 + i, 1))
+    assert aggregator.close_elapsed(now=base + 6 * 120 + 60) == 1
+    assert minute.closed()["start"].tolist() == [base + i * 120 for i in range(3, 7)]
+    assert minute.current is None and aggregator.series[(1, 300)].current is not None
+
+
+async def test_queries_combine_database_and_ring(session_factory):
+    market_id = await make_market(session_factory)
+    aggregator = CandleAggregator(ring_size=3)
+    aggregator._session_factory = session_factory
+    base = int(time.time()) // 60 * 60 - 60 * 20
+    for i in range(10):
+        trade(aggregator, market_id, base + i * 60, (50 + i, 1))
+    assert await aggregator.flush() > 0
+
+    async with session_factory() as session:
+        persisted = (await session.execute(
+            select(Candle.start).where(Candle.market_id == market_id, Candle.resolution == 60).order_by(Candle.start)
+        )).scalars().all()
+    assert persisted == [base + i * 60 for i in range(10)]
+
+    everything = await aggregator.query(market_id, 60, base, base + 3600, 100)
+    assert [row[0] for row in everything] == [base + i * 60 for i in range(10)]
+    assert [row[4] for row in everything] == [50 + i for i in range(10)]
+
+    # Within the ring: no database needed, limit applies oldest first.
+    recent = await aggregator.query(market_id, 60, base + 7 * 60, base + 3600, 2)
+    assert [row[0] for row in recent] == [base + 7 * 60, base + 8 * 60]
+    assert await aggregator.query(market_id, 60, base + 2 * 60, base + 4 * 60, 100) == [
+        [base + 2 * 60, 52, 52, 52, 52, 1, 1], [base + 3 * 60, 53, 53, 53, 53, 1, 1],
+    ]
+
+
+async def test_load_rebuilds_today_from_fills(session_factory):
+    now = int(time.time())
+    first = now // 60 * 60 - 120
+    if first < now - now % DAY:
+        pytest.skip("Too close to midnight UTC for two closed minutes today")
+    market_id = await make_market(session_factory)
+    rows = [
+        (first + 1, 10, 2), (first + 30, 14, 1), (first + 59, 9, 1),
+        (first + 61, 11, 5), (now, 12, 1),
+    ]
+    async with session_factory() as session:
+        await session.execute(insert(FillRow), [
+            {
+                "market_id": market_id, "taker_order_id": i, "maker_order_id": i, "taker_side": 0,
+                "buy_account_id": BUYER, "sell_account_id": SELLER, "price": price, "quantity": quantity,
+                "created_at": datetime.fromtimestamp(timestamp, timezone.utc),
+            }
+            for i, (timestamp, price, quantity) in enumerate(rows, 1)
+        ])
+        await session.commit()
+
+    aggregator = CandleAggregator(ring_size=10)
+    await aggregator.load(session_factory)
+
+    minutes = await aggregator.query(market_id, 60, first, now + 60, 10)
+    assert minutes == [
+        [first, 10, 14, 9, 9, 4, 3],
+        [first + 60, 11, 11, 11, 11, 5, 1],
+        [now // 60 * 60, 12, 12, 12, 12, 1, 1],
+    ]
+    # The minutes that had closed were written back, the open one was not.
+    async with session_factory() as session:
+        persisted = (await session.execute(
+            select(Candle.start).where(Candle.market_id == market_id, Candle.resolution == 60).order_by(Candle.start)
+        )).scalars().all()
+    assert persisted == [first, first + 60]
+    day = aggregator.series[(market_id, DAY)].current
+    assert day[1:] == [10, 14, 9, 12, 10, 5]
+
+
+async def test_candles_endpoint(client: AsyncClient, tenant_id):
+    market_id = await create_market(client, tenant_id)
+    headers = principal_headers(tenant_id)
+    await client.post(f"/markets/{market_id}/orders/", json={"side": "SELL", "price": 30, "quantity": 5}, headers=headers)
+    await client.post(f"/markets/{market_id}/orders/", json={"side": "BUY", "price": 30, "quantity": 3}, headers=headers)
+    await client.post(f"/markets/{market_id}/orders/", json={"side": "BUY", "price": 30, "quantity": 2}, headers=headers)
+
+    res = await client.get(f"/markets/{market_id}/candles", params={"resolution": "5m"}, headers=headers)
+    assert res.status_code == 200
+    body = res.json()
+    assert body["resolution"] == "5m"
+    assert [candle[1:] for candle in body["candles"]] == [[30, 30, 30, 30, 5, 2]]
+
+    res = await client.get(f"/markets/{market_id}/candles", params={"resolution": "2m"}, headers=headers)
+    assert res.status_code == 422
+    res = await client.get(f"/markets/{market_id}/candles", params={"start": 100, "end": 50}, headers=headers)
+    assert res.status_code == 400
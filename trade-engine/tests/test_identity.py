@@ -0,0 +1,208 @@
+import asyncio
+import contextvars
+import time
+import uuid
+import pytest
+import pytest_asyncio
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from fastapi import FastAPI
+from httpx import AsyncClient
+from jose import jwk, jwt
+
+from app.config import Settings, settings
+from app.dependencies import get_principal
+from app.identity import InvalidToken, forwarded_headers, verifier
+from app.logging_config import tenant_id_var
+from app.resilience import set_deadline
+from tests.test_orders import create_market
+
+pytestmark = pytest.mark.asyncio
+
+
+class SigningKey:
+    def __init__(self, kid: str):
+        self.kid = kid
+        self.pem = ec.generate_private_key(ec.SECP256R1()).private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ).decode()
+        self.jwk = {**jwk.construct(self.pem, "ES256").public_key().to_dict(), "kid": kid, "use": "sig"}
+
+    def token(self, account_id: uuid.UUID, tenant_id: uuid.UUID, lifetime: float = 600, **claims) -> str:
+        now = int(time.time())
+        body = {
+            "iss": "identity-service", "sub": str(account_id), "tid": str(tenant_id),
+            "jti": uuid.uuid4().hex, "iat": now, "exp": now + lifetime, **claims,
+        }
+        return jwt.encode(body, self.pem, algorithm="ES256", headers={"kid": self.kid})
+
+
+class StandIn:
+    """Local HTTP stand-in for identity-service's key set and revocation list."""
+
+    def __init__(self):
+        self.keys = [SigningKey("key-1")]
+        # (cursor, jti, exp)
+        self.revocations: list[tuple[int, str, int]] = []
+        self.jwks_calls = 0
+        self.revocation_calls: list[int] = []
+        self.app = FastAPI()
+
+        @self.app.get("/.well-known/jwks.json")
+        async def jwks():
+            self.jwks_calls += 1
+            return {"keys": [key.jwk for key in self.keys]}
+
+        @self.app.get("/internal/revocations")
+        async def revocations(since: int = 0):
+            self.revocation_calls.append(since)
+            page = [entry for entry in self.revocations if entry[0] > since][:2]
+            return {
+                "cursor": page[-1][0] if page else since,
+                "revoked": [[jti, exp] for _, jti, exp in page],
+                "more": len(page) == 2,
+            }
+
+    def revoke(self, token: str) -> None:
+        claims = jwt.get_unverified_claims(token)
+        self.revocations.append((len(self.revocations) + 1, claims["jti"], claims["exp"]))
+
+
+@pytest_asyncio.fixture
+async def identity(monkeypatch, serve):
+    stub = StandIn()
+    monkeypatch.setattr(verifier, "base_url", await serve(stub.app))
+    monkeypatch.setattr(settings, "identity_jwks_min_refresh_seconds", 0.0)
+    monkeypatch.setattr(settings, "identity_revocation_poll_interval_seconds", 3600.0)
+    verifier.start()
+    yield stub
+    await verifier.stop()
+    verifier.keys, verifier.revoked, verifier.cache, verifier.cursor = {}, {}, {}, 0
+    verifier._refreshed_at = float("-inf")
+
+
+async def test_tokens_are_verified_locally_with_cached_keys(identity):
+    account_id, tenant_id = uuid.uuid4(), uuid.uuid4()
+    token = identity.keys[0].token(account_id, tenant_id, mkt=3)
+
+    verified = await verifier.verify(token)
+    assert (verified.account_id, verified.tenant_id, verified.max_markets) == (account_id, tenant_id, 3)
+    calls = identity.jwks_calls
+    # Further tokens signed with a known key, and concurrent ones, need no call to identity-service.
+    await asyncio.gather(*(verifier.verify(identity.keys[0].token(uuid.uuid4(), tenant_id)) for _ in range(20)))
+    assert identity.jwks_calls == calls
+
+    with pytest.raises(InvalidToken):
+        await verifier.verify(identity.keys[0].token(account_id, tenant_id, lifetime=-1))
+    with pytest.raises(InvalidToken):
+        await verifier.verify(identity.keys[0].token(account_id, tenant_id, iss="someone-else"))
+    forged = SigningKey("key-1").token(account_id, tenant_id)
+    with pytest.raises(InvalidToken):
+        await verifier.verify(forged)
+
+
+async def test_unknown_key_ids_refresh_the_key_set_once(identity, monkeypatch):
+    await verifier.verify(identity.keys[0].token(uuid.uuid4(), uuid.uuid4()))
+    calls = identity.jwks_calls
+
+    # Rotation: identity-service starts signing with a new key.
+    identity.keys.insert(0, SigningKey("key-2"))
+    tokens = [identity.keys[0].token(uuid.uuid4(), uuid.uuid4()) for _ in range(10)]
+    await asyncio.gather(*(verifier.verify(token) for token in tokens))
+    assert identity.jwks_calls == calls + 1
+
+    # Made-up key ids are rate limited rather than each fetching the key set.
+    monkeypatch.setattr(settings, "identity_jwks_min_refresh_seconds", 60.0)
+    for i in range(5):
+        with pytest.raises(InvalidToken):
+            await verifier.verify(SigningKey(f"bogus-{i}").token(uuid.uuid4(), uuid.uuid4()))
+    assert identity.jwks_calls == calls + 1
+
+
+async def test_key_fetch_ignores_the_deadline_of_the_request_that_started_it(identity):
+    await verifier.verify(identity.keys[0].token(uuid.uuid4(), uuid.uuid4()))
+    identity.keys.insert(0, SigningKey("key-2"))
+    tenant_id = uuid.uuid4()
+    token = identity.keys[0].token(uuid.uuid4(), tenant_id)
+
+    async def hurried_request():
+        set_deadline(0.000001)
+        return await verifier.verify(token)
+
+    assert (await asyncio.create_task(hurried_request())).tenant_id == tenant_id
+    assert "key-2" in verifier.keys
+
+
+async def test_revocations_are_pulled_incrementally(identity):
+    account_id, tenant_id = uuid.uuid4(), uuid.uuid4()
+    tokens = [identity.keys[0].token(account_id, tenant_id) for _ in range(4)]
+    for token in tokens:
+        await verifier.verify(token)
+
+    for token in tokens[:3]:
+        identity.revoke(token)
+    # An already expired revocation is pulled, then forgotten.
+    identity.revocations.append((4, "long-gone", int(time.time()) - 10))
+    assert await verifier.sync_revocations() == 4
+    assert verifier.cursor == 4 and "long-gone" not in verifier.revoked
+
+    for token in tokens[:3]:
+        with pytest.raises(InvalidToken):
+            await verifier.verify(token)
+    await verifier.verify(tokens[3])
+
+    identity.revoke(tokens[3])
+    identity.revocation_calls.clear()
+    assert await verifier.sync_revocations() == 1
+    assert identity.revocation_calls == [4]
+    with pytest.raises(InvalidToken):
+        await verifier.verify(tokens[3])
+
+
+async def test_orders_accept_bearer_tokens(client: AsyncClient, identity, tenant_id, monkeypatch):
+    market_id = await create_market(client, tenant_id)
+    token = identity.keys[0].token(uuid.uuid4(), tenant_id)
+
+    res = await client.post(
+        f"/markets/{market_id}/orders/", json={"side": "BUY", "price": 10, "quantity": 1},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert res.status_code == 201, res.text
+    res = await client.get("/portfolio/", headers={"Authorization": "Bearer not-a-token"})
+    assert res.status_code == 401
+
+    monkeypatch.setattr(settings, "trust_forwarded_headers", False)
+    res = await client.get("/portfolio/", headers={"X-User-ID": str(uuid.uuid4()), "X-Tenant-ID": str(tenant_id)})
+    assert res.status_code == 401
+
+
+async def test_principal_binds_the_tenant_for_logging(identity):
+    tenant_id = uuid.uuid4()
+    token = identity.keys[0].token(uuid.uuid4(), tenant_id)
+
+    context = contextvars.copy_context()
+    principal = await asyncio.create_task(get_principal(authorization=f"Bearer {token}"), context=context)
+    assert principal.tenant_id == tenant_id
+    assert context[tenant_id_var] == str(tenant_id)
+
+
+async def test_forwarded_headers_must_be_signed(client: AsyncClient, monkeypatch):
+    tenant_id = uuid.uuid4()
+    signed = forwarded_headers(uuid.uuid4(), tenant_id, max_markets=1)
+    assert (await client.get("/markets/", headers=signed)).status_code == 200
+
+    unsigned = {"X-User-ID": signed["X-User-ID"], "X-Tenant-ID": str(tenant_id)}
+    raised_quota = {**signed, "X-Tenant-Max-Markets": "1000"}
+    other_tenant = {**signed, "X-Tenant-ID": str(uuid.uuid4())}
+    stale = forwarded_headers(uuid.uuid4(), tenant_id)
+    stale["X-Forwarded-Timestamp"] = str(int(time.time()) - 3600)
+    for headers in (unsigned, raised_quota, other_tenant, stale):
+        assert (await client.get("/markets/", headers=headers)).status_code == 401
+
+    # Without a secret, forwarded headers are never believed.
+    monkeypatch.setattr(settings, "trade_forwarded_headers_secret", "")
+    assert (await client.get("/markets/", headers=forwarded_headers(uuid.uuid4(), tenant_id))).status_code == 401
+
+
+async def test_forwarded_headers_are_off_by_default():
+    assert Settings.model_fields["trust_forwarded_headers"].default is False
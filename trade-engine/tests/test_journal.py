@@ -0,0 +1,251 @@
+import itertools
+import os
+import uuid
+import pytest
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from app.engine.journal import Journal, JournalCorrupt, list_segments, list_snapshots, orders_from_rows, recover, snapshot_rows
+from app.engine.market import MarketEngine, MarketUnavailable
+from app.engine.orderbook import BUY, LIMIT, MARKET, SELL
+from app.engine.registry import MarketRegistry
+from app.models import Fill, JournalCheckpoint, Order
+from tests.test_settlement import make_market
+
+pytestmark = pytest.mark.asyncio
+
+
+def resting(books) -> list[tuple]:
+    return sorted((o.order_id, o.market_id, o.account_id, o.side, o.price, o.quantity, o.remaining) for book in books for o in book.orders.values())
+
+
+def recovered(recovery) -> list[tuple]:
+    return sorted((o.order_id, o.market_id, o.account_id, o.side, o.price, o.quantity, o.remaining) for o in orders_from_rows(recovery.resting))
+
+
+async def trade(engine: MarketEngine, accounts: list[uuid.UUID], count: int, seed: int) -> None:
+    """Deterministic mix of resting, crossing, market orders and cancels."""
+    for i in range(count):
+        account = accounts[(i * 7 + seed) % len(accounts)]
+        if i % 5 == 4:
+            await engine.submit(account, i % 2, MARKET, 0, 3)
+        else:
+            side = BUY if (i + seed) % 2 else SELL
+            result = await engine.submit(account, side, LIMIT, 100 + (i * 13 + seed) % 9 - 4, 1 + i % 6)
+            if i % 7 == 0 and result.remaining:
+                await engine.cancel(result.order_id, account)
+
+
+async def journaled_engines(directory, market_ids, segment_bytes=None):
+    journal = Journal(directory, segment_bytes)
+    journal.open(1)
+    journal.start()
+    ids = itertools.count(1)
+    engines = [MarketEngine(market_id, None, lambda: next(ids), journal=journal) for market_id in market_ids]
+    for engine in engines:
+        engine.start()
+    return journal, engines
+
+
+async def stop_all(journal, engines) -> None:
+    for engine in engines:
+        await engine.stop()
+    await journal.stop()
+
+
+async def test_recovery_rebuilds_books(tmp_path):
+    journal, engines = await journaled_engines(tmp_path, [1, 2])
+    accounts = [uuid.uuid4() for _ in range(5)]
+    for seed, engine in enumerate(engines):
+        await trade(engine, accounts, 200, seed)
+    await stop_all(journal, engines)
+
+    recovery = recover(tmp_path)
+    assert recovery.last_seq == journal.last_seq
+    assert recovered(recovery) == resting(engine.book for engine in engines)
+
+
+async def test_failed_commit_halts_the_market(tmp_path, monkeypatch):
+    journal, engines = await journaled_engines(tmp_path, [1])
+    engine = engines[0]
+    account = uuid.uuid4()
+    rested = await engine.submit(account, SELL, LIMIT, 100, 5)
+
+    def disk_full(frame):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(journal, "_write", disk_full)
+    with pytest.raises(MarketUnavailable):
+        await engine.submit(account, BUY, LIMIT, 100, 2)
+    assert engine.halted is not None
+
+    # Even once the disk recovers, nothing more is matched against a book that lost events.
+    monkeypatch.undo()
+    for command in (
+        engine.submit(account, BUY, LIMIT, 100, 1),
+        engine.cancel(rested.order_id, account),
+        engine.cancel_all(account),
+    ):
+        with pytest.raises(MarketUnavailable):
+            await command
+    await stop_all(journal, engines)
+
+    recovery = recover(tmp_path)
+    assert [(o.order_id, o.remaining) for o in orders_from_rows(recovery.resting)] == [(rested.order_id, 5)]
+
+
+async def test_command_failing_midway_halts_the_market(tmp_path, monkeypatch):
+    journal, engines = await journaled_engines(tmp_path, [1])
+    engine = engines[0]
+    account = uuid.uuid4()
+    rested = await engine.submit(account, SELL, LIMIT, 100, 5)
+    published = []
+    engine.listeners.append(type("Listener", (), {"on_batch": lambda self, engine, batch: published.append(batch)})())
+    last_seq = journal.last_seq
+
+    def broken(fill):
+        raise RuntimeError("boom")
+
+    # The second order matches, and fails after the book has already changed.
+    monkeypatch.setattr(journal, "record_fill", broken)
+    with pytest.raises(MarketUnavailable):
+        await engine.submit_many(account, [(BUY, LIMIT, 90, 1), (BUY, LIMIT, 100, 2)])
+    assert engine.halted is not None
+    assert journal.last_seq == last_seq and published == []
+    with pytest.raises(MarketUnavailable):
+        await engine.cancel(rested.order_id, account)
+    monkeypatch.undo()
+    await stop_all(journal, engines)
+
+    recovery = recover(tmp_path)
+    assert [(o.order_id, o.remaining) for o in orders_from_rows(recovery.resting)] == [(rested.order_id, 5)]
+
+
+async def test_snapshot_plus_tail_and_pruning(tmp_path):
+    journal, engines = await journaled_engines(tmp_path, [1], segment_bytes=2048)
+    engine = engines[0]
+    accounts = [uuid.uuid4() for _ in range(4)]
+    await trade(engine, accounts, 150, 0)
+
+    seq = journal.last_seq
+    rows = snapshot_rows([engine.book], seq)
+    await journal.commit()
+    journal.write_snapshot(seq, 10_000, rows)
+    segments_before = len(list_segments(tmp_path))
+    journal.prune(seq)
+    assert 1 < segments_before
+    assert len(list_segments(tmp_path)) < segments_before
+
+    await trade(engine, accounts, 150, 1)
+    await stop_all(journal, engines)
+
+    recovery = recover(tmp_path)
+    assert recovery.snapshot_seq == seq
+    assert 0 < recovery.records_replayed < journal.last_seq
+    assert recovered(recovery) == resting([engine.book])
+    assert recovery.next_order_id == 10_000
+
+    # Only the newest snapshot is kept.
+    journal.write_snapshot(journal.last_seq, 10_000, snapshot_rows([engine.book], journal.last_seq))
+    journal.prune(0)
+    assert [s for s, _ in list_snapshots(tmp_path)] == [journal.last_seq]
+
+
+async def test_torn_tail_is_truncated(tmp_path):
+    journal, engines = await journaled_engines(tmp_path, [1])
+    account = uuid.uuid4()
+    await engines[0].submit(account, BUY, LIMIT, 100, 5)
+    await engines[0].submit(account, BUY, LIMIT, 101, 5)
+    await stop_all(journal, engines)
+
+    (_, path), = list_segments(tmp_path)
+    good_size = path.stat().st_size
+    with open(path, "ab") as f:
+        # Half of a frame that never finished writing.
+        f.write(b"\x40\x00\x00\x00\xde\xad\xbe\xef\x01\x00")
+
+    recovery = recover(tmp_path)
+    assert [row[1] for row in recovery.resting.tolist()] == [1, 2]
+    assert path.stat().st_size == good_size
+
+
+async def test_corrupt_frame_drops_it_and_everything_after(tmp_path):
+    journal, engines = await journaled_engines(tmp_path, [1])
+    account = uuid.uuid4()
+    await engines[0].submit(account, BUY, LIMIT, 100, 5)
+    size_after_first = os.path.getsize(list_segments(tmp_path)[0][1])
+    await engines[0].submit(account, BUY, LIMIT, 101, 5)
+    await stop_all(journal, engines)
+
+    (_, path), = list_segments(tmp_path)
+    with open(path, "r+b") as f:
+        f.seek(size_after_first + 30)
+        f.write(b"\xff")
+
+    recovery = recover(tmp_path)
+    assert [row[1] for row in recovery.resting.tolist()] == [1]
+    assert path.stat().st_size == size_after_first
+
+
+async def test_corrupt_frame_in_an_older_segment_stops_recovery(tmp_path):
+    journal, engines = await journaled_engines(tmp_path, [1], segment_bytes=2048)
+    await trade(engines[0], [uuid.uuid4() for _ in range(4)], 150, 0)
+    await stop_all(journal, engines)
+
+    segments = list_segments(tmp_path)
+    assert len(segments) > 2
+    _, path = segments[1]
+    size = path.stat().st_size
+    with open(path, "r+b") as f:
+        f.seek(size // 2)
+        byte = f.read(1)[0]
+        f.seek(size // 2)
+        f.write(bytes([byte ^ 0xff]))
+
+    with pytest.raises(JournalCorrupt):
+        recover(tmp_path)
+    # Nothing is cut off, so the damage can still be inspected.
+    assert path.stat().st_size == size
+
+
+async def test_registry_restart_recovers_and_redrives(tmp_path, session_factory):
+    market_id = await make_market(session_factory)
+    seller, buyer = uuid.uuid4(), uuid.uuid4()
+
+    first = MarketRegistry()
+    await first.start(session_factory, journal_dir=str(tmp_path))
+    assert list_snapshots(tmp_path)
+    engine = first.get(market_id)
+    rest = await engine.submit(seller, SELL, LIMIT, 60, 10)
+    await first.writer.flush()
+
+    # From here on the database sees nothing: the process "crashes" after the journal commit.
+    first.writer._task.cancel()
+    cancelled = await engine.submit(seller, SELL, LIMIT, 70, 4)
+    taker = await engine.submit(buyer, BUY, MARKET, 0, 3)
+    assert (await engine.cancel(cancelled.order_id, seller)).status == "CANCELLED"
+    expected = resting([engine.book])
+    for market in first.engines.values():
+        await market.stop()
+    last_seq = first.journal.last_seq
+    await first.journal.stop()
+
+    second = MarketRegistry()
+    await second.start(session_factory, journal_dir=str(tmp_path))
+    try:
+        assert resting([second.get(market_id).book]) == expected
+        assert second.next_order_id() > taker.order_id
+
+        await second.writer.flush()
+        async with session_factory() as session:
+            orders = {row.id: row for row in (await session.execute(select(Order).where(Order.market_id == market_id))).scalars()}
+            fills = (await session.execute(select(func.count()).select_from(Fill).where(Fill.market_id == market_id))).scalar_one()
+            checkpoint = await session.get(JournalCheckpoint, "writer")
+        assert (orders[rest.order_id].remaining, orders[rest.order_id].status) == (7, "PARTIALLY_FILLED")
+        assert orders[cancelled.order_id].status == "CANCELLED"
+        assert orders[taker.order_id].status == "FILLED"
+        assert fills == 1
+        assert checkpoint.last_seq == last_seq
+    finally:
+        await second.stop()
+    assert len(list_snapshots(tmp_path)) == 1
@@ -0,0 +1,151 @@
+import asyncio
+import time
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from httpx import AsyncClient
+
+from app.config import settings
+from app.market_data import PriceFeed, PriceUnavailable
+from app.routers import markets
+from tests.conftest import principal_headers
+
+pytestmark = pytest.mark.asyncio
+
+
+class StandIn:
+    """Local HTTP stand-in for CoinGecko's /simple/price."""
+
+    def __init__(self):
+        self.prices = {"bitcoin": 65000.0, "ethereum": 3200.0, "solana": 150.0}
+        self.calls: list[list[str]] = []
+        self.mode = "ok"
+        self.delay = 0.0
+        self.app = FastAPI()
+
+        @self.app.get("/api/v3/simple/price")
+        async def simple_price(request: Request):
+            ids = request.query_params["ids"].split(",")
+            currency = request.query_params["vs_currencies"]
+            self.calls.append(ids)
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            if self.mode == "error":
+                return JSONResponse(status_code=500, content={"error": "upstream down"})
+            if self.mode == "rate_limited":
+                return JSONResponse(status_code=429, content={"error": "slow down"}, headers={"Retry-After": "120"})
+            return {coin: {currency: self.prices[coin]} for coin in ids if coin in self.prices}
+
+
+@pytest_asyncio.fixture
+async def stand_in(serve):
+    stub = StandIn()
+    stub.url = f"{await serve(stub.app)}/api/v3"
+    return stub
+
+
+@pytest_asyncio.fixture
+async def feed(stand_in):
+    price_feed = PriceFeed(base_url=stand_in.url)
+    price_feed.start()
+    yield price_feed
+    await price_feed.stop()
+
+
+async def test_poll_fetches_all_tracked_coins_in_one_request(feed, stand_in):
+    feed.track(["bitcoin", "ethereum", "solana"])
+    await feed.refresh(feed.tracked)
+
+    assert stand_in.calls == [["bitcoin", "ethereum", "solana"]]
+    assert (await feed.get_quote("ethereum")).price == 3200.0
+    # Served from the snapshot, no further upstream calls
+    assert len(stand_in.calls) == 1
+
+
+async def test_large_id_lists_are_split(feed, stand_in, monkeypatch):
+    monkeypatch.setattr(settings, "price_batch_size", 2)
+    await feed.refresh(["bitcoin", "ethereum", "solana"])
+    assert stand_in.calls == [["bitcoin", "ethereum"], ["solana"]]
+
+
+async def test_concurrent_misses_are_coalesced(feed, stand_in):
+    stand_in.delay = 0.05
+    coins = ["bitcoin", "ethereum", "solana"] * 20
+
+    quotes = await asyncio.gather(*(feed.get_quote(coin) for coin in coins))
+
+    assert len(stand_in.calls) == 1
+    assert sorted(stand_in.calls[0]) == ["bitcoin", "ethereum", "solana"]
+    assert [q.price for q in quotes[:3]] == [65000.0, 3200.0, 150.0]
+
+
+async def test_unknown_coins_are_cached_as_misses(feed, stand_in, monkeypatch):
+    for _ in range(3):
+        with pytest.raises(PriceUnavailable):
+            await feed.get_quote("not-a-coin")
+    assert stand_in.calls == [["not-a-coin"]]
+
+    # Once the miss is older than the TTL, the upstream is asked again.
+    monkeypatch.setattr(settings, "price_ttl_seconds", 0.0)
+    stand_in.prices["not-a-coin"] = 1.0
+    assert (await feed.get_quote("not-a-coin")).price == 1.0
+    assert len(stand_in.calls) == 2
+
+
+async def test_stale_quotes_are_served_while_revalidating(feed, stand_in, monkeypatch):
+    await feed.refresh(["bitcoin"])
+    monkeypatch.setattr(settings, "price_ttl_seconds", 0.0)
+    stand_in.prices["bitcoin"] = 66000.0
+    stand_in.delay = 0.05
+
+    started = time.perf_counter()
+    quote = await feed.get_quote("bitcoin")
+    assert time.perf_counter() - started < stand_in.delay
+    assert quote.price == 65000.0
+
+    await asyncio.shield(feed._inflight["bitcoin"])
+    assert (await feed.get_quote("bitcoin")).price == 66000.0
+    assert len(stand_in.calls) == 2
+
+
+async def test_upstream_failure_keeps_last_known_good(feed, stand_in, monkeypatch):
+    await feed.refresh(["bitcoin"])
+    stand_in.mode = "error"
+    monkeypatch.setattr(settings, "price_ttl_seconds", 0.0)
+
+    await feed.refresh(["bitcoin"])
+    quote = await feed.get_quote("bitcoin")
+    assert quote.price == 65000.0 and quote.is_stale()
+
+    # While backing off, misses fail fast instead of hammering the upstream
+    calls = len(stand_in.calls)
+    with pytest.raises(PriceUnavailable):
+        await feed.get_quote("solana")
+    assert len(stand_in.calls) == calls
+
+
+async def test_rate_limit_honours_retry_after(feed, stand_in):
+    stand_in.mode = "rate_limited"
+    await feed.refresh(["bitcoin"])
+    assert feed._backoff_until - time.monotonic() > 100
+
+    with pytest.raises(PriceUnavailable):
+        await feed.get_quote("bitcoin")
+    assert len(stand_in.calls) == 1
+
+
+async def test_market_price_endpoint(client: AsyncClient, tenant_id, feed, monkeypatch):
+    monkeypatch.setattr(markets, "price_feed", feed)
+    res = await client.post("/markets/", json={"symbol": "BTC-100K", "price_feed_id": "bitcoin"}, headers=principal_headers(tenant_id))
+    market_id = res.json()["id"]
+    assert "bitcoin" in feed.tracked
+
+    price = await client.get(f"/markets/{market_id}/price", headers=principal_headers(tenant_id))
+    assert price.status_code == 200
+    assert price.json()["price"] == 65000.0
+    assert price.json()["currency"] == "usd"
+    assert price.json()["stale"] is False
+
+    res = await client.post("/markets/", json={"symbol": "NO-FEED"}, headers=principal_headers(tenant_id))
+    assert (await client.get(f"/markets/{res.json()['id']}/price", headers=principal_headers(tenant_id))).status_code == 404
@@ -0,0 +1,62 @@
+from app.engine.orderbook import BUY, SELL, LIMIT, MARKET, Order, OrderBook
+
+
+def make_order(order_id: int, side: int, price: int, quantity: int, order_type: int = LIMIT, account: str = "a") -> Order:
+    return Order(order_id, 1, account, side, order_type, price, quantity)
+
+
+def test_resting_orders_build_sorted_levels():
+    book = OrderBook(1)
+    for order_id, (side, price) in enumerate([(BUY, 48), (BUY, 50), (BUY, 49), (SELL, 53), (SELL, 51), (SELL, 52)], 1):
+        assert book.submit(make_order(order_id, side, price, 10)) == []
+
+    assert book.best_bid() == 50
+    assert book.best_ask() == 51
+    assert book.depth(2) == {"bids": [[50, 10], [49, 10]], "asks": [[51, 10], [52, 10]]}
+
+
+def test_price_time_priority_and_partial_fills():
+    """Better prices fill first; within a level the earliest order fills first."""
+    book = OrderBook(1)
+    book.submit(make_order(1, SELL, 51, 5, account="early"))
+    book.submit(make_order(2, SELL, 51, 5, account="late"))
+    book.submit(make_order(3, SELL, 50, 3, account="best"))
+
+    taker = make_order(4, BUY, 51, 10, account="taker")
+    fills = book.submit(taker)
+
+    assert [(f.maker_order_id, f.price, f.quantity) for f in fills] == [(3, 50, 3), (1, 51, 5), (2, 51, 2)]
+    assert fills[-1].maker_remaining == 3
+    assert fills[0].buy_account_id == "taker" and fills[0].sell_account_id == "best"
+    assert taker.remaining == 0
+    assert book.depth() == {"bids": [], "asks": [[51, 3]]}
+
+
+def test_limit_remainder_rests_and_market_remainder_does_not():
+    book = OrderBook(1)
+    book.submit(make_order(1, SELL, 50, 4))
+
+    limit = make_order(2, BUY, 50, 10)
+    book.submit(limit)
+    assert limit.remaining == 6
+    assert book.best_bid() == 50
+
+    market = make_order(3, SELL, 0, 20, order_type=MARKET)
+    fills = book.submit(market)
+    assert sum(f.quantity for f in fills) == 6
+    assert market.remaining == 14
+    assert len(book) == 0
+
+
+def test_cancel_is_constant_time_and_keeps_fifo():
+    book = OrderBook(1)
+    for order_id in range(1, 4):
+        book.submit(make_order(order_id, BUY, 50, 1))
+
+    assert book.cancel(2).order_id == 2
+    assert book.cancel(2) is None
+
+    fills = book.submit(make_order(4, SELL, 50, 2))
+    assert [f.maker_order_id for f in fills] == [1, 3]
+    assert book.best_bid() is None
+    assert book.bid_keys == [] and book.bids == {}
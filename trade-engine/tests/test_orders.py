@@ -0,0 +1,173 @@
+import asyncio
+import uuid
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.engine import writer as writer_module
+from app.engine.orderbook import BUY, LIMIT, Order as BookOrder
+from app.engine.writer import TradeWriter, WriteBatch, order_row
+from app.models import Fill, Order
+from tests.conftest import principal_headers
+
+pytestmark = pytest.mark.asyncio
+
+
+async def create_market(client: AsyncClient, tenant_id: uuid.UUID, symbol: str | None = None) -> int:
+    res = await client.post("/markets/", json={"symbol": symbol or f"MKT-{uuid.uuid4().hex[:8]}"}, headers=principal_headers(tenant_id))
+    assert res.status_code == 201, res.text
+    return res.json()["id"]
+
+
+async def test_create_market_duplicate_symbol(client: AsyncClient, tenant_id):
+    await create_market(client, tenant_id, "ELECTION-2028")
+    res = await client.post("/markets/", json={"symbol": "ELECTION-2028"}, headers=principal_headers(tenant_id))
+    assert res.status_code == 409
+
+
+async def test_orders_match_and_persist(client: AsyncClient, tenant_id, trading_registry, db_session):
+    """
+    Test the full order flow: a resting sell is partially filled by a crossing buy,
+    the rest is cancelled, and fills and final order states reach the database.
+    """
+    market_id = await create_market(client, tenant_id)
+    seller = principal_headers(tenant_id)
+    buyer = principal_headers(tenant_id)
+
+    sell = await client.post(f"/markets/{market_id}/orders/", json={"side": "SELL", "price": 60, "quantity": 10}, headers=seller)
+    assert sell.status_code == 201
+    assert sell.json()["status"] == "OPEN"
+    sell_id = sell.json()["order_id"]
+
+    buy = await client.post(f"/markets/{market_id}/orders/", json={"side": "BUY", "type": "MARKET", "quantity": 4}, headers=buyer)
+    assert buy.json()["status"] == "FILLED"
+    assert buy.json()["fills"] == [{"price": 60, "quantity": 4, "maker_order_id": sell_id}]
+
+    book = await client.get(f"/markets/{market_id}/book", headers=seller)
+    assert book.json()["asks"] == [[60, 6]]
+
+    # Only the owner can cancel
+    assert (await client.delete(f"/markets/{market_id}/orders/{sell_id}", headers=buyer)).status_code == 404
+    cancel = await client.delete(f"/markets/{market_id}/orders/{sell_id}", headers=seller)
+    assert cancel.json()["status"] == "CANCELLED"
+
+    await trading_registry.writer.flush()
+
+    fills = (await db_session.execute(select(Fill).where(Fill.market_id == market_id))).scalars().all()
+    assert [(f.price, f.quantity) for f in fills] == [(60, 4)]
+    stored = await db_session.get(Order, sell_id)
+    assert (stored.status, stored.remaining) == ("CANCELLED", 6)
+
+
+async def test_limit_orders_require_a_price(client: AsyncClient, tenant_id):
+    market_id = await create_market(client, tenant_id)
+    res = await client.post(f"/markets/{market_id}/orders/", json={"side": "BUY", "quantity": 1}, headers=principal_headers(tenant_id))
+    assert res.status_code == 422
+
+
+async def test_unknown_market(client: AsyncClient, tenant_id):
+    res = await client.post("/markets/999999/orders/", json={"side": "BUY", "price": 1, "quantity": 1}, headers=principal_headers(tenant_id))
+    assert res.status_code == 404
+
+
+async def test_other_tenants_markets_are_not_found(client: AsyncClient, tenant_id):
+    market_id = await create_market(client, tenant_id)
+    owner = principal_headers(tenant_id)
+    resting = await client.post(f"/markets/{market_id}/orders/", json={"side": "SELL", "price": 60, "quantity": 1}, headers=owner)
+    assert resting.status_code == 201
+
+    outsider = principal_headers(uuid.uuid4())
+    res = await client.post(f"/markets/{market_id}/orders/", json={"side": "BUY", "price": 60, "quantity": 1}, headers=outsider)
+    assert res.status_code == 404
+    assert (await client.get(f"/markets/{market_id}/book", headers=outsider)).status_code == 404
+    assert (await client.delete(f"/markets/{market_id}/orders/", headers=outsider)).status_code == 404
+    assert (await client.get(f"/markets/{market_id}/book", headers=owner)).json()["asks"] == [[60, 1]]
+
+
+async def test_batch_submit_and_mass_cancel(client: AsyncClient, tenant_id, trading_registry, db_session):
+    market_id = await create_market(client, tenant_id)
+    maker = principal_headers(tenant_id)
+    orders = [
+        {"side": "SELL", "price": 52, "quantity": 5},
+        {"side": "SELL", "price": 51, "quantity": 5},
+        {"side": "BUY", "price": 1_000_000, "quantity": 1_000},
+        {"side": "BUY", "price": 48, "quantity": 5},
+        {"side": "BUY", "price": 49, "quantity": 5},
+    ]
+    res = await client.post(f"/markets/{market_id}/orders/batch", json={"orders": orders}, headers=maker)
+    assert res.status_code == 200
+    body = res.json()
+    assert (body["accepted"], body["rejected"]) == (4, 1)
+    assert body["results"][2] == {"status": "REJECTED", "reason": "insufficient_balance", "detail": "Insufficient available balance"}
+    assert [result["status"] for result in body["results"]] == ["OPEN", "OPEN", "REJECTED", "OPEN", "OPEN"]
+
+    book = (await client.get(f"/markets/{market_id}/book", headers=maker)).json()
+    assert (book["bids"], book["asks"]) == ([[49, 5], [48, 5]], [[51, 5], [52, 5]])
+
+    # Another account's orders are untouched.
+    other = await client.post(f"/markets/{market_id}/orders/", json={"side": "SELL", "price": 60, "quantity": 1}, headers=principal_headers(tenant_id))
+    res = await client.delete(f"/markets/{market_id}/orders/", params={"side": "SELL"}, headers=maker)
+    assert res.json()["cancelled"] == 2
+    res = await client.delete(f"/markets/{market_id}/orders/", headers=maker)
+    cancelled = res.json()["orders"]
+    assert sorted(order["order_id"] for order in cancelled) == sorted(body["results"][i]["order_id"] for i in (3, 4))
+    book = (await client.get(f"/markets/{market_id}/book", headers=maker)).json()
+    assert (book["bids"], book["asks"]) == ([], [[60, 1]])
+
+    await trading_registry.writer.flush()
+    stored = (await db_session.execute(select(Order).where(Order.market_id == market_id, Order.id != other.json()["order_id"]))).scalars().all()
+    assert sorted(order.status for order in stored) == ["CANCELLED"] * 4
+
+
+async def test_batch_size_is_limited(client: AsyncClient, tenant_id):
+    market_id = await create_market(client, tenant_id)
+    headers = principal_headers(tenant_id)
+    res = await client.post(f"/markets/{market_id}/orders/batch", json={"orders": []}, headers=headers)
+    assert res.status_code == 422
+    res = await client.post(
+        f"/markets/{market_id}/orders/batch", json={"orders": [{"side": "BUY", "price": 1, "quantity": 1}] * 201}, headers=headers
+    )
+    assert res.status_code == 422
+
+
+async def test_writer_dead_letters_only_the_batch_at_fault(client: AsyncClient, tenant_id, session_factory, monkeypatch, caplog):
+    monkeypatch.setattr(writer_module, "RETRY_SECONDS", 0.0)
+    monkeypatch.setattr(settings, "writer_max_attempts", 2)
+    market_id = await create_market(client, tenant_id)
+    writer = TradeWriter(session_factory)
+
+    good, bad = WriteBatch(), WriteBatch()
+    # An order id far above the engine's sequence, in a market that exists...
+    good.new_orders.append(order_row(BookOrder(10**12, market_id, uuid.uuid4(), BUY, LIMIT, 10, 1), "OPEN", good.created_at))
+    # ...and one in a market that does not, which no retry can fix.
+    bad.new_orders.append(order_row(BookOrder(10**12 + 1, 999_999, uuid.uuid4(), BUY, LIMIT, 10, 1), "OPEN", bad.created_at))
+    writer.submit(bad)
+    writer.submit(good)
+    writer.start()
+    try:
+        await asyncio.wait_for(writer.flush(), timeout=5)
+    finally:
+        await writer.stop()
+
+    async with session_factory() as session:
+        written = await session.get(Order, 10**12)
+        assert written is not None
+        assert await session.get(Order, 10**12 + 1) is None
+        await session.delete(written)
+        await session.commit()
+    assert "Dropping a write batch" in caplog.text
+    assert not writer.stalled
+
+
+async def test_orders_are_refused_while_the_writer_is_stalled(client: AsyncClient, tenant_id, trading_registry, monkeypatch):
+    market_id = await create_market(client, tenant_id)
+    headers = principal_headers(tenant_id)
+    monkeypatch.setattr(trading_registry.writer, "stalled", True)
+
+    res = await client.post(f"/markets/{market_id}/orders/", json={"side": "BUY", "price": 10, "quantity": 1}, headers=headers)
+    assert res.status_code == 503
+    res = await client.post(f"/markets/{market_id}/orders/batch", json={"orders": [{"side": "BUY", "price": 10, "quantity": 1}]}, headers=headers)
+    assert res.status_code == 503
+    # Cancels still go through.
+    assert (await client.delete(f"/markets/{market_id}/orders/", headers=headers)).status_code == 200
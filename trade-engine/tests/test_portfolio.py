@@ -0,0 +1,128 @@
+import uuid
+import numpy as np
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import insert
+
+from app.engine.orderbook import BUY, SELL, Fill
+from app.models import Fill as FillRow
+from app.portfolio import PortfolioValuation
+from app.routers import portfolio as portfolio_router
+from app.settlement import settle_pending
+from tests.conftest import principal_headers
+from tests.test_settlement import make_market
+
+pytestmark = pytest.mark.asyncio
+
+ALICE, BOB, CAROL = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+
+def fill(market_id, buyer, seller, price, quantity, taker_side=BUY) -> Fill:
+    return Fill(market_id, 0, 0, taker_side, buyer, seller, price, quantity, 0)
+
+
+def assert_matches_full_pass(valuation: PortfolioValuation) -> None:
+    """The incrementally maintained totals must equal a from-scratch pass."""
+    incremental = {name: column.copy() for name, column in valuation.totals().items()}
+    valuation.revalue()
+    for name, column in valuation.totals().items():
+        np.testing.assert_allclose(incremental[name], column, err_msg=name)
+
+
+async def test_mark_to_market_and_margin():
+    valuation = PortfolioValuation(margin_rate=0.5)
+    valuation.apply_fills([fill(1, ALICE, BOB, 40, 10), fill(2, ALICE, CAROL, 70, 2)])
+    valuation.set_marks([1, 2], [50, 60])
+
+    alice = valuation.account_summary(ALICE)
+    assert alice["cash"] == -400 - 140
+    assert alice["market_value"] == 500 + 120
+    assert alice["unrealized_pnl"] == (500 - 400) + (120 - 140)
+    assert alice["equity"] == 80
+    assert alice["margin_used"] == 310
+    assert {p["market_id"]: p["unrealized_pnl"] for p in alice["positions"]} == {1: 100, 2: -20}
+
+    bob = valuation.account_summary(BOB)
+    # Short 10 @ 40, marked at 50
+    assert (bob["market_value"], bob["unrealized_pnl"], bob["margin_used"]) == (-500, -100, 250)
+    # Margin used with negative equity has no ratio
+    assert (bob["equity"], bob["margin_usage"]) == (-100, None)
+    assert_matches_full_pass(valuation)
+
+
+async def test_unpriced_markets_are_carried_at_cost():
+    valuation = PortfolioValuation()
+    valuation.apply_fills([fill(3, ALICE, BOB, 25, 4)])
+    summary = valuation.account_summary(ALICE)
+    assert summary["market_value"] == 100 and summary["unrealized_pnl"] == 0
+    assert summary["positions"][0]["mark"] is None
+
+
+async def test_incremental_updates_match_a_full_pass():
+    rng = np.random.default_rng(3)
+    accounts = [uuid.uuid4() for _ in range(200)]
+    valuation = PortfolioValuation(capacity=4)
+
+    for _ in range(20):
+        fills = [
+            fill(int(rng.integers(1, 30)), accounts[rng.integers(200)], accounts[rng.integers(200)], int(rng.integers(1, 100)), int(rng.integers(1, 20)), SELL)
+            for _ in range(50)
+        ]
+        valuation.apply_fills(fills)
+        moved = rng.choice(np.arange(1, 30), size=3, replace=False)
+        valuation.set_marks(moved.tolist(), rng.integers(1, 100, size=3).tolist())
+        assert_matches_full_pass(valuation)
+
+    # Cash and positions net to zero across all accounts
+    totals = valuation.totals()
+    assert totals["cash"].sum() == 0
+    assert valuation.quantity[:valuation.size].sum() == 0
+
+
+async def test_load_includes_settled_and_unsettled_fills(session_factory):
+    await settle_pending(session_factory)
+    market_id = await make_market(session_factory)
+    buyer, seller = uuid.uuid4(), uuid.uuid4()
+
+    async def add_fill(price, quantity):
+        async with session_factory() as session:
+            await session.execute(insert(FillRow), [{
+                "market_id": market_id, "taker_order_id": 1, "maker_order_id": 2, "taker_side": BUY,
+                "buy_account_id": buyer, "sell_account_id": seller, "price": price, "quantity": quantity,
+            }])
+            await session.commit()
+
+    await add_fill(30, 5)
+    await settle_pending(session_factory)
+    await add_fill(36, 5)
+
+    valuation = PortfolioValuation()
+    await valuation.load(session_factory)
+
+    summary = valuation.account_summary(buyer)
+    assert summary["cash"] == -150 - 180
+    assert summary["cost"] == 330
+    # Marked at the last trade
+    assert summary["market_value"] == 10 * 36
+    assert_matches_full_pass(valuation)
+
+
+async def test_portfolio_endpoint_follows_live_fills(client: AsyncClient, tenant_id, trading_registry, monkeypatch):
+    valuation = PortfolioValuation()
+    valuation.loaded = True
+    monkeypatch.setattr(portfolio_router, "portfolio", valuation)
+    for engine in trading_registry.engines.values():
+        engine.listeners.append(valuation)
+    trading_registry.listeners.append(valuation)
+
+    res = await client.post("/markets/", json={"symbol": f"PF-{uuid.uuid4().hex[:6]}"}, headers=principal_headers(tenant_id))
+    market_id = res.json()["id"]
+    maker, taker = principal_headers(tenant_id), principal_headers(tenant_id)
+    await client.post(f"/markets/{market_id}/orders/", json={"side": "SELL", "price": 20, "quantity": 3}, headers=maker)
+    await client.post(f"/markets/{market_id}/orders/", json={"side": "BUY", "price": 20, "quantity": 3}, headers=taker)
+
+    res = await client.get("/portfolio/", headers=taker)
+    assert res.status_code == 200
+    body = res.json()
+    assert body["cash"] == -60
+    assert body["positions"] == [{"market_id": market_id, "quantity": 3, "cost": 60, "mark": 20.0, "market_value": 60.0, "unrealized_pnl": 0.0}]
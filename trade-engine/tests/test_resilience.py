@@ -0,0 +1,168 @@
+import asyncio
+import time
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from httpx import AsyncClient
+
+from app.resilience import (
+    BulkheadFull, CircuitBreaker, CircuitOpen, DeadlineExceeded, DependencyUnavailable, ResilientClient,
+    hedges_total, requests_total, reset_deadline, set_deadline,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+class StandIn:
+    """A local dependency whose latency and status can be scripted per call."""
+
+    def __init__(self):
+        self.calls = 0
+        self.concurrent = 0
+        self.max_concurrent = 0
+        self.deadlines: list[int] = []
+        # Delay and status for the next calls, in order; then 0s and 200
+        self.delays: list[float] = []
+        self.statuses: list[int] = []
+        self.app = FastAPI()
+
+        @self.app.get("/lookup")
+        async def lookup(request: Request):
+            self.calls += 1
+            self.deadlines.append(int(request.headers.get("x-deadline-ms", -1)))
+            delay = self.delays.pop(0) if self.delays else 0.0
+            status = self.statuses.pop(0) if self.statuses else 200
+            self.concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self.concurrent)
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self.concurrent -= 1
+            return JSONResponse(status_code=status, content={"call": self.calls})
+
+
+@pytest_asyncio.fixture
+async def stand_in(serve):
+    stub = StandIn()
+    stub.url = await serve(stub.app)
+    return stub
+
+
+@pytest_asyncio.fixture
+async def make_client(stand_in):
+    clients = []
+
+    def make(name: str, **options) -> ResilientClient:
+        options = {"timeout": 1.0, "max_connections": 10, **options}
+        client = ResilientClient(name, stand_in.url, **options)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        await client.aclose()
+
+
+async def test_deadline_bounds_and_propagates(stand_in, make_client):
+    client = make_client("deadline-test", timeout=5.0)
+    await client.get("/lookup")
+    assert 4000 < stand_in.deadlines[-1] <= 5000
+
+    token = set_deadline(0.3)
+    try:
+        await client.get("/lookup")
+        assert 0 < stand_in.deadlines[-1] <= 300
+
+        # Timing out against the caller's deadline does not count against the dependency.
+        stand_in.delays = [1.0]
+        with pytest.raises(DeadlineExceeded):
+            await client.get("/lookup")
+        assert client.breaker.failures == 0
+    finally:
+        reset_deadline(token)
+
+    token = set_deadline(-0.01)
+    try:
+        calls = stand_in.calls
+        with pytest.raises(DeadlineExceeded):
+            await client.get("/lookup")
+        assert stand_in.calls == calls
+    finally:
+        reset_deadline(token)
+
+
+async def test_breaker_opens_fails_fast_and_recovers(stand_in, make_client):
+    client = make_client("breaker-test", breaker_failures=3, breaker_reset_seconds=0.2, timeout=0.2)
+    stand_in.statuses = [500, 503]
+    stand_in.delays = [0, 0, 1.0]
+    for _ in range(3):
+        with pytest.raises(DependencyUnavailable):
+            await client.get("/lookup")
+    assert client.breaker.state == CircuitBreaker.OPEN
+    assert requests_total.value(dependency="breaker-test", outcome="timeout") == 1
+
+    calls = stand_in.calls
+    started = time.perf_counter()
+    with pytest.raises(CircuitOpen):
+        await client.get("/lookup")
+    assert time.perf_counter() - started < 0.05
+    assert stand_in.calls == calls
+
+    await asyncio.sleep(0.25)
+    # Half-open: one probe goes through; the rest still fail fast until it answers.
+    stand_in.delays = [0.1]
+    probe = asyncio.create_task(client.get("/lookup"))
+    await asyncio.sleep(0.02)
+    with pytest.raises(CircuitOpen):
+        await client.get("/lookup")
+    assert (await probe).status_code == 200
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    # Client errors mean the dependency is healthy.
+    stand_in.statuses = [404] * 5
+    for _ in range(5):
+        assert (await client.get("/lookup")).status_code == 404
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+async def test_bulkhead_caps_calls_in_flight(stand_in, make_client):
+    client = make_client("bulkhead-test", max_connections=2)
+    stand_in.delays = [0.3, 0.3]
+    busy = [asyncio.create_task(client.get("/lookup")) for _ in range(2)]
+    await asyncio.sleep(0.05)
+
+    token = set_deadline(0.1)
+    try:
+        with pytest.raises(BulkheadFull):
+            await client.get("/lookup")
+    finally:
+        reset_deadline(token)
+    # Without a tight deadline a call waits for a slot instead.
+    assert (await client.get("/lookup")).status_code == 200
+    await asyncio.gather(*busy)
+    assert stand_in.max_concurrent == 2
+    assert requests_total.value(dependency="bulkhead-test", outcome="bulkhead_full") == 1
+
+
+async def test_slow_idempotent_calls_are_hedged(stand_in, make_client):
+    client = make_client("hedge-test", hedge_after_seconds=0.05)
+    stand_in.delays = [0.5]
+    started = time.perf_counter()
+    response = await client.get("/lookup", hedge=True)
+    assert time.perf_counter() - started < 0.3
+    assert response.json() == {"call": 2}
+    assert hedges_total.value(dependency="hedge-test", winner="hedge") == 1
+
+    # Fast answers are never hedged, and hedging is opt-in per call.
+    calls = stand_in.calls
+    await client.get("/lookup", hedge=True)
+    stand_in.delays = [0.1]
+    await client.get("/lookup")
+    assert stand_in.calls == calls + 2
+
+
+async def test_requests_past_their_deadline_are_not_served(client: AsyncClient):
+    res = await client.get("/health", headers={"X-Deadline-Ms": "0"})
+    assert res.status_code == 504
+    res = await client.get("/health", headers={"X-Deadline-Ms": "500"})
+    assert res.status_code == 200
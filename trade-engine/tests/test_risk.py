@@ -0,0 +1,125 @@
+import uuid
+import pytest
+from httpx import AsyncClient
+
+from app.engine.market import MarketEngine
+from app.engine.orderbook import BUY, LIMIT, MARKET, SELL, Fill
+from app.engine.risk import INSUFFICIENT_BALANCE, POSITION_LIMIT, RiskLedger, RiskRejected
+from app.settlement import settle_pending
+from tests.conftest import principal_headers
+from tests.test_orders import create_market
+from tests.test_settlement import cash, insert_fills, make_market
+
+pytestmark = pytest.mark.asyncio
+
+
+async def risk_engine(ledger: RiskLedger, market_id: int = 1) -> MarketEngine:
+    ids = iter(range(1, 10_000)).__next__
+    engine = MarketEngine(market_id, None, ids, ledger=ledger)
+    engine.start()
+    return engine
+
+
+async def test_buys_reserve_and_release_cash():
+    ledger = RiskLedger(credit_limit=1000, max_position=100)
+    engine = await risk_engine(ledger)
+    buyer, seller = uuid.uuid4(), uuid.uuid4()
+    try:
+        first = await engine.submit(buyer, BUY, LIMIT, 60, 10)
+        assert ledger.available(buyer) == 400
+        with pytest.raises(RiskRejected) as rejected:
+            await engine.submit(buyer, BUY, LIMIT, 60, 10)
+        assert rejected.value.reason == INSUFFICIENT_BALANCE
+
+        # A partial fill turns part of the reservation into spent cash.
+        await engine.submit(seller, SELL, LIMIT, 55, 4)
+        assert ledger.accounts[buyer].reserved == 360
+        assert ledger.accounts[buyer].unsettled == -240
+        assert ledger.accounts[seller].unsettled == 240
+        assert ledger.positions[(buyer, 1)].quantity == 4
+        assert ledger.positions[(seller, 1)].quantity == -4
+
+        await engine.cancel(first.order_id, buyer)
+        assert ledger.accounts[buyer].reserved == 0
+        assert ledger.available(buyer) == 760
+        assert ledger.positions[(buyer, 1)].open_buy == 0
+    finally:
+        await engine.stop()
+
+
+async def test_market_buys_are_checked_at_sweep_cost():
+    ledger = RiskLedger(credit_limit=1000, max_position=100)
+    engine = await risk_engine(ledger)
+    buyer, seller = uuid.uuid4(), uuid.uuid4()
+    try:
+        await engine.submit(seller, SELL, LIMIT, 50, 10)
+        await engine.submit(seller, SELL, LIMIT, 80, 10)
+        assert engine.book.sweep_cost(BUY, 15) == 10 * 50 + 5 * 80
+
+        with pytest.raises(RiskRejected):
+            await engine.submit(buyer, BUY, MARKET, 0, 18)
+        result = await engine.submit(buyer, BUY, MARKET, 0, 12)
+        assert result.status == "FILLED"
+        assert ledger.available(buyer) == 1000 - 10 * 50 - 2 * 80
+    finally:
+        await engine.stop()
+
+
+async def test_position_limit_counts_resting_orders():
+    ledger = RiskLedger(credit_limit=10**9, max_position=10)
+    engine = await risk_engine(ledger)
+    account = uuid.uuid4()
+    try:
+        await engine.submit(account, SELL, LIMIT, 70, 6)
+        with pytest.raises(RiskRejected) as rejected:
+            await engine.submit(account, SELL, LIMIT, 71, 5)
+        assert rejected.value.reason == POSITION_LIMIT
+        # Buying reduces the short exposure side independently.
+        await engine.submit(account, BUY, LIMIT, 60, 10)
+    finally:
+        await engine.stop()
+
+
+async def test_settlement_reconciles_the_ledger(session_factory):
+    await settle_pending(session_factory)
+    market_id = await make_market(session_factory)
+    ledger = RiskLedger()
+    await ledger.load(session_factory, [])
+    buyer, seller = uuid.uuid4(), uuid.uuid4()
+
+    await insert_fills(session_factory, market_id, [(buyer, seller, 40, 5), (buyer, seller, 42, 5)])
+    # What the engine would have booked for those fills.
+    ledger.apply_fills([
+        Fill(market_id, 1, 1, BUY, buyer, seller, 40, 5, 0),
+        Fill(market_id, 2, 2, BUY, buyer, seller, 42, 5, 0),
+    ])
+    before = ledger.available(buyer)
+
+    await settle_pending(session_factory, on_settled=ledger.apply_settlement)
+
+    account = ledger.accounts[buyer]
+    assert (account.settled, account.unsettled) == (await cash(session_factory, buyer), 0) == (-410, 0)
+    assert ledger.positions[(seller, market_id)].settled == -10
+    assert ledger.positions[(seller, market_id)].unsettled == 0
+    assert ledger.available(buyer) == before
+
+    # A fresh load agrees with the incrementally maintained ledger.
+    reloaded = RiskLedger()
+    await reloaded.load(session_factory, [])
+    assert reloaded.available(buyer) == ledger.available(buyer)
+
+
+async def test_api_rejects_orders_and_markets_over_limits(client: AsyncClient, tenant_id):
+    market_id = await create_market(client, tenant_id)
+    res = await client.post(
+        f"/markets/{market_id}/orders/", json={"side": "BUY", "price": 1_000_000, "quantity": 1_000}, headers=principal_headers(tenant_id)
+    )
+    assert res.status_code == 400
+    assert res.json()["detail"] == "Insufficient available balance"
+
+    headers = principal_headers(tenant_id, max_markets=2)
+    res = await client.post("/markets/", json={"symbol": f"MKT-{uuid.uuid4().hex[:8]}"}, headers=headers)
+    assert res.status_code == 201
+    res = await client.post("/markets/", json={"symbol": f"MKT-{uuid.uuid4().hex[:8]}"}, headers=headers)
+    assert res.status_code == 400
+    assert res.json()["detail"] == "Maximum number of active markets reached"
@@ -0,0 +1,123 @@
+import uuid
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.future import select
+
+from app import settlement
+from app.models import Balance, Fill, Market, Position, SettlementCheckpoint
+from app.settlement import settle_pending
+
+pytestmark = pytest.mark.asyncio
+
+
+async def make_market(session_factory) -> int:
+    async with session_factory() as session:
+        market = Market(tenant_id=uuid.uuid4(), symbol=f"SETTLE-{uuid.uuid4().hex[:8]}", status='ACTIVE')
+        session.add(market)
+        await session.commit()
+        return market.id #type: ignore
+
+
+async def insert_fills(session_factory, market_id: int, trades: list[tuple[uuid.UUID, uuid.UUID, int, int]]) -> None:
+    """trades: (buyer, seller, price, quantity)"""
+    rows = [
+        {
+            "market_id": market_id, "taker_order_id": i, "maker_order_id": i, "taker_side": 0,
+            "buy_account_id": buyer, "sell_account_id": seller, "price": price, "quantity": quantity,
+        }
+        for i, (buyer, seller, price, quantity) in enumerate(trades, 1)
+    ]
+    async with session_factory() as session:
+        await session.execute(insert(Fill), rows)
+        await session.commit()
+
+
+async def cash(session_factory, account_id) -> int:
+    async with session_factory() as session:
+        balance = await session.get(Balance, account_id)
+        return balance.cash if balance else 0
+
+
+async def position(session_factory, account_id, market_id) -> int:
+    async with session_factory() as session:
+        row = await session.get(Position, (account_id, market_id))
+        return row.quantity if row else 0
+
+
+async def test_settles_balances_and_positions(session_factory):
+    await settle_pending(session_factory)
+    market_id = await make_market(session_factory)
+    alice, bob, carol = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+    await insert_fills(session_factory, market_id, [
+        (alice, bob, 60, 10),
+        (alice, carol, 62, 5),
+        (bob, alice, 65, 3),
+    ])
+    summary = await settle_pending(session_factory)
+
+    assert summary["fills"] == 3
+    assert await cash(session_factory, alice) == -600 - 310 + 195
+    assert await cash(session_factory, bob) == 600 - 195
+    assert await cash(session_factory, carol) == 310
+    assert await position(session_factory, alice, market_id) == 12
+    assert await position(session_factory, bob, market_id) == -7
+    assert await position(session_factory, carol, market_id) == -5
+
+    # Nothing left: a second run is a no-op
+    again = await settle_pending(session_factory)
+    assert again["fills"] == 0
+    assert await cash(session_factory, alice) == -715
+
+
+async def test_batches_are_bounded_and_checkpointed(session_factory):
+    await settle_pending(session_factory)
+    market_id = await make_market(session_factory)
+    buyer, seller = uuid.uuid4(), uuid.uuid4()
+    await insert_fills(session_factory, market_id, [(buyer, seller, 10, 1)] * 5)
+
+    summary = await settle_pending(session_factory, batch_size=2)
+
+    assert summary["batches"] == 3
+    assert await position(session_factory, buyer, market_id) == 5
+    async with session_factory() as session:
+        checkpoint = await session.get(SettlementCheckpoint, settlement.CHECKPOINT)
+        last_fill = (await session.execute(select(Fill.seq).order_by(Fill.seq.desc()).limit(1))).scalar_one()
+    assert checkpoint.last_seq == summary["checkpoint"] == last_fill
+
+
+async def test_crashed_run_resumes_without_double_settlement(session_factory, monkeypatch):
+    await settle_pending(session_factory)
+    market_id = await make_market(session_factory)
+    buyer, seller = uuid.uuid4(), uuid.uuid4()
+    await insert_fills(session_factory, market_id, [(buyer, seller, 7, 2)] * 6)
+
+    real_settle_batch = settlement._settle_batch
+    calls = 0
+
+    async def crash_on_second_batch(session, batch_size):
+        nonlocal calls
+        calls += 1
+        result = await real_settle_batch(session, batch_size)
+        if calls == 2:
+            raise ConnectionError("connection lost before commit")
+        return result
+
+    monkeypatch.setattr(settlement, "_settle_batch", crash_on_second_batch)
+    with pytest.raises(ConnectionError):
+        await settle_pending(session_factory, batch_size=2)
+    # Only the first batch committed
+    assert await position(session_factory, buyer, market_id) == 4
+
+    monkeypatch.setattr(settlement, "_settle_batch", real_settle_batch)
+    resumed = await settle_pending(session_factory, batch_size=2)
+
+    assert resumed["fills"] == 4
+    assert await position(session_factory, buyer, market_id) == 12
+    assert await cash(session_factory, seller) == 6 * 14
+
+
+async def test_scheduler_never_overlaps_runs():
+    job = settlement.create_scheduler().get_job("settlement")
+    assert job.max_instances == 1
+    assert job.coalesce is True
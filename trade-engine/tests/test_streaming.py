@@ -0,0 +1,191 @@
+import asyncio
+import json
+import uuid
+import pytest
+import pytest_asyncio
+import websockets
+from httpx import AsyncClient
+
+from app.config import settings
+from app.dependencies import Principal
+from app.main import app
+from app.routers.stream import _resolve_topic
+from app.streaming import StreamHub, CLOSE_TOO_SLOW
+from tests.conftest import principal_headers
+from tests.test_identity import identity  # noqa: F401 (fixture)
+from tests.test_orders import create_market
+
+pytestmark = pytest.mark.asyncio
+
+
+class FakeSocket:
+    """Records what the hub sends; can be 'stalled' to simulate a client that stops reading."""
+
+    def __init__(self):
+        self.sent: list[str] = []
+        self.flowing = asyncio.Event()
+        self.flowing.set()
+        self.closed_with = None
+
+    async def send_text(self, message: str) -> None:
+        await self.flowing.wait()
+        self.sent.append(message)
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        self.closed_with = code
+
+
+async def drain() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_each_update_is_serialized_once_per_topic():
+    hub = StreamHub()
+    sockets = [FakeSocket() for _ in range(500)]
+    subscribers = [hub.connect(ws, None) for ws in sockets]
+    for subscriber in subscribers:
+        hub.subscribe(subscriber, "book:1")
+
+    hub.publish("book:1", {"bids": [[50, 1]], "asks": []})
+    await drain()
+
+    first = sockets[0].sent[0]
+    assert json.loads(first) == {"topic": "book:1", "data": {"bids": [[50, 1]], "asks": []}}
+    assert all(ws.sent == [first] and ws.sent[0] is first for ws in sockets)
+    for subscriber in subscribers:
+        await hub.disconnect(subscriber)
+
+
+async def test_slow_consumers_get_the_latest_value():
+    hub = StreamHub()
+    slow = FakeSocket()
+    subscriber = hub.connect(slow, None)
+    hub.subscribe(subscriber, "book:1")
+    hub.subscribe(subscriber, "ticker:1")
+
+    slow.flowing.clear()
+    hub.publish("book:1", {"best": 0})
+    await drain()
+    for price in range(1, 100):
+        hub.publish("book:1", {"best": price})
+    hub.publish("ticker:1", {"last_price": 7})
+    await drain()
+    slow.flowing.set()
+    await drain()
+
+    received = [json.loads(message) for message in slow.sent]
+    # The first update was already being written when the client stalled; the other 99 collapsed into the latest.
+    assert [m["data"] for m in received] == [{"best": 0}, {"best": 99}, {"last_price": 7}]
+    await hub.disconnect(subscriber)
+
+
+async def test_clients_too_far_behind_are_disconnected(monkeypatch):
+    monkeypatch.setattr(settings, "stream_max_pending", 3)
+    hub = StreamHub()
+    slow, fast = FakeSocket(), FakeSocket()
+    slow_sub, fast_sub = hub.connect(slow, None), hub.connect(fast, None)
+    for subscriber in (slow_sub, fast_sub):
+        hub.subscribe(subscriber, "orders:a")
+
+    slow.flowing.clear()
+    for order_id in range(5):
+        hub.publish("orders:a", {"order_id": order_id}, key=f"order:{order_id}")
+        await drain()
+
+    assert slow.closed_with == CLOSE_TOO_SLOW
+    assert slow_sub.closed and slow_sub not in hub.topics["orders:a"]
+    assert len(fast.sent) == 5
+    await hub.disconnect(fast_sub)
+
+
+async def test_stale_backlog_triggers_disconnect(monkeypatch):
+    monkeypatch.setattr(settings, "stream_max_lag_seconds", 0.01)
+    hub = StreamHub()
+    slow = FakeSocket()
+    subscriber = hub.connect(slow, None)
+    hub.subscribe(subscriber, "book:1")
+
+    slow.flowing.clear()
+    hub.publish("book:1", {"v": 1})
+    hub.publish("book:1", {"v": 2})
+    await asyncio.sleep(0.02)
+    hub.publish("book:1", {"v": 3})
+    await drain()
+
+    assert slow.closed_with == CLOSE_TOO_SLOW
+
+
+@pytest_asyncio.fixture
+async def live_server(client, serve):
+    """Serves the app on a local port in this event loop, sharing the test registry and database."""
+    return (await serve(app)).replace("http://", "ws://", 1)
+
+
+async def next_message(ws, topic: str) -> dict:
+    while True:
+        message = json.loads(await asyncio.wait_for(ws.recv(), timeout=2))
+        if message["topic"] == topic:
+            return message["data"]
+
+
+async def test_stream_book_ticker_and_order_events(client: AsyncClient, live_server, tenant_id):
+    market_id = await create_market(client, tenant_id)
+    maker = principal_headers(tenant_id)
+    taker = principal_headers(tenant_id)
+
+    async with websockets.connect(f"{live_server}/stream", additional_headers=maker) as ws:
+        await ws.send(json.dumps({"op": "subscribe", "topics": [f"book:{market_id}", f"ticker:{market_id}", "orders", "book:999999"]}))
+        assert await next_message(ws, f"book:{market_id}") == {"market_id": market_id, "bids": [], "asks": []}
+        assert (await next_message(ws, "error"))["detail"] == "Unknown topic book:999999"
+        assert (await next_message(ws, "subscriptions"))["topics"] == sorted([f"book:{market_id}", f"ticker:{market_id}", f"orders:{maker['X-User-ID']}"])
+
+        sell = await client.post(f"/markets/{market_id}/orders/", json={"side": "SELL", "price": 40, "quantity": 5}, headers=maker)
+        sell_id = sell.json()["order_id"]
+        assert (await next_message(ws, f"book:{market_id}"))["asks"] == [[40, 5]]
+        assert (await next_message(ws, f"orders:{maker['X-User-ID']}"))["status"] == "OPEN"
+
+        await client.post(f"/markets/{market_id}/orders/", json={"side": "BUY", "price": 40, "quantity": 2}, headers=taker)
+        assert (await next_message(ws, f"book:{market_id}"))["asks"] == [[40, 3]]
+        ticker = await next_message(ws, f"ticker:{market_id}")
+        assert (ticker["last_price"], ticker["last_quantity"], ticker["last_side"]) == (40, 2, "BUY")
+        # The maker only sees its own order, never the taker's
+        event = await next_message(ws, f"orders:{maker['X-User-ID']}")
+        assert (event["order_id"], event["status"], event["remaining"]) == (sell_id, "PARTIALLY_FILLED", 3)
+
+
+async def test_browser_clients_authenticate_with_a_token(client: AsyncClient, live_server, identity, tenant_id):
+    market_id = await create_market(client, tenant_id)
+    account_id = uuid.uuid4()
+    token = identity.keys[0].token(account_id, tenant_id)
+    subscribe = json.dumps({"op": "subscribe", "topics": [f"ticker:{market_id}", "orders"]})
+    expected = sorted([f"ticker:{market_id}", f"orders:{account_id}"])
+
+    async with websockets.connect(f"{live_server}/stream", subprotocols=["bearer", token]) as ws:
+        assert ws.subprotocol == "bearer"
+        await ws.send(subscribe)
+        assert (await next_message(ws, "subscriptions"))["topics"] == expected
+
+    async with websockets.connect(f"{live_server}/stream") as ws:
+        await ws.send(json.dumps({"op": "auth", "token": token}))
+        await ws.send(subscribe)
+        assert (await next_message(ws, "subscriptions"))["topics"] == expected
+
+    with pytest.raises(websockets.exceptions.InvalidStatus):
+        async with websockets.connect(f"{live_server}/stream", subprotocols=["bearer", "not-a-token"]):
+            pass
+    async with websockets.connect(f"{live_server}/stream") as ws:
+        await ws.send(subscribe)
+        with pytest.raises(websockets.exceptions.ConnectionClosed) as closed:
+            await ws.recv()
+        assert closed.value.rcvd.code == 1008
+
+
+async def test_other_tenants_markets_cannot_be_streamed(client: AsyncClient, tenant_id):
+    market_id = await create_market(client, tenant_id)
+    owner = Principal(account_id=uuid.uuid4(), tenant_id=tenant_id)
+    outsider = Principal(account_id=uuid.uuid4(), tenant_id=uuid.uuid4())
+
+    assert _resolve_topic(f"book:{market_id}", owner) == f"book:{market_id}"
+    assert _resolve_topic(f"book:{market_id}", outsider) is None
+    assert _resolve_topic(f"ticker:{market_id}", outsider) is None